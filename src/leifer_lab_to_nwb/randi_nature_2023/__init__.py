@@ -2,5 +2,14 @@
 
 from ._randi_nature_2023_converter import RandiNature2023Converter
 from ._pump_probe_to_nwb import pump_probe_to_nwb
+from ._dataset_scheduler import pump_probe_dataset_to_nwb
+from ._dataset_worker import pump_probe_dataset_worker
+from ._preflight import preflight_dataset
 
-__all__ = ["RandiNature2023Converter", "pump_probe_to_nwb"]
+__all__ = [
+    "RandiNature2023Converter",
+    "pump_probe_to_nwb",
+    "pump_probe_dataset_to_nwb",
+    "pump_probe_dataset_worker",
+    "preflight_dataset",
+]
@@ -1,11 +1,18 @@
 """Command line interface wrapper around the PumpProbe conversion function."""
 
+import json
 import pathlib
 
 import click
 import pydantic
 
-from .convert_session import pump_probe_to_nwb
+from ._compression_benchmark import _format_compression_benchmark, benchmark_compression_methods
+from ._conversion_benchmark import _format_conversion_benchmark, benchmark_conversion
+from ._dataset_scheduler import pump_probe_dataset_to_nwb
+from ._dataset_worker import pump_probe_dataset_worker
+from ._preflight import preflight_dataset
+from ._pump_probe_to_nwb import pump_probe_to_nwb
+from ._testing._synthetic_session import generate_synthetic_session
 
 
 @click.command(name="pump_probe_to_nwb")
@@ -61,6 +68,131 @@ it marked as `nwb_testing`.
     required=False,
     default=False,
 )
+@click.option(
+    "--number_of_compression_workers",
+    help="""
+The number of workers used to compress the chunks of the raw imaging data in parallel.
+
+If not specified, compression is performed serially by HDF5.
+""",
+    required=False,
+    type=int,
+    default=None,
+)
+@click.option(
+    "--backend",
+    help="The backend of the NWB files; Zarr requires the `hdmf-zarr` package.",
+    required=False,
+    type=click.Choice(["hdf5", "zarr"]),
+    default="hdf5",
+)
+@click.option(
+    "--number_of_jobs",
+    help="Only applies to the Zarr backend. The number of processes writing the raw imaging data concurrently.",
+    required=False,
+    type=int,
+    default=1,
+)
+@click.option(
+    "--read_method",
+    help="""
+How the raw frames are read: copied out of a memory map ("memmap"), or in long reads that are dropped from the page
+cache once read ("sequential"), which is usually faster over network mounts and spares the cache of shared nodes.
+""",
+    required=False,
+    type=click.Choice(["memmap", "sequential"]),
+    default="memmap",
+)
+@click.option(
+    "--memory_budget_in_gb",
+    help="""
+The memory the buffers of the raw imaging data may take, in GB.
+
+Defaults to half of the memory available when the conversion starts, up to 10 GB.
+""",
+    required=False,
+    type=float,
+    default=None,
+)
+@click.option(
+    "--storage_mode",
+    help="""
+Whether to copy the raw imaging data into the NWB file ("copy"), to write a small 'index' file referring to the raw
+'.dat' files in place ("reference"), which can only be read alongside them, or to compress the raw imaging data into
+shard files written in parallel ("sharded"), which the NWB file stitches together and can only be read alongside.
+""",
+    required=False,
+    type=click.Choice(["copy", "reference", "sharded"]),
+    default="copy",
+)
+@click.option(
+    "--number_of_shards",
+    help="""
+The number of shard files of each imaging dataset with the "sharded" storage mode.
+
+Defaults to the number of CPUs.
+""",
+    required=False,
+    type=int,
+    default=None,
+)
+@click.option(
+    "--resume",
+    help="""
+Commit the progress of writing the raw imaging data to a checkpoint next to each NWB file, and continue an interrupted
+conversion of the same session from it rather than starting over.
+""",
+    is_flag=True,
+    required=False,
+    default=False,
+)
+@click.option(
+    "--volume_projections",
+    help="""
+Also write the maximum and mean projections over depth of each volume of the raw imaging data, computed while it is
+written, as small series of the 'ophys' processing module for quick looks and quality control.
+""",
+    is_flag=True,
+    required=False,
+    default=False,
+)
+@click.option(
+    "--live",
+    help="""
+Convert a session that is still being acquired, appending its raw imaging frames to the NWB file in batches as they are
+acquired, until none of its source files grew for the `--live_end_of_acquisition_timeout_in_s`.
+
+Only the raw conversion is run, since the processed data is produced after the acquisition.
+""",
+    is_flag=True,
+    required=False,
+    default=False,
+)
+@click.option(
+    "--live_poll_interval_in_s",
+    help="How often a live conversion checks the source files for newly acquired frames, in seconds.",
+    required=False,
+    type=float,
+    default=10.0,
+)
+@click.option(
+    "--live_end_of_acquisition_timeout_in_s",
+    help="How long the source files of a live conversion may go without growing before the acquisition has ended.",
+    required=False,
+    type=float,
+    default=300.0,
+)
+@click.option(
+    "--source_cache_folder_path",
+    help="""
+A folder in which to cache the parsed text, JSON, and pickle sources of the session.
+
+Repeated conversions of the same session then skip the parsing.
+""",
+    required=False,
+    type=click.Path(writable=True),
+    default=None,
+)
 def _pump_probe_to_nwb_cli(
     *,
     base_folder_path: pydantic.DirectoryPath,
@@ -68,24 +200,729 @@ def _pump_probe_to_nwb_cli(
     subject_id: int,
     nwb_output_folder_path: pydantic.DirectoryPath,
     testing: bool = False,
+    number_of_compression_workers: int | None = None,
+    backend: str = "hdf5",
+    number_of_jobs: int = 1,
+    memory_budget_in_gb: float | None = None,
+    read_method: str = "memmap",
+    storage_mode: str = "copy",
+    number_of_shards: int | None = None,
+    resume: bool = False,
+    volume_projections: bool = False,
+    live: bool = False,
+    live_poll_interval_in_s: float = 10.0,
+    live_end_of_acquisition_timeout_in_s: float = 300.0,
+    source_cache_folder_path: pydantic.DirectoryPath | None = None,
 ) -> None:
     subject_info_file_path = pathlib.Path(subject_info_file_path)
     nwb_output_folder_path = pathlib.Path(nwb_output_folder_path)
+    if source_cache_folder_path is not None:
+        source_cache_folder_path = pathlib.Path(source_cache_folder_path)
+        source_cache_folder_path.mkdir(parents=True, exist_ok=True)
+
+    if live is False:
+        pump_probe_to_nwb(
+            base_folder_path=base_folder_path,
+            subject_info_file_path=subject_info_file_path,
+            subject_id=subject_id,
+            nwb_output_folder_path=nwb_output_folder_path,
+            raw_or_processed="processed",
+            testing=testing,
+            backend=backend,
+            source_cache_folder_path=source_cache_folder_path,
+        )
 
     pump_probe_to_nwb(
         base_folder_path=base_folder_path,
         subject_info_file_path=subject_info_file_path,
         subject_id=subject_id,
         nwb_output_folder_path=nwb_output_folder_path,
-        raw_or_processed="processed",
+        raw_or_processed="raw",
         testing=testing,
+        number_of_compression_workers=number_of_compression_workers,
+        backend=backend,
+        number_of_jobs=number_of_jobs,
+        memory_budget_in_gb=memory_budget_in_gb,
+        read_method=read_method,
+        storage_mode=storage_mode,
+        number_of_shards=number_of_shards,
+        resume=resume,
+        volume_projections=volume_projections,
+        live=live,
+        live_poll_interval_in_s=live_poll_interval_in_s,
+        live_end_of_acquisition_timeout_in_s=live_end_of_acquisition_timeout_in_s,
+        source_cache_folder_path=source_cache_folder_path,
     )
 
-    pump_probe_to_nwb(
+
+@click.command(name="pump_probe_benchmark_compression")
+@click.option(
+    "--dat_file_path",
+    help="""
+Path to a raw binary file of frames, such as 'sCMOS_Frames_U16_1024x512.dat' from a pumpprobe folder or
+'frames-2048x2048.dat' from a multicolorworm folder.
+""",
+    required=True,
+    type=click.Path(writable=False),
+)
+@click.option(
+    "--number_of_frames",
+    help="The number of consecutive frames to sample from the middle of the file.",
+    required=False,
+    type=int,
+    default=100,
+)
+@click.option(
+    "--report_file_path",
+    help="If specified, the results are also saved to this JSON file.",
+    required=False,
+    type=click.Path(writable=True),
+    default=None,
+)
+def _benchmark_compression_cli(
+    *,
+    dat_file_path: pydantic.FilePath,
+    number_of_frames: int = 100,
+    report_file_path: pydantic.FilePath | None = None,
+) -> None:
+    results = benchmark_compression_methods(dat_file_path=dat_file_path, number_of_frames=number_of_frames)
+
+    print(_format_compression_benchmark(results=results))
+
+    if report_file_path is not None:
+        with open(file=report_file_path, mode="w") as io:
+            json.dump(obj=results, fp=io, indent=2)
+
+
+@click.command(name="pump_probe_generate_synthetic_session")
+@click.option(
+    "--base_folder_path",
+    help="The folder to write the synthetic session to.",
+    required=True,
+    type=click.Path(writable=True),
+)
+@click.option(
+    "--number_of_volumes",
+    help="The number of volumes of the pumpprobe recording.",
+    required=False,
+    type=int,
+    default=100,
+)
+@click.option(
+    "--frames_per_volume",
+    help="The number of frames per volume of the pumpprobe recording; each frame takes 1 MiB.",
+    required=False,
+    type=int,
+    default=40,
+)
+@click.option(
+    "--seed",
+    help="The seed of the random generator.",
+    required=False,
+    type=int,
+    default=0,
+)
+def _generate_synthetic_session_cli(
+    *,
+    base_folder_path: pydantic.DirectoryPath,
+    number_of_volumes: int = 100,
+    frames_per_volume: int = 40,
+    seed: int = 0,
+) -> None:
+    base_folder_path = pathlib.Path(base_folder_path)
+    base_folder_path.mkdir(parents=True, exist_ok=True)
+
+    subject_info_file_path = generate_synthetic_session(
+        base_folder_path=base_folder_path,
+        number_of_volumes=number_of_volumes,
+        frames_per_volume=frames_per_volume,
+        seed=seed,
+    )
+
+    print(f"\n\nSynthetic session written to '{base_folder_path}' with subject log '{subject_info_file_path}'!\n\n")
+
+
+@click.command(name="pump_probe_benchmark_conversion")
+@click.option(
+    "--benchmark_folder_path",
+    help="The folder to write the synthetic session, outputs, and results of the benchmark to.",
+    required=True,
+    type=click.Path(writable=True),
+)
+@click.option(
+    "--number_of_volumes",
+    help="The number of volumes of the synthetic pumpprobe recording.",
+    required=False,
+    type=int,
+    default=100,
+)
+@click.option(
+    "--frames_per_volume",
+    help="The number of frames per volume of the synthetic pumpprobe recording; each frame takes 1 MiB.",
+    required=False,
+    type=int,
+    default=40,
+)
+@click.option(
+    "--raw_or_processed",
+    help="Which kinds of conversions to benchmark; may be passed more than once. Defaults to both.",
+    required=False,
+    type=click.Choice(["raw", "processed"]),
+    multiple=True,
+    default=("processed", "raw"),
+)
+@click.option(
+    "--number_of_repeats",
+    help="The number of times each case is run; the fastest run is kept.",
+    required=False,
+    type=int,
+    default=1,
+)
+@click.option(
+    "--compression",
+    help="The compression method of the raw imaging data.",
+    required=False,
+    type=str,
+    default=None,
+)
+@click.option(
+    "--number_of_compression_workers",
+    help="The number of workers used to compress the chunks of the raw imaging data in parallel.",
+    required=False,
+    type=int,
+    default=None,
+)
+@click.option(
+    "--backend",
+    help="The backend of the NWB files; Zarr requires the `hdmf-zarr` package.",
+    required=False,
+    type=click.Choice(["hdf5", "zarr"]),
+    default="hdf5",
+)
+@click.option(
+    "--regression_tolerance",
+    help="The fraction by which the wall time of a case may grow over the earlier results before it is a regression.",
+    required=False,
+    type=float,
+    default=0.2,
+)
+def _benchmark_conversion_cli(
+    *,
+    benchmark_folder_path: pydantic.DirectoryPath,
+    number_of_volumes: int = 100,
+    frames_per_volume: int = 40,
+    raw_or_processed: tuple[str, ...] = ("processed", "raw"),
+    number_of_repeats: int = 1,
+    compression: str | None = None,
+    number_of_compression_workers: int | None = None,
+    backend: str = "hdf5",
+    regression_tolerance: float = 0.2,
+) -> None:
+    benchmark_folder_path = pathlib.Path(benchmark_folder_path)
+    benchmark_folder_path.mkdir(parents=True, exist_ok=True)
+
+    session_options = {"backend": backend}
+    if compression is not None:
+        session_options["compression"] = compression
+    if number_of_compression_workers is not None:
+        session_options["number_of_compression_workers"] = number_of_compression_workers
+
+    results = benchmark_conversion(
+        benchmark_folder_path=benchmark_folder_path,
+        number_of_volumes=number_of_volumes,
+        frames_per_volume=frames_per_volume,
+        raw_or_processed=raw_or_processed,
+        session_options=session_options,
+        number_of_repeats=number_of_repeats,
+        regression_tolerance=regression_tolerance,
+    )
+
+    print(_format_conversion_benchmark(results=results))
+
+    if len(results["failures"]) != 0 or len(results["regressions"]) != 0:
+        raise SystemExit(1)
+
+
+@click.command(name="pump_probe_dataset_to_nwb")
+@click.option(
+    "--base_folder_path",
+    help="The base folder in which to search for data referenced by the `subject_info_file_path`.",
+    required=True,
+    type=click.Path(writable=False),
+)
+@click.option(
+    "--subject_info_file_path",
+    help="The path to the subject log YAML file.",
+    required=True,
+    type=click.Path(writable=False),
+)
+@click.option(
+    "--nwb_output_folder_path",
+    help="The folder path to save the NWB files to.",
+    required=True,
+    type=click.Path(writable=True),
+)
+@click.option(
+    "--testing",
+    help="Whether or not to 'test' the conversion process by limiting the amount of data written to the NWB files.",
+    is_flag=True,
+    required=False,
+    default=False,
+)
+@click.option(
+    "--raw_or_processed",
+    help="Which kinds of conversions to run for each session; may be passed more than once. Defaults to both.",
+    required=False,
+    type=click.Choice(["raw", "processed"]),
+    multiple=True,
+    default=("processed", "raw"),
+)
+@click.option(
+    "--skip_processed_subject_id",
+    help="A subject ID for which the processed conversion is skipped; may be passed more than once.",
+    required=False,
+    type=int,
+    multiple=True,
+    default=(),
+)
+@click.option(
+    "--maximum_number_of_raw_sessions",
+    help="If specified, at most this many raw sessions (that were not already completed) are converted.",
+    required=False,
+    type=int,
+    default=None,
+)
+@click.option(
+    "--number_of_processed_workers",
+    help="The number of processed sessions converted concurrently. Defaults to the number of CPUs.",
+    required=False,
+    type=int,
+    default=None,
+)
+@click.option(
+    "--number_of_raw_workers",
+    help="The number of raw sessions converted concurrently.",
+    required=False,
+    type=int,
+    default=2,
+)
+@click.option(
+    "--number_of_compression_workers",
+    help="The number of workers used to compress the chunks of the raw imaging data of each session in parallel.",
+    required=False,
+    type=int,
+    default=None,
+)
+@click.option(
+    "--backend",
+    help="The backend of the NWB files; Zarr requires the `hdmf-zarr` package.",
+    required=False,
+    type=click.Choice(["hdf5", "zarr"]),
+    default="hdf5",
+)
+@click.option(
+    "--read_method",
+    help="""
+How the raw frames are read: copied out of a memory map ("memmap"), or in long reads that are dropped from the page
+cache once read ("sequential"), which is usually faster over network mounts and spares the cache of shared nodes.
+""",
+    required=False,
+    type=click.Choice(["memmap", "sequential"]),
+    default="memmap",
+)
+@click.option(
+    "--memory_budget_in_gb",
+    help="""
+The memory the buffers of the raw imaging data of each session may take, in GB.
+
+Defaults to an equal share, across the concurrent raw sessions, of half of the available memory (up to 10 GB each).
+""",
+    required=False,
+    type=float,
+    default=None,
+)
+@click.option(
+    "--resume",
+    help="""
+Commit the progress of writing the raw imaging data to a checkpoint next to each NWB file, and continue an interrupted
+conversion of the same session from it rather than starting over.
+""",
+    is_flag=True,
+    required=False,
+    default=False,
+)
+@click.option(
+    "--volume_projections",
+    help="""
+Also write the maximum and mean projections over depth of each volume of the raw imaging data, computed while it is
+written, as small series of the 'ophys' processing module for quick looks and quality control.
+""",
+    is_flag=True,
+    required=False,
+    default=False,
+)
+@click.option(
+    "--source_cache_folder_path",
+    help="A folder in which to cache the parsed text, JSON, and pickle sources of the sessions.",
+    required=False,
+    type=click.Path(writable=True),
+    default=None,
+)
+@click.option(
+    "--hash_source_contents",
+    help="""
+Fingerprint the source files of each session by their contents rather than by their sizes and modification times.
+
+Sessions are only converted again if their fingerprint changed since their last conversion.
+""",
+    is_flag=True,
+    required=False,
+    default=False,
+)
+@click.option(
+    "--skip_preflight",
+    help="Do not run the consistency checks of `pump_probe_preflight` before converting, nor skip failing sessions.",
+    is_flag=True,
+    required=False,
+    default=False,
+)
+def _pump_probe_dataset_to_nwb_cli(
+    *,
+    base_folder_path: pydantic.DirectoryPath,
+    subject_info_file_path: pydantic.FilePath,
+    nwb_output_folder_path: pydantic.DirectoryPath,
+    testing: bool = False,
+    raw_or_processed: tuple[str, ...] = ("processed", "raw"),
+    skip_processed_subject_id: tuple[int, ...] = (),
+    maximum_number_of_raw_sessions: int | None = None,
+    number_of_processed_workers: int | None = None,
+    number_of_raw_workers: int = 2,
+    number_of_compression_workers: int | None = None,
+    backend: str = "hdf5",
+    memory_budget_in_gb: float | None = None,
+    read_method: str = "memmap",
+    resume: bool = False,
+    volume_projections: bool = False,
+    source_cache_folder_path: pydantic.DirectoryPath | None = None,
+    hash_source_contents: bool = False,
+    skip_preflight: bool = False,
+) -> None:
+    nwb_output_folder_path = pathlib.Path(nwb_output_folder_path)
+    nwb_output_folder_path.mkdir(parents=True, exist_ok=True)
+    if source_cache_folder_path is not None:
+        source_cache_folder_path = pathlib.Path(source_cache_folder_path)
+        source_cache_folder_path.mkdir(parents=True, exist_ok=True)
+
+    results = pump_probe_dataset_to_nwb(
         base_folder_path=base_folder_path,
         subject_info_file_path=subject_info_file_path,
-        subject_id=subject_id,
         nwb_output_folder_path=nwb_output_folder_path,
-        raw_or_processed="raw",
         testing=testing,
+        raw_or_processed=raw_or_processed,
+        skip_processed_subject_ids=list(skip_processed_subject_id),
+        maximum_number_of_raw_sessions=maximum_number_of_raw_sessions,
+        number_of_processed_workers=number_of_processed_workers,
+        number_of_raw_workers=number_of_raw_workers,
+        session_options={
+            "number_of_compression_workers": number_of_compression_workers,
+            "backend": backend,
+            "memory_budget_in_gb": memory_budget_in_gb,
+            "read_method": read_method,
+            "resume": resume,
+            "volume_projections": volume_projections,
+            "source_cache_folder_path": source_cache_folder_path,
+        },
+        hash_source_contents=hash_source_contents,
+        preflight=not skip_preflight,
+    )
+
+    print(
+        f"\n\n{len(results['succeeded'])} conversions succeeded, {len(results['failed'])} failed, and "
+        f"{len(results['rejected'])} were rejected by the preflight checks!\n\n"
+    )
+
+
+@click.command(name="pump_probe_dataset_worker")
+@click.option(
+    "--base_folder_path",
+    help="The base folder in which to search for data referenced by the `subject_info_file_path`.",
+    required=True,
+    type=click.Path(writable=False),
+)
+@click.option(
+    "--subject_info_file_path",
+    help="The path to the subject log YAML file.",
+    required=True,
+    type=click.Path(writable=False),
+)
+@click.option(
+    "--nwb_output_folder_path",
+    help="The folder path to save the NWB files to.",
+    required=True,
+    type=click.Path(writable=True),
+)
+@click.option(
+    "--queue_folder_path",
+    help="""
+The folder that holds the state of the queue; must be the same for all workers.
+
+Defaults to the 'queue' subfolder of the `nwb_output_folder_path`.
+""",
+    required=False,
+    type=click.Path(writable=True),
+    default=None,
+)
+@click.option(
+    "--testing",
+    help="Whether or not to 'test' the conversion process by limiting the amount of data written to the NWB files.",
+    is_flag=True,
+    required=False,
+    default=False,
+)
+@click.option(
+    "--raw_or_processed",
+    help="Which kinds of conversions this worker runs; may be passed more than once. Defaults to both.",
+    required=False,
+    type=click.Choice(["raw", "processed"]),
+    multiple=True,
+    default=("processed", "raw"),
+)
+@click.option(
+    "--skip_processed_subject_id",
+    help="A subject ID for which the processed conversion is skipped; may be passed more than once.",
+    required=False,
+    type=int,
+    multiple=True,
+    default=(),
+)
+@click.option(
+    "--lease_duration_in_s",
+    help="The time after which the claim of a worker that stopped may be taken over by another worker.",
+    required=False,
+    type=float,
+    default=600.0,
+)
+@click.option(
+    "--worker_name",
+    help="A name unique to this worker. Defaults to the host name and process ID.",
+    required=False,
+    type=str,
+    default=None,
+)
+@click.option(
+    "--number_of_compression_workers",
+    help="The number of workers used to compress the chunks of the raw imaging data of each session in parallel.",
+    required=False,
+    type=int,
+    default=None,
+)
+@click.option(
+    "--backend",
+    help="The backend of the NWB files; Zarr requires the `hdmf-zarr` package.",
+    required=False,
+    type=click.Choice(["hdf5", "zarr"]),
+    default="hdf5",
+)
+@click.option(
+    "--read_method",
+    help="""
+How the raw frames are read: copied out of a memory map ("memmap"), or in long reads that are dropped from the page
+cache once read ("sequential"), which is usually faster over network mounts and spares the cache of shared nodes.
+""",
+    required=False,
+    type=click.Choice(["memmap", "sequential"]),
+    default="memmap",
+)
+@click.option(
+    "--memory_budget_in_gb",
+    help="""
+The memory the buffers of the raw imaging data of each session may take, in GB.
+
+Defaults to half of the memory available when each conversion starts, up to 10 GB.
+""",
+    required=False,
+    type=float,
+    default=None,
+)
+@click.option(
+    "--resume",
+    help="""
+Commit the progress of writing the raw imaging data to a checkpoint next to each NWB file, and continue an interrupted
+conversion of the same session from it rather than starting over.
+""",
+    is_flag=True,
+    required=False,
+    default=False,
+)
+@click.option(
+    "--volume_projections",
+    help="""
+Also write the maximum and mean projections over depth of each volume of the raw imaging data, computed while it is
+written, as small series of the 'ophys' processing module for quick looks and quality control.
+""",
+    is_flag=True,
+    required=False,
+    default=False,
+)
+@click.option(
+    "--source_cache_folder_path",
+    help="A folder in which to cache the parsed text, JSON, and pickle sources of the sessions.",
+    required=False,
+    type=click.Path(writable=True),
+    default=None,
+)
+@click.option(
+    "--hash_source_contents",
+    help="""
+Fingerprint the source files of each session by their contents rather than by their sizes and modification times.
+
+Sessions are only converted again if their fingerprint changed since their last conversion.
+""",
+    is_flag=True,
+    required=False,
+    default=False,
+)
+@click.option(
+    "--skip_preflight",
+    help="Do not run the consistency checks of `pump_probe_preflight` before converting, nor skip failing sessions.",
+    is_flag=True,
+    required=False,
+    default=False,
+)
+def _pump_probe_dataset_worker_cli(
+    *,
+    base_folder_path: pydantic.DirectoryPath,
+    subject_info_file_path: pydantic.FilePath,
+    nwb_output_folder_path: pydantic.DirectoryPath,
+    queue_folder_path: pydantic.DirectoryPath | None = None,
+    testing: bool = False,
+    raw_or_processed: tuple[str, ...] = ("processed", "raw"),
+    skip_processed_subject_id: tuple[int, ...] = (),
+    lease_duration_in_s: float = 600.0,
+    worker_name: str | None = None,
+    number_of_compression_workers: int | None = None,
+    backend: str = "hdf5",
+    memory_budget_in_gb: float | None = None,
+    read_method: str = "memmap",
+    resume: bool = False,
+    volume_projections: bool = False,
+    source_cache_folder_path: pydantic.DirectoryPath | None = None,
+    hash_source_contents: bool = False,
+    skip_preflight: bool = False,
+) -> None:
+    nwb_output_folder_path = pathlib.Path(nwb_output_folder_path)
+    nwb_output_folder_path.mkdir(parents=True, exist_ok=True)
+    if source_cache_folder_path is not None:
+        source_cache_folder_path = pathlib.Path(source_cache_folder_path)
+        source_cache_folder_path.mkdir(parents=True, exist_ok=True)
+
+    results = pump_probe_dataset_worker(
+        base_folder_path=base_folder_path,
+        subject_info_file_path=subject_info_file_path,
+        nwb_output_folder_path=nwb_output_folder_path,
+        queue_folder_path=queue_folder_path,
+        testing=testing,
+        raw_or_processed=raw_or_processed,
+        skip_processed_subject_ids=list(skip_processed_subject_id),
+        lease_duration_in_s=lease_duration_in_s,
+        worker_name=worker_name,
+        session_options={
+            "number_of_compression_workers": number_of_compression_workers,
+            "backend": backend,
+            "memory_budget_in_gb": memory_budget_in_gb,
+            "read_method": read_method,
+            "resume": resume,
+            "volume_projections": volume_projections,
+            "source_cache_folder_path": source_cache_folder_path,
+        },
+        hash_source_contents=hash_source_contents,
+        preflight=not skip_preflight,
+    )
+
+    print(
+        f"\n\nAll sessions are finished! This worker converted {len(results['succeeded'])} of them "
+        f"and failed {len(results['failed'])}.\n\n"
+    )
+
+
+@click.command(name="pump_probe_preflight")
+@click.option(
+    "--base_folder_path",
+    help="The base folder in which to search for data referenced by the `subject_info_file_path`.",
+    required=True,
+    type=click.Path(writable=False),
+)
+@click.option(
+    "--subject_info_file_path",
+    help="The path to the subject log YAML file.",
+    required=True,
+    type=click.Path(writable=False),
+)
+@click.option(
+    "--subject_id",
+    help="A subject ID to check; may be passed more than once. Defaults to all sessions in the subject log.",
+    required=False,
+    type=int,
+    multiple=True,
+    default=(),
+)
+@click.option(
+    "--raw_or_processed",
+    help="Which kinds of conversions to check each session for; may be passed more than once. Defaults to both.",
+    required=False,
+    type=click.Choice(["raw", "processed"]),
+    multiple=True,
+    default=("processed", "raw"),
+)
+@click.option(
+    "--number_of_workers",
+    help="The number of sessions checked concurrently. Defaults to the number of CPUs.",
+    required=False,
+    type=int,
+    default=None,
+)
+@click.option(
+    "--source_cache_folder_path",
+    help="A folder in which to cache the parsed sources, to be reused by the later conversions.",
+    required=False,
+    type=click.Path(writable=True),
+    default=None,
+)
+@click.option(
+    "--report_file_path",
+    help="If specified, the full report is also saved to this JSON file.",
+    required=False,
+    type=click.Path(writable=True),
+    default=None,
+)
+def _preflight_cli(
+    *,
+    base_folder_path: pydantic.DirectoryPath,
+    subject_info_file_path: pydantic.FilePath,
+    subject_id: tuple[int, ...] = (),
+    raw_or_processed: tuple[str, ...] = ("processed", "raw"),
+    number_of_workers: int | None = None,
+    source_cache_folder_path: pydantic.DirectoryPath | None = None,
+    report_file_path: pydantic.FilePath | None = None,
+) -> None:
+    if source_cache_folder_path is not None:
+        source_cache_folder_path = pathlib.Path(source_cache_folder_path)
+        source_cache_folder_path.mkdir(parents=True, exist_ok=True)
+
+    report = preflight_dataset(
+        base_folder_path=base_folder_path,
+        subject_info_file_path=subject_info_file_path,
+        subject_ids=list(subject_id) if len(subject_id) != 0 else None,
+        raw_or_processed=raw_or_processed,
+        number_of_workers=number_of_workers,
+        source_cache_folder_path=source_cache_folder_path,
+        report_file_path=report_file_path,
     )
+
+    for session_report in report["sessions"]:
+        for issue in session_report["issues"]:
+            print(
+                f"Subject ID '{session_report['subject_id']}' ({session_report['raw_or_processed']}) - "
+                f"[{issue['severity']}] {issue['check']}: {issue['message']}"
+            )
+    print(f"\n\n{report['number_passed']} sessions passed and {report['number_failed']} failed!\n\n")
@@ -0,0 +1,130 @@
+"""Compare the compression ratio and throughput of each compression method on a sample of raw imaging data."""
+
+import re
+import time
+
+import h5py
+import numpy
+import pydantic
+
+from .interfaces._compression import get_hdf5_compression_kwargs
+
+DEFAULT_COMPRESSION_METHODS_TO_BENCHMARK = (
+    ("gzip", {"level": 1}),
+    ("gzip", {"level": 4}),
+    ("lzf", dict()),
+    ("blosc", {"cname": "zstd", "clevel": 5, "shuffle": "bit"}),
+    ("blosc", {"cname": "zstd", "clevel": 5, "shuffle": "byte"}),
+    ("blosc", {"cname": "lz4", "clevel": 5, "shuffle": "bit"}),
+    ("blosc", {"cname": "lz4", "clevel": 5, "shuffle": "byte"}),
+    ("zstd", {"clevel": 3}),
+    ("lz4", dict()),
+    ("bitshuffle", {"cname": "lz4"}),
+)
+
+
+@pydantic.validate_call
+def benchmark_compression_methods(
+    *,
+    dat_file_path: pydantic.FilePath,
+    number_of_frames: int = 100,
+    start_frame: int | None = None,
+    compression_methods: list[tuple[str, dict]] | None = None,
+) -> list[dict]:
+    """
+    Compress a sample of frames from a raw '.dat' file with each compression method and report the results.
+
+    Each method is applied through HDF5 to an in-memory file, using the same chunking as the conversion, so the
+    results reflect what would be obtained in the NWB file.
+
+    Parameters
+    ----------
+    dat_file_path : FilePath
+        Path to a raw binary file of uint16 frames, such as 'sCMOS_Frames_U16_1024x512.dat' from a pumpprobe folder
+        or 'frames-2048x2048.dat' from a multicolorworm folder. The frame shape is inferred from the file name.
+    number_of_frames : int, default: 100
+        The number of consecutive frames to sample.
+    start_frame : int, optional
+        The first frame of the sample. The default is to take the sample from the middle of the file.
+    compression_methods : list of tuples, optional
+        Pairs of compression method and options, as passed to the imaging interfaces.
+        The default is `DEFAULT_COMPRESSION_METHODS_TO_BENCHMARK`.
+
+    Returns
+    -------
+    list of dict
+        One entry per compression method, with the compression ratio and the throughputs (in MB/s) of compression
+        and decompression. Methods whose filters are unavailable on this system report an 'error' instead.
+    """
+    compression_methods = compression_methods or DEFAULT_COMPRESSION_METHODS_TO_BENCHMARK
+
+    frame_shape_match = re.search(pattern=r"(\d+)x(\d+)", string=dat_file_path.name)
+    if frame_shape_match is None:
+        message = f"Unable to infer the frame shape from the file name '{dat_file_path.name}'!"
+        raise ValueError(message)
+    frame_shape = (int(frame_shape_match.group(1)), int(frame_shape_match.group(2)))
+
+    # Trailing bytes (such as those at the end of the NeuroPAL file) are ignored
+    dtype = numpy.dtype("uint16")
+    frame_size_bytes = frame_shape[0] * frame_shape[1] * dtype.itemsize
+    total_number_of_frames = dat_file_path.stat().st_size // frame_size_bytes
+    number_of_frames = min(number_of_frames, total_number_of_frames)
+    start_frame = start_frame if start_frame is not None else (total_number_of_frames - number_of_frames) // 2
+
+    memory_map = numpy.memmap(
+        filename=dat_file_path, dtype=dtype, mode="r", shape=(total_number_of_frames, frame_shape[0], frame_shape[1])
+    )
+    sample = numpy.array(memory_map[start_frame : start_frame + number_of_frames])
+    sample_size_in_mb = sample.nbytes / 1e6
+
+    # Same as the default chunking of the imaging interfaces: ~10 MB along time, with full frames
+    number_of_frames_per_chunk = max(min(int(10e6 / frame_size_bytes), number_of_frames), 1)
+    chunk_shape = (number_of_frames_per_chunk, frame_shape[0], frame_shape[1])
+
+    results = list()
+    for compression, compression_options in compression_methods:
+        result = dict(compression=compression, compression_options=compression_options)
+        results.append(result)
+
+        try:
+            compression_kwargs = get_hdf5_compression_kwargs(
+                compression=compression, compression_options=compression_options
+            )
+        except (ImportError, ValueError) as exception:
+            result["error"] = str(exception)
+            continue
+        compression_kwargs.pop("allow_plugin_filters", None)
+
+        with h5py.File(name=f"{compression}_benchmark.h5", mode="w", driver="core", backing_store=False) as file:
+            start_time = time.perf_counter()
+            dataset = file.create_dataset(name="data", data=sample, chunks=chunk_shape, **compression_kwargs)
+            file.flush()
+            compression_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            dataset[...]
+            decompression_time = time.perf_counter() - start_time
+
+            storage_size = dataset.id.get_storage_size()
+
+        result["compression_ratio"] = sample.nbytes / storage_size
+        result["compression_throughput_in_mb_per_s"] = sample_size_in_mb / compression_time
+        result["decompression_throughput_in_mb_per_s"] = sample_size_in_mb / decompression_time
+
+    return results
+
+
+def _format_compression_benchmark(results: list[dict]) -> str:
+    lines = [f"{'compression':<12} {'options':<50} {'ratio':>7} {'write (MB/s)':>13} {'read (MB/s)':>12}"]
+    for result in results:
+        options = str(result["compression_options"])
+        if "error" in result:
+            lines.append(f"{result['compression']:<12} {options:<50} unavailable: {result['error']}")
+            continue
+
+        lines.append(
+            f"{result['compression']:<12} {options:<50} {result['compression_ratio']:>7.2f} "
+            f"{result['compression_throughput_in_mb_per_s']:>13.1f} "
+            f"{result['decompression_throughput_in_mb_per_s']:>12.1f}"
+        )
+    return "\n".join(lines)
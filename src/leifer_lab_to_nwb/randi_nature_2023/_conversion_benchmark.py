@@ -0,0 +1,338 @@
+"""Time each interface and the full conversions on a synthetic session, and catch regressions against earlier runs."""
+
+import concurrent.futures
+import datetime
+import importlib.metadata
+import json
+import multiprocessing
+import os
+import pathlib
+import platform
+import shutil
+import socket
+import time
+import typing
+
+import pydantic
+
+from ._testing._synthetic_session import (
+    SYNTHETIC_SESSION_PARAMETERS_FILE_NAME,
+    SYNTHETIC_SUBJECT_ID,
+    SYNTHETIC_SUBJECT_INFO_FILE_NAME,
+    generate_synthetic_session,
+)
+from .interfaces._instrumentation import get_report_file_path
+
+# The interfaces timed on their own, for each kind of conversion
+BENCHMARKED_INTERFACE_NAMES = {
+    "raw": ("PumpProbeImagingInterfaceGreen", "PumpProbeImagingInterfaceRed", "NeuroPALImagingInterface"),
+    "processed": (
+        "PumpProbeSegmentationInterfaceGreed",
+        "PumpProbeSegmentationInterfaceRed",
+        "NeuroPALSegmentationInterface",
+        "OptogeneticStimulationInterface",
+    ),
+}
+
+
+@pydantic.validate_call
+def benchmark_conversion(
+    *,
+    benchmark_folder_path: pydantic.DirectoryPath,
+    number_of_volumes: int = 100,
+    frames_per_volume: int = 40,
+    raw_or_processed: tuple[typing.Literal["raw", "processed"], ...] = ("processed", "raw"),
+    session_options: dict | None = None,
+    number_of_repeats: int = 1,
+    results_folder_path: pathlib.Path | None = None,
+    regression_tolerance: float = 0.2,
+    evict_sources_from_cache: bool = True,
+) -> dict:
+    """
+    Time the conversion of each interface on its own, and of the full raw and processed sessions, on synthetic data.
+
+    The synthetic session is generated in the 'source' subfolder of the `benchmark_folder_path`, unless one of the
+    same size is already there. Each case is then converted in a fresh process, so that none benefits from the
+    memory or imports of another, into the 'outputs' subfolder (which is removed afterwards).
+
+    The results are saved in the `results_folder_path` as '< timestamp >_< host name >.json', and compared to the
+    latest earlier results of the same host, session size, and `session_options`. A case whose wall time grew by more
+    than the `regression_tolerance` is reported as a regression.
+
+    Parameters
+    ----------
+    benchmark_folder_path : DirectoryPath
+        The folder to write the synthetic session, outputs, and results to. The NeuroPAL volume alone takes ~870 MB.
+    number_of_volumes : int, default: 100
+        The number of volumes of the synthetic pumpprobe recording.
+    frames_per_volume : int, default: 40
+        The number of frames per volume of the synthetic pumpprobe recording; each frame takes 1 MiB.
+    raw_or_processed : tuple of "raw" and/or "processed", default: ("processed", "raw")
+        Which kinds of conversions to benchmark.
+    session_options : dict, optional
+        Additional keyword arguments of `pump_probe_to_nwb` for every case, such as {"compression": "blosc"}.
+    number_of_repeats : int, default: 1
+        The number of times each case is run; the fastest run is kept.
+    results_folder_path : path, optional
+        The folder of the results of this and earlier benchmarks. Defaults to the 'results' subfolder of the
+        `benchmark_folder_path`.
+    regression_tolerance : float, default: 0.2
+        The fraction by which the wall time of a case may grow over that of the earlier results before it is reported
+        as a regression.
+    evict_sources_from_cache : bool, default: True
+        Whether to evict the source files from the page cache of the operating system before each run, so that
+        they are read from storage as they would be on their first conversion (Linux only).
+
+    Returns
+    -------
+    dict
+        The details of the "host" and "parameters", the "cases" keyed by name (each with its wall and CPU times, bytes
+        read, throughput in MB/s, output size, peak memory, and the stages of its report; or only the "error" of a
+        failed case), the "failures" among them, the "baseline_file_path" compared against (if any), and the
+        "regressions" found.
+    """
+    session_options = session_options or dict()
+    benchmark_folder_path = pathlib.Path(benchmark_folder_path)
+    results_folder_path = pathlib.Path(results_folder_path or benchmark_folder_path / "results")
+    results_folder_path.mkdir(parents=True, exist_ok=True)
+
+    source_folder_path = benchmark_folder_path / "source"
+    source_folder_path.mkdir(exist_ok=True)
+    session_parameters = _get_synthetic_session_parameters(source_folder_path=source_folder_path)
+    session_size = [session_parameters.get(name, None) for name in ("number_of_volumes", "frames_per_volume")]
+    if session_size != [number_of_volumes, frames_per_volume]:
+        print(f"Generating a synthetic session of {number_of_volumes} volumes of {frames_per_volume} frames...")
+        generate_synthetic_session(
+            base_folder_path=source_folder_path,
+            number_of_volumes=number_of_volumes,
+            frames_per_volume=frames_per_volume,
+        )
+        session_parameters = _get_synthetic_session_parameters(source_folder_path=source_folder_path)
+
+    cases = dict()
+    for kind in raw_or_processed:
+        for interface_name in BENCHMARKED_INTERFACE_NAMES[kind]:
+            cases[interface_name] = dict(raw_or_processed=kind, interface_names=[interface_name])
+        cases[f"{kind}_conversion"] = dict(raw_or_processed=kind, interface_names=None)
+
+    output_folder_path = benchmark_folder_path / "outputs"
+    case_results = dict()
+    failures = list()
+    for case_name, case in cases.items():
+        print(f"Benchmarking '{case_name}'...")
+        runs = list()
+        error = None
+        for _ in range(number_of_repeats):
+            shutil.rmtree(path=output_folder_path, ignore_errors=True)
+            output_folder_path.mkdir()
+            if evict_sources_from_cache is True:
+                _evict_from_page_cache(folder_path=source_folder_path)
+
+            case_options = dict(
+                base_folder_path=source_folder_path,
+                subject_info_file_path=source_folder_path / SYNTHETIC_SUBJECT_INFO_FILE_NAME,
+                subject_id=SYNTHETIC_SUBJECT_ID,
+                nwb_output_folder_path=output_folder_path,
+                skip_existing=False,
+                display_progress=False,
+                **session_options,
+                **case,
+            )
+            # A fresh process per run, which also bounds its peak memory to that of the case alone
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                # A failed case (including one whose process crashed) is recorded, and the other cases still run
+                try:
+                    runs.append(executor.submit(_run_benchmark_case, case_options).result())
+                except Exception as exception:
+                    error = f"{type(exception).__name__}: {exception}"
+                    print(f"Benchmarking '{case_name}' failed with {error}")
+                    break
+        shutil.rmtree(path=output_folder_path, ignore_errors=True)
+
+        if error is not None:
+            case_results[case_name] = dict(error=error)
+            failures.append(dict(case_name=case_name, error=error))
+            continue
+
+        case_result = min(runs, key=lambda run: run["wall_time_in_s"])
+        case_result["wall_times_in_s"] = [run["wall_time_in_s"] for run in runs]
+        case_result["error"] = None
+        case_results[case_name] = case_result
+
+    results = dict(
+        timestamp=datetime.datetime.now().isoformat(),
+        host=_get_host_details(),
+        parameters=dict(
+            session_parameters=session_parameters,
+            session_options={key: str(value) for key, value in session_options.items()},
+            evict_sources_from_cache=evict_sources_from_cache,
+        ),
+        cases=case_results,
+        failures=failures,
+    )
+
+    baseline_file_path = _find_baseline_file_path(results_folder_path=results_folder_path, results=results)
+    results["baseline_file_path"] = str(baseline_file_path) if baseline_file_path is not None else None
+    results["regressions"] = list()
+    if baseline_file_path is not None:
+        with open(file=baseline_file_path, mode="r") as io:
+            baseline = json.load(fp=io)
+        results["regressions"] = _find_regressions(
+            results=results, baseline=baseline, regression_tolerance=regression_tolerance
+        )
+
+    results_file_name = f"{datetime.datetime.now():%Y%m%d_%H%M%S}_{results['host']['host_name']}.json"
+    with open(file=results_folder_path / results_file_name, mode="w") as io:
+        json.dump(obj=results, fp=io, indent=2, default=str)
+
+    return results
+
+
+def _run_benchmark_case(case_options: dict) -> dict:
+    """Convert a single case in this (fresh) process and measure it."""
+    from ._pump_probe_to_nwb import pump_probe_to_nwb
+
+    start_cpu_time = time.process_time()
+    start_wall_time = time.perf_counter()
+    nwbfile_path = pump_probe_to_nwb(**case_options)
+    wall_time = time.perf_counter() - start_wall_time
+    cpu_time = time.process_time() - start_cpu_time
+
+    with open(file=get_report_file_path(nwbfile_path=nwbfile_path), mode="r") as io:
+        report = json.load(fp=io)
+
+    # Counted by the innermost stage only, so the stages may be summed without counting any byte twice
+    bytes_read = sum(
+        metrics.get("bytes_read", 0) for stages in report["stages"].values() for metrics in stages.values()
+    )
+
+    return dict(
+        wall_time_in_s=wall_time,
+        cpu_time_in_s=cpu_time,
+        bytes_read=bytes_read,
+        throughput_in_mb_per_s=bytes_read / 1e6 / wall_time if bytes_read != 0 else None,
+        output_size_in_bytes=_get_size_in_bytes(path=nwbfile_path),
+        peak_rss_in_bytes=report["peak_rss_in_bytes"],
+        stages=report["stages"],
+    )
+
+
+def _get_synthetic_session_parameters(*, source_folder_path: pathlib.Path) -> dict:
+    parameters_file_path = source_folder_path / SYNTHETIC_SESSION_PARAMETERS_FILE_NAME
+    if not parameters_file_path.exists():
+        return dict()
+
+    with open(file=parameters_file_path, mode="r") as io:
+        return json.load(fp=io)
+
+
+def _evict_from_page_cache(*, folder_path: pathlib.Path) -> None:
+    """Drop the cached pages of every file in the folder, without requiring the privileges to drop the whole cache."""
+    if not hasattr(os, "posix_fadvise"):  # Such as on Windows and macOS, where the runs may then be warm
+        return
+
+    for file_path in folder_path.rglob("*"):
+        if not file_path.is_file():
+            continue
+
+        file_descriptor = os.open(file_path, os.O_RDONLY)
+        try:
+            # Pages not yet written back to storage (such as those of a freshly generated session) are not dropped
+            os.fdatasync(file_descriptor)
+            os.posix_fadvise(file_descriptor, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(file_descriptor)
+
+
+def _get_size_in_bytes(*, path: pathlib.Path) -> int:
+    """The size of a file, or of all files within a folder (such as a Zarr store)."""
+    if path.is_file():
+        return path.stat().st_size
+
+    return sum(file_path.stat().st_size for file_path in path.rglob("*") if file_path.is_file())
+
+
+def _get_host_details() -> dict:
+    try:
+        package_version = importlib.metadata.version("leifer_lab_to_nwb")
+    except importlib.metadata.PackageNotFoundError:
+        package_version = None
+
+    return dict(
+        host_name=socket.gethostname(),
+        platform=platform.platform(),
+        processor=platform.processor(),
+        number_of_cpus=os.cpu_count(),
+        python_version=platform.python_version(),
+        package_version=package_version,
+    )
+
+
+def _find_baseline_file_path(*, results_folder_path: pathlib.Path, results: dict) -> pathlib.Path | None:
+    """Find the latest earlier results of the same host and parameters, which are the only comparable ones."""
+    host_name = results["host"]["host_name"]
+
+    # The file names start with their timestamp, so they sort from the earliest to the latest
+    for results_file_path in sorted(results_folder_path.glob(f"*_{host_name}.json"), reverse=True):
+        with open(file=results_file_path, mode="r") as io:
+            earlier_results = json.load(fp=io)
+
+        if earlier_results["parameters"] == results["parameters"]:
+            return results_file_path
+
+    return None
+
+
+def _find_regressions(*, results: dict, baseline: dict, regression_tolerance: float) -> list[dict]:
+    regressions = list()
+    for case_name, case_result in results["cases"].items():
+        baseline_case_result = baseline["cases"].get(case_name, None)
+        if baseline_case_result is None:
+            continue
+        if case_result.get("error", None) is not None or baseline_case_result.get("error", None) is not None:
+            continue  # A failed case has no timing to compare; it is reported among the failures instead
+
+        slowdown = case_result["wall_time_in_s"] / baseline_case_result["wall_time_in_s"] - 1
+        if slowdown > regression_tolerance:
+            regressions.append(
+                dict(
+                    case_name=case_name,
+                    wall_time_in_s=case_result["wall_time_in_s"],
+                    baseline_wall_time_in_s=baseline_case_result["wall_time_in_s"],
+                    slowdown=slowdown,
+                )
+            )
+
+    return regressions
+
+
+def _format_conversion_benchmark(results: dict) -> str:
+    lines = [
+        f"{'case':<38} {'wall (s)':>9} {'CPU (s)':>9} {'read (MB/s)':>12} {'output (MB)':>12} {'peak memory (MB)':>17}"
+    ]
+    for case_name, case_result in results["cases"].items():
+        if case_result["error"] is not None:
+            lines.append(f"{case_name:<38} {'failed':>9}")
+            continue
+
+        throughput = case_result["throughput_in_mb_per_s"]
+        peak_rss = case_result["peak_rss_in_bytes"]
+        lines.append(
+            f"{case_name:<38} {case_result['wall_time_in_s']:>9.2f} {case_result['cpu_time_in_s']:>9.2f} "
+            f"{f'{throughput:.1f}' if throughput is not None else '-':>12} "
+            f"{case_result['output_size_in_bytes'] / 1e6:>12.1f} "
+            f"{f'{peak_rss / 1e6:.0f}' if peak_rss is not None else '-':>17}"
+        )
+
+    for failure in results["failures"]:
+        lines.append(f"\nFailure of '{failure['case_name']}': {failure['error']}")
+    if results["baseline_file_path"] is None:
+        lines.append("\nNo earlier results of this host and parameters to compare to.")
+    for regression in results["regressions"]:
+        lines.append(
+            f"\nRegression of '{regression['case_name']}': {regression['wall_time_in_s']:.2f} s against "
+            f"{regression['baseline_wall_time_in_s']:.2f} s ({regression['slowdown']:+.0%})."
+        )
+    return "\n".join(lines)
@@ -0,0 +1,137 @@
+"""Record of the inputs of each converted file, used to re-convert only the sessions whose inputs have changed."""
+
+import hashlib
+import importlib.metadata
+import json
+import os
+import pathlib
+import typing
+import uuid
+
+BOX_SHAPE_FILE_PATH = pathlib.Path(__file__).parent / "session_to_box_shape.json"
+
+# Options of `pump_probe_to_nwb` that affect only how fast the output is written, not its contents
+_OUTPUT_INDEPENDENT_OPTIONS = (
+    "number_of_compression_workers",
+    "number_of_jobs",
+    "memory_budget_in_gb",
+    "read_method",
+    "read_size_in_bytes",
+    "source_cache_folder_path",
+    "display_progress",
+    "skip_existing",
+    "resume",
+)
+
+# Bump whenever the layout of the fingerprints changes; all sessions are then re-converted once
+_MANIFEST_VERSION = 1
+
+
+class ConversionManifest:
+    """
+    The fingerprint of the inputs of each output file, as of the last time it was converted.
+
+    Each entry is a JSON file of its own in the manifest folder, so that any number of concurrent workers can record
+    their conversions without coordinating.
+    """
+
+    def __init__(self, *, manifest_folder_path: str | pathlib.Path) -> None:
+        self.manifest_folder_path = pathlib.Path(manifest_folder_path)
+        self.manifest_folder_path.mkdir(parents=True, exist_ok=True)
+
+    def get_entry(self, *, job_name: str) -> dict | None:
+        entry_file_path = self.manifest_folder_path / f"{job_name}.json"
+        if not entry_file_path.exists():
+            return None
+
+        with open(file=entry_file_path, mode="r") as io:
+            return json.load(fp=io)
+
+    def is_up_to_date(self, *, job_name: str, fingerprint: dict) -> bool:
+        """Whether the output of the job exists and was converted from inputs with the same fingerprint."""
+        entry = self.get_entry(job_name=job_name)
+        if entry is None or entry["fingerprint"] != fingerprint:
+            return False
+
+        return pathlib.Path(entry["nwbfile_path"]).exists()
+
+    def record(self, *, job_name: str, fingerprint: dict, nwbfile_path: str | pathlib.Path) -> None:
+        entry = dict(nwbfile_path=str(nwbfile_path), fingerprint=fingerprint)
+
+        entry_file_path = self.manifest_folder_path / f"{job_name}.json"
+        temporary_file_path = entry_file_path.with_name(f"{entry_file_path.name}.{uuid.uuid4().hex}.tmp")
+        with open(file=temporary_file_path, mode="w") as io:
+            json.dump(obj=entry, fp=io, indent=2)
+        os.replace(src=temporary_file_path, dst=entry_file_path)
+
+
+def fingerprint_session(
+    *,
+    subject_info: dict,
+    source_folder_paths: list[pathlib.Path],
+    raw_or_processed: typing.Literal["raw", "processed"],
+    session_options: dict | None = None,
+    hash_contents: bool = False,
+) -> dict:
+    """
+    Fingerprint everything that the output of a conversion depends on.
+
+    These are the version of this package, the entry of the session in the subject log YAML file, the options of the
+    conversion (other than those that only affect its speed), every source file (by size and modification time, or
+    by contents if `hash_contents` is True), and for processed conversions, the box shapes of the session in
+    'session_to_box_shape.json'.
+
+    The binary '.dat' files of frames are only included for raw conversions, which are the only ones that read them.
+    """
+    sources = dict()
+    for folder_path in source_folder_paths:
+        if not folder_path.is_dir():
+            continue
+
+        for file_path in sorted(folder_path.iterdir()):
+            if not file_path.is_file() or (file_path.suffix == ".dat" and raw_or_processed != "raw"):
+                continue
+
+            file_stat = file_path.stat()
+            source_key = f"{folder_path.name}/{file_path.name}"
+            if hash_contents:
+                sources[source_key] = dict(size=file_stat.st_size, blake2b=_hash_file_contents(file_path=file_path))
+            else:
+                sources[source_key] = dict(size=file_stat.st_size, mtime_ns=file_stat.st_mtime_ns)
+
+    fingerprint = dict(
+        manifest_version=_MANIFEST_VERSION,
+        package_version=_get_package_version(),
+        subject_info=subject_info,
+        session_options={
+            name: value
+            for name, value in (session_options or dict()).items()
+            if name not in _OUTPUT_INDEPENDENT_OPTIONS
+        },
+        sources=sources,
+    )
+    if raw_or_processed == "processed":
+        with open(file=BOX_SHAPE_FILE_PATH, mode="r") as io:
+            box_shape_mapping = json.load(fp=io)
+        fingerprint["box_shapes"] = {
+            folder_path.name: box_shape_mapping.get(folder_path.name) for folder_path in source_folder_paths
+        }
+
+    # Normalized through JSON so that it compares equal to the one recorded in the manifest
+    return json.loads(json.dumps(obj=fingerprint, sort_keys=True, default=str))
+
+
+def _get_package_version() -> str:
+    try:
+        return importlib.metadata.version("leifer_lab_to_nwb")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _hash_file_contents(*, file_path: pathlib.Path) -> str:
+    file_hash = hashlib.blake2b()
+    with open(file=file_path, mode="rb") as io:
+        while block := io.read(2**24):
+            file_hash.update(block)
+
+    return file_hash.hexdigest()
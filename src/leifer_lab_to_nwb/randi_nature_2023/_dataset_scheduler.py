@@ -0,0 +1,456 @@
+"""Concurrent conversion of every session of the dataset across a pool of processes."""
+
+import concurrent.futures
+import contextlib
+import json
+import multiprocessing
+import os
+import pathlib
+import traceback
+import typing
+
+import pydantic
+import tqdm
+import yaml
+
+from ._conversion_manifest import ConversionManifest, fingerprint_session
+from ._work_queue import _write_atomically
+from .interfaces._instrumentation import aggregate_conversion_reports
+from .interfaces._memory_budget import get_default_memory_budget_in_bytes
+from ._preflight import preflight_dataset
+from ._pump_probe_to_nwb import _get_session_folder_paths, pump_probe_to_nwb
+
+COMPLETED_RAW_SESSIONS_FILE_NAME = "completed_raw_sessions.txt"
+CONVERSION_REPORTS_FILE_NAME = "conversion_reports.json"
+
+
+@pydantic.validate_call
+def pump_probe_dataset_to_nwb(
+    *,
+    base_folder_path: pydantic.DirectoryPath,
+    subject_info_file_path: pydantic.FilePath,
+    nwb_output_folder_path: pydantic.DirectoryPath,
+    testing: bool = False,
+    raw_or_processed: tuple[typing.Literal["raw", "processed"], ...] = ("processed", "raw"),
+    subject_ids: list[int] | None = None,
+    skip_processed_subject_ids: list[int] | None = None,
+    maximum_number_of_raw_sessions: int | None = None,
+    number_of_processed_workers: int | None = None,
+    number_of_raw_workers: int = 2,
+    session_options: dict | None = None,
+    use_manifest: bool = True,
+    hash_source_contents: bool = False,
+    preflight: bool = True,
+    display_progress: bool = True,
+) -> dict[str, list[tuple[int, str]]]:
+    """
+    Convert many sessions of the dataset concurrently, each by `pump_probe_to_nwb` in a process of its own.
+
+    Processed conversions are mostly bound by the CPU while raw conversions are mostly bound by reading and writing
+    the imaging data, so each kind runs in its own pool with its own limit on the number of concurrent sessions.
+    Within each pool, the sessions with the largest sources start first so that no long conversion is left running
+    alone at the end.
+
+    The fingerprint of the inputs of each converted file is recorded in the 'manifest' folder of the
+    `nwb_output_folder_path`; later runs only convert again the sessions whose fingerprint has changed, such as when
+    a source file, the subject log entry, the box shapes, the options, or the version of this package differ.
+
+    The traceback of any failed conversion is saved to the 'errors' folder of the `nwb_output_folder_path`, and the
+    subject IDs of the completed raw sessions are appended to its 'completed_raw_sessions.txt' file.
+
+    The reports written next to each NWB file (see `RandiNature2023Converter.run_conversion`) are finally combined
+    into the 'conversion_reports.json' file of the `nwb_output_folder_path` (or of its 'stubs' folder when testing).
+
+    Parameters
+    ----------
+    base_folder_path : DirectoryPath
+        The base folder in which to search for data referenced by the `subject_info_file_path`.
+    subject_info_file_path : FilePath
+        The path to the subject log YAML file.
+    nwb_output_folder_path : DirectoryPath
+        The folder path to save the NWB files to.
+    testing : bool, default: False
+        Whether or not to 'test' the conversion process by limiting the amount of data written to the NWB files.
+    raw_or_processed : tuple of "raw" and/or "processed", default: ("processed", "raw")
+        Which kinds of conversions to run for each session.
+    subject_ids : list of int, optional
+        The subject IDs of the sessions to convert. By default, all sessions in the subject log are converted.
+    skip_processed_subject_ids : list of int, optional
+        The subject IDs of sessions for which only the processed conversion is skipped, such as those with known
+        mismatches in their processed data.
+    maximum_number_of_raw_sessions : int, optional
+        If specified, at most this many raw sessions (that were not already completed) are converted in this run.
+    number_of_processed_workers : int, optional
+        The number of processed sessions converted concurrently. Defaults to the number of CPUs.
+    number_of_raw_workers : int, default: 2
+        The number of raw sessions converted concurrently. Each holds a buffer of several GB of imaging data, and
+        they compete for the bandwidth of the same drives, so this is usually much lower than the number of CPUs.
+        Unless `session_options` sets a "memory_budget_in_gb", the memory available for the buffers is split evenly
+        across these sessions.
+    session_options : dict, optional
+        Additional keyword arguments of `pump_probe_to_nwb` for every session, such as
+        {"compression": "blosc", "backend": "zarr"}.
+    use_manifest : bool, default: True
+        Whether to skip the sessions whose inputs are unchanged since their last conversion (see above).
+        If False, only the raw sessions listed in 'completed_raw_sessions.txt' and existing outputs are skipped.
+    hash_source_contents : bool, default: False
+        Whether to fingerprint the source files by their contents rather than by their sizes and modification times.
+        This reads every source file in full, including the raw frames.
+    preflight : bool, default: True
+        Whether to first run the consistency checks of `preflight_dataset` on every session to convert, and skip
+        those that fail them. The report is saved to 'preflight_report.json' in the `nwb_output_folder_path`, and
+        the issues of each rejected session to its error file.
+    display_progress : bool, default: True
+        Whether to display a single progress bar over all sessions.
+
+    Returns
+    -------
+    dict
+        The (subject ID, "raw" or "processed") of each "succeeded" and "failed" conversion, and of each session
+        "rejected" by the preflight checks.
+    """
+    nwb_output_folder_path = pathlib.Path(nwb_output_folder_path)
+    error_folder_path = nwb_output_folder_path / "errors"
+    error_folder_path.mkdir(exist_ok=True)
+    completed_raw_file_path = nwb_output_folder_path / COMPLETED_RAW_SESSIONS_FILE_NAME
+    manifest = ConversionManifest(manifest_folder_path=nwb_output_folder_path / "manifest") if use_manifest else None
+
+    jobs_per_kind = _list_session_jobs(
+        base_folder_path=base_folder_path,
+        subject_info_file_path=subject_info_file_path,
+        nwb_output_folder_path=nwb_output_folder_path,
+        testing=testing,
+        raw_or_processed=raw_or_processed,
+        subject_ids=subject_ids,
+        skip_processed_subject_ids=skip_processed_subject_ids,
+        session_options=session_options or dict(),
+        manifest=manifest,
+        hash_source_contents=hash_source_contents,
+    )
+    rejected_jobs = list()
+    if preflight is True:
+        jobs_per_kind, rejected_jobs = _reject_jobs_failing_preflight(
+            jobs_per_kind=jobs_per_kind,
+            base_folder_path=base_folder_path,
+            subject_info_file_path=subject_info_file_path,
+            error_folder_path=error_folder_path,
+            testing=testing,
+            source_cache_folder_path=(session_options or dict()).get("source_cache_folder_path", None),
+            report_file_path=nwb_output_folder_path / "preflight_report.json",
+        )
+    if maximum_number_of_raw_sessions is not None:
+        jobs_per_kind["raw"] = jobs_per_kind["raw"][:maximum_number_of_raw_sessions]
+
+    maximum_workers_per_kind = {
+        "processed": number_of_processed_workers or os.cpu_count(),
+        "raw": number_of_raw_workers,
+    }
+
+    # The default budget of a single conversion is measured as it starts, which would not leave room for the others
+    # starting alongside it; so the concurrent raw sessions share a budget measured once, unless one was given
+    if len(jobs_per_kind["raw"]) != 0 and (session_options or dict()).get("memory_budget_in_gb", None) is None:
+        number_of_concurrent_raw_sessions = max(min(number_of_raw_workers, len(jobs_per_kind["raw"])), 1)
+        memory_budget_in_gb = get_default_memory_budget_in_bytes() / number_of_concurrent_raw_sessions / 1e9
+        for job in jobs_per_kind["raw"]:
+            job["options"]["memory_budget_in_gb"] = memory_budget_in_gb
+    results = {
+        "succeeded": list(),
+        "failed": list(),
+        "rejected": [(job["subject_id"], job["raw_or_processed"]) for job in rejected_jobs],
+    }
+    futures = dict()
+    with contextlib.ExitStack() as stack:
+        for kind, jobs in jobs_per_kind.items():
+            if len(jobs) == 0:
+                continue
+
+            # A fresh process per session returns all memory held by a conversion and keeps the state of HDF5 clean
+            executor = stack.enter_context(
+                concurrent.futures.ProcessPoolExecutor(
+                    max_workers=max(min(maximum_workers_per_kind[kind], len(jobs)), 1),
+                    mp_context=multiprocessing.get_context("spawn"),
+                    max_tasks_per_child=1,
+                )
+            )
+            for job in jobs:
+                # The progress bars of each session are replaced by the single one over all sessions
+                job_options = {**job["options"], "display_progress": False}
+                futures[executor.submit(_convert_session, job_options)] = job
+
+        progress_bar = tqdm.tqdm(
+            total=len(futures),
+            desc="Converting sessions",
+            unit="session",
+            disable=not display_progress,
+            mininterval=5.0,
+            smoothing=0,
+        )
+        with progress_bar:
+            for future in concurrent.futures.as_completed(futures):
+                job = futures[future]
+                subject_id, kind = job["subject_id"], job["raw_or_processed"]
+                try:
+                    outcome = future.result()
+                except Exception as exception:  # Such as the worker process being killed when out of memory
+                    outcome = dict(error=f"{type(exception)}: {str(exception)}\n\n{traceback.format_exc()}")
+
+                error = outcome["error"]
+                if error is None:
+                    results["succeeded"].append((subject_id, kind))
+                    if kind == "raw" and testing is False:
+                        with open(file=completed_raw_file_path, mode="a") as io:
+                            io.write(f"{subject_id}\n")
+                    if manifest is not None and outcome["nwbfile_path"] is not None:
+                        manifest.record(
+                            job_name=job["job_name"],
+                            fingerprint=job["fingerprint"],
+                            nwbfile_path=outcome["nwbfile_path"],
+                        )
+                else:
+                    results["failed"].append((subject_id, kind))
+                    _write_error_file(
+                        error_folder_path=error_folder_path,
+                        subject_id=subject_id,
+                        raw_or_processed=kind,
+                        testing=testing,
+                        error=error,
+                    )
+
+                progress_bar.set_postfix(failed=len(results["failed"]), refresh=False)
+                progress_bar.update(n=1)
+
+    _aggregate_session_reports(nwb_output_folder_path=nwb_output_folder_path, testing=testing)
+
+    return results
+
+
+def _list_session_jobs(
+    *,
+    base_folder_path: pathlib.Path,
+    subject_info_file_path: pathlib.Path,
+    nwb_output_folder_path: pathlib.Path,
+    testing: bool,
+    raw_or_processed: tuple[typing.Literal["raw", "processed"], ...],
+    subject_ids: list[int] | None,
+    skip_processed_subject_ids: list[int] | None,
+    session_options: dict,
+    manifest: ConversionManifest | None,
+    hash_source_contents: bool = False,
+) -> dict[str, list[dict]]:
+    """
+    List the sessions to convert for each kind of conversion, largest first.
+
+    With a manifest, the sessions whose inputs have the same fingerprint as when they were last converted are left
+    out; the others are converted again even if their output exists. Sessions without an entry in the manifest (such
+    as those converted before it was used) are only converted if their output does not exist.
+
+    Without one, the raw sessions listed in 'completed_raw_sessions.txt' (if not testing) are left out.
+
+    Returns
+    -------
+    dict
+        For "raw" and "processed", the list of jobs, each a dictionary of the "subject_id", "raw_or_processed",
+        "job_name", "estimated_size", "fingerprint" (None without a manifest), and "options" of `pump_probe_to_nwb`.
+    """
+    with open(file=subject_info_file_path, mode="r") as stream:
+        all_subject_info = yaml.safe_load(stream=stream)
+    _validate_subject_info(all_subject_info=all_subject_info)
+
+    completed_raw_file_path = nwb_output_folder_path / COMPLETED_RAW_SESSIONS_FILE_NAME
+    completed_raw_sessions = list()
+    if manifest is None and testing is False and completed_raw_file_path.exists():
+        with open(file=completed_raw_file_path, mode="r") as io:
+            completed_raw_sessions = [x.strip() for x in io.readlines()]
+
+    subject_ids = subject_ids if subject_ids is not None else list(all_subject_info.keys())
+    skip_processed_subject_ids = skip_processed_subject_ids or list()
+
+    jobs_per_kind = {"processed": list(), "raw": list()}
+    for subject_id in subject_ids:
+        subject_info = all_subject_info[subject_id]
+        source_folder_paths = list(
+            _get_session_folder_paths(base_folder_path=base_folder_path, subject_info=subject_info)
+        )
+        for kind in raw_or_processed:
+            if kind == "processed" and subject_id in skip_processed_subject_ids:
+                continue
+            if kind == "raw" and str(subject_id) in completed_raw_sessions:
+                continue
+
+            job_name = _get_job_name(subject_id=subject_id, raw_or_processed=kind, testing=testing)
+            options = {
+                **session_options,
+                "base_folder_path": base_folder_path,
+                "subject_info_file_path": subject_info_file_path,
+                "subject_id": subject_id,
+                "nwb_output_folder_path": nwb_output_folder_path,
+                "raw_or_processed": kind,
+                "testing": testing,
+            }
+
+            fingerprint = None
+            if manifest is not None:
+                fingerprint = fingerprint_session(
+                    subject_info=subject_info,
+                    source_folder_paths=source_folder_paths,
+                    raw_or_processed=kind,
+                    session_options=session_options,
+                    hash_contents=hash_source_contents,
+                )
+                if manifest.is_up_to_date(job_name=job_name, fingerprint=fingerprint):
+                    continue
+                if manifest.get_entry(job_name=job_name) is not None:
+                    options["skip_existing"] = False  # The existing output was converted from other inputs
+
+            estimated_size = _estimate_session_size(source_folder_paths=source_folder_paths, raw_or_processed=kind)
+            jobs_per_kind[kind].append(
+                dict(
+                    subject_id=subject_id,
+                    raw_or_processed=kind,
+                    job_name=job_name,
+                    estimated_size=estimated_size,
+                    fingerprint=fingerprint,
+                    options=options,
+                )
+            )
+
+    for jobs in jobs_per_kind.values():
+        jobs.sort(key=lambda job: job["estimated_size"], reverse=True)
+
+    return jobs_per_kind
+
+
+def _get_job_name(*, subject_id: int, raw_or_processed: typing.Literal["raw", "processed"], testing: bool) -> str:
+    return f"{subject_id}_{raw_or_processed}_testing={testing}"
+
+
+def _reject_jobs_failing_preflight(
+    *,
+    jobs_per_kind: dict[str, list[dict]],
+    base_folder_path: pathlib.Path,
+    subject_info_file_path: pathlib.Path,
+    error_folder_path: pathlib.Path,
+    testing: bool,
+    source_cache_folder_path: pathlib.Path | None,
+    report_file_path: pathlib.Path,
+) -> tuple[dict[str, list[dict]], list[dict]]:
+    """Split off the jobs whose sessions fail the preflight checks, saving their issues to their error files."""
+    subject_ids = sorted(set(job["subject_id"] for jobs in jobs_per_kind.values() for job in jobs))
+    if len(subject_ids) == 0:
+        return jobs_per_kind, list()
+
+    report = preflight_dataset(
+        base_folder_path=base_folder_path,
+        subject_info_file_path=subject_info_file_path,
+        subject_ids=subject_ids,
+        raw_or_processed=tuple(kind for kind, jobs in jobs_per_kind.items() if len(jobs) != 0),
+        source_cache_folder_path=source_cache_folder_path,
+        report_file_path=report_file_path,
+    )
+    failed_session_reports = {
+        (session_report["subject_id"], session_report["raw_or_processed"]): session_report
+        for session_report in report["sessions"]
+        if not session_report["passed"]
+    }
+
+    accepted_jobs_per_kind = {kind: list() for kind in jobs_per_kind}
+    rejected_jobs = list()
+    for kind, jobs in jobs_per_kind.items():
+        for job in jobs:
+            session_report = failed_session_reports.get((job["subject_id"], kind), None)
+            if session_report is None:
+                accepted_jobs_per_kind[kind].append(job)
+                continue
+
+            rejected_jobs.append(job)
+            issues = "\n".join(
+                f"[{issue['severity']}] {issue['check']}: {issue['message']}" for issue in session_report["issues"]
+            )
+            _write_error_file(
+                error_folder_path=error_folder_path,
+                subject_id=job["subject_id"],
+                raw_or_processed=kind,
+                testing=testing,
+                error=f"Rejected by the preflight checks:\n\n{issues}",
+            )
+
+    return accepted_jobs_per_kind, rejected_jobs
+
+
+def _write_error_file(
+    *,
+    error_folder_path: pathlib.Path,
+    subject_id: int,
+    raw_or_processed: typing.Literal["raw", "processed"],
+    testing: bool,
+    error: str,
+) -> None:
+    error_file_path = error_folder_path / f"{subject_id}_{raw_or_processed}_testing={testing}_error.txt"
+    with open(file=error_file_path, mode="w") as io:
+        io.write(f"Error encountered during conversion of {raw_or_processed} subject ID '{subject_id}'!\n\n{error}")
+
+
+def _aggregate_session_reports(*, nwb_output_folder_path: pathlib.Path, testing: bool) -> pathlib.Path | None:
+    """Combine the reports of every NWB file in the output folder, including those of earlier runs."""
+    if testing is True:
+        reports_folder_path = nwb_output_folder_path / "stubs"
+        report_file_paths = sorted(reports_folder_path.glob("*.report.json"))
+    else:
+        reports_folder_path = nwb_output_folder_path
+        report_file_paths = sorted(reports_folder_path.glob("sub-*/*.report.json"))
+
+    if len(report_file_paths) == 0:
+        return None
+
+    aggregated_report = aggregate_conversion_reports(report_file_paths=report_file_paths)
+    aggregated_report_file_path = reports_folder_path / CONVERSION_REPORTS_FILE_NAME
+    # Written atomically since several workers may finish at the same time
+    _write_atomically(file_path=aggregated_report_file_path, text=json.dumps(obj=aggregated_report, indent=2))
+
+    return aggregated_report_file_path
+
+
+def _validate_subject_info(*, all_subject_info: dict) -> None:
+    for subject_key, subject_info in all_subject_info.items():
+        if subject_key != subject_info["subject_id"]:
+            message = (
+                "\n\nMismatch detected between lookup key and subject ID!\n\n"
+                f"Lookup key: {subject_key}\nSubject ID: {subject_info['subject_id']}\n\n"
+                "Please fix this entry of the subject metadata YAML file."
+            )
+            raise ValueError(message)
+
+
+def _estimate_session_size(
+    *, source_folder_paths: list[pathlib.Path], raw_or_processed: typing.Literal["raw", "processed"]
+) -> int:
+    """
+    Estimate the cost of converting a session as the total size (in bytes) of the sources that dominate it.
+
+    These are the binary '.dat' files of frames for raw conversions, and all other files for processed conversions.
+    """
+    estimated_size = 0
+    for folder_path in source_folder_paths:
+        if not folder_path.is_dir():
+            continue
+
+        for file_path in folder_path.iterdir():
+            if file_path.is_file() and (file_path.suffix == ".dat") == (raw_or_processed == "raw"):
+                estimated_size += file_path.stat().st_size
+
+    return estimated_size
+
+
+def _convert_session(job_options: dict) -> dict[str, str | None]:
+    """
+    Run a single conversion in a worker process.
+
+    Returns the path of the NWB file (None if the source data was not found), or the description of the error if the
+    conversion failed.
+    """
+    try:
+        nwbfile_path = pump_probe_to_nwb(**job_options)
+    except Exception as exception:
+        return dict(nwbfile_path=None, error=f"{type(exception)}: {str(exception)}\n\n{traceback.format_exc()}")
+
+    return dict(nwbfile_path=str(nwbfile_path) if nwbfile_path is not None else None, error=None)
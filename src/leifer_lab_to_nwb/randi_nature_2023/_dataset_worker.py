@@ -0,0 +1,245 @@
+"""Conversion of the dataset by any number of workers, on any number of hosts, sharing a queue on the file system."""
+
+import hashlib
+import json
+import multiprocessing
+import pathlib
+import time
+import traceback
+import typing
+from queue import Empty
+
+import pydantic
+
+from ._conversion_manifest import ConversionManifest
+from ._dataset_scheduler import (
+    _aggregate_session_reports,
+    _convert_session,
+    _list_session_jobs,
+    _reject_jobs_failing_preflight,
+    _write_error_file,
+)
+from ._work_queue import FileSystemWorkQueue, WorkQueueLease
+
+
+@pydantic.validate_call
+def pump_probe_dataset_worker(
+    *,
+    base_folder_path: pydantic.DirectoryPath,
+    subject_info_file_path: pydantic.FilePath,
+    nwb_output_folder_path: pydantic.DirectoryPath,
+    queue_folder_path: pathlib.Path | None = None,
+    testing: bool = False,
+    raw_or_processed: tuple[typing.Literal["raw", "processed"], ...] = ("processed", "raw"),
+    subject_ids: list[int] | None = None,
+    skip_processed_subject_ids: list[int] | None = None,
+    lease_duration_in_s: float = 600.0,
+    poll_interval_in_s: float = 60.0,
+    worker_name: str | None = None,
+    session_options: dict | None = None,
+    use_manifest: bool = True,
+    hash_source_contents: bool = False,
+    preflight: bool = True,
+) -> dict[str, list[tuple[int, str]]]:
+    """
+    Claim and convert sessions of the dataset one at a time until every one of them is finished.
+
+    Any number of workers, on any number of hosts that mount the same source and output folders, may be started with
+    the same arguments; each session is converted by exactly one of them. See `FileSystemWorkQueue` for how the
+    sessions are claimed. The largest sessions are claimed first, and the sessions of workers that stopped before
+    finishing (such as by crashing or losing power) are reclaimed by the others once their lease goes stale. Such
+    sessions are converted again from scratch, overwriting any partial output.
+
+    A worker only returns once no session is left to claim and none is still being converted by another worker, so
+    that it is available to take over from any that stops. It then combines the reports of all the converted files,
+    as `pump_probe_dataset_to_nwb` does.
+
+    Parameters
+    ----------
+    base_folder_path : DirectoryPath
+        The base folder in which to search for data referenced by the `subject_info_file_path`.
+    subject_info_file_path : FilePath
+        The path to the subject log YAML file.
+    nwb_output_folder_path : DirectoryPath
+        The folder path to save the NWB files to.
+    queue_folder_path : path, optional
+        The folder that holds the state of the queue; must be the same for all workers.
+        Defaults to the 'queue' subfolder of the `nwb_output_folder_path` (or 'queue_testing' when testing).
+    testing : bool, default: False
+        Whether or not to 'test' the conversion process by limiting the amount of data written to the NWB files.
+    raw_or_processed : tuple of "raw" and/or "processed", default: ("processed", "raw")
+        Which kinds of conversions this worker runs. Workers on hosts with fast drives and plenty of memory may be
+        dedicated to raw conversions, for example.
+    subject_ids : list of int, optional
+        The subject IDs of the sessions to convert. By default, all sessions in the subject log are converted.
+    skip_processed_subject_ids : list of int, optional
+        The subject IDs of sessions for which only the processed conversion is skipped.
+    lease_duration_in_s : float, default: 600.0
+        The time after which the claim of a worker that stopped keeping it alive may be taken over by another worker.
+    poll_interval_in_s : float, default: 60.0
+        How often to look for stale claims once every remaining session is claimed by other workers.
+    worker_name : str, optional
+        A name unique to this worker, recorded in the files of the queue. Defaults to the host name and process ID.
+    session_options : dict, optional
+        Additional keyword arguments of `pump_probe_to_nwb` for every session, such as
+        {"compression": "blosc", "backend": "zarr"}.
+    use_manifest : bool, default: True
+        Whether to skip the sessions whose inputs are unchanged since their last conversion, as recorded in the
+        'manifest' folder of the `nwb_output_folder_path`; see `pump_probe_dataset_to_nwb`.
+    hash_source_contents : bool, default: False
+        Whether to fingerprint the source files by their contents rather than by their sizes and modification times.
+    preflight : bool, default: True
+        Whether to leave out the sessions that fail the consistency checks of `preflight_dataset`; see
+        `pump_probe_dataset_to_nwb`.
+
+    Returns
+    -------
+    dict
+        The (subject ID, "raw" or "processed") of each "succeeded" and "failed" conversion run by this worker.
+    """
+    nwb_output_folder_path = pathlib.Path(nwb_output_folder_path)
+    error_folder_path = nwb_output_folder_path / "errors"
+    error_folder_path.mkdir(exist_ok=True)
+    queue_folder_path = queue_folder_path or nwb_output_folder_path / ("queue_testing" if testing else "queue")
+
+    queue = FileSystemWorkQueue(
+        queue_folder_path=queue_folder_path, lease_duration_in_s=lease_duration_in_s, worker_name=worker_name
+    )
+
+    # Without a manifest, the completed raw sessions recorded by the single-host scheduler are only read by workers
+    manifest = ConversionManifest(manifest_folder_path=nwb_output_folder_path / "manifest") if use_manifest else None
+    jobs_per_kind = _list_session_jobs(
+        base_folder_path=base_folder_path,
+        subject_info_file_path=subject_info_file_path,
+        nwb_output_folder_path=nwb_output_folder_path,
+        testing=testing,
+        raw_or_processed=raw_or_processed,
+        subject_ids=subject_ids,
+        skip_processed_subject_ids=skip_processed_subject_ids,
+        session_options=session_options or dict(),
+        manifest=manifest,
+        hash_source_contents=hash_source_contents,
+    )
+    if preflight is True:
+        jobs_per_kind, _ = _reject_jobs_failing_preflight(
+            jobs_per_kind=jobs_per_kind,
+            base_folder_path=base_folder_path,
+            subject_info_file_path=subject_info_file_path,
+            error_folder_path=error_folder_path,
+            testing=testing,
+            source_cache_folder_path=(session_options or dict()).get("source_cache_folder_path", None),
+            report_file_path=queue.queue_folder_path / f"preflight_report_{queue.worker_name}.json",
+        )
+    jobs = [job for jobs_of_kind in jobs_per_kind.values() for job in jobs_of_kind]
+    jobs.sort(key=lambda job: job["estimated_size"], reverse=True)
+
+    # A changed fingerprint makes a new job of the queue, since the previous one may have been finished already
+    for job in jobs:
+        job["queue_job_name"] = job["job_name"]
+        if job["fingerprint"] is not None:
+            fingerprint_hash = hashlib.sha1(json.dumps(obj=job["fingerprint"], sort_keys=True).encode()).hexdigest()
+            job["queue_job_name"] += f"_{fingerprint_hash[:12]}"
+
+    results = {"succeeded": list(), "failed": list()}
+    while True:
+        unfinished_jobs = [job for job in jobs if not queue.is_finished(job_name=job["queue_job_name"])]
+        if len(unfinished_jobs) == 0:
+            break
+
+        # Always start over from the largest unfinished session, which may have been released by a stopped worker
+        for job in unfinished_jobs:
+            lease = queue.claim(job_name=job["queue_job_name"])
+            if lease is not None:
+                break
+        else:
+            time.sleep(poll_interval_in_s)
+            continue
+
+        subject_id, kind = job["subject_id"], job["raw_or_processed"]
+        print(f"Worker '{queue.worker_name}' is converting the {kind} session of subject ID '{subject_id}'...")
+        with lease:
+            job_options = dict(job["options"])
+            if lease.was_reclaimed:
+                job_options["skip_existing"] = False  # Any existing output was left partial by the stopped worker
+
+            start_time = time.time()
+            try:
+                outcome = _convert_session_while_leased(job_options=job_options, lease=lease)
+            except Exception as exception:  # Such as the process being killed when out of memory
+                outcome = dict(error=f"{type(exception)}: {str(exception)}\n\n{traceback.format_exc()}")
+
+            if outcome is None:
+                # The session is now converted by the worker that took over, which records its outcome
+                print(
+                    f"Worker '{queue.worker_name}' lost its claim on the {kind} session of subject ID '{subject_id}' "
+                    "and stopped converting it!"
+                )
+                continue
+
+            error = outcome["error"]
+            if error is None:
+                results["succeeded"].append((subject_id, kind))
+                lease.mark_done(details=dict(conversion_time_in_s=time.time() - start_time))
+                if manifest is not None and outcome["nwbfile_path"] is not None:
+                    manifest.record(
+                        job_name=job["job_name"], fingerprint=job["fingerprint"], nwbfile_path=outcome["nwbfile_path"]
+                    )
+            else:
+                results["failed"].append((subject_id, kind))
+                lease.mark_failed(error=error)
+                _write_error_file(
+                    error_folder_path=error_folder_path,
+                    subject_id=subject_id,
+                    raw_or_processed=kind,
+                    testing=testing,
+                    error=error,
+                )
+
+    # Each worker that finishes refreshes the combined report, so that the last one includes every session
+    _aggregate_session_reports(nwb_output_folder_path=nwb_output_folder_path, testing=testing)
+
+    return results
+
+
+def _convert_session_while_leased(*, job_options: dict, lease: WorkQueueLease) -> dict | None:
+    """
+    Convert a session in a fresh process, which is stopped as soon as the lease of its job is lost.
+
+    The lease is kept alive from this process even while the conversion stalls. Once it is lost, another worker may
+    already be converting the same session into the same files, so the conversion is stopped rather than awaited.
+
+    Returns
+    -------
+    dict or None
+        The outcome of `_convert_session`, or None if the lease was lost before the conversion finished.
+    """
+    context = multiprocessing.get_context("spawn")
+    outcome_queue = context.Queue()
+    process = context.Process(target=_put_conversion_outcome, args=(job_options, outcome_queue))
+    process.start()
+    try:
+        while True:
+            try:
+                return outcome_queue.get(timeout=lease.queue.lease_duration_in_s / 4)
+            except Empty:
+                pass
+
+            if lease.is_lost:
+                return None
+
+            if not process.is_alive():
+                # The outcome of a process that just finished may still be on its way
+                try:
+                    return outcome_queue.get(timeout=1.0)
+                except Empty:
+                    message = f"The conversion process stopped with exit code {process.exitcode} before finishing!"
+                    raise RuntimeError(message)
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+        outcome_queue.close()
+
+
+def _put_conversion_outcome(job_options: dict, outcome_queue: multiprocessing.Queue) -> None:
+    outcome_queue.put(_convert_session(job_options))
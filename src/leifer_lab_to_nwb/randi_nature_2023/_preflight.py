@@ -0,0 +1,267 @@
+"""Fast consistency checks of the sources of each session, run before any data is written."""
+
+import concurrent.futures
+import json
+import multiprocessing
+import pathlib
+import typing
+
+import pydantic
+import yaml
+
+from ._pump_probe_to_nwb import _get_session_folder_paths
+from .interfaces._globals import _DEFAULT_CHANNEL_NAMES
+from .interfaces._session_context import SessionSourceContext
+from .interfaces._source_checks import (
+    check_box_shape,
+    check_neuropal_brains,
+    check_neuropal_coordinates,
+    check_neuropal_volume,
+    check_optogenetic_stimulation,
+    check_pump_probe_brains_summary,
+    check_pump_probe_frames,
+    check_pump_probe_signal,
+    load_box_shape_mapping,
+)
+
+# As hardcoded by the imaging interfaces
+_PUMP_PROBE_FRAME_SIZE_IN_BYTES = 1024 * 512 * 2
+_NEUROPAL_VOLUME_SIZE_IN_BYTES = 4 * 26 * 2048 * 2048 * 2
+_NEUROPAL_NUMBER_OF_DEPTHS = 26
+
+
+@pydantic.validate_call
+def preflight_dataset(
+    *,
+    base_folder_path: pydantic.DirectoryPath,
+    subject_info_file_path: pydantic.FilePath,
+    subject_ids: list[int] | None = None,
+    raw_or_processed: tuple[typing.Literal["raw", "processed"], ...] = ("processed", "raw"),
+    number_of_workers: int | None = None,
+    source_cache_folder_path: pydantic.DirectoryPath | None = None,
+    report_file_path: pathlib.Path | None = None,
+) -> dict:
+    """
+    Run the consistency checks of every interface on the sources of many sessions, without writing any data.
+
+    Only the small sources (tables, JSON, and pickles) and the sizes of the binary files of frames are read, so that
+    the sessions that would fail partway through their conversion (such as those with mismatched ROI counts between
+    the signal and 'brains.json' files, timestamps that do not cover every volume, several labeled volumes, or unknown
+    mask types and box shapes) can be found in seconds rather than hours.
+
+    Parameters
+    ----------
+    base_folder_path : DirectoryPath
+        The base folder in which to search for data referenced by the `subject_info_file_path`.
+    subject_info_file_path : FilePath
+        The path to the subject log YAML file.
+    subject_ids : list of int, optional
+        The subject IDs of the sessions to check. By default, all sessions in the subject log are checked.
+    raw_or_processed : tuple of "raw" and/or "processed", default: ("processed", "raw")
+        Which kinds of conversions to check each session for.
+    number_of_workers : int, optional
+        The number of sessions checked concurrently. Defaults to the number of CPUs.
+    source_cache_folder_path : DirectoryPath, optional
+        A folder in which to cache the parsed sources; the later conversions of the same sessions then reuse them.
+    report_file_path : path, optional
+        If specified, the report is also saved to this JSON file.
+
+    Returns
+    -------
+    dict
+        The report, with one entry per session and kind of conversion in "sessions"; each lists the "subject_id",
+        "raw_or_processed", whether it "passed" (has no errors), and its "issues", each with the "check", its
+        "severity" ("error" or "warning"), and a "message".
+    """
+    with open(file=subject_info_file_path, mode="r") as stream:
+        all_subject_info = yaml.safe_load(stream=stream)
+    subject_ids = subject_ids if subject_ids is not None else list(all_subject_info.keys())
+
+    session_reports = list()
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=number_of_workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        futures = [
+            executor.submit(
+                preflight_session,
+                base_folder_path=base_folder_path,
+                subject_info=all_subject_info[subject_id],
+                raw_or_processed=raw_or_processed,
+                source_cache_folder_path=source_cache_folder_path,
+            )
+            for subject_id in subject_ids
+        ]
+        for subject_id, future in zip(subject_ids, futures):
+            try:
+                issues_per_kind = future.result()
+            except Exception as exception:  # Such as the worker process crashing on a corrupt source
+                message = f"{type(exception).__name__}: {str(exception)}"
+                issues_per_kind = {
+                    kind: [dict(check="preflight_session", severity="error", message=message)]
+                    for kind in raw_or_processed
+                }
+
+            for kind, issues in issues_per_kind.items():
+                passed = all(issue["severity"] != "error" for issue in issues)
+                session_reports.append(dict(subject_id=subject_id, raw_or_processed=kind, passed=passed, issues=issues))
+
+    report = dict(
+        number_passed=sum(session_report["passed"] for session_report in session_reports),
+        number_failed=sum(not session_report["passed"] for session_report in session_reports),
+        sessions=session_reports,
+    )
+    if report_file_path is not None:
+        with open(file=report_file_path, mode="w") as io:
+            json.dump(obj=report, fp=io, indent=2)
+
+    return report
+
+
+def preflight_session(
+    *,
+    base_folder_path: pydantic.DirectoryPath,
+    subject_info: dict,
+    raw_or_processed: tuple[typing.Literal["raw", "processed"], ...] = ("processed", "raw"),
+    source_cache_folder_path: pydantic.DirectoryPath | None = None,
+) -> dict[str, list[dict]]:
+    """
+    Run the consistency checks of every interface on the sources of a single session.
+
+    Parameters
+    ----------
+    base_folder_path : DirectoryPath
+        The base folder in which to search for data referenced by the `subject_info`.
+    subject_info : dict
+        The entry of the session in the subject log YAML file.
+    raw_or_processed : tuple of "raw" and/or "processed", default: ("processed", "raw")
+        Which kinds of conversions to check the session for.
+    source_cache_folder_path : DirectoryPath, optional
+        A folder in which to cache the parsed sources.
+
+    Returns
+    -------
+    dict
+        For each kind of conversion, the list of issues found; see `preflight_dataset`.
+    """
+    pump_probe_folder_path, multicolor_folder_path = _get_session_folder_paths(
+        base_folder_path=base_folder_path, subject_info=subject_info
+    )
+    session_context = SessionSourceContext(source_cache_folder_path=source_cache_folder_path)
+
+    # Every other check would only fail to find its files
+    missing_folder_issues = [
+        dict(check="source_folders", severity="error", message=f"Could not find source data at '{folder_path}'!")
+        for folder_path in (pump_probe_folder_path, multicolor_folder_path)
+        if not folder_path.is_dir()
+    ]
+    if len(missing_folder_issues) != 0:
+        return {kind: missing_folder_issues for kind in raw_or_processed}
+
+    issues_per_kind = dict()
+    for kind in raw_or_processed:
+        issues = list()
+        for check in _CHECKS[kind]:
+            try:
+                found_issues = check(
+                    session_context=session_context,
+                    pump_probe_folder_path=pump_probe_folder_path,
+                    multicolor_folder_path=multicolor_folder_path,
+                )
+            except Exception as exception:  # Such as a missing or unreadable source file
+                found_issues = [("error", f"{type(exception).__name__}: {str(exception)}")]
+
+            check_name = check.__name__.removeprefix("_check_")
+            issues.extend(
+                dict(check=check_name, severity=severity, message=message) for severity, message in found_issues
+            )
+        issues_per_kind[kind] = issues
+
+    return issues_per_kind
+
+
+def _check_pump_probe_imaging(
+    *, session_context: SessionSourceContext, pump_probe_folder_path: pathlib.Path, multicolor_folder_path: pathlib.Path
+) -> list[tuple[str, str]]:
+    dat_file_path = pump_probe_folder_path / "sCMOS_Frames_U16_1024x512.dat"
+    return check_pump_probe_frames(
+        sync_table=session_context.read_table(file_path=pump_probe_folder_path / "other-frameSynchronous.txt"),
+        timestamps_table=session_context.read_table(file_path=pump_probe_folder_path / "framesDetails.txt"),
+        number_of_frames_in_file=dat_file_path.stat().st_size // _PUMP_PROBE_FRAME_SIZE_IN_BYTES,
+    )
+
+
+def _check_pump_probe_segmentation(
+    *, session_context: SessionSourceContext, pump_probe_folder_path: pathlib.Path, multicolor_folder_path: pathlib.Path
+) -> list[tuple[str, str]]:
+    brains_summary = session_context.load_pump_probe_brains_summary(file_path=pump_probe_folder_path / "brains.json")
+    timestamps_table = session_context.read_table(file_path=pump_probe_folder_path / "framesDetails.txt")
+    issues = check_pump_probe_brains_summary(
+        brains_summary=brains_summary, number_of_timestamps=timestamps_table.shape[0]
+    )
+
+    signals = {
+        f"{channel_name.lower()}.pickle": session_context.load_signal(
+            file_path=pump_probe_folder_path / f"{channel_name.lower()}.pickle"
+        )
+        for channel_name in _DEFAULT_CHANNEL_NAMES
+    }
+    for signal_file_name, signal in signals.items():
+        issues.extend(
+            check_pump_probe_signal(signal=signal, signal_file_name=signal_file_name, brains_summary=brains_summary)
+        )
+
+    # The shape is only used by the 'box' masks, but must be specified for every session
+    uses_box_masks = any(signal.info.get("method") == "box" for signal in signals.values())
+    issues.extend(
+        check_box_shape(
+            box_shape_mapping=load_box_shape_mapping(),
+            folder_name=pump_probe_folder_path.name,
+            validate_shape=uses_box_masks,
+        )
+    )
+
+    return issues
+
+
+def _check_neuropal_imaging(
+    *, session_context: SessionSourceContext, pump_probe_folder_path: pathlib.Path, multicolor_folder_path: pathlib.Path
+) -> list[tuple[str, str]]:
+    brains_info = session_context.load_json(file_path=multicolor_folder_path / "brains.json")
+    issues = check_neuropal_brains(brains_info=brains_info)
+    issues.extend(
+        check_neuropal_volume(
+            brains_info=brains_info,
+            number_of_depths=_NEUROPAL_NUMBER_OF_DEPTHS,
+            dat_file_size_in_bytes=(multicolor_folder_path / "frames-2048x2048.dat").stat().st_size,
+            volume_size_in_bytes=_NEUROPAL_VOLUME_SIZE_IN_BYTES,
+        )
+    )
+
+    return issues
+
+
+def _check_neuropal_segmentation(
+    *, session_context: SessionSourceContext, pump_probe_folder_path: pathlib.Path, multicolor_folder_path: pathlib.Path
+) -> list[tuple[str, str]]:
+    brains_info = session_context.load_json(file_path=multicolor_folder_path / "brains.json")
+    issues = check_neuropal_brains(brains_info=brains_info)
+    issues.extend(check_neuropal_coordinates(brains_info=brains_info))
+    issues.extend(check_box_shape(box_shape_mapping=load_box_shape_mapping(), folder_name=multicolor_folder_path.name))
+
+    return issues
+
+
+def _check_optogenetic_stimulation(
+    *, session_context: SessionSourceContext, pump_probe_folder_path: pathlib.Path, multicolor_folder_path: pathlib.Path
+) -> list[tuple[str, str]]:
+    return check_optogenetic_stimulation(
+        stimulus_table=session_context.read_table(file_path=pump_probe_folder_path / "pharosTriggers.txt"),
+        timestamps_table=session_context.read_table(file_path=pump_probe_folder_path / "framesDetails.txt"),
+        target_ids_table=session_context.read_table(file_path=pump_probe_folder_path / "targets_manually_located.txt"),
+    )
+
+
+_CHECKS = {
+    "raw": (_check_pump_probe_imaging, _check_neuropal_imaging),
+    "processed": (_check_pump_probe_segmentation, _check_neuropal_segmentation, _check_optogenetic_stimulation),
+}
@@ -1,6 +1,7 @@
 """Main code definition for the conversion of a full session (including NeuroPAL)."""
 
 import datetime
+import pathlib
 import warnings
 import typing
 
@@ -9,6 +10,7 @@ import dateutil.tz
 import pydantic
 
 from ._randi_nature_2023_converter import RandiNature2023Converter
+from .interfaces._checkpoints import get_checkpoint_file_path
 
 
 @pydantic.validate_call
@@ -21,7 +23,26 @@ def pump_probe_to_nwb(
     raw_or_processed: typing.Literal["raw", "processed"],
     testing: bool = False,
     skip_existing: bool = True,
-) -> None:
+    chunking: typing.Literal["size", "volume"] = "size",
+    compression: str = "gzip",
+    compression_options: dict | None = None,
+    number_of_compression_workers: int | None = None,
+    backend: typing.Literal["hdf5", "zarr"] = "hdf5",
+    number_of_jobs: int = 1,
+    source_cache_folder_path: pydantic.DirectoryPath | None = None,
+    display_progress: bool = True,
+    interface_names: list[str] | None = None,
+    memory_budget_in_gb: float | None = None,
+    read_method: typing.Literal["memmap", "sequential"] = "memmap",
+    read_size_in_bytes: int | None = None,
+    storage_mode: typing.Literal["copy", "reference", "sharded"] = "copy",
+    number_of_shards: int | None = None,
+    resume: bool = False,
+    volume_projections: bool = False,
+    live: bool = False,
+    live_poll_interval_in_s: float = 10.0,
+    live_end_of_acquisition_timeout_in_s: float = 300.0,
+) -> pathlib.Path | None:
     """
     Convert a single session of pumpprobe (and its corresponding NeuroPAL) data to NWB format.
 
@@ -56,14 +77,98 @@ def pump_probe_to_nwb(
 
         Note that files produced in this way will not save in the `nwb_output_folder_path`, but rather in a folder
         adjacent to it marked as `nwb_testing`.
+    skip_existing : bool, default: True
+        Whether or not to skip the conversion if the NWB file already exists.
+    chunking : "size" or "volume", default: "size"
+        Only applies to raw conversions.
+        Whether to chunk the PumpProbe imaging data by a target size of about 10 MB, or to align the chunks with the
+        volumes (scan cycles) so that reading a single volume touches as few chunks as possible. The chunks all have
+        the same length, so they only match every volume if all volumes have the same number of frames.
+    compression : str, default: "gzip"
+        Only applies to raw conversions.
+        The compression method of the imaging data; one of "gzip", "lzf", "blosc", "zstd", "lz4", or "bitshuffle".
+        Use `pump_probe_benchmark_compression` to compare them on a sample of the data.
+    compression_options : dict, optional
+        Only applies to raw conversions.
+        Options specific to the compression method, such as {"cname": "zstd", "clevel": 5, "shuffle": "bit"}.
+    number_of_compression_workers : int, optional
+        Only applies to raw conversions.
+        If specified, the chunks of the imaging data are compressed by this many workers in parallel instead of
+        serially by HDF5.
+    backend : "hdf5" or "zarr", default: "hdf5"
+        The backend of the NWB file; Zarr files are saved with the suffix '.nwb.zarr'.
+        Requires the `hdmf-zarr` package.
+    number_of_jobs : int, default: 1
+        Only applies to raw conversions with the Zarr backend.
+        The number of processes writing the chunks of the imaging data concurrently.
+    source_cache_folder_path : DirectoryPath, optional
+        A folder in which to cache the parsed text, JSON, and pickle sources of each session (as '.npz' files).
+        Repeated conversions of the same session (such as stub, raw, and processed) then skip the parsing.
+    display_progress : bool, default: True
+        Only applies to raw conversions.
+        Whether to display a progress bar while writing the imaging data.
+    interface_names : list of str, optional
+        Only convert the data of these interfaces, such as ["PumpProbeImagingInterfaceGreen"]; mostly for benchmarking
+        and debugging. By default, all interfaces of the `raw_or_processed` conversion are included.
+    memory_budget_in_gb : float, optional
+        Only applies to raw conversions.
+        The memory the buffers of the imaging data may take, in GB, split across the imaging interfaces.
+        The default is half of the memory available when the conversion starts, up to 10 GB.
+    read_method : "memmap" or "sequential", default: "memmap"
+        Only applies to raw conversions.
+        How the raw frames are read. "sequential" reads them in long reads that are dropped from the page cache once
+        read, which is usually faster over network mounts and spares the cache of other users of shared nodes.
+    read_size_in_bytes : int, optional
+        Only applies to raw conversions with the "sequential" `read_method`.
+        The size of each read; the default is 64 MiB.
+    storage_mode : "copy", "reference", or "sharded", default: "copy"
+        Only applies to raw conversions with the HDF5 backend.
+        "reference" writes a small 'index' file whose imaging data refers to the raw '.dat' files in place rather
+        than holding a compressed copy, within minutes; for internal analysis only, as it can only be read alongside
+        those files and its '.external.h5' file. Its name is marked with 'imagingreference' instead of 'imaging', so
+        it does not replace the archival file.
+        "sharded" compresses the imaging data into shard files along time (or depth), written in parallel processes
+        into a '.shards' folder next to the NWB file, whose datasets stitch them together, so that the writing of a
+        single large session scales with the number of cores; the file can only be read alongside that folder.
+    number_of_shards : int, optional
+        Only applies to raw conversions with the "sharded" `storage_mode`.
+        The number of shard files of each imaging dataset; the default is the number of CPUs.
+    resume : bool, default: False
+        Only applies to raw conversions with the HDF5 backend and the "copy" `storage_mode`.
+        Whether to commit the progress of writing the imaging data to a checkpoint next to the NWB file, and to
+        continue from it if a conversion of the same session was interrupted, rather than starting over.
+        A file with a checkpoint is incomplete, so it is never skipped as existing.
+    volume_projections : bool, default: False
+        Only applies to raw conversions with the HDF5 backend and the "copy" `storage_mode`, and not when resuming.
+        Whether to also write the maximum and mean projections over depth of each volume of the PumpProbe imaging
+        data, computed as the raw frames are written, as small series of the 'ophys' processing module for quick
+        looks and quality control.
+    live : bool, default: False
+        Only applies to raw conversions with the HDF5 backend and the "copy" `storage_mode`.
+        Whether the session is still being acquired. The NWB file is then written with the PumpProbe frames acquired
+        so far, and the later frames are appended to it in batches as they are acquired, until none of the source
+        files grew for `live_end_of_acquisition_timeout_in_s`. The file is appended to in SWMR mode, so it can be read
+        between batches by opening it with `h5py.File(..., mode="r", swmr=True)`. The NeuroPAL data is only included
+        if its folder exists when the conversion starts.
+    live_poll_interval_in_s : float, default: 10.0
+        Only applies to live conversions.
+        How often to check the source files for newly acquired frames, in seconds.
+    live_end_of_acquisition_timeout_in_s : float, default: 300.0
+        Only applies to live conversions.
+        How long the source files may go without growing before the acquisition is taken to have ended, in seconds.
+
+    Returns
+    -------
+    pathlib.Path or None
+        The path of the NWB file, whether written now or skipped as existing; None if the source data was not found.
     """
     with open(file=subject_info_file_path, mode="r") as stream:
         all_subject_info = yaml.safe_load(stream=stream)
     subject_info = all_subject_info[subject_id]
 
-    session_folder_path = base_folder_path / str(subject_info["date"])
-    pump_probe_folder_path = session_folder_path / subject_info["pump_probe_folder"]
-    multicolor_folder_path = session_folder_path / subject_info["multicolor_folder"]
+    pump_probe_folder_path, multicolor_folder_path = _get_session_folder_paths(
+        base_folder_path=base_folder_path, subject_info=subject_info
+    )
 
     if pump_probe_folder_path.exists() is False:
         message = f"Could not find source data at '{pump_probe_folder_path}'!"
@@ -83,21 +188,25 @@ def pump_probe_to_nwb(
     subject_id = str(subject_info.get("subject_id", subject_id_from_start_time))
 
     session_type = "imaging" if raw_or_processed == "raw" else "segmentation"
+    if raw_or_processed == "raw" and storage_mode == "reference":
+        session_type = "imagingreference"
+    suffix = ".nwb" if backend == "hdf5" else ".nwb.zarr"
     if testing is True:
         stub_folder_path = nwb_output_folder_path / "stubs"
         stub_folder_path.mkdir(exist_ok=True)
-        nwbfile_path = stub_folder_path / f"{session_string}_stub_{session_type}.nwb"
+        nwbfile_path = stub_folder_path / f"{session_string}_stub_{session_type}{suffix}"
     else:
         # Name and nest the file in a DANDI compliant way
         subject_folder_path = nwb_output_folder_path / f"sub-{subject_id}"
         subject_folder_path.mkdir(exist_ok=True)
         dandi_session_string = session_string.replace("_", "-")
-        dandi_filename = f"sub-{subject_id}_ses-{dandi_session_string}_desc-{session_type}_ophys+ogen.nwb"
+        dandi_filename = f"sub-{subject_id}_ses-{dandi_session_string}_desc-{session_type}_ophys+ogen{suffix}"
         nwbfile_path = subject_folder_path / dandi_filename
 
-    if skip_existing is True and nwbfile_path.exists():
+    nwbfile_is_partial = get_checkpoint_file_path(nwbfile_path=nwbfile_path).exists()
+    if skip_existing is True and nwbfile_path.exists() and not nwbfile_is_partial:
         print(f"File at '{nwbfile_path}' exists - skipping!")
-        return None
+        return nwbfile_path
 
     if raw_or_processed == "raw":
         source_data = {
@@ -108,13 +217,55 @@ def pump_probe_to_nwb(
             "PumpProbeImagingInterfaceRed": {"pump_probe_folder_path": pump_probe_folder_path, "channel_name": "Red"},
             "NeuroPALImagingInterface": {"multicolor_folder_path": multicolor_folder_path},
         }
+        if live is True:
+            source_data["PumpProbeImagingInterfaceGreen"]["live"] = True
+            source_data["PumpProbeImagingInterfaceRed"]["live"] = True
+
+            if not multicolor_folder_path.exists():
+                message = f"Could not find NeuroPAL data at '{multicolor_folder_path}'; converting without it!"
+                warnings.warn(message=message, stacklevel=3)
+                del source_data["NeuroPALImagingInterface"]
 
         progress_bar_options = {"position": 1, "leave": False, "unit": "buffer"}
+        imaging_options = {
+            "compression": compression,
+            "compression_options": compression_options,
+            "number_of_compression_workers": number_of_compression_workers,
+            "read_method": read_method,
+            "storage_mode": storage_mode,
+        }
+        if storage_mode == "sharded":
+            imaging_options["number_of_shards"] = number_of_shards
+        if read_size_in_bytes is not None:
+            imaging_options["read_size_in_bytes"] = read_size_in_bytes
+        live_options = dict()
+        if live is True:
+            live_options = {
+                "live_poll_interval_in_s": live_poll_interval_in_s,
+                "live_end_of_acquisition_timeout_in_s": live_end_of_acquisition_timeout_in_s,
+            }
         conversion_options = {
-            "PumpProbeImagingInterfaceGreen": {"stub_test": testing, "progress_bar_options": progress_bar_options},
-            "PumpProbeImagingInterfaceRed": {"stub_test": testing, "progress_bar_options": progress_bar_options},
-            "NeuroPALImagingInterface": {"stub_test": testing},
+            "PumpProbeImagingInterfaceGreen": {
+                "stub_test": testing,
+                "display_progress": display_progress,
+                "progress_bar_options": progress_bar_options,
+                "chunking": chunking,
+                "volume_projections": volume_projections,
+                **imaging_options,
+                **live_options,
+            },
+            "PumpProbeImagingInterfaceRed": {
+                "stub_test": testing,
+                "display_progress": display_progress,
+                "progress_bar_options": progress_bar_options,
+                "chunking": chunking,
+                "volume_projections": volume_projections,
+                **imaging_options,
+                **live_options,
+            },
+            "NeuroPALImagingInterface": {"stub_test": testing, **imaging_options},
         }
+        conversion_options = {name: options for name, options in conversion_options.items() if name in source_data}
     elif raw_or_processed == "processed":
         source_data = {
             "PumpProbeSegmentationInterfaceGreed": {
@@ -133,7 +284,21 @@ def pump_probe_to_nwb(
             "PumpProbeSegmentationInterfaceRed": {"stub_test": testing},
         }
 
-    converter = RandiNature2023Converter(source_data=source_data, verbose=False)
+    if interface_names is not None:
+        unknown_interface_names = set(interface_names) - set(source_data)
+        if len(unknown_interface_names) != 0:
+            message = (
+                f"Unknown interface names {sorted(unknown_interface_names)} for a {raw_or_processed} conversion! "
+                f"Please choose from {list(source_data)}."
+            )
+            raise ValueError(message)
+
+        source_data = {name: source_data[name] for name in interface_names}
+        conversion_options = {name: options for name, options in conversion_options.items() if name in interface_names}
+
+    converter = RandiNature2023Converter(
+        source_data=source_data, verbose=False, source_cache_folder_path=source_cache_folder_path
+    )
 
     metadata = converter.get_metadata()
 
@@ -179,7 +344,25 @@ def pump_probe_to_nwb(
     warnings.filterwarnings(action="ignore", message="The linked table for DynamicTableRegion*", category=UserWarning)
 
     converter.run_conversion(
-        nwbfile_path=nwbfile_path, metadata=metadata, overwrite=True, conversion_options=conversion_options
+        nwbfile_path=nwbfile_path,
+        metadata=metadata,
+        overwrite=True,
+        conversion_options=conversion_options,
+        backend=backend,
+        number_of_jobs=number_of_jobs,
+        memory_budget_in_gb=memory_budget_in_gb,
+        resume=resume and raw_or_processed == "raw",
     )
 
-    return None
+    return nwbfile_path
+
+
+def _get_session_folder_paths(
+    *, base_folder_path: pydantic.DirectoryPath, subject_info: dict
+) -> tuple[pathlib.Path, pathlib.Path]:
+    """Get the pumpprobe and multicolorworm folders of a session from its entry in the subject log YAML file."""
+    session_folder_path = pathlib.Path(base_folder_path) / str(subject_info["date"])
+    pump_probe_folder_path = session_folder_path / subject_info["pump_probe_folder"]
+    multicolor_folder_path = session_folder_path / subject_info["multicolor_folder"]
+
+    return pump_probe_folder_path, multicolor_folder_path
@@ -1,9 +1,17 @@
+import collections
+import contextlib
 import copy
+import pathlib
+import shutil
+import warnings
+from typing import Literal
 
+import h5py
 import ndx_subjects
 import neuroconv
 import pynwb
-from pydantic import FilePath
+from hdmf.data_utils import DataIO
+from pydantic import DirectoryPath, FilePath
 
 from leifer_lab_to_nwb.randi_nature_2023.interfaces import (
     NeuroPALImagingInterface,
@@ -12,6 +20,29 @@ from leifer_lab_to_nwb.randi_nature_2023.interfaces import (
     PumpProbeImagingInterface,
     PumpProbeSegmentationInterface,
 )
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._checkpoints import ConversionCheckpoint
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._direct_chunk_writing import DeferredDataChunkIterator
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._instrumentation import (
+    ConversionInstrumentation,
+    get_report_file_path,
+    measure_stage,
+)
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._memory_budget import get_default_memory_budget_in_bytes
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._prefetching import PrefetchingDataChunkIterator
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._session_context import SessionSourceContext
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._sharded_storage import get_shards_folder_path
+
+# The conversion options that only affect how fast the data is written, which may change when resuming a conversion
+_RESUME_INDEPENDENT_OPTIONS = (
+    "display_progress",
+    "progress_bar_options",
+    "number_of_compression_workers",
+    "compression_executor",
+    "memory_budget_in_bytes",
+    "number_of_prefetched_buffers",
+    "read_method",
+    "read_size_in_bytes",
+)
 
 
 class RandiNature2023Converter(neuroconv.NWBConverter):
@@ -25,6 +56,45 @@ class RandiNature2023Converter(neuroconv.NWBConverter):
         "OptogeneticStimulationInterface": OptogeneticStimulationInterface,
     }
 
+    def __init__(
+        self,
+        source_data: dict[str, dict],
+        verbose: bool = True,
+        source_cache_folder_path: DirectoryPath | None = None,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        source_data : dict
+            The source data of each interface, keyed by the interface names.
+        verbose : bool, default: True
+            Whether to print the status of the conversion.
+        source_cache_folder_path : DirectoryPath, optional
+            A folder in which to cache the parsed text, JSON, and pickle sources of the session, so that further
+            conversions of the same session skip the parsing.
+            The default is the folder set by the environment variable `LEIFER_LAB_TO_NWB_SOURCE_CACHE_FOLDER_PATH`,
+            if any; otherwise the sources are parsed every time.
+        """
+        # Each source file is loaded once and shared by all interfaces; this includes the raw PumpProbe frames, which
+        # are then read only once for all channels
+        self.session_context = SessionSourceContext(source_cache_folder_path=source_cache_folder_path)
+
+        # The time spent in each stage of each interface is reported next to the NWB file by `run_conversion`
+        self.instrumentation = ConversionInstrumentation()
+
+        # Same as `neuroconv.NWBConverter.__init__`, but measuring the parsing of the sources by each interface
+        self.verbose = verbose
+        self._validate_source_data(source_data=source_data, verbose=self.verbose)
+        self.data_interface_objects = dict()
+        with self.session_context.activate(), self.instrumentation.activate():
+            for interface_name, data_interface_class in self.data_interface_classes.items():
+                if interface_name not in source_data:
+                    continue
+
+                with measure_stage(stage="source_parsing", interface_name=interface_name):
+                    data_interface = data_interface_class(**source_data[interface_name])
+                self.data_interface_objects[interface_name] = data_interface
+
     def get_metadata_schema(self) -> dict:
         base_metadata_schema = super().get_metadata_schema()
 
@@ -41,7 +111,52 @@ class RandiNature2023Converter(neuroconv.NWBConverter):
         metadata: dict | None = None,
         overwrite: bool = False,
         conversion_options: dict | None = None,
+        backend: Literal["hdf5", "zarr"] = "hdf5",
+        number_of_jobs: int = 1,
+        write_conversion_report: bool = True,
+        memory_budget_in_gb: float | None = None,
+        resume: bool = False,
     ) -> pynwb.NWBFile:
+        """
+        Run the conversion of all interfaces, writing the result to the `nwbfile_path`.
+
+        Parameters
+        ----------
+        nwbfile_path : FilePath, optional
+            The path to write the NWB file to.
+        nwbfile : pynwb.NWBFile, optional
+            An in-memory NWB file to add the data to.
+        metadata : dict, optional
+            The metadata to use; defaults to that of `get_metadata`.
+        overwrite : bool, default: False
+            Whether to overwrite an existing file; otherwise the data is appended to it.
+        conversion_options : dict, optional
+            The conversion options for each interface, keyed by the interface names.
+        backend : "hdf5" or "zarr", default: "hdf5"
+            The backend to write the NWB file with.
+            Zarr requires the `hdmf-zarr` package; its file names conventionally end in '.nwb.zarr'.
+        number_of_jobs : int, default: 1
+            Only applies to the Zarr backend.
+            The number of processes writing independent chunks of the imaging data concurrently.
+        write_conversion_report : bool, default: True
+            Whether to write the wall time, CPU time, bytes read and written, chunk counts, and peak memory of each
+            stage of each interface to a JSON file next to the NWB file, named as the file with '.report.json'
+            appended. See `ConversionInstrumentation` for the meaning of each metric, and `measure_stage` for how to
+            profile the stages.
+            The chunks written by the processes of the Zarr backend are not included.
+        memory_budget_in_gb : float, optional
+            The memory the buffers of the imaging data may take, in GB; it is split evenly across the imaging
+            interfaces since they are all written concurrently. Lower it to fit more conversions on the same machine.
+            The default is `get_default_memory_budget_in_bytes`, which depends on the memory available at the start.
+            Only applies to the interfaces without a `memory_budget_in_bytes` in their `conversion_options`.
+        resume : bool, default: False
+            Whether the imaging data may be resumed after an interruption, such as the preemption of the node.
+            Each buffer written is then committed to a checkpoint next to the NWB file (see `ConversionCheckpoint`),
+            which is removed once the conversion finishes. If a checkpoint of the same conversion (with the same
+            metadata and conversion options, other than those only affecting the speed) is found, the partial file is
+            verified and its imaging data is written from the last committed buffer on; if it fails the verification,
+            the file is written anew. Requires an `nwbfile_path` and the HDF5 backend.
+        """
         if metadata is None:
             metadata = self.get_metadata()
         self.validate_metadata(metadata=metadata)
@@ -50,20 +165,342 @@ class RandiNature2023Converter(neuroconv.NWBConverter):
         subject_metadata = metadata_copy.pop("Subject")  # Must remove from base metadata
         subject = ndx_subjects.CElegansSubject(**subject_metadata)
 
-        conversion_options = conversion_options or dict()
+        imaging_interface_names = [
+            interface_name
+            for interface_name, data_interface in self.data_interface_objects.items()
+            if isinstance(data_interface, (PumpProbeImagingInterface, NeuroPALImagingInterface))
+        ]
+        memory_budget_in_bytes = (
+            memory_budget_in_gb * 1e9 if memory_budget_in_gb is not None else get_default_memory_budget_in_bytes()
+        )
+        conversion_options = copy.deepcopy(conversion_options or dict())
+        for interface_name in imaging_interface_names:
+            interface_conversion_options = conversion_options.setdefault(interface_name, dict())
+            interface_conversion_options.setdefault("backend", backend)
+            interface_conversion_options.setdefault(
+                "memory_budget_in_bytes", int(memory_budget_in_bytes / len(imaging_interface_names))
+            )
+            if resume is True:
+                interface_conversion_options.setdefault("resumable", True)
         self.validate_conversion_options(conversion_options=conversion_options)
 
-        with neuroconv.tools.nwb_helpers.make_or_load_nwbfile(
-            nwbfile_path=nwbfile_path,
-            nwbfile=nwbfile,
-            metadata=metadata_copy,
-            overwrite=overwrite,
-            verbose=self.verbose,
-        ) as nwbfile_out:
+        checkpoint = None
+        if resume is True:
+            if nwbfile_path is None or backend != "hdf5":
+                message = "Resuming a conversion requires an `nwbfile_path` and the HDF5 backend!"
+                raise ValueError(message)
+
+            # The identifier is generated anew by `get_metadata` for every conversion
+            fingerprinted_metadata = copy.deepcopy(metadata)
+            fingerprinted_metadata.get("NWBFile", dict()).pop("identifier", None)
+            fingerprint = dict(
+                metadata=fingerprinted_metadata,
+                conversion_options={
+                    interface_name: {
+                        name: value for name, value in options.items() if name not in _RESUME_INDEPENDENT_OPTIONS
+                    }
+                    for interface_name, options in conversion_options.items()
+                },
+            )
+            checkpoint = ConversionCheckpoint(nwbfile_path=nwbfile_path, fingerprint=fingerprint)
+
+        nwbfile_out = None
+        if checkpoint is not None and checkpoint.load() is True:
+            nwbfile_out = self._resume_conversion(
+                nwbfile_path=nwbfile_path,
+                metadata=metadata_copy,
+                conversion_options=conversion_options,
+                checkpoint=checkpoint,
+            )
+            overwrite = True  # Unless resumed, the partial file is not appended to
+        if nwbfile_out is None:
+            nwbfile_out = self._write_conversion(
+                nwbfile_path=nwbfile_path,
+                nwbfile=nwbfile,
+                metadata=metadata_copy,
+                subject=subject,
+                overwrite=overwrite,
+                conversion_options=conversion_options,
+                backend=backend,
+                number_of_jobs=number_of_jobs,
+                checkpoint=checkpoint,
+            )
+
+        if nwbfile_path is not None and write_conversion_report is True:
+            self.instrumentation.write_report(
+                report_file_path=get_report_file_path(nwbfile_path=nwbfile_path),
+                nwbfile_path=str(nwbfile_path),
+                backend=backend,
+            )
+
+        return nwbfile_out
+
+    def _write_conversion(
+        self,
+        *,
+        nwbfile_path: FilePath | None,
+        nwbfile: pynwb.NWBFile | None,
+        metadata: dict,
+        subject: ndx_subjects.CElegansSubject,
+        overwrite: bool,
+        conversion_options: dict,
+        backend: Literal["hdf5", "zarr"],
+        number_of_jobs: int,
+        checkpoint: ConversionCheckpoint | None,
+    ) -> pynwb.NWBFile:
+        # Datasets whose chunks are compressed and written by the interfaces themselves after the file is created
+        deferred_dataset_writers = list()
+        with (
+            self.instrumentation.activate(),
+            _make_or_load_nwbfile(
+                nwbfile_path=nwbfile_path,
+                nwbfile=nwbfile,
+                metadata=metadata,
+                overwrite=overwrite,
+                verbose=self.verbose,
+                backend=backend,
+                number_of_jobs=number_of_jobs,
+                deferred_dataset_writers=deferred_dataset_writers,
+                checkpoint=checkpoint,
+            ) as nwbfile_out,
+        ):
             nwbfile_out.subject = subject
-            for interface_name, data_interface in self.data_interface_objects.items():
-                data_interface.add_to_nwbfile(
-                    nwbfile=nwbfile_out, metadata=metadata_copy, **conversion_options.get(interface_name, dict())
+            self._add_to_nwbfile(
+                nwbfile=nwbfile_out,
+                metadata=metadata,
+                conversion_options=conversion_options,
+                deferred_dataset_writers=deferred_dataset_writers,
+            )
+
+            if nwbfile_path is None and len(deferred_dataset_writers) != 0:
+                message = (
+                    "Parallel compression, reference storage, or sharded storage was requested by some interfaces, "
+                    "but no `nwbfile_path` was specified! "
+                    "Those datasets can only be written to a file on disk."
                 )
+                raise ValueError(message)
 
         return nwbfile_out
+
+    def _resume_conversion(
+        self, *, nwbfile_path: FilePath, metadata: dict, conversion_options: dict, checkpoint: ConversionCheckpoint
+    ) -> pynwb.NWBFile | None:
+        """
+        Continue writing the imaging data of a partial NWB file from its checkpoint.
+
+        The interfaces are added to a new in-memory NWB file, which is not written, only to create the writers of the
+        deferred datasets. Returns None if the partial file fails the verification of any of them.
+        """
+        nwbfile = neuroconv.tools.nwb_helpers.make_nwbfile_from_metadata(metadata=metadata)
+        deferred_dataset_writers = list()
+        with self.instrumentation.activate():
+            self._add_to_nwbfile(
+                nwbfile=nwbfile,
+                metadata=metadata,
+                conversion_options=conversion_options,
+                deferred_dataset_writers=deferred_dataset_writers,
+            )
+
+            with measure_stage(stage="checkpoint_verification"):
+                problems = _verify_partial_file(
+                    nwbfile_path=nwbfile_path, deferred_dataset_writers=deferred_dataset_writers, checkpoint=checkpoint
+                )
+            if len(problems) != 0:
+                message = f"Unable to resume the conversion of '{nwbfile_path}', which is written anew! " + " ".join(
+                    problems
+                )
+                warnings.warn(message=message, stacklevel=3)
+                return None
+
+            if self.verbose:
+                print(f"Resuming the conversion of '{nwbfile_path}'...")
+            with measure_stage(stage="deferred_dataset_write"):
+                _write_deferred_datasets(
+                    nwbfile_path=nwbfile_path, deferred_dataset_writers=deferred_dataset_writers, checkpoint=checkpoint
+                )
+
+        checkpoint.remove()
+        if self.verbose:
+            print(f"NWB file saved at {nwbfile_path}!")
+
+        return nwbfile
+
+    def _add_to_nwbfile(
+        self, *, nwbfile: pynwb.NWBFile, metadata: dict, conversion_options: dict, deferred_dataset_writers: list
+    ) -> None:
+        for interface_name, data_interface in self.data_interface_objects.items():
+            with measure_stage(stage="add_to_nwbfile", interface_name=interface_name):
+                data_interface.add_to_nwbfile(
+                    nwbfile=nwbfile, metadata=metadata, **conversion_options.get(interface_name, dict())
+                )
+            deferred_dataset_writers.extend(getattr(data_interface, "deferred_dataset_writers", list()))
+
+
+@contextlib.contextmanager
+def _make_or_load_nwbfile(
+    *,
+    nwbfile_path: FilePath | None = None,
+    nwbfile: pynwb.NWBFile | None = None,
+    metadata: dict | None = None,
+    overwrite: bool = False,
+    verbose: bool = True,
+    backend: Literal["hdf5", "zarr"] = "hdf5",
+    number_of_jobs: int = 1,
+    deferred_dataset_writers: list | None = None,
+    checkpoint: ConversionCheckpoint | None = None,
+):
+    """
+    Adapted from `neuroconv.tools.nwb_helpers.make_or_load_nwbfile`.
+
+    The data chunk iterators are not exhausted one at a time upon writing, but are instead written in turns of one
+    buffer each. This allows the PumpProbe channels to share each block of raw frames read.
+
+    With the Zarr backend, the chunks of the data chunk iterators may instead be written by `number_of_jobs` processes.
+
+    Any `deferred_dataset_writers` (which may be appended to within the context) then fill their datasets in the
+    written file, also taking turns. If any of them `requires_swmr` (such as a `LiveSeriesWriter`), a new HDF5 file is
+    written in the latest format, and is then filled in single-writer multiple-reader (SWMR) mode, so that it can be
+    read while its datasets are appended to.
+
+    With a `checkpoint`, the file is marked as incomplete until it is finished, and the writers commit their progress
+    to it. The file is then kept if the writing fails once its structure is written, so that it may be resumed.
+    """
+    deferred_dataset_writers = deferred_dataset_writers if deferred_dataset_writers is not None else list()
+
+    nwbfile_path = pathlib.Path(nwbfile_path) if nwbfile_path is not None else None
+    file_initially_exists = nwbfile_path is not None and nwbfile_path.exists()
+    append_mode = file_initially_exists and not overwrite
+
+    io = None
+    write_kwargs = dict(exhaust_dci=False)
+    if nwbfile_path is not None and backend == "hdf5" and append_mode:
+        io = pynwb.NWBHDF5IO(path=nwbfile_path, mode="r+", load_namespaces=True)
+    elif nwbfile_path is not None and backend == "zarr":
+        from hdmf_zarr.nwb import NWBZarrIO
+
+        io = NWBZarrIO(path=str(nwbfile_path), mode="r+" if append_mode else "w", load_namespaces=append_mode)
+        write_kwargs.update(number_of_jobs=number_of_jobs)
+
+    success = True
+    try:
+        if append_mode:
+            nwbfile = io.read()
+        elif nwbfile is None:
+            nwbfile = neuroconv.tools.nwb_helpers.make_nwbfile_from_metadata(metadata=metadata)
+
+        yield nwbfile
+
+        # Only created once the deferred writers are known, since any followed while writing needs the latest format
+        if nwbfile_path is not None and backend == "hdf5" and not append_mode:
+            libver = "latest" if _requires_swmr(deferred_dataset_writers=deferred_dataset_writers) else None
+            file = h5py.File(name=nwbfile_path, mode="w", libver=libver)
+            io = pynwb.NWBHDF5IO(path=nwbfile_path, mode="w", file=file)
+
+        if io is not None:
+            if checkpoint is not None:
+                checkpoint.start()
+
+            # With the serial HDF5 filters, this includes the iteration and compression of the chunks
+            with measure_stage(stage="file_write"):
+                io.write(nwbfile, **write_kwargs)
+                io.close()
+
+            if checkpoint is not None:
+                checkpoint.mark_structure_written()
+
+            if len(deferred_dataset_writers) != 0:
+                with measure_stage(stage="deferred_dataset_write"):
+                    _write_deferred_datasets(
+                        nwbfile_path=nwbfile_path,
+                        deferred_dataset_writers=deferred_dataset_writers,
+                        checkpoint=checkpoint,
+                    )
+
+            if checkpoint is not None:
+                checkpoint.remove()
+
+            if verbose:
+                print(f"NWB file saved at {nwbfile_path}!")
+    except Exception:
+        success = False
+        if nwbfile is not None:
+            _stop_prefetching(nwbfile=nwbfile)
+        raise
+    finally:
+        if io is not None:
+            io.close()
+
+            resumable = checkpoint is not None and checkpoint.structure_written
+            if not success and not file_initially_exists and nwbfile_path.is_dir():
+                shutil.rmtree(path=nwbfile_path, ignore_errors=True)
+            elif not success and not file_initially_exists and not resumable:
+                nwbfile_path.unlink(missing_ok=True)
+                shutil.rmtree(path=get_shards_folder_path(nwbfile_path=nwbfile_path), ignore_errors=True)
+                if checkpoint is not None:
+                    checkpoint.remove()
+
+
+def _write_deferred_datasets(
+    *, nwbfile_path: FilePath, deferred_dataset_writers: list, checkpoint: ConversionCheckpoint | None = None
+) -> None:
+    # Only the writers of resumable datasets take a checkpoint
+    writer_kwargs = dict(checkpoint=checkpoint) if checkpoint is not None else dict()
+    requires_swmr = _requires_swmr(deferred_dataset_writers=deferred_dataset_writers)
+    with h5py.File(name=nwbfile_path, mode="r+", libver="latest" if requires_swmr else None) as file:
+        if requires_swmr:
+            # Lets any number of readers open the file (with `swmr=True`) while its datasets are appended to
+            file.swmr_mode = True
+
+        ongoing_writes = collections.deque(
+            writer.iter_write(file=file, **writer_kwargs) for writer in deferred_dataset_writers
+        )
+        try:
+            while len(ongoing_writes) != 0:
+                ongoing_write = ongoing_writes.popleft()
+                try:
+                    next(ongoing_write)
+                except StopIteration:
+                    continue
+                ongoing_writes.append(ongoing_write)
+        finally:
+            # The writes abandoned when another one fails are closed, which releases their resources
+            for ongoing_write in ongoing_writes:
+                ongoing_write.close()
+
+
+def _requires_swmr(*, deferred_dataset_writers: list) -> bool:
+    """Whether any of the writers (such as a `LiveSeriesWriter`) appends to a file that is read while it is written."""
+    return any(getattr(writer, "requires_swmr", False) for writer in deferred_dataset_writers)
+
+
+def _stop_prefetching(*, nwbfile: pynwb.NWBFile) -> None:
+    """Stop the background reading of the data chunk iterators of the datasets of a file whose writing failed."""
+    for neurodata_object in nwbfile.objects.values():
+        for value in neurodata_object.fields.values():
+            data = value.data if isinstance(value, DataIO) else value
+            if isinstance(data, DeferredDataChunkIterator):
+                data = data.data_iterator
+            if isinstance(data, PrefetchingDataChunkIterator):
+                data.stop_prefetching()
+
+
+def _verify_partial_file(
+    *, nwbfile_path: FilePath, deferred_dataset_writers: list, checkpoint: ConversionCheckpoint
+) -> list[str]:
+    """Check that each deferred dataset of a partial file can be resumed; returns the problems found, if any."""
+    problems = list()
+    try:
+        with h5py.File(name=nwbfile_path, mode="r") as file:
+            for writer in deferred_dataset_writers:
+                if not hasattr(writer, "verify_committed_data"):
+                    problems.append(f"The dataset '{writer.dataset_path}' cannot be resumed.")
+                    continue
+
+                committed_length = checkpoint.get_committed_length(dataset_path=writer.dataset_path)
+                problem = writer.verify_committed_data(file=file, committed_length=committed_length)
+                if problem is not None:
+                    problems.append(problem)
+    except OSError as exception:
+        problems.append(f"The file could not be read ({exception}).")
+
+    return problems
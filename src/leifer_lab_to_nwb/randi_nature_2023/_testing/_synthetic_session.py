@@ -0,0 +1,399 @@
+"""Generation of a fake pumpprobe and multicolorworm session pair with the layout of the real sources."""
+
+import json
+import pathlib
+import pickle
+import types
+import typing
+
+import numpy
+import pydantic
+import yaml
+
+# Named after a real session so that its box shapes are found in 'session_to_box_shape.json'
+SYNTHETIC_SESSION_DATE = "20211104"
+SYNTHETIC_PUMP_PROBE_FOLDER_NAME = "pumpprobe_20211104_163944"
+SYNTHETIC_MULTICOLOR_FOLDER_NAME = "multicolorworm_20211104_162630"
+SYNTHETIC_SUBJECT_ID = 1
+
+SYNTHETIC_SUBJECT_INFO_FILE_NAME = "synthetic_subject_info.yaml"
+SYNTHETIC_SESSION_PARAMETERS_FILE_NAME = "synthetic_session.json"
+
+# As hardcoded by the imaging interfaces
+_PUMP_PROBE_FRAME_SHAPE = (1024, 512)
+_NEUROPAL_FRAME_SHAPE = (2048, 2048)
+_NEUROPAL_NUMBER_OF_CHANNELS = 4
+_NEUROPAL_NUMBER_OF_DEPTHS = 26
+
+# The real 'frames-2048x2048.dat' files always end with a few bytes beyond the full volume
+_NEUROPAL_TRAILING_BYTES = 1000
+
+# Roughly those of the recordings of the paper
+_FRAME_RATE_IN_HZ = 200.0
+_PIEZO_RANGE_IN_V = (-2.5, 2.5)
+_DEPTH_PER_PIEZO_VOLT_IN_UM = 1 / 0.125
+_FIRST_SYNC_FRAME_INDEX = 10
+_FIRST_FRAME_COUNT = 25
+_LABELED_VOLUME_INDEX = 30
+
+_NEURON_NAMES = ("AVAL", "AVAR", "AVEL", "AVER", "AIBL", "AIBR", "RIAL", "RIAR", "SMDDL", "SMDDR", "ASHL", "ASHR")
+
+# The frames are written this many at a time to bound the memory used
+_FRAMES_PER_BLOCK = 64
+
+
+@pydantic.validate_call
+def generate_synthetic_session(
+    *,
+    base_folder_path: pydantic.DirectoryPath,
+    number_of_volumes: int = 100,
+    frames_per_volume: int = 40,
+    number_of_rois: int = 150,
+    number_of_stimuli: int = 10,
+    mask_method: typing.Literal["box", "weightedMask"] = "box",
+    seed: int = 0,
+) -> pathlib.Path:
+    """
+    Write a fake session with the same files, layout, and formats as the real ones, for testing and benchmarking.
+
+    The result is structured like the base folder expected by `pump_probe_to_nwb`...
+
+    |- < base folder >
+    |--- synthetic_subject_info.yaml : the subject log, with the single subject ID 1
+    |--- synthetic_session.json : the parameters of the generation
+    |--- 20211104
+    |----- multicolorworm_20211104_162630
+    |----- pumpprobe_20211104_163944
+
+    The frames hold a static image of blurred neurons over camera noise, so that they compress about as well as real
+    ones. The raw PumpProbe frames take 1 MiB each, so `number_of_volumes` times `frames_per_volume` sets their size
+    in MiB; the NeuroPAL volume is always of its real size (about 870 MB).
+
+    The signal pickles hold simple namespaces with the attributes read from the `wormdatamodel.signal.Signal` objects
+    of the real ones, so that they can be loaded without that package.
+
+    Parameters
+    ----------
+    base_folder_path : DirectoryPath
+        The folder to write the session to; any previous synthetic session in it is overwritten.
+    number_of_volumes : int, default: 100
+        The number of volumes (scan cycles) of the pumpprobe recording.
+    frames_per_volume : int, default: 40
+        The typical number of frames in each volume; each actual volume has one more or one fewer at random.
+    number_of_rois : int, default: 150
+        The number of ROIs segmented in each volume.
+    number_of_stimuli : int, default: 10
+        The number of optogenetic stimuli, spread evenly over the recording.
+    mask_method : "box" or "weightedMask", default: "box"
+        The method of extraction of the signals, which determines the masks of the ROIs.
+    seed : int, default: 0
+        The seed of the random generator; the same parameters always produce the same files.
+
+    Returns
+    -------
+    pathlib.Path
+        The path to the subject log YAML file of the session.
+    """
+    base_folder_path = pathlib.Path(base_folder_path)
+    random_generator = numpy.random.default_rng(seed=seed)
+
+    session_folder_path = base_folder_path / SYNTHETIC_SESSION_DATE
+    pump_probe_folder_path = session_folder_path / SYNTHETIC_PUMP_PROBE_FOLDER_NAME
+    multicolor_folder_path = session_folder_path / SYNTHETIC_MULTICOLOR_FOLDER_NAME
+    pump_probe_folder_path.mkdir(parents=True, exist_ok=True)
+    multicolor_folder_path.mkdir(parents=True, exist_ok=True)
+
+    # Each volume is a sweep of the piezo, alternating upward and downward, that starts at its turning point
+    frames_per_volume_array = random_generator.integers(
+        low=max(frames_per_volume - 1, 1), high=frames_per_volume + 2, size=number_of_volumes
+    )
+    number_of_frames = int(frames_per_volume_array.sum())
+    sweep_fractions = numpy.concatenate(
+        [
+            numpy.arange(length) / length if volume_index % 2 == 0 else 1 - numpy.arange(length) / length
+            for volume_index, length in enumerate(frames_per_volume_array)
+        ]
+    )
+    piezo_position_in_v = _PIEZO_RANGE_IN_V[0] + sweep_fractions * (_PIEZO_RANGE_IN_V[1] - _PIEZO_RANGE_IN_V[0])
+    depth_per_frame_in_um = piezo_position_in_v * _DEPTH_PER_PIEZO_VOLT_IN_UM
+
+    labeled_volume_index = min(_LABELED_VOLUME_INDEX, number_of_volumes - 1)
+    roi_coordinates_yx = random_generator.integers(low=16, high=512 - 16, size=(number_of_rois, 2))
+
+    _write_pump_probe_tables(
+        pump_probe_folder_path=pump_probe_folder_path,
+        piezo_position_in_v=piezo_position_in_v,
+        roi_coordinates_yx=roi_coordinates_yx,
+        number_of_stimuli=number_of_stimuli,
+        random_generator=random_generator,
+    )
+    _write_pump_probe_brains(
+        file_path=pump_probe_folder_path / "brains.json",
+        frames_per_volume=frames_per_volume_array,
+        depth_per_frame_in_um=depth_per_frame_in_um,
+        roi_coordinates_yx=roi_coordinates_yx,
+        labeled_volume_index=labeled_volume_index,
+        random_generator=random_generator,
+    )
+    for channel_name in ("green", "red"):
+        _write_signal(
+            file_path=pump_probe_folder_path / f"{channel_name}.pickle",
+            number_of_volumes=number_of_volumes,
+            number_of_rois=number_of_rois,
+            mask_method=mask_method,
+            labeled_volume_index=labeled_volume_index,
+            random_generator=random_generator,
+        )
+
+    # Both optical channels are halves of the same camera frame
+    channel_frame_shape = (_PUMP_PROBE_FRAME_SHAPE[0] // 2, _PUMP_PROBE_FRAME_SHAPE[1])
+    pump_probe_template = numpy.concatenate(
+        [
+            _make_template(
+                frame_shape=channel_frame_shape, coordinates_yx=roi_coordinates_yx, random_generator=random_generator
+            )
+            for _ in range(2)
+        ],
+        axis=0,
+    )
+    _write_frames(
+        file_path=pump_probe_folder_path / "sCMOS_Frames_U16_1024x512.dat",
+        template=pump_probe_template,
+        number_of_frames=number_of_frames,
+        random_generator=random_generator,
+    )
+
+    neuropal_coordinates_yx = random_generator.integers(
+        low=64, high=_NEUROPAL_FRAME_SHAPE[0] - 64, size=(number_of_rois, 2)
+    )
+    _write_neuropal_brains(
+        file_path=multicolor_folder_path / "brains.json",
+        roi_coordinates_yx=neuropal_coordinates_yx,
+        random_generator=random_generator,
+    )
+    neuropal_template = _make_template(
+        frame_shape=_NEUROPAL_FRAME_SHAPE, coordinates_yx=neuropal_coordinates_yx, random_generator=random_generator
+    )
+    _write_frames(
+        file_path=multicolor_folder_path / "frames-2048x2048.dat",
+        template=neuropal_template,
+        number_of_frames=_NEUROPAL_NUMBER_OF_DEPTHS * _NEUROPAL_NUMBER_OF_CHANNELS,
+        random_generator=random_generator,
+        trailing_bytes=_NEUROPAL_TRAILING_BYTES,
+    )
+
+    subject_info = dict(
+        subject_id=SYNTHETIC_SUBJECT_ID,
+        date=int(SYNTHETIC_SESSION_DATE),
+        pump_probe_folder=SYNTHETIC_PUMP_PROBE_FOLDER_NAME,
+        multicolor_folder=SYNTHETIC_MULTICOLOR_FOLDER_NAME,
+    )
+    subject_info_file_path = base_folder_path / SYNTHETIC_SUBJECT_INFO_FILE_NAME
+    with open(file=subject_info_file_path, mode="w") as io:
+        yaml.safe_dump(data={SYNTHETIC_SUBJECT_ID: subject_info}, stream=io)
+
+    # Written last, so that its presence means that the session is complete
+    parameters = dict(
+        number_of_volumes=number_of_volumes,
+        frames_per_volume=frames_per_volume,
+        number_of_rois=number_of_rois,
+        number_of_stimuli=number_of_stimuli,
+        mask_method=mask_method,
+        seed=seed,
+    )
+    with open(file=base_folder_path / SYNTHETIC_SESSION_PARAMETERS_FILE_NAME, mode="w") as io:
+        json.dump(obj=parameters, fp=io, indent=2)
+
+    return subject_info_file_path
+
+
+def _write_pump_probe_tables(
+    *,
+    pump_probe_folder_path: pathlib.Path,
+    piezo_position_in_v: numpy.ndarray,
+    roi_coordinates_yx: numpy.ndarray,
+    number_of_stimuli: int,
+    random_generator: numpy.random.Generator,
+) -> None:
+    number_of_frames = piezo_position_in_v.shape[0]
+
+    # The synchronization table starts a few frames before the first timestamp and ends a few frames after the last
+    frame_count_delay = _FIRST_FRAME_COUNT - _FIRST_SYNC_FRAME_INDEX
+    number_of_sync_frames = frame_count_delay + number_of_frames + 5
+    sync_piezo_position_in_v = numpy.concatenate(
+        (
+            numpy.full(shape=frame_count_delay, fill_value=_PIEZO_RANGE_IN_V[0]),
+            piezo_position_in_v,
+            numpy.full(shape=5, fill_value=piezo_position_in_v[-1]),
+        )
+    )
+    sync_lines = ["Frame index\tPiezo position (V)"]
+    sync_lines.extend(
+        f"{_FIRST_SYNC_FRAME_INDEX + index}\t{sync_piezo_position_in_v[index]:.6f}"
+        for index in range(number_of_sync_frames)
+    )
+    _write_lines(file_path=pump_probe_folder_path / "other-frameSynchronous.txt", lines=sync_lines)
+
+    timestamps = numpy.arange(number_of_frames) / _FRAME_RATE_IN_HZ
+    timestamps += random_generator.normal(scale=1e-5, size=number_of_frames)
+    timestamp_lines = ["Timestamp\tframeCount"]
+    timestamp_lines.extend(
+        f"{timestamps[index]:.6f}\t{_FIRST_FRAME_COUNT + index}" for index in range(number_of_frames)
+    )
+    _write_lines(file_path=pump_probe_folder_path / "framesDetails.txt", lines=timestamp_lines)
+
+    stimulus_frame_indices = numpy.linspace(start=0, stop=number_of_frames, num=number_of_stimuli + 2)[1:-1]
+    targeted_roi_indices = random_generator.choice(
+        a=roi_coordinates_yx.shape[0], size=number_of_stimuli, replace=number_of_stimuli > roi_coordinates_yx.shape[0]
+    )
+    stimulus_lines = ["frameCount\toptogTargetX\toptogTargetY\toptogTargetZ"]
+    stimulus_lines.extend(
+        f"{_FIRST_FRAME_COUNT + int(frame_index)}\t{roi_coordinates_yx[roi_index, 1]}\t"
+        f"{roi_coordinates_yx[roi_index, 0]}\t{random_generator.uniform(low=-15.0, high=15.0):.3f}"
+        for frame_index, roi_index in zip(stimulus_frame_indices, targeted_roi_indices)
+    )
+    _write_lines(file_path=pump_probe_folder_path / "pharosTriggers.txt", lines=stimulus_lines)
+
+    # Some targets are not located, as marked by -1
+    located_target_ids = numpy.where(random_generator.random(size=number_of_stimuli) < 0.8, targeted_roi_indices, -1)
+    target_lines = ["target_id"]
+    target_lines.extend(str(target_id) for target_id in located_target_ids)
+    _write_lines(file_path=pump_probe_folder_path / "targets_manually_located.txt", lines=target_lines)
+
+
+def _write_pump_probe_brains(
+    *,
+    file_path: pathlib.Path,
+    frames_per_volume: numpy.ndarray,
+    depth_per_frame_in_um: numpy.ndarray,
+    roi_coordinates_yx: numpy.ndarray,
+    labeled_volume_index: int,
+    random_generator: numpy.random.Generator,
+) -> None:
+    number_of_rois = roi_coordinates_yx.shape[0]
+    volume_start_frames = numpy.concatenate(([0], numpy.cumsum(frames_per_volume)[:-1]))
+
+    # Only the labeled volume is guaranteed to have all ROIs; the segmentation of the others varies slightly
+    number_of_rois_per_volume = list()
+    coordinates = list()
+    for volume_index, length in enumerate(frames_per_volume):
+        volume_number_of_rois = number_of_rois
+        if volume_index != labeled_volume_index:
+            volume_number_of_rois = max(number_of_rois + int(random_generator.integers(low=-5, high=6)), 1)
+        number_of_rois_per_volume.append(volume_number_of_rois)
+
+        roi_indices = numpy.arange(volume_number_of_rois) % number_of_rois
+        depths = random_generator.integers(low=0, high=length, size=volume_number_of_rois)
+        coordinates.extend(
+            [int(depth), int(roi_coordinates_yx[roi_index, 0]), int(roi_coordinates_yx[roi_index, 1])]
+            for depth, roi_index in zip(depths, roi_indices)
+        )
+
+    labels = [list() for _ in frames_per_volume]
+    labels[labeled_volume_index] = [
+        _NEURON_NAMES[roi_index] if roi_index < len(_NEURON_NAMES) else "" for roi_index in range(number_of_rois)
+    ]
+
+    brains = dict(
+        nInVolume=number_of_rois_per_volume,
+        zOfFrame=[
+            [round(float(depth), 4) for depth in depth_per_frame_in_um[start : start + length]]
+            for start, length in zip(volume_start_frames, frames_per_volume)
+        ],
+        labels=labels,
+        coordZYX=coordinates,
+    )
+    with open(file=file_path, mode="w") as io:
+        json.dump(obj=brains, fp=io)
+
+
+def _write_signal(
+    *,
+    file_path: pathlib.Path,
+    number_of_volumes: int,
+    number_of_rois: int,
+    mask_method: typing.Literal["box", "weightedMask"],
+    labeled_volume_index: int,
+    random_generator: numpy.random.Generator,
+) -> None:
+    baseline = random_generator.uniform(low=50.0, high=500.0, size=(1, number_of_rois))
+    data = baseline * (1.0 + 0.1 * random_generator.standard_normal(size=(number_of_volumes, number_of_rois)))
+
+    # A few values of the real signals are missing and interpolated over
+    nan_mask = random_generator.random(size=(number_of_volumes, number_of_rois)) < 0.01
+
+    signal = types.SimpleNamespace(
+        data=data,
+        info=dict(method=mask_method, version="1.5-dirty", ref_index=labeled_volume_index),
+        nan_interpolated=True,
+        nan_mask=nan_mask,
+    )
+    with open(file=file_path, mode="wb") as io:
+        pickle.dump(obj=signal, file=io)
+
+
+def _write_neuropal_brains(
+    *, file_path: pathlib.Path, roi_coordinates_yx: numpy.ndarray, random_generator: numpy.random.Generator
+) -> None:
+    number_of_rois = roi_coordinates_yx.shape[0]
+    depths = random_generator.integers(low=0, high=_NEUROPAL_NUMBER_OF_DEPTHS, size=number_of_rois)
+
+    brains = dict(
+        nInVolume=[number_of_rois],
+        zOfFrame=[[float(depth) for depth in numpy.linspace(start=-12.5, stop=12.5, num=_NEUROPAL_NUMBER_OF_DEPTHS)]],
+        labels=[[_NEURON_NAMES[index] if index < len(_NEURON_NAMES) else "" for index in range(number_of_rois)]],
+        labels_confidences=[[round(float(value), 3) for value in random_generator.random(size=number_of_rois)]],
+        labels_comments=[["" for _ in range(number_of_rois)]],
+        coordZYX=[
+            [int(depth), int(coordinates_yx[0]), int(coordinates_yx[1])]
+            for depth, coordinates_yx in zip(depths, roi_coordinates_yx)
+        ],
+    )
+    with open(file=file_path, mode="w") as io:
+        json.dump(obj=brains, fp=io)
+
+
+def _make_template(
+    *, frame_shape: tuple[int, int], coordinates_yx: numpy.ndarray, random_generator: numpy.random.Generator
+) -> numpy.ndarray:
+    """Make an image of blurred neurons at the given coordinates over a dim background."""
+    template = numpy.full(shape=frame_shape, fill_value=100.0)
+
+    radius = 6
+    offsets = numpy.arange(-radius, radius + 1)
+    blob = numpy.exp(-(offsets[:, numpy.newaxis] ** 2 + offsets[numpy.newaxis, :] ** 2) / (2 * 2.5**2))
+    for coordinate_y, coordinate_x in coordinates_yx:
+        if not (radius <= coordinate_y < frame_shape[0] - radius and radius <= coordinate_x < frame_shape[1] - radius):
+            continue
+
+        brightness = random_generator.uniform(low=200.0, high=2000.0)
+        template[
+            coordinate_y - radius : coordinate_y + radius + 1, coordinate_x - radius : coordinate_x + radius + 1
+        ] += (brightness * blob)
+
+    return template
+
+
+def _write_frames(
+    *,
+    file_path: pathlib.Path,
+    template: numpy.ndarray,
+    number_of_frames: int,
+    random_generator: numpy.random.Generator,
+    trailing_bytes: int = 0,
+) -> None:
+    """Write frames of the template with independent camera noise, as consecutive uint16 values."""
+    template = template.astype("uint16")
+    with open(file=file_path, mode="wb") as io:
+        for block_start in range(0, number_of_frames, _FRAMES_PER_BLOCK):
+            block_length = min(_FRAMES_PER_BLOCK, number_of_frames - block_start)
+            noise = random_generator.integers(low=0, high=32, size=(block_length, *template.shape), dtype="uint16")
+            block = template[numpy.newaxis, :, :] + noise
+            io.write(block.tobytes())
+
+        io.write(bytes(trailing_bytes))
+
+
+def _write_lines(*, file_path: pathlib.Path, lines: list[str]) -> None:
+    with open(file=file_path, mode="w") as io:
+        io.write("\n".join(lines) + "\n")
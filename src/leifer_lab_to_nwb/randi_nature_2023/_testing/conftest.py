@@ -0,0 +1,38 @@
+import pathlib
+
+import pytest
+
+from leifer_lab_to_nwb.randi_nature_2023._testing._synthetic_session import (
+    SYNTHETIC_MULTICOLOR_FOLDER_NAME,
+    SYNTHETIC_PUMP_PROBE_FOLDER_NAME,
+    SYNTHETIC_SESSION_DATE,
+    generate_synthetic_session,
+)
+
+# Scripts run by hand against the real data, rather than tests
+collect_ignore = ["test_all_interfaces.py", "generate_session_to_box_shape.py"]
+
+
+@pytest.fixture(scope="session")
+def synthetic_base_folder_path(tmp_path_factory: pytest.TempPathFactory) -> pathlib.Path:
+    """A small synthetic session, written once for all tests; the tests must not modify it."""
+    base_folder_path = tmp_path_factory.mktemp("synthetic_session")
+    generate_synthetic_session(
+        base_folder_path=base_folder_path,
+        number_of_volumes=12,
+        frames_per_volume=8,
+        number_of_rois=20,
+        number_of_stimuli=3,
+    )
+
+    return base_folder_path
+
+
+@pytest.fixture(scope="session")
+def pump_probe_folder_path(synthetic_base_folder_path: pathlib.Path) -> pathlib.Path:
+    return synthetic_base_folder_path / SYNTHETIC_SESSION_DATE / SYNTHETIC_PUMP_PROBE_FOLDER_NAME
+
+
+@pytest.fixture(scope="session")
+def multicolor_folder_path(synthetic_base_folder_path: pathlib.Path) -> pathlib.Path:
+    return synthetic_base_folder_path / SYNTHETIC_SESSION_DATE / SYNTHETIC_MULTICOLOR_FOLDER_NAME
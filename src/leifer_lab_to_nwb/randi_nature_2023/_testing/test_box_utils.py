@@ -0,0 +1,29 @@
+import numpy
+import pytest
+
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._box_utils import _calculate_box_offsets, _calculate_voxel_masks
+
+
+def test_voxel_masks_are_boxes_around_the_centroids():
+    centroids_zyx = numpy.array([[5, 100, 200], [0, 0, 511]])
+    box_shape = (1, 3, 5)
+
+    voxel_masks, voxel_mask_index = _calculate_voxel_masks(centroids_zyx=centroids_zyx, box_shape=box_shape)
+
+    numpy.testing.assert_array_equal(voxel_mask_index, [15, 30])
+    first_roi_voxels = voxel_masks[:15]
+    assert set(first_roi_voxels["z"]) == {5}
+    assert set(first_roi_voxels["y"]) == {99, 100, 101}
+    assert set(first_roi_voxels["x"]) == {198, 199, 200, 201, 202}
+    assert numpy.all(voxel_masks["weight"] == 1.0)
+
+    # The boxes are clipped to the frames
+    second_roi_voxels = voxel_masks[15:]
+    assert second_roi_voxels["y"].min() == 0
+    assert second_roi_voxels["x"].max() == 511
+
+
+@pytest.mark.parametrize("box_shape", [(1, 2, 3), (3, 3), (0, 1, 1)])
+def test_box_offsets_reject_invalid_shapes(box_shape: tuple):
+    with pytest.raises(ValueError, match="three odd and positive lengths"):
+        _calculate_box_offsets(box_shape=box_shape)
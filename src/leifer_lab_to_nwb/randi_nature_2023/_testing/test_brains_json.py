@@ -0,0 +1,61 @@
+import json
+import pathlib
+
+import numpy
+
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._brains_json import read_pump_probe_brains_summary
+
+
+def test_pump_probe_brains_summary_matches_full_parse(pump_probe_folder_path: pathlib.Path):
+    brains_file_path = pump_probe_folder_path / "brains.json"
+    with open(file=brains_file_path, mode="r") as io:
+        brains = json.load(fp=io)
+
+    brains_summary = read_pump_probe_brains_summary(file_path=brains_file_path)
+
+    labeled_volume_indices = [index for index, labels in enumerate(brains["labels"]) if len(labels) != 0]
+    assert len(labeled_volume_indices) == 1
+    labeled_volume_index = labeled_volume_indices[0]
+    first_roi = sum(brains["nInVolume"][:labeled_volume_index])
+    number_of_rois = brains["nInVolume"][labeled_volume_index]
+
+    numpy.testing.assert_array_equal(brains_summary["nInVolume"], brains["nInVolume"])
+    numpy.testing.assert_array_equal(
+        brains_summary["frames_per_volume"], [len(depths) for depths in brains["zOfFrame"]]
+    )
+    numpy.testing.assert_array_equal(brains_summary["labeled_volume_indices"], labeled_volume_indices)
+    numpy.testing.assert_array_equal(brains_summary["labels"], brains["labels"][labeled_volume_index])
+    numpy.testing.assert_array_equal(
+        brains_summary["coordZYX"], brains["coordZYX"][first_roi : first_roi + number_of_rois]
+    )
+
+
+def test_pump_probe_brains_summary_skips_keys_within_strings(tmp_path: pathlib.Path):
+    brains = dict(
+        nInVolume=[1, 2],
+        zOfFrame=[[0.0, 1.0, 2.0], [2.0, 1.0]],
+        labels=[["coordZYX"], []],
+        coordZYX=[[1, 2, 3], [4, 5, 6], [7, 8, 9]],
+    )
+    brains_file_path = tmp_path / "brains.json"
+    with open(file=brains_file_path, mode="w") as io:
+        json.dump(obj=brains, fp=io, indent=1)
+
+    brains_summary = read_pump_probe_brains_summary(file_path=brains_file_path)
+
+    numpy.testing.assert_array_equal(brains_summary["frames_per_volume"], [3, 2])
+    numpy.testing.assert_array_equal(brains_summary["labels"], ["coordZYX"])
+    numpy.testing.assert_array_equal(brains_summary["coordZYX"], [[1, 2, 3]])
+
+
+def test_pump_probe_brains_summary_without_single_labeled_volume(tmp_path: pathlib.Path):
+    brains = dict(nInVolume=[1, 1], zOfFrame=[[0.0], [0.0]], labels=[["AVAL"], ["AVAR"]], coordZYX=[[0, 0, 0]] * 2)
+    brains_file_path = tmp_path / "brains.json"
+    with open(file=brains_file_path, mode="w") as io:
+        json.dump(obj=brains, fp=io)
+
+    brains_summary = read_pump_probe_brains_summary(file_path=brains_file_path)
+
+    numpy.testing.assert_array_equal(brains_summary["labeled_volume_indices"], [0, 1])
+    assert brains_summary["labels"].shape == (0,)
+    assert brains_summary["coordZYX"].shape == (0, 3)
@@ -0,0 +1,150 @@
+import json
+import pathlib
+
+import h5py
+import numpy
+
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._checkpoints import (
+    ConversionCheckpoint,
+    get_checkpoint_file_path,
+)
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._direct_chunk_writing import DirectChunkDatasetWriter
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._pump_probe_frame_reader import (
+    PumpProbeChannelDataChunkIterator,
+    PumpProbeFrameReader,
+)
+
+DATASET_PATH = "/acquisition/PumpProbeImagingGreen/data"
+CHANNEL_FRAME_SLICING = (slice(0, 512), slice(0, 512))
+CHUNK_LENGTH = 5
+BUFFER_LENGTH = 10
+
+
+def _make_writer(*, pump_probe_folder_path: pathlib.Path, number_of_frames: int) -> DirectChunkDatasetWriter:
+    frame_reader = PumpProbeFrameReader(
+        dat_file_path=pump_probe_folder_path / "sCMOS_Frames_U16_1024x512.dat",
+        number_of_frames=number_of_frames,
+        frame_shape=(1024, 512),
+        dtype="uint16",
+    )
+    frame_reader.register_channel(channel_name="Green")
+    data_iterator = PumpProbeChannelDataChunkIterator(
+        frame_reader=frame_reader,
+        channel_name="Green",
+        channel_frame_slicing=CHANNEL_FRAME_SLICING,
+        number_of_frames=number_of_frames,
+        chunk_shape=(CHUNK_LENGTH, 512, 512),
+        buffer_shape=(BUFFER_LENGTH, 512, 512),
+        display_progress=False,
+    )
+
+    return DirectChunkDatasetWriter(dataset_path=DATASET_PATH, data_iterator=data_iterator, number_of_workers=2)
+
+
+def _read_source_frames(*, pump_probe_folder_path: pathlib.Path, number_of_frames: int) -> numpy.ndarray:
+    frames = numpy.memmap(
+        filename=pump_probe_folder_path / "sCMOS_Frames_U16_1024x512.dat",
+        dtype="uint16",
+        mode="r",
+        shape=(number_of_frames, 1024, 512),
+    )
+    return numpy.array(frames[:, CHANNEL_FRAME_SLICING[0], CHANNEL_FRAME_SLICING[1]])
+
+
+def test_interrupted_writing_resumes_from_checkpoint(pump_probe_folder_path: pathlib.Path, tmp_path: pathlib.Path):
+    number_of_frames = 4 * BUFFER_LENGTH + 3
+    nwbfile_path = tmp_path / "session.nwb"
+    fingerprint = dict(session="synthetic", compression="gzip")
+
+    checkpoint = ConversionCheckpoint(nwbfile_path=nwbfile_path, fingerprint=fingerprint)
+    checkpoint.start()
+    with h5py.File(name=nwbfile_path, mode="w") as file:
+        file.create_dataset(
+            name=DATASET_PATH,
+            shape=(number_of_frames, 512, 512),
+            dtype="uint16",
+            chunks=(CHUNK_LENGTH, 512, 512),
+            compression="gzip",
+        )
+    checkpoint.mark_structure_written()
+
+    # Interrupted after two buffers
+    writer = _make_writer(pump_probe_folder_path=pump_probe_folder_path, number_of_frames=number_of_frames)
+    with h5py.File(name=nwbfile_path, mode="r+") as file:
+        turns = writer.iter_write(file=file, checkpoint=checkpoint)
+        next(turns)
+        next(turns)
+        turns.close()
+
+    record = json.loads(get_checkpoint_file_path(nwbfile_path=nwbfile_path).read_text())
+    assert record["structure_written"] is True
+    assert record["committed_lengths"] == {DATASET_PATH: 2 * BUFFER_LENGTH}
+
+    resumed_checkpoint = ConversionCheckpoint(nwbfile_path=nwbfile_path, fingerprint=fingerprint)
+    assert resumed_checkpoint.load() is True
+    committed_length = resumed_checkpoint.get_committed_length(dataset_path=DATASET_PATH)
+    assert committed_length == 2 * BUFFER_LENGTH
+
+    resumed_writer = _make_writer(pump_probe_folder_path=pump_probe_folder_path, number_of_frames=number_of_frames)
+    with h5py.File(name=nwbfile_path, mode="r+") as file:
+        assert resumed_writer.verify_committed_data(file=file, committed_length=committed_length) is None
+
+        # Only the buffers after the committed ones are written again
+        number_of_turns = sum(1 for _ in resumed_writer.iter_write(file=file, checkpoint=resumed_checkpoint))
+    assert number_of_turns == 3
+    resumed_checkpoint.remove()
+
+    expected_data = _read_source_frames(
+        pump_probe_folder_path=pump_probe_folder_path, number_of_frames=number_of_frames
+    )
+    with h5py.File(name=nwbfile_path, mode="r") as file:
+        numpy.testing.assert_array_equal(file[DATASET_PATH][:], expected_data)
+    assert not get_checkpoint_file_path(nwbfile_path=nwbfile_path).exists()
+
+
+def test_checkpoint_only_resumes_the_same_conversion(pump_probe_folder_path: pathlib.Path, tmp_path: pathlib.Path):
+    number_of_frames = 2 * BUFFER_LENGTH
+    nwbfile_path = tmp_path / "session.nwb"
+    fingerprint = dict(session="synthetic", compression="gzip")
+
+    checkpoint = ConversionCheckpoint(nwbfile_path=nwbfile_path, fingerprint=fingerprint)
+    checkpoint.start()
+    with h5py.File(name=nwbfile_path, mode="w") as file:
+        file.create_dataset(
+            name=DATASET_PATH,
+            shape=(number_of_frames, 512, 512),
+            dtype="uint16",
+            chunks=(CHUNK_LENGTH, 512, 512),
+            compression="gzip",
+        )
+
+    # The structure of the file was not fully written
+    assert ConversionCheckpoint(nwbfile_path=nwbfile_path, fingerprint=fingerprint).load() is False
+
+    checkpoint.mark_structure_written()
+    other_fingerprint = dict(session="synthetic", compression="lzf")
+    assert ConversionCheckpoint(nwbfile_path=nwbfile_path, fingerprint=other_fingerprint).load() is False
+    assert ConversionCheckpoint(nwbfile_path=nwbfile_path, fingerprint=fingerprint).load() is True
+
+
+def test_committed_data_that_differs_from_the_source_is_detected(
+    pump_probe_folder_path: pathlib.Path, tmp_path: pathlib.Path
+):
+    number_of_frames = 2 * BUFFER_LENGTH
+    nwbfile_path = tmp_path / "session.nwb"
+
+    writer = _make_writer(pump_probe_folder_path=pump_probe_folder_path, number_of_frames=number_of_frames)
+    with h5py.File(name=nwbfile_path, mode="w") as file:
+        dataset = file.create_dataset(
+            name=DATASET_PATH,
+            shape=(number_of_frames, 512, 512),
+            dtype="uint16",
+            chunks=(CHUNK_LENGTH, 512, 512),
+            compression="gzip",
+        )
+        writer.write(file=file)
+        dataset[BUFFER_LENGTH - 1] = 0
+
+        mismatch = writer.verify_committed_data(file=file, committed_length=BUFFER_LENGTH)
+    assert mismatch is not None
+    assert "differ from the source" in mismatch
@@ -0,0 +1,41 @@
+import json
+import pathlib
+
+from leifer_lab_to_nwb.randi_nature_2023._conversion_benchmark import (
+    BENCHMARKED_INTERFACE_NAMES,
+    _format_conversion_benchmark,
+    benchmark_conversion,
+)
+from leifer_lab_to_nwb.randi_nature_2023._testing._synthetic_session import SYNTHETIC_SESSION_PARAMETERS_FILE_NAME
+
+
+def test_failed_cases_are_recorded(synthetic_base_folder_path: pathlib.Path, tmp_path: pathlib.Path):
+    with open(file=synthetic_base_folder_path / SYNTHETIC_SESSION_PARAMETERS_FILE_NAME, mode="r") as io:
+        session_parameters = json.load(fp=io)
+
+    # The benchmark only reads its source, so the shared synthetic session is used rather than generating another
+    benchmark_folder_path = tmp_path / "benchmark"
+    benchmark_folder_path.mkdir()
+    (benchmark_folder_path / "source").symlink_to(synthetic_base_folder_path, target_is_directory=True)
+
+    # Every case fails from the unknown option, yet each is still run and recorded
+    benchmark_options = dict(
+        benchmark_folder_path=benchmark_folder_path,
+        number_of_volumes=session_parameters["number_of_volumes"],
+        frames_per_volume=session_parameters["frames_per_volume"],
+        raw_or_processed=("processed",),
+        session_options=dict(unknown_option=True),
+        evict_sources_from_cache=False,
+    )
+    results = benchmark_conversion(**benchmark_options)
+
+    expected_case_names = [*BENCHMARKED_INTERFACE_NAMES["processed"], "processed_conversion"]
+    assert list(results["cases"]) == expected_case_names
+    assert [failure["case_name"] for failure in results["failures"]] == expected_case_names
+    assert all("unknown_option" in case_result["error"] for case_result in results["cases"].values())
+    assert "Failure of 'processed_conversion'" in _format_conversion_benchmark(results=results)
+
+    # Failed cases are not compared against the failed cases of the earlier results
+    repeated_results = benchmark_conversion(**benchmark_options)
+    assert repeated_results["baseline_file_path"] is not None
+    assert repeated_results["regressions"] == []
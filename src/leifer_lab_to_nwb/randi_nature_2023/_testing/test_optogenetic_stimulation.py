@@ -0,0 +1,45 @@
+import pathlib
+
+import numpy
+import pynwb
+from pynwb.testing.mock.file import mock_NWBFile
+
+from leifer_lab_to_nwb.randi_nature_2023.interfaces import OptogeneticStimulationInterface
+
+
+def test_stimulus_table_is_written_and_read_back(pump_probe_folder_path: pathlib.Path, tmp_path: pathlib.Path):
+    interface = OptogeneticStimulationInterface(pump_probe_folder_path=pump_probe_folder_path)
+    number_of_stimuli = interface.optogenetic_stimulus_table.shape[0]
+
+    nwbfile = mock_NWBFile()
+    interface.add_to_nwbfile(nwbfile=nwbfile)
+
+    nwbfile_path = tmp_path / "optogenetic_stimulation.nwb"
+    with pynwb.NWBHDF5IO(path=nwbfile_path, mode="w") as io:
+        io.write(nwbfile)
+
+    with pynwb.NWBHDF5IO(path=nwbfile_path, mode="r") as io:
+        read_nwbfile = io.read()
+        stimulus_table = read_nwbfile.intervals["OptogeneticStimulusTable"]
+        stimulus_target = read_nwbfile.lab_meta_data["OptogeneticStimulusTarget"]
+        targeted_plane_segmentation = read_nwbfile.processing["ophys"]["TargetedImageSegmentation"][
+            "TargetPlaneSegmentation"
+        ]
+
+        assert len(stimulus_table) == number_of_stimuli
+
+        # Every stimulus references the single target, which covers all the targeted ROIs
+        assert all(target is stimulus_target for target in stimulus_table["targets"][:])
+        assert stimulus_target.targeted_rois.table is targeted_plane_segmentation
+        numpy.testing.assert_array_equal(stimulus_target.targeted_rois.data[:], numpy.arange(number_of_stimuli))
+
+        # While the ROI of each stimulus is its own row of the plane segmentation
+        targeted_roi = stimulus_table["targeted_roi"]
+        assert targeted_roi.table is targeted_plane_segmentation
+        numpy.testing.assert_array_equal(targeted_roi.data[:], numpy.arange(number_of_stimuli))
+
+        pixel_masks = targeted_plane_segmentation["pixel_mask"][:]
+        expected_x = interface.optogenetic_stimulus_table["optogTargetX"].to_numpy()
+        expected_y = interface.optogenetic_stimulus_table["optogTargetY"].to_numpy()
+        for pixel_mask, x, y in zip(pixel_masks, expected_x, expected_y):
+            assert (pixel_mask[0][0], pixel_mask[0][1]) == (x, y)
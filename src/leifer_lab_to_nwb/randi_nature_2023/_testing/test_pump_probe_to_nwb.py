@@ -0,0 +1,36 @@
+import json
+import pathlib
+
+import pynwb
+
+from leifer_lab_to_nwb.randi_nature_2023 import pump_probe_to_nwb
+from leifer_lab_to_nwb.randi_nature_2023._testing._synthetic_session import (
+    SYNTHETIC_SESSION_PARAMETERS_FILE_NAME,
+    SYNTHETIC_SUBJECT_ID,
+    SYNTHETIC_SUBJECT_INFO_FILE_NAME,
+)
+
+
+def test_processed_conversion(synthetic_base_folder_path: pathlib.Path, tmp_path: pathlib.Path):
+    with open(file=synthetic_base_folder_path / SYNTHETIC_SESSION_PARAMETERS_FILE_NAME, mode="r") as io:
+        session_parameters = json.load(fp=io)
+
+    nwbfile_path = pump_probe_to_nwb(
+        base_folder_path=synthetic_base_folder_path,
+        subject_info_file_path=synthetic_base_folder_path / SYNTHETIC_SUBJECT_INFO_FILE_NAME,
+        subject_id=SYNTHETIC_SUBJECT_ID,
+        nwb_output_folder_path=tmp_path,
+        raw_or_processed="processed",
+        display_progress=False,
+    )
+    assert nwbfile_path.exists()
+
+    with pynwb.NWBHDF5IO(path=nwbfile_path, mode="r") as io:
+        nwbfile = io.read()
+
+        ophys_module = nwbfile.processing["ophys"]
+        for segmentations_name in ("PumpProbeGreenSegmentations", "PumpProbeRedSegmentations", "NeuroPALSegmentations"):
+            assert segmentations_name in ophys_module.data_interfaces
+
+        stimulus_table = nwbfile.intervals["OptogeneticStimulusTable"]
+        assert len(stimulus_table) == session_parameters["number_of_stimuli"]
@@ -0,0 +1,72 @@
+import pathlib
+import pickle
+import types
+
+import numpy
+import pandas
+import pytest
+
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._source_cache import load_signal, read_table, use_source_cache
+
+
+@pytest.fixture(params=["uncached", "cached"])
+def source_cache_folder_path(request: pytest.FixtureRequest, tmp_path: pathlib.Path) -> pathlib.Path | None:
+    return tmp_path / "cache" if request.param == "cached" else None
+
+
+def test_table_matches_pandas(pump_probe_folder_path: pathlib.Path, source_cache_folder_path: pathlib.Path | None):
+    file_path = pump_probe_folder_path / "framesDetails.txt"
+
+    # Read twice, so that the second read is from the cache (if any)
+    with use_source_cache(source_cache_folder_path=source_cache_folder_path):
+        tables = [read_table(file_path=file_path) for _ in range(2)]
+
+    expected_table = pandas.read_table(filepath_or_buffer=file_path, index_col=False)
+    for table in tables:
+        pandas.testing.assert_frame_equal(table, expected_table)
+
+
+def test_table_with_missing_text_matches_pandas(tmp_path: pathlib.Path, source_cache_folder_path: pathlib.Path | None):
+    file_path = tmp_path / "table.txt"
+    file_path.write_text("frameCount\tcomment\tvalue\n1\tfirst\t0.5\n2\t\t\n3\tnan\t1.5\n")
+
+    with use_source_cache(source_cache_folder_path=source_cache_folder_path):
+        tables = [read_table(file_path=file_path) for _ in range(2)]
+
+    expected_table = pandas.read_table(filepath_or_buffer=file_path, index_col=False)
+    assert expected_table["comment"].isna().sum() == 2
+    for table in tables:
+        pandas.testing.assert_frame_equal(table, expected_table)
+
+
+def test_signal_info_is_kept_as_is(tmp_path: pathlib.Path, source_cache_folder_path: pathlib.Path | None):
+    info = dict(method="box", version="1.5", ref_index=numpy.int64(3), box_shape=(1, 3, 3))
+    signal = types.SimpleNamespace(data=numpy.ones(shape=(4, 2)), info=info, nan_interpolated=False, nan_mask=None)
+    file_path = tmp_path / "green.pickle"
+    with open(file=file_path, mode="wb") as io:
+        pickle.dump(obj=signal, file=io)
+
+    with use_source_cache(source_cache_folder_path=source_cache_folder_path):
+        loaded_signals = [load_signal(file_path=file_path) for _ in range(2)]
+
+    for loaded_signal in loaded_signals:
+        assert loaded_signal.info == info
+        assert type(loaded_signal.info["ref_index"]) is numpy.int64
+        assert type(loaded_signal.info["box_shape"]) is tuple
+        numpy.testing.assert_array_equal(loaded_signal.data, signal.data)
+        assert loaded_signal.nan_mask is None
+
+
+def test_signal_matches_pickle(pump_probe_folder_path: pathlib.Path, source_cache_folder_path: pathlib.Path | None):
+    file_path = pump_probe_folder_path / "green.pickle"
+    with open(file=file_path, mode="rb") as io:
+        signal = pickle.load(file=io)
+
+    with use_source_cache(source_cache_folder_path=source_cache_folder_path):
+        loaded_signals = [load_signal(file_path=file_path) for _ in range(2)]
+
+    for loaded_signal in loaded_signals:
+        assert loaded_signal.info == signal.info
+        assert loaded_signal.nan_interpolated == signal.nan_interpolated
+        numpy.testing.assert_array_equal(loaded_signal.data, signal.data)
+        numpy.testing.assert_array_equal(loaded_signal.nan_mask, signal.nan_mask)
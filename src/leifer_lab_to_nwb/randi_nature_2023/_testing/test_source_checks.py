@@ -0,0 +1,92 @@
+import pathlib
+
+import numpy
+import pytest
+
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._brains_json import read_pump_probe_brains_summary
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._source_cache import load_json, load_signal, read_table
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._source_checks import (
+    check_box_shape,
+    check_neuropal_brains,
+    check_neuropal_coordinates,
+    check_optogenetic_stimulation,
+    check_pump_probe_brains_summary,
+    check_pump_probe_frames,
+    check_pump_probe_signal,
+    load_box_shape_mapping,
+    raise_for_issues,
+)
+
+
+def test_synthetic_session_passes_source_checks(pump_probe_folder_path: pathlib.Path, multicolor_folder_path):
+    sync_table = read_table(file_path=pump_probe_folder_path / "other-frameSynchronous.txt")
+    timestamps_table = read_table(file_path=pump_probe_folder_path / "framesDetails.txt")
+    brains_summary = read_pump_probe_brains_summary(file_path=pump_probe_folder_path / "brains.json")
+    number_of_frames_in_file = (pump_probe_folder_path / "sCMOS_Frames_U16_1024x512.dat").stat().st_size // (
+        1024 * 512 * 2
+    )
+    neuropal_brains_info = load_json(file_path=multicolor_folder_path / "brains.json")
+    box_shape_mapping = load_box_shape_mapping()
+
+    issues = [
+        *check_pump_probe_frames(
+            sync_table=sync_table, timestamps_table=timestamps_table, number_of_frames_in_file=number_of_frames_in_file
+        ),
+        *check_pump_probe_brains_summary(brains_summary=brains_summary, number_of_timestamps=timestamps_table.shape[0]),
+        *check_box_shape(box_shape_mapping=box_shape_mapping, folder_name=pump_probe_folder_path.name),
+        *check_box_shape(box_shape_mapping=box_shape_mapping, folder_name=multicolor_folder_path.name),
+        *check_neuropal_brains(brains_info=neuropal_brains_info),
+        *check_neuropal_coordinates(brains_info=neuropal_brains_info),
+        *check_optogenetic_stimulation(
+            stimulus_table=read_table(file_path=pump_probe_folder_path / "pharosTriggers.txt"),
+            timestamps_table=timestamps_table,
+            target_ids_table=read_table(file_path=pump_probe_folder_path / "targets_manually_located.txt"),
+        ),
+    ]
+    for signal_file_name in ("green.pickle", "red.pickle"):
+        issues += check_pump_probe_signal(
+            signal=load_signal(file_path=pump_probe_folder_path / signal_file_name),
+            signal_file_name=signal_file_name,
+            brains_summary=brains_summary,
+        )
+
+    assert issues == []
+
+
+def test_source_checks_report_mismatches(pump_probe_folder_path: pathlib.Path):
+    sync_table = read_table(file_path=pump_probe_folder_path / "other-frameSynchronous.txt")
+    timestamps_table = read_table(file_path=pump_probe_folder_path / "framesDetails.txt")
+    brains_summary = read_pump_probe_brains_summary(file_path=pump_probe_folder_path / "brains.json")
+    signal = load_signal(file_path=pump_probe_folder_path / "green.pickle")
+    signal.data = signal.data[:, :-1]
+
+    frame_issues = check_pump_probe_frames(
+        sync_table=sync_table, timestamps_table=timestamps_table, number_of_frames_in_file=timestamps_table.shape[0] - 1
+    )
+    signal_issues = check_pump_probe_signal(
+        signal=signal, signal_file_name="green.pickle", brains_summary=brains_summary
+    )
+
+    assert [severity for severity, _ in frame_issues] == ["error"]
+    assert [severity for severity, _ in signal_issues] == ["error"]
+    with pytest.raises(ValueError, match="Mismatch in the number of ROIs"):
+        raise_for_issues(issues=frame_issues + signal_issues)
+
+
+def test_brains_summary_without_single_labeled_volume_is_rejected():
+    brains_summary = dict(
+        nInVolume=numpy.array([1, 1]),
+        frames_per_volume=numpy.array([1, 1]),
+        labeled_volume_indices=numpy.array([0, 1]),
+        labels=numpy.array(list(), dtype=str),
+        coordZYX=numpy.empty(shape=(0, 3)),
+    )
+
+    issues = check_pump_probe_brains_summary(brains_summary=brains_summary, number_of_timestamps=2)
+
+    assert [severity for severity, _ in issues] == ["error"]
+
+
+def test_raise_for_issues_only_warns_of_warnings():
+    with pytest.warns(UserWarning, match="Some warning"):
+        raise_for_issues(issues=[("warning", "Some warning")])
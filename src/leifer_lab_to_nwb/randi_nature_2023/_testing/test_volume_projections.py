@@ -0,0 +1,97 @@
+import pathlib
+
+import numpy
+import pytest
+
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._brains_json import read_pump_probe_brains_summary
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._pump_probe_frame_reader import (
+    PumpProbeChannelDataChunkIterator,
+    PumpProbeFrameReader,
+)
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._volume_projections import VolumeProjectionAccumulator
+
+
+def _get_expected_projections(*, frames: numpy.ndarray, frames_per_volume: numpy.ndarray) -> list[tuple]:
+    volume_end_frames = numpy.cumsum(frames_per_volume)
+    return [
+        (volume_index, frames[end - length : end].max(axis=0), frames[end - length : end].mean(axis=0))
+        for volume_index, (length, end) in enumerate(zip(frames_per_volume, volume_end_frames))
+        if length > 0 and end <= frames.shape[0]
+    ]
+
+
+def test_accumulator_projects_each_volume():
+    random_generator = numpy.random.default_rng(seed=0)
+    frames = random_generator.integers(low=0, high=1000, size=(12, 4, 3), dtype="uint16")
+    frames_per_volume = numpy.array([3, 0, 4, 2, 4])
+
+    accumulator = VolumeProjectionAccumulator(
+        frames_per_volume=frames_per_volume, number_of_frames=frames.shape[0], frame_shape=(4, 3), dtype="uint16"
+    )
+
+    # Ranges that split volumes, and one read again in part
+    completed_volumes = list()
+    for start, stop in ((0, 2), (2, 5), (3, 8), (8, 12)):
+        accumulator.add_frames(start=start, frames=frames[start:stop])
+        completed_volumes += accumulator.pop_completed_volumes()
+
+    # The empty volume and the last one, which ends beyond the frames, have no projection
+    expected_volumes = _get_expected_projections(frames=frames, frames_per_volume=frames_per_volume)
+    assert accumulator.number_of_volumes == 3
+    assert accumulator.is_complete
+    assert [volume_index for volume_index, _, _ in completed_volumes] == [0, 1, 2]
+    for (_, maximum, mean), (_, expected_maximum, expected_mean) in zip(completed_volumes, expected_volumes):
+        assert maximum.dtype == numpy.dtype("uint16")
+        numpy.testing.assert_array_equal(maximum, expected_maximum)
+        numpy.testing.assert_allclose(mean, expected_mean, rtol=1e-6)
+
+
+def test_accumulator_rejects_frames_out_of_order():
+    accumulator = VolumeProjectionAccumulator(
+        frames_per_volume=numpy.array([4]), number_of_frames=4, frame_shape=(1, 1), dtype="uint16"
+    )
+
+    with pytest.raises(ValueError, match="must be added in order"):
+        accumulator.add_frames(start=2, frames=numpy.zeros(shape=(2, 1, 1), dtype="uint16"))
+
+
+def test_accumulator_follows_the_raw_frames(pump_probe_folder_path: pathlib.Path):
+    dat_file_path = pump_probe_folder_path / "sCMOS_Frames_U16_1024x512.dat"
+    frames_per_volume = read_pump_probe_brains_summary(file_path=pump_probe_folder_path / "brains.json")[
+        "frames_per_volume"
+    ]
+    number_of_frames = int(frames_per_volume.sum())
+    channel_frame_slicing = (slice(0, 512), slice(0, 512))
+
+    frame_reader = PumpProbeFrameReader(
+        dat_file_path=dat_file_path, number_of_frames=number_of_frames, frame_shape=(1024, 512), dtype="uint16"
+    )
+    frame_reader.register_channel(channel_name="Green")
+    accumulator = VolumeProjectionAccumulator(
+        frames_per_volume=frames_per_volume, number_of_frames=number_of_frames, frame_shape=(512, 512), dtype="uint16"
+    )
+    data_iterator = PumpProbeChannelDataChunkIterator(
+        frame_reader=frame_reader,
+        channel_name="Green",
+        channel_frame_slicing=channel_frame_slicing,
+        number_of_frames=number_of_frames,
+        volume_projection_accumulator=accumulator,
+        chunk_shape=(5, 512, 512),
+        buffer_shape=(15, 512, 512),
+        display_progress=False,
+    )
+
+    completed_volumes = list()
+    for _ in data_iterator:
+        completed_volumes += accumulator.pop_completed_volumes()
+
+    frames = numpy.memmap(filename=dat_file_path, dtype="uint16", mode="r", shape=(number_of_frames, 1024, 512))
+    expected_volumes = _get_expected_projections(
+        frames=numpy.array(frames[:, channel_frame_slicing[0], channel_frame_slicing[1]]),
+        frames_per_volume=frames_per_volume,
+    )
+    assert accumulator.is_complete
+    assert len(completed_volumes) == len(expected_volumes) == len(frames_per_volume)
+    for (_, maximum, mean), (_, expected_maximum, expected_mean) in zip(completed_volumes, expected_volumes):
+        numpy.testing.assert_array_equal(maximum, expected_maximum)
+        numpy.testing.assert_allclose(mean, expected_mean, rtol=1e-6)
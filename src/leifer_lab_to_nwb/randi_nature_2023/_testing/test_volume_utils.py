@@ -0,0 +1,56 @@
+import pathlib
+
+import numpy
+
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._brains_json import read_pump_probe_brains_summary
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._frame_tables import get_frame_timestamps_and_depths
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._source_cache import read_table
+from leifer_lab_to_nwb.randi_nature_2023.interfaces._volume_utils import (
+    calculate_volume_aligned_chunk_length,
+    get_frames_per_volume_from_depths,
+)
+
+
+def test_frames_per_volume_from_depths_matches_brains(pump_probe_folder_path: pathlib.Path):
+    sync_table = read_table(file_path=pump_probe_folder_path / "other-frameSynchronous.txt")
+    timestamps_table = read_table(file_path=pump_probe_folder_path / "framesDetails.txt")
+    brains_summary = read_pump_probe_brains_summary(file_path=pump_probe_folder_path / "brains.json")
+
+    timestamps, depth_per_frame_in_um = get_frame_timestamps_and_depths(
+        sync_table=sync_table, timestamps_table=timestamps_table
+    )
+
+    assert timestamps.shape == depth_per_frame_in_um.shape == (timestamps_table.shape[0],)
+    numpy.testing.assert_array_equal(
+        get_frames_per_volume_from_depths(depth_per_frame=depth_per_frame_in_um), brains_summary["frames_per_volume"]
+    )
+
+
+def test_frames_per_volume_from_depths_without_scanning():
+    numpy.testing.assert_array_equal(get_frames_per_volume_from_depths(depth_per_frame=numpy.zeros(5)), [5])
+    numpy.testing.assert_array_equal(get_frames_per_volume_from_depths(depth_per_frame=numpy.zeros(1)), [1])
+
+
+def test_volume_aligned_chunk_length():
+    assert calculate_volume_aligned_chunk_length(frames_per_volume=numpy.full(10, 40), maximum_chunk_length=64) == 40
+    assert calculate_volume_aligned_chunk_length(frames_per_volume=numpy.full(10, 40), maximum_chunk_length=16) <= 16
+    assert calculate_volume_aligned_chunk_length(frames_per_volume=numpy.zeros(3), maximum_chunk_length=8) == 8
+
+
+def test_volume_aligned_chunk_length_with_varying_volumes():
+    random_generator = numpy.random.default_rng(seed=0)
+
+    for low, high in ((38, 42), (30, 50)):
+        frames_per_volume = random_generator.integers(low=low, high=high + 1, size=500)
+        volume_end_frames = numpy.cumsum(frames_per_volume)
+        volume_start_frames = volume_end_frames - frames_per_volume
+
+        chunk_length = calculate_volume_aligned_chunk_length(
+            frames_per_volume=frames_per_volume, maximum_chunk_length=64
+        )
+
+        # Chunks of about a volume, which the volumes span at most three of
+        assert low - 5 <= chunk_length <= high + 15
+        number_of_chunks_touched = (volume_end_frames - 1) // chunk_length - volume_start_frames // chunk_length + 1
+        assert number_of_chunks_touched.max() <= 3
+        assert number_of_chunks_touched.mean() < 2.5
@@ -0,0 +1,136 @@
+import json
+import os
+import pathlib
+import time
+
+import pytest
+
+from leifer_lab_to_nwb.randi_nature_2023._dataset_worker import _convert_session_while_leased
+from leifer_lab_to_nwb.randi_nature_2023._testing._synthetic_session import (
+    SYNTHETIC_SUBJECT_ID,
+    SYNTHETIC_SUBJECT_INFO_FILE_NAME,
+)
+from leifer_lab_to_nwb.randi_nature_2023._work_queue import FileSystemWorkQueue
+
+JOB_NAME = "subject_1_raw"
+
+
+def _make_lease_stale(*, queue: FileSystemWorkQueue, job_name: str) -> None:
+    lease_file_path = queue.leases_folder_path / f"{job_name}.json"
+    stale_time = queue.get_file_system_time() - 2 * queue.lease_duration_in_s
+    os.utime(lease_file_path, times=(stale_time, stale_time))
+
+
+def test_job_is_claimed_by_a_single_worker(tmp_path: pathlib.Path):
+    queue = FileSystemWorkQueue(queue_folder_path=tmp_path, worker_name="first")
+    other_queue = FileSystemWorkQueue(queue_folder_path=tmp_path, worker_name="second")
+
+    lease = queue.claim(job_name=JOB_NAME)
+    assert lease is not None
+    assert lease.was_reclaimed is False
+    with lease:
+        assert other_queue.claim(job_name=JOB_NAME) is None
+        lease.mark_done(details=dict(conversion_time_in_s=1.0))
+
+    assert not lease.lease_file_path.exists()
+    assert queue.is_done(job_name=JOB_NAME)
+    assert other_queue.claim(job_name=JOB_NAME) is None
+
+
+def test_released_job_can_be_claimed_again(tmp_path: pathlib.Path):
+    queue = FileSystemWorkQueue(queue_folder_path=tmp_path, worker_name="first")
+    other_queue = FileSystemWorkQueue(queue_folder_path=tmp_path, worker_name="second")
+
+    with queue.claim(job_name=JOB_NAME):
+        pass
+
+    lease = other_queue.claim(job_name=JOB_NAME)
+    assert lease is not None
+    assert lease.was_reclaimed is False
+
+
+def test_failed_job_is_not_retried(tmp_path: pathlib.Path):
+    queue = FileSystemWorkQueue(queue_folder_path=tmp_path, worker_name="first")
+
+    with queue.claim(job_name=JOB_NAME) as lease:
+        lease.mark_failed(error="Some error")
+
+    assert queue.is_failed(job_name=JOB_NAME)
+    assert "Some error" in (queue.failed_folder_path / f"{JOB_NAME}.txt").read_text()
+    assert queue.claim(job_name=JOB_NAME) is None
+
+
+def test_stale_lease_is_reclaimed_and_lost(tmp_path: pathlib.Path):
+    queue = FileSystemWorkQueue(queue_folder_path=tmp_path, lease_duration_in_s=60.0, worker_name="crashed")
+    other_queue = FileSystemWorkQueue(queue_folder_path=tmp_path, lease_duration_in_s=60.0, worker_name="second")
+
+    # Never kept alive, as if its worker crashed
+    stale_lease = queue.claim(job_name=JOB_NAME)
+    assert other_queue.claim(job_name=JOB_NAME) is None
+
+    _make_lease_stale(queue=queue, job_name=JOB_NAME)
+    lease = other_queue.claim(job_name=JOB_NAME)
+    assert lease is not None
+    assert lease.was_reclaimed is True
+
+    # The outcome of the worker that lost the lease is not recorded, nor is the new lease released by it
+    with pytest.warns(UserWarning, match="was lost to another worker"):
+        stale_lease.mark_done()
+    stale_lease.release()
+    assert not queue.is_done(job_name=JOB_NAME)
+    assert lease.lease_file_path.exists()
+
+    with lease:
+        lease.mark_done()
+    assert queue.is_done(job_name=JOB_NAME)
+
+
+def test_lease_kept_alive_is_not_reclaimed(tmp_path: pathlib.Path):
+    queue = FileSystemWorkQueue(queue_folder_path=tmp_path, lease_duration_in_s=0.4, worker_name="first")
+    other_queue = FileSystemWorkQueue(queue_folder_path=tmp_path, lease_duration_in_s=0.4, worker_name="second")
+
+    with queue.claim(job_name=JOB_NAME) as lease:
+        time.sleep(1.0)
+        assert other_queue.claim(job_name=JOB_NAME) is None
+        assert lease.is_lost is False
+
+
+def test_heartbeat_notices_the_loss_of_the_lease(tmp_path: pathlib.Path):
+    queue = FileSystemWorkQueue(queue_folder_path=tmp_path, lease_duration_in_s=0.4, worker_name="first")
+
+    with queue.claim(job_name=JOB_NAME) as lease:
+        # As if another worker found the lease stale (such as after a stall of the file system) and reclaimed it
+        lease.lease_file_path.write_text(json.dumps(obj=dict(worker_name="second", token="other")))
+
+        deadline = time.monotonic() + 5.0
+        while not lease.is_lost and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert lease.is_lost is True
+
+        with pytest.warns(UserWarning, match="was lost to another worker"):
+            lease.mark_failed(error="Some error")
+
+    assert lease.lease_file_path.exists()
+    assert not queue.is_failed(job_name=JOB_NAME)
+
+
+def test_conversion_stops_once_the_lease_is_lost(synthetic_base_folder_path: pathlib.Path, tmp_path: pathlib.Path):
+    queue = FileSystemWorkQueue(queue_folder_path=tmp_path / "queue", lease_duration_in_s=0.4, worker_name="first")
+    nwb_output_folder_path = tmp_path / "nwbfiles"
+    nwb_output_folder_path.mkdir()
+    job_options = dict(
+        base_folder_path=synthetic_base_folder_path,
+        subject_info_file_path=synthetic_base_folder_path / SYNTHETIC_SUBJECT_INFO_FILE_NAME,
+        subject_id=SYNTHETIC_SUBJECT_ID,
+        nwb_output_folder_path=nwb_output_folder_path,
+        raw_or_processed="raw",
+        display_progress=False,
+    )
+
+    lease = queue.claim(job_name=JOB_NAME)
+    lease.is_lost = True  # As set by its heartbeat once the lease is taken over
+
+    # The conversion process takes far longer than a check of the lease just to start
+    start_time = time.monotonic()
+    assert _convert_session_while_leased(job_options=job_options, lease=lease) is None
+    assert time.monotonic() - start_time < 60.0
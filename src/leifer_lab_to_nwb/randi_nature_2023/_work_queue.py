@@ -0,0 +1,253 @@
+"""A queue of jobs shared by any number of workers through files on a common (network) file system."""
+
+import json
+import os
+import pathlib
+import socket
+import threading
+import uuid
+import warnings
+
+
+class FileSystemWorkQueue:
+    """
+    Lets any number of processes, on any number of hosts, each claim a distinct job from the same set of jobs.
+
+    The state of each job is held in a folder that all workers can reach, with no service running anywhere:
+
+    |- < queue folder >
+    |--- leases/< job name >.json : the job is being run by the worker named in the file
+    |--- done/< job name >.json : the job has succeeded
+    |--- failed/< job name >.txt : the job has failed, with the description of the error
+    |--- clocks/< worker name > : touched to read the current time of the file system
+
+    A lease is claimed by exclusively creating its file, which is atomic on local file systems as well as on NFS (v3
+    and above) and SMB shares. While the job runs, the lease is kept alive by updating the modification time of its
+    file. A lease that has not been kept alive for `lease_duration_in_s` is considered stale (such as when its worker
+    crashed or lost power) and can be reclaimed by any other worker. All ages are measured against the clock of the
+    file system itself, so that the clocks of the hosts do not need to agree.
+
+    Failed jobs are not retried; delete their file from the 'failed' folder to have them claimed again.
+    """
+
+    def __init__(
+        self,
+        *,
+        queue_folder_path: str | pathlib.Path,
+        lease_duration_in_s: float = 600.0,
+        worker_name: str | None = None,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        queue_folder_path : path
+            The folder that holds the state of the queue; created if it does not exist.
+        lease_duration_in_s : float, default: 600.0
+            The time after which a lease that was not kept alive is considered stale.
+            Must be much longer than any stall of the workers or of the file system.
+        worker_name : str, optional
+            A name unique to this worker. Defaults to the host name and process ID.
+        """
+        self.queue_folder_path = pathlib.Path(queue_folder_path)
+        self.lease_duration_in_s = lease_duration_in_s
+        self.worker_name = worker_name or f"{socket.gethostname()}_{os.getpid()}"
+
+        self.leases_folder_path = self.queue_folder_path / "leases"
+        self.done_folder_path = self.queue_folder_path / "done"
+        self.failed_folder_path = self.queue_folder_path / "failed"
+        self.clocks_folder_path = self.queue_folder_path / "clocks"
+        for folder_path in (
+            self.leases_folder_path,
+            self.done_folder_path,
+            self.failed_folder_path,
+            self.clocks_folder_path,
+        ):
+            folder_path.mkdir(parents=True, exist_ok=True)
+
+    def is_done(self, *, job_name: str) -> bool:
+        return (self.done_folder_path / f"{job_name}.json").exists()
+
+    def is_failed(self, *, job_name: str) -> bool:
+        return (self.failed_folder_path / f"{job_name}.txt").exists()
+
+    def is_finished(self, *, job_name: str) -> bool:
+        return self.is_done(job_name=job_name) or self.is_failed(job_name=job_name)
+
+    def claim(self, *, job_name: str) -> "WorkQueueLease | None":
+        """
+        Try to claim an unfinished job, reclaiming its lease if it is stale.
+
+        Returns
+        -------
+        WorkQueueLease or None
+            The lease of the job, to be used as a context manager that keeps it alive; None if the job is finished
+            or is being run by another worker.
+        """
+        if self.is_finished(job_name=job_name):
+            return None
+
+        lease_file_path = self.leases_folder_path / f"{job_name}.json"
+        lease = self._try_to_create_lease(job_name=job_name, lease_file_path=lease_file_path, was_reclaimed=False)
+        if lease is not None or not self._remove_stale_lease(lease_file_path=lease_file_path):
+            return lease
+
+        return self._try_to_create_lease(job_name=job_name, lease_file_path=lease_file_path, was_reclaimed=True)
+
+    def get_file_system_time(self) -> float:
+        """Get the current time according to the file system holding the queue, as a POSIX timestamp."""
+        clock_file_path = self.clocks_folder_path / self.worker_name
+        clock_file_path.touch()
+        return clock_file_path.stat().st_mtime
+
+    def _try_to_create_lease(
+        self, *, job_name: str, lease_file_path: pathlib.Path, was_reclaimed: bool
+    ) -> "WorkQueueLease | None":
+        token = uuid.uuid4().hex
+        try:
+            file_descriptor = os.open(lease_file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+
+        with os.fdopen(file_descriptor, mode="w") as io:
+            json.dump(obj=dict(worker_name=self.worker_name, token=token), fp=io)
+
+        # Another worker may have finished the job between the check and the creation of the lease
+        if self.is_finished(job_name=job_name):
+            lease_file_path.unlink(missing_ok=True)
+            return None
+
+        return WorkQueueLease(
+            queue=self, job_name=job_name, lease_file_path=lease_file_path, token=token, was_reclaimed=was_reclaimed
+        )
+
+    def _remove_stale_lease(self, *, lease_file_path: pathlib.Path) -> bool:
+        """Remove the lease if it is stale, returning whether the job may now be claimed."""
+        try:
+            stale_token = _read_lease_token(lease_file_path=lease_file_path)
+            lease_age = self.get_file_system_time() - lease_file_path.stat().st_mtime
+        except FileNotFoundError:
+            return True  # Released in the meantime
+
+        if lease_age < self.lease_duration_in_s:
+            return False
+
+        # Renaming is atomic, so only one of the workers that found the same stale lease can move it out of the way
+        moved_file_path = lease_file_path.with_name(f"{lease_file_path.name}.{self.worker_name}.stale")
+        try:
+            os.rename(lease_file_path, moved_file_path)
+        except FileNotFoundError:
+            return False
+
+        # In the rare case that the lease was renewed by another worker since it was found stale, put it back
+        moved_token = _read_lease_token(lease_file_path=moved_file_path)
+        if moved_token != stale_token:
+            try:
+                os.link(moved_file_path, lease_file_path)
+            except FileExistsError:
+                pass
+            moved_file_path.unlink(missing_ok=True)
+            return False
+
+        moved_file_path.unlink(missing_ok=True)
+        return True
+
+
+class WorkQueueLease:
+    """The claim of a worker on a job of a `FileSystemWorkQueue`, kept alive while used as a context manager."""
+
+    def __init__(
+        self,
+        *,
+        queue: FileSystemWorkQueue,
+        job_name: str,
+        lease_file_path: pathlib.Path,
+        token: str,
+        was_reclaimed: bool,
+    ) -> None:
+        self.queue = queue
+        self.job_name = job_name
+        self.lease_file_path = lease_file_path
+        self.token = token
+
+        # Whether the job had been claimed by a worker that stopped before finishing it, possibly leaving partial output
+        self.was_reclaimed = was_reclaimed
+
+        self.is_lost = False
+        self._stop_heartbeat = threading.Event()
+        self._heartbeat_thread = threading.Thread(target=self._keep_alive, daemon=True)
+
+    def __enter__(self) -> "WorkQueueLease":
+        self._heartbeat_thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._stop_heartbeat.set()
+        self._heartbeat_thread.join()
+        self.release()
+
+    def mark_done(self, *, details: dict | None = None) -> None:
+        if self._warn_if_lost():
+            return
+
+        done_file_path = self.queue.done_folder_path / f"{self.job_name}.json"
+        _write_atomically(
+            file_path=done_file_path,
+            text=json.dumps(obj=dict(worker_name=self.queue.worker_name, **(details or dict())), indent=2),
+        )
+
+    def mark_failed(self, *, error: str) -> None:
+        if self._warn_if_lost():
+            return
+
+        failed_file_path = self.queue.failed_folder_path / f"{self.job_name}.txt"
+        _write_atomically(file_path=failed_file_path, text=f"Worker: {self.queue.worker_name}\n\n{error}")
+
+    def release(self) -> None:
+        """Remove the lease, unless it was lost to another worker."""
+        if self._is_still_held():
+            self.lease_file_path.unlink(missing_ok=True)
+
+    def _keep_alive(self) -> None:
+        while not self._stop_heartbeat.wait(timeout=self.queue.lease_duration_in_s / 4):
+            if not self._is_still_held():
+                self.is_lost = True
+                return
+
+            # The lease may be reclaimed by another worker right after it was found to be held
+            try:
+                os.utime(self.lease_file_path)
+            except FileNotFoundError:
+                self.is_lost = True
+                return
+
+    def _is_still_held(self) -> bool:
+        try:
+            return _read_lease_token(lease_file_path=self.lease_file_path) == self.token
+        except FileNotFoundError:
+            return False
+
+    def _warn_if_lost(self) -> bool:
+        if self.is_lost or not self._is_still_held():
+            message = (
+                f"The lease of the job '{self.job_name}' was lost to another worker (it was not kept alive for "
+                f"{self.queue.lease_duration_in_s} seconds), so its outcome is not recorded by this worker!"
+            )
+            warnings.warn(message=message, stacklevel=3)
+            return True
+
+        return False
+
+
+def _read_lease_token(*, lease_file_path: pathlib.Path) -> str | None:
+    try:
+        with open(file=lease_file_path, mode="r") as io:
+            return json.load(fp=io)["token"]
+    except (json.JSONDecodeError, KeyError):
+        return None  # Such as a lease still being written by its worker
+
+
+def _write_atomically(*, file_path: pathlib.Path, text: str) -> None:
+    temporary_file_path = file_path.with_name(f"{file_path.name}.{uuid.uuid4().hex}.tmp")
+    with open(file=temporary_file_path, mode="w") as io:
+        io.write(text)
+    os.replace(src=temporary_file_path, dst=file_path)
@@ -1,12 +1,8 @@
 """Main conversion script for the entire dataset for the Randi et al. Nature 2023 paper."""
 
 import pathlib
-import traceback
 
-import tqdm
-import yaml
-
-from leifer_lab_to_nwb.randi_nature_2023 import pump_probe_to_nwb
+from leifer_lab_to_nwb.randi_nature_2023 import pump_probe_dataset_to_nwb
 
 # TESTING=True creates 'preview' files that truncate all major data blocks; useful for ensuring process runs smoothly
 # TESTING = True
@@ -22,9 +18,12 @@ SUBJECT_INFO_FILE_PATH = pathlib.Path("D:/Leifer/all_subjects_metadata.yaml")
 OUTPUT_FOLDER_PATH = pathlib.Path("E:/Leifer")
 NWB_OUTPUT_FOLDER_PATH = OUTPUT_FOLDER_PATH / "nwbfiles"
 ERROR_FOLDER = NWB_OUTPUT_FOLDER_PATH / "errors"
-COMPLETED_RAW_FILE_PATH = NWB_OUTPUT_FOLDER_PATH / "completed_raw_sessions.txt"
 LIMIT_RAW = 0
 
+# Processed sessions are limited by the CPU, raw sessions by the drives and memory
+NUMBER_OF_PROCESSED_WORKERS = None  # All CPUs
+NUMBER_OF_RAW_WORKERS = 2
+
 SKIP_PROCESSED_SUBJECT_IDS = [
     20,  # Data mismatches: https://github.com/catalystneuro/leifer_lab_to_nwb/issues/39
     23,
@@ -33,103 +32,19 @@ SKIP_PROCESSED_SUBJECT_IDS = [
 
 if __name__ == "__main__":
     NWB_OUTPUT_FOLDER_PATH.mkdir(exist_ok=True)
-    ERROR_FOLDER.mkdir(exist_ok=True)
-
-    with open(file=SUBJECT_INFO_FILE_PATH, mode="r") as stream:
-        all_subject_info = yaml.safe_load(stream=stream)
-
-    completed_raw_sessions = []
-    if COMPLETED_RAW_FILE_PATH.exists() and TESTING is False:
-        with open(file=COMPLETED_RAW_FILE_PATH, mode="r") as io:
-            completed_raw_sessions = [x.strip() for x in io.readlines()]
-
-    # Check YAML for integrity
-    for subject_key, subject_info in all_subject_info.items():
-        if subject_key != subject_info["subject_id"]:
-            message = (
-                "\n\nMismatch detected between lookup key and subject ID!\n\n"
-                f"Lookup key: {subject_key}\nSubject ID: {subject_info['subject_id']}\n\n"
-                "Please fix this entry of the subject metadata YAML file."
-            )
-            raise ValueError(message)
-
-    # Convert all processed sessions
-    raw_or_processed = "processed"
-    for subject_key, subject_info in tqdm.tqdm(
-        iterable=all_subject_info.items(),
-        total=len(all_subject_info),
-        desc="Converting processed sessions",
-        unit="session",
-        position=0,
-        leave=True,
-        mininterval=5.0,
-        smoothing=0,
-    ):
-        if subject_key in SKIP_PROCESSED_SUBJECT_IDS:
-            continue
-
-        try:
-            pump_probe_to_nwb(
-                base_folder_path=BASE_FOLDER_PATH,
-                subject_info_file_path=SUBJECT_INFO_FILE_PATH,
-                subject_id=subject_key,
-                nwb_output_folder_path=NWB_OUTPUT_FOLDER_PATH,
-                raw_or_processed="processed",
-                testing=TESTING,
-            )
-        except Exception as exception:
-            error_file_path = ERROR_FOLDER / f"{subject_key}_{raw_or_processed}_testing={TESTING}_error.txt"
-            message = (
-                f"Error encountered during conversion of processed subject ID '{subject_key}'!\n\n"
-                f"{type(exception)}: {str(exception)}\n\n"
-                f"{traceback.format_exc()}"
-            )
-            with open(file=error_file_path, mode="w") as io:
-                io.write(message)
-
-    print("\n\nProcessed sessions were converted!\n\n")
-
-    # Convert all raw sessions
-    raw_or_processed = "raw"
-    raw_counter = 0
-    for subject_key, subject_info in tqdm.tqdm(
-        iterable=all_subject_info.items(),
-        total=len(all_subject_info),
-        desc="Converting raw sessions",
-        unit="session",
-        position=0,
-        leave=True,
-        mininterval=5.0,
-        smoothing=0,
-    ):
-        try:
-            if raw_counter >= LIMIT_RAW:
-                break
-            if str(subject_key) in completed_raw_sessions:
-                continue
-
-            pump_probe_to_nwb(
-                base_folder_path=BASE_FOLDER_PATH,
-                subject_info_file_path=SUBJECT_INFO_FILE_PATH,
-                subject_id=subject_key,
-                nwb_output_folder_path=NWB_OUTPUT_FOLDER_PATH,
-                raw_or_processed="raw",
-                testing=TESTING,
-            )
-
-            if TESTING is False:
-                raw_counter += 1
-
-                with open(file=COMPLETED_RAW_FILE_PATH, mode="a") as io:
-                    io.write(f"{subject_key}\n")
-        except Exception as exception:
-            error_file_path = ERROR_FOLDER / f"{subject_key}_{raw_or_processed}_testing={TESTING}_error.txt"
-            message = (
-                f"Error encountered during conversion of raw session '{subject_key}'!\n\n"
-                f"{type(exception)}: {str(exception)}\n\n"
-                f"{traceback.format_exc()}"
-            )
-            with open(file=error_file_path, mode="w") as io:
-                io.write(message)
 
-    print(f"\n\n{raw_counter} more raw sessions were converted!\n\n")
+    results = pump_probe_dataset_to_nwb(
+        base_folder_path=BASE_FOLDER_PATH,
+        subject_info_file_path=SUBJECT_INFO_FILE_PATH,
+        nwb_output_folder_path=NWB_OUTPUT_FOLDER_PATH,
+        testing=TESTING,
+        skip_processed_subject_ids=SKIP_PROCESSED_SUBJECT_IDS,
+        maximum_number_of_raw_sessions=LIMIT_RAW,
+        number_of_processed_workers=NUMBER_OF_PROCESSED_WORKERS,
+        number_of_raw_workers=NUMBER_OF_RAW_WORKERS,
+    )
+
+    print(
+        f"\n\n{len(results['succeeded'])} conversions succeeded, {len(results['failed'])} failed, and "
+        f"{len(results['rejected'])} were rejected by the preflight checks (see '{ERROR_FOLDER}')!\n\n"
+    )
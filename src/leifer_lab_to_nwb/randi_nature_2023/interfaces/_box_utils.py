@@ -2,55 +2,73 @@
 Adapted from https://github.com/leiferlab/wormdatamodel/blob/2ab956199e3931de41a190d2b9985e961df3810c/wormdatamodel/signal/extraction.py#L12
 """
 
-import pathlib
-import json
-import math
 from typing import Literal
 
 import numpy
 
+VOXEL_MASK_DTYPE = numpy.dtype([("x", "uint32"), ("y", "uint32"), ("z", "uint32"), ("weight", "float32")])
 
-def _calculate_voxel_mask(
-    centroid_zyx: tuple[int, int, int],
-    box_shape: tuple[int, int, int],
-    method: Literal["box"] = "box",
-) -> tuple[tuple[int, int, int, float], ...]:
-    """Generate indices used for slicing of an image array to extract the pixels in the specified box."""
-    if method not in ("box"):
-        message = f"`method` must be either 'box'. Received '{method}'."
+
+def _calculate_box_offsets(box_shape: tuple[int, int, int]) -> numpy.ndarray:
+    """
+    Generate the (z, y, x) offsets of every voxel in a box from its center.
+
+    The voxels are ordered with Z varying slowest and X fastest.
+    """
+    if len(box_shape) != 3 or any(length < 1 or length % 2 == 0 for length in box_shape):
+        message = f"The box shape must be three odd and positive lengths (z, y, x). Received {box_shape}."
         raise ValueError(message)
 
-    # Only applying to a single Z-frame but assuming ~28 for lower bound on Z-frames
-    frame_shape = (max(28, centroid_zyx[0]), 512, 512)
+    offsets_per_axis = [numpy.arange(length) - length // 2 for length in box_shape]
+    offsets_z, offsets_y, offsets_x = numpy.meshgrid(*offsets_per_axis, indexing="ij")
+    return numpy.stack((offsets_z.ravel(), offsets_y.ravel(), offsets_x.ravel()), axis=1)
 
-    box_size_to_array_file_path = pathlib.Path(__file__).parent / "box_size_to_array.json"
-    with open(file=box_size_to_array_file_path, mode="r") as io:
-        box_size_to_array = json.load(fp=io)
 
-    full_box = None
-    match {"method": method, "box_shape": box_shape}:
-        case {"method": "box", "box_shape": (1, 3, 3)}:
-            full_box = numpy.array(box_size_to_array["(1,3,3)"])
-        case {"method": "box", "box_shape": (3, 5, 5)}:
-            full_box = numpy.array(box_size_to_array["(3,5,5)"])
-        case {"method": "box", "box_shape": (5, 5, 5)}:
-            full_box = numpy.array(box_size_to_array["(5,5,5)"])
+def _calculate_voxel_masks(
+    centroids_zyx: numpy.ndarray,
+    box_shape: tuple[int, int, int],
+    method: Literal["box"] = "box",
+) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Generate the voxel masks of all ROIs at once as a box around each of their centroids.
+
+    Parameters
+    ----------
+    centroids_zyx : numpy.ndarray
+        The (z, y, x) centroid of each ROI, of shape (number of ROIs, 3).
+    box_shape : tuple of three odd integers
+        The (z, y, x) lengths of the box.
+    method : "box", default: "box"
+        The type of mask.
+
+    Returns
+    -------
+    voxel_masks : numpy.ndarray
+        The (x, y, z, weight) voxels of all ROIs, one after the other, as a structured array of `VOXEL_MASK_DTYPE`.
+    voxel_mask_index : numpy.ndarray
+        The end of the voxels of each ROI in `voxel_masks`, as expected by the index of a ragged column.
+    """
+    if method not in ("box",):
+        message = f"`method` must be either 'box'. Received '{method}'."
+        raise ValueError(message)
 
-    total_number_of_elements = math.prod(box_shape)
+    centroids_zyx = numpy.asarray(centroids_zyx).reshape(-1, 3)
+    box_offsets = _calculate_box_offsets(box_shape=box_shape)
 
-    center_repeated = numpy.repeat(centroid_zyx, repeats=total_number_of_elements).reshape(
-        (3, total_number_of_elements)
-    )
+    # Of shape (number of ROIs, number of voxels per box, 3)
+    indices = centroids_zyx[:, numpy.newaxis, :] + box_offsets[numpy.newaxis, :, :]
 
-    center_adjusted_by_box = center_repeated.copy()
-    for _ in range(3):
-        center_adjusted_by_box += full_box[:, :]
+    # Only applying to a single Z-frame but assuming ~28 for lower bound on Z-frames (and enough to hold the centroid)
+    upper_bounds_zyx = numpy.empty(shape=(centroids_zyx.shape[0], 1, 3), dtype=indices.dtype)
+    upper_bounds_zyx[:, 0, 0] = numpy.maximum(28, centroids_zyx[:, 0] + 1) - 1
+    upper_bounds_zyx[:, 0, 1:] = 512 - 1
+    numpy.clip(indices, 0, upper_bounds_zyx, out=indices)
 
-    indices = center_adjusted_by_box.copy()
-    for coordinate_index in range(3):
-        numpy.clip(indices[coordinate_index], 0, frame_shape[coordinate_index] - 1, indices[coordinate_index])
+    voxel_masks = numpy.empty(shape=indices.shape[0] * indices.shape[1], dtype=VOXEL_MASK_DTYPE)
+    voxel_masks["x"] = indices[:, :, 2].ravel()
+    voxel_masks["y"] = indices[:, :, 1].ravel()
+    voxel_masks["z"] = indices[:, :, 0].ravel()
+    voxel_masks["weight"] = 1.0
 
-    voxel_mask = tuple(
-        (indices[2, index], indices[1, index], indices[0, index], 1.0) for index in range(total_number_of_elements)
-    )
-    return voxel_mask
+    voxel_mask_index = numpy.arange(1, centroids_zyx.shape[0] + 1, dtype="int64") * box_offsets.shape[0]
+    return voxel_masks, voxel_mask_index
@@ -0,0 +1,169 @@
+"""Partial reading of the (potentially very large) 'brains.json' file of a pumpprobe session."""
+
+import json
+import mmap
+import pathlib
+import re
+
+import numpy
+import pydantic
+
+# The scan over the numeric fields works on blocks of this many bytes at a time to bound its memory
+_SCAN_BLOCK_SIZE = 2**22
+
+_KEY_SEPARATOR_PATTERN = re.compile(rb"\s*:\s*")
+_JSON_DECODER = json.JSONDecoder()
+
+
+def read_pump_probe_brains_summary(file_path: pydantic.FilePath) -> dict[str, numpy.ndarray]:
+    """
+    Read only the parts of a pumpprobe 'brains.json' file that are needed for the conversion.
+
+    The 'coordZYX' field holds the coordinates of every ROI in every volume of the recording, but only those of the
+    single labeled volume are used. Likewise, only the number of frames in each volume is needed from 'zOfFrame'.
+    Neither field is ever parsed as a whole; the other fields used are small.
+
+    Returns
+    -------
+    dict
+        nInVolume : The number of ROIs in each volume.
+        frames_per_volume : The number of frames in each volume (the lengths of 'zOfFrame').
+        labeled_volume_indices : The indices of the volumes that have labels.
+        labels : The labels of each ROI in the labeled volume; only read if there is exactly one such volume.
+        coordZYX : The (z, y, x) coordinates of each ROI in the labeled volume; only read if there is exactly one.
+    """
+    file_path = pathlib.Path(file_path)
+
+    with open(file=file_path, mode="rb") as io, mmap.mmap(io.fileno(), length=0, access=mmap.ACCESS_READ) as buffer:
+        number_of_rois_per_volume = numpy.array(
+            _decode_value(buffer=buffer, start=_find_value_start(buffer=buffer, key="nInVolume")), dtype="int64"
+        )
+        labels_per_volume = _decode_value(buffer=buffer, start=_find_value_start(buffer=buffer, key="labels"))
+        frames_per_volume = _count_inner_list_lengths(
+            buffer=buffer, start=_find_value_start(buffer=buffer, key="zOfFrame")
+        )
+
+        labeled_volume_indices = numpy.array(
+            [index for index, volume_labels in enumerate(labels_per_volume) if len(volume_labels) != 0], dtype="int64"
+        )
+        labels = numpy.array(list(), dtype=str)
+        coordinates = numpy.empty(shape=(0, 3), dtype="float64")
+        if len(labeled_volume_indices) == 1:
+            labeled_volume_index = labeled_volume_indices[0]
+            labels = numpy.array(labels_per_volume[labeled_volume_index], dtype=str)
+
+            first_roi = int(numpy.sum(number_of_rois_per_volume[:labeled_volume_index]))
+            number_of_rois = int(number_of_rois_per_volume[labeled_volume_index])
+            coordinates = _read_inner_lists(
+                buffer=buffer,
+                start=_find_value_start(buffer=buffer, key="coordZYX"),
+                first_index=first_roi,
+                stop_index=first_roi + number_of_rois,
+            )
+
+    return dict(
+        nInVolume=number_of_rois_per_volume,
+        frames_per_volume=frames_per_volume,
+        labeled_volume_indices=labeled_volume_indices,
+        labels=labels,
+        coordZYX=coordinates,
+    )
+
+
+def _find_value_start(*, buffer: mmap.mmap, key: str) -> int:
+    quoted_key = f'"{key}"'.encode()
+
+    position = buffer.find(quoted_key)
+    while position != -1:
+        # Skip any occurrence that is not followed by a colon, such as within a string value
+        separator_match = _KEY_SEPARATOR_PATTERN.match(buffer, position + len(quoted_key))
+        if separator_match is not None:
+            return separator_match.end()
+        position = buffer.find(quoted_key, position + len(quoted_key))
+
+    message = f"The field '{key}' was not found in the 'brains.json' file!"
+    raise ValueError(message)
+
+
+def _decode_value(*, buffer: mmap.mmap, start: int):
+    """Decode a single (small) JSON value, reading more of the file only until the value is complete."""
+    window_size = 2**16
+    while True:
+        text = buffer[start : start + window_size].decode(errors="replace")
+        try:
+            value, _ = _JSON_DECODER.raw_decode(text)
+            return value
+        except json.JSONDecodeError:
+            if start + window_size >= len(buffer):
+                raise
+            window_size *= 2
+
+
+def _locate_inner_lists(*, buffer: mmap.mmap, start: int) -> tuple[numpy.ndarray, numpy.ndarray, int]:
+    """
+    Locate the inner lists of a list of lists of numbers, without decoding any of them.
+
+    Returns the positions of the opening and closing brackets of each inner list, and the position just past the end
+    of the outer list.
+    """
+    opening_positions = list()
+    closing_positions = list()
+    depth = 0
+    block_start = start
+    while block_start < len(buffer):
+        block = numpy.frombuffer(buffer[block_start : block_start + _SCAN_BLOCK_SIZE], dtype="uint8")
+        is_opening = block == ord("[")
+        is_closing = block == ord("]")
+        depth_after_each_byte = depth + numpy.cumsum(is_opening.astype("int64") - is_closing)
+
+        outer_closing_indices = numpy.flatnonzero(is_closing & (depth_after_each_byte == 0))
+        block_end = outer_closing_indices[0] + 1 if len(outer_closing_indices) != 0 else len(block)
+
+        is_opening, is_closing = is_opening[:block_end], is_closing[:block_end]
+        depth_after_each_byte = depth_after_each_byte[:block_end]
+        opening_positions.append(numpy.flatnonzero(is_opening & (depth_after_each_byte == 2)) + block_start)
+        closing_positions.append(numpy.flatnonzero(is_closing & (depth_after_each_byte == 1)) + block_start)
+
+        if len(outer_closing_indices) != 0:
+            return numpy.concatenate(opening_positions), numpy.concatenate(closing_positions), block_start + block_end
+
+        depth = depth_after_each_byte[-1]
+        block_start += len(block)
+
+    message = "Unexpected end of the 'brains.json' file while scanning a list!"
+    raise ValueError(message)
+
+
+def _count_inner_list_lengths(*, buffer: mmap.mmap, start: int) -> numpy.ndarray:
+    opening_positions, closing_positions, stop = _locate_inner_lists(buffer=buffer, start=start)
+
+    outer_list = numpy.frombuffer(buffer[start:stop], dtype="uint8")
+    comma_positions = numpy.flatnonzero(outer_list == ord(",")) + start
+    number_of_commas = numpy.searchsorted(comma_positions, closing_positions) - numpy.searchsorted(
+        comma_positions, opening_positions
+    )
+
+    # An inner list without commas has either one or no elements
+    is_element_byte = ~numpy.isin(outer_list, numpy.frombuffer(b" \t\r\n[],", dtype="uint8"))
+    cumulative_element_bytes = numpy.concatenate(([0], numpy.cumsum(is_element_byte)))
+    element_bytes_per_inner_list = (
+        cumulative_element_bytes[closing_positions - start] - cumulative_element_bytes[opening_positions - start]
+    )
+
+    return numpy.where(element_bytes_per_inner_list == 0, 0, number_of_commas + 1).astype("int64")
+
+
+def _read_inner_lists(*, buffer: mmap.mmap, start: int, first_index: int, stop_index: int) -> numpy.ndarray:
+    """Decode only the inner lists in the range [first_index, stop_index) of a list of lists of numbers."""
+    opening_positions, closing_positions, _ = _locate_inner_lists(buffer=buffer, start=start)
+    if stop_index > len(opening_positions):
+        message = (
+            f"Expected at least {stop_index} entries in the 'coordZYX' field of the 'brains.json' file, "
+            f"but found {len(opening_positions)}!"
+        )
+        raise ValueError(message)
+    if stop_index <= first_index:
+        return numpy.empty(shape=(0, 3), dtype="float64")
+
+    inner_lists = buffer[opening_positions[first_index] : closing_positions[stop_index - 1] + 1]
+    return numpy.array(json.loads(b"[" + inner_lists + b"]"))
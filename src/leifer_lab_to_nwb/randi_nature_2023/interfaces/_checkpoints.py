@@ -0,0 +1,118 @@
+"""Durable records of the progress of writing an NWB file, from which an interrupted conversion may resume."""
+
+import json
+import os
+import pathlib
+
+import h5py
+
+
+def get_checkpoint_file_path(*, nwbfile_path: str | pathlib.Path) -> pathlib.Path:
+    """
+    Get the path of the file next to an NWB file that records the progress of its writing.
+
+    The NWB file is incomplete for as long as this file exists.
+    """
+    nwbfile_path = pathlib.Path(nwbfile_path)
+    return nwbfile_path.with_name(f"{nwbfile_path.name}.checkpoint.json")
+
+
+class ConversionCheckpoint:
+    """
+    The progress of writing an NWB file, recorded in the JSON file given by `get_checkpoint_file_path`.
+
+    The record holds a fingerprint of the conversion, whether the structure of the file (everything but the data of the
+    deferred datasets) has been written, and the number of items along the first axis (such as frames) of each deferred
+    dataset that are committed to disk. Each update is written to a temporary file, synced, then renamed over the
+    record, so that the record is never left partial.
+
+    The record is removed once the conversion finishes.
+    """
+
+    def __init__(self, *, nwbfile_path: str | pathlib.Path, fingerprint: dict) -> None:
+        """
+        Parameters
+        ----------
+        nwbfile_path : path
+            The path of the NWB file being written.
+        fingerprint : dict
+            Anything identifying the output of the conversion, such as its metadata and conversion options; a
+            conversion only resumes from a record with the same fingerprint. Must be serializable to JSON, through
+            `str` if need be.
+        """
+        self.nwbfile_path = pathlib.Path(nwbfile_path)
+        self.checkpoint_file_path = get_checkpoint_file_path(nwbfile_path=self.nwbfile_path)
+
+        # Normalized through JSON so that it compares equal to the one recorded
+        self.fingerprint = json.loads(json.dumps(obj=fingerprint, sort_keys=True, default=str))
+
+        self.structure_written = False
+        self.committed_lengths = dict()
+
+    def load(self) -> bool:
+        """
+        Load the record of an earlier conversion of the same NWB file.
+
+        Returns whether that conversion may be resumed: the record exists, has the same fingerprint, and the structure
+        of the file was written.
+        """
+        if not self.checkpoint_file_path.exists() or not self.nwbfile_path.exists():
+            return False
+
+        try:
+            record = json.loads(self.checkpoint_file_path.read_text())
+        except (OSError, ValueError):
+            return False
+        if record.get("fingerprint") != self.fingerprint or record.get("structure_written") is not True:
+            return False
+
+        self.structure_written = True
+        self.committed_lengths = dict(record["committed_lengths"])
+        return True
+
+    def start(self) -> None:
+        """Record the start of a new conversion, marking the NWB file as incomplete."""
+        self.structure_written = False
+        self.committed_lengths = dict()
+        self._save()
+
+    def mark_structure_written(self) -> None:
+        self.structure_written = True
+        self._save()
+
+    def get_committed_length(self, *, dataset_path: str) -> int:
+        return self.committed_lengths.get(dataset_path, 0)
+
+    def commit(self, *, file: h5py.File, dataset_path: str, committed_length: int) -> None:
+        """Sync the HDF5 file to disk, then record the number of items of the dataset that it holds."""
+        file.flush()
+        _sync_to_disk(file_path=file.filename)
+
+        self.committed_lengths[dataset_path] = committed_length
+        self._save()
+
+    def remove(self) -> None:
+        self.checkpoint_file_path.unlink(missing_ok=True)
+
+    def _save(self) -> None:
+        record = dict(
+            fingerprint=self.fingerprint,
+            structure_written=self.structure_written,
+            committed_lengths=self.committed_lengths,
+        )
+
+        temporary_file_path = self.checkpoint_file_path.with_name(f"{self.checkpoint_file_path.name}.tmp")
+        with open(file=temporary_file_path, mode="w") as io:
+            json.dump(obj=record, fp=io, indent=4)
+            io.flush()
+            os.fsync(io.fileno())
+        os.replace(src=temporary_file_path, dst=self.checkpoint_file_path)
+
+
+def _sync_to_disk(*, file_path: str | pathlib.Path) -> None:
+    """Have the operating system write any cached data of the file to disk, such as that flushed by HDF5."""
+    file_descriptor = os.open(file_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        os.fsync(file_descriptor)
+    finally:
+        os.close(file_descriptor)
@@ -0,0 +1,173 @@
+"""Lookup of the compression methods available to the imaging interfaces."""
+
+import functools
+import zlib
+from typing import Callable, Literal
+
+import numpy
+
+_COMPRESSION_METHODS = ("gzip", "lzf", "blosc", "zstd", "lz4", "bitshuffle")
+CompressionMethod = Literal[_COMPRESSION_METHODS]
+
+_DEFAULT_COMPRESSION_OPTIONS = {
+    "gzip": {"level": 4},
+    "lzf": dict(),
+    "blosc": {"cname": "zstd", "clevel": 5, "shuffle": "bit"},
+    "zstd": {"clevel": 3},
+    "lz4": dict(),
+    "bitshuffle": {"cname": "lz4"},
+}
+
+_BLOSC_SHUFFLES = {"none": 0, "byte": 1, "bit": 2}
+
+
+def _resolve_compression_options(compression: CompressionMethod, compression_options: dict | None) -> dict:
+    if compression not in _COMPRESSION_METHODS:
+        message = f"Unknown compression method '{compression}'! Please choose one of {_COMPRESSION_METHODS}."
+        raise ValueError(message)
+
+    resolved_compression_options = dict(_DEFAULT_COMPRESSION_OPTIONS[compression])
+    resolved_compression_options.update(compression_options or dict())
+    return resolved_compression_options
+
+
+def _get_hdf5plugin():
+    try:
+        import hdf5plugin
+    except ImportError:
+        message = (
+            "The 'hdf5plugin' package is required for the 'blosc', 'zstd', 'lz4', and 'bitshuffle' compression "
+            "methods. Please install it with `pip install hdf5plugin`."
+        )
+        raise ImportError(message)
+
+    return hdf5plugin
+
+
+def get_hdf5_compression_kwargs(
+    compression: CompressionMethod = "gzip", compression_options: dict | None = None
+) -> dict:
+    """
+    Get the keyword arguments to pass to `pynwb.H5DataIO` (or `h5py.Group.create_dataset`) for a compression method.
+
+    Parameters
+    ----------
+    compression : str, default: "gzip"
+        One of "gzip", "lzf", "blosc", "zstd", "lz4", or "bitshuffle".
+        All methods other than "gzip" and "lzf" require the `hdf5plugin` package (also when reading the file).
+    compression_options : dict, optional
+        Options specific to each method, updating the defaults of...
+            gzip: {"level": 4}
+            blosc: {"cname": "zstd", "clevel": 5, "shuffle": "bit"}
+            zstd: {"clevel": 3}
+            bitshuffle: {"cname": "lz4"}
+    """
+    resolved_compression_options = _resolve_compression_options(
+        compression=compression, compression_options=compression_options
+    )
+
+    if compression == "gzip":
+        return dict(compression="gzip", compression_opts=resolved_compression_options["level"])
+    if compression == "lzf":
+        return dict(compression="lzf")
+
+    hdf5plugin = _get_hdf5plugin()
+    match compression:
+        case "blosc":
+            hdf5_filter = hdf5plugin.Blosc(
+                cname=resolved_compression_options["cname"],
+                clevel=resolved_compression_options["clevel"],
+                shuffle=_BLOSC_SHUFFLES[resolved_compression_options["shuffle"]],
+            )
+        case "zstd":
+            hdf5_filter = hdf5plugin.Zstd(clevel=resolved_compression_options["clevel"])
+        case "lz4":
+            hdf5_filter = hdf5plugin.LZ4()
+        case "bitshuffle":
+            hdf5_filter = hdf5plugin.Bitshuffle(cname=resolved_compression_options["cname"])
+
+    return dict(
+        compression=hdf5_filter.filter_id, compression_opts=hdf5_filter.filter_options, allow_plugin_filters=True
+    )
+
+
+def get_zarr_compression_kwargs(
+    compression: CompressionMethod = "gzip", compression_options: dict | None = None
+) -> dict:
+    """
+    Get the keyword arguments to pass to `hdmf_zarr.ZarrDataIO` for a compression method.
+
+    Takes the same arguments as `get_hdf5_compression_kwargs`, except that "lzf" is not available for Zarr.
+    """
+    resolved_compression_options = _resolve_compression_options(
+        compression=compression, compression_options=compression_options
+    )
+
+    import numcodecs
+
+    match compression:
+        case "gzip":
+            compressor = numcodecs.GZip(level=resolved_compression_options["level"])
+        case "blosc":
+            compressor = numcodecs.Blosc(
+                cname=resolved_compression_options["cname"],
+                clevel=resolved_compression_options["clevel"],
+                shuffle=_BLOSC_SHUFFLES[resolved_compression_options["shuffle"]],
+            )
+        case "zstd":
+            compressor = numcodecs.Zstd(level=resolved_compression_options["clevel"])
+        case "lz4":
+            compressor = numcodecs.LZ4()
+        case "bitshuffle":
+            compressor = numcodecs.Blosc(cname=resolved_compression_options["cname"], shuffle=_BLOSC_SHUFFLES["bit"])
+        case _:
+            message = f"The compression method '{compression}' is not available for the Zarr backend."
+            raise ValueError(message)
+
+    return dict(compressor=compressor)
+
+
+def get_chunk_encoder(
+    compression: CompressionMethod = "gzip", compression_options: dict | None = None
+) -> Callable[[numpy.ndarray], bytes]:
+    """
+    Get a (picklable) function that compresses a single chunk into the bytes that the HDF5 filter would have produced.
+
+    Used for direct chunk writes; only 'gzip', 'blosc', and 'zstd' have encodings matching their HDF5 filters.
+    The latter two require the `numcodecs` package.
+    """
+    resolved_compression_options = _resolve_compression_options(
+        compression=compression, compression_options=compression_options
+    )
+
+    if compression == "gzip":
+        return functools.partial(_encode_gzip, level=resolved_compression_options["level"])
+
+    if compression not in ("blosc", "zstd"):
+        message = f"The compression method '{compression}' does not support parallel compression of chunks."
+        raise ValueError(message)
+
+    try:
+        import numcodecs
+    except ImportError:
+        message = (
+            f"The 'numcodecs' package is required for parallel compression with '{compression}'. "
+            "Please install it with `pip install numcodecs`."
+        )
+        raise ImportError(message)
+
+    if compression == "blosc":
+        codec = numcodecs.Blosc(
+            cname=resolved_compression_options["cname"],
+            clevel=resolved_compression_options["clevel"],
+            shuffle=_BLOSC_SHUFFLES[resolved_compression_options["shuffle"]],
+        )
+    else:
+        codec = numcodecs.Zstd(level=resolved_compression_options["clevel"])
+
+    return codec.encode
+
+
+def _encode_gzip(chunk_data: numpy.ndarray, level: int) -> bytes:
+    # The HDF5 'gzip' filter is a zlib stream of the raw chunk bytes
+    return zlib.compress(chunk_data, level)
@@ -0,0 +1,127 @@
+"""Shared logic for how the imaging interfaces configure the writing of their large datasets."""
+
+from typing import Literal
+
+import pynwb
+from hdmf.data_utils import DataIO, GenericDataChunkIterator
+
+from ._compression import (
+    CompressionMethod,
+    get_chunk_encoder,
+    get_hdf5_compression_kwargs,
+    get_zarr_compression_kwargs,
+)
+from ._direct_chunk_writing import DeferredDataChunkIterator, DirectChunkDatasetWriter
+from ._external_storage import ExternalReferenceDatasetWriter
+from ._sharded_storage import ShardedDatasetWriter, ShardedWriteGroup
+
+
+def configure_dataset_io(
+    *,
+    data_iterator: GenericDataChunkIterator,
+    dataset_path: str,
+    backend: Literal["hdf5", "zarr"] = "hdf5",
+    compression: CompressionMethod = "gzip",
+    compression_options: dict | None = None,
+    number_of_compression_workers: int | None = None,
+    compression_executor: Literal["thread", "process"] = "thread",
+    storage_mode: Literal["copy", "reference", "sharded"] = "copy",
+    raw_source: dict | None = None,
+    number_of_shards: int | None = None,
+    shard_datasets: dict | None = None,
+    sharded_write_group: ShardedWriteGroup | None = None,
+    resumable: bool = False,
+    always_defer: bool = False,
+) -> tuple[DataIO, list[DirectChunkDatasetWriter | ExternalReferenceDatasetWriter | ShardedDatasetWriter]]:
+    """
+    Wrap a data iterator for writing with the requested backend and compression.
+
+    With the "reference" `storage_mode`, the data is instead left in its raw binary source, which the dataset refers
+    to; see `ExternalReferenceDatasetWriter`. With the "sharded" `storage_mode`, it is written to `number_of_shards`
+    shard files along its first axis in parallel processes, together with the slices of the `shard_datasets`, and the
+    dataset stitches them together; see `ShardedDatasetWriter`. The processes are those of the `sharded_write_group`,
+    if given, so that the sharded datasets of a conversion share them.
+
+    If `resumable`, the data is always compressed and written by a `DirectChunkDatasetWriter` (with one worker per
+    CPU if no `number_of_compression_workers` are given), which `RandiNature2023Converter.run_conversion` can resume
+    after an interruption. The same holds if `always_defer`, so that the buffers of the data iterator are read while
+    the converter runs the other deferred writers, such as the `VolumeProjectionWriter` of the same data.
+
+    With the "reference" or "sharded" `storage_mode`, the `raw_source` holds the keyword arguments describing the raw
+    binary source of the data: the "dat_file_path", "source_shape", "dtype", and "selection".
+
+    Returns
+    -------
+    data_io : DataIO
+        The object to pass as the data of the neurodata object.
+    deferred_dataset_writers : list of DirectChunkDatasetWriter, ExternalReferenceDatasetWriter, or ShardedDatasetWriter
+        Any writers responsible for filling the dataset after the file has been created.
+        These are run by `RandiNature2023Converter.run_conversion`.
+    """
+    if resumable is True and (storage_mode != "copy" or backend != "hdf5"):
+        message = (
+            "Resumable writing is specific to copying the data with the HDF5 backend! "
+            "Please use the 'copy' `storage_mode` and the 'hdf5' backend."
+        )
+        raise ValueError(message)
+
+    if storage_mode in ("reference", "sharded"):
+        if backend != "hdf5" or number_of_compression_workers is not None:
+            message = (
+                f"The '{storage_mode}' `storage_mode` is specific to the HDF5 backend, and is not combined with the "
+                "direct writing of chunks! Please use the 'hdf5' backend, without `number_of_compression_workers`."
+            )
+            raise ValueError(message)
+
+        # Only the empty dataset is created when the file is written; the converter then replaces it
+        data_io = pynwb.H5DataIO(data=DeferredDataChunkIterator(data_iterator=data_iterator))
+        if storage_mode == "reference":
+            deferred_dataset_writer = ExternalReferenceDatasetWriter(dataset_path=dataset_path, **raw_source)
+        else:
+            deferred_dataset_writer = ShardedDatasetWriter(
+                dataset_path=dataset_path,
+                chunk_shape=data_iterator.chunk_shape,
+                buffer_length=data_iterator.buffer_shape[0],
+                compression=compression,
+                compression_options=compression_options,
+                number_of_shards=number_of_shards,
+                shard_datasets=shard_datasets,
+                group=sharded_write_group,
+                **raw_source,
+            )
+        return data_io, [deferred_dataset_writer]
+
+    if backend == "zarr":
+        if number_of_compression_workers is not None:
+            message = (
+                "Parallel compression through `number_of_compression_workers` is specific to the HDF5 backend! "
+                "With Zarr, the chunks are compressed by the writing jobs themselves (see `number_of_jobs`)."
+            )
+            raise ValueError(message)
+
+        from hdmf_zarr import ZarrDataIO
+
+        zarr_compression_kwargs = get_zarr_compression_kwargs(
+            compression=compression, compression_options=compression_options
+        )
+        data_io = ZarrDataIO(data=data_iterator, chunks=data_iterator.chunk_shape, **zarr_compression_kwargs)
+        return data_io, list()
+
+    hdf5_compression_kwargs = get_hdf5_compression_kwargs(
+        compression=compression, compression_options=compression_options
+    )
+
+    if number_of_compression_workers is None and resumable is False and always_defer is False:
+        data_io = pynwb.H5DataIO(data=data_iterator, **hdf5_compression_kwargs)
+        return data_io, list()
+
+    # Only the empty dataset is created when the file is written; the converter then fills the chunks
+    data_io = pynwb.H5DataIO(data=DeferredDataChunkIterator(data_iterator=data_iterator), **hdf5_compression_kwargs)
+    deferred_dataset_writer = DirectChunkDatasetWriter(
+        dataset_path=dataset_path,
+        data_iterator=data_iterator,
+        chunk_encoder=get_chunk_encoder(compression=compression, compression_options=compression_options),
+        number_of_workers=number_of_compression_workers,
+        executor=compression_executor,
+    )
+    return data_io, [deferred_dataset_writer]
@@ -0,0 +1,231 @@
+"""Compression of dataset chunks outside of HDF5 so that it may be spread across many cores."""
+
+import collections
+import concurrent.futures
+import itertools
+import os
+import time
+from typing import Callable, Literal
+
+import h5py
+import numpy
+from hdmf.data_utils import GenericDataChunkIterator
+
+from ._checkpoints import ConversionCheckpoint
+from ._compression import get_chunk_encoder
+from ._instrumentation import count, get_current_interface_name, measure_stage, record_stage
+from ._prefetching import PrefetchingDataChunkIterator
+
+
+class DeferredDataChunkIterator(GenericDataChunkIterator):
+    """
+    Declares the shape, type and chunking of a dataset without yielding any data.
+
+    Used in place of the actual iterator when the NWB file is first written; the chunks are then filled directly by
+    a `DirectChunkDatasetWriter` once the file exists.
+    """
+
+    def __init__(self, *, data_iterator: GenericDataChunkIterator) -> None:
+        self.data_iterator = data_iterator
+
+        super().__init__(
+            chunk_shape=data_iterator.chunk_shape, buffer_shape=data_iterator.buffer_shape, display_progress=False
+        )
+
+    def __next__(self):
+        raise StopIteration
+
+    def _get_data(self, selection: tuple[slice, ...]) -> numpy.ndarray:
+        raise NotImplementedError("The data for this dataset is written by a `DirectChunkDatasetWriter`.")
+
+    def _get_maxshape(self) -> tuple[int, ...]:
+        return self.data_iterator.maxshape
+
+    def _get_dtype(self) -> numpy.dtype:
+        return self.data_iterator.dtype
+
+
+class DirectChunkDatasetWriter:
+    """
+    Fill an existing chunked HDF5 dataset by compressing its chunks in a pool of workers.
+
+    The compressed chunks are handed to HDF5 through direct chunk writes, bypassing its (single-threaded) filter
+    pipeline. The result is indistinguishable from a dataset compressed by the corresponding HDF5 filter.
+    """
+
+    def __init__(
+        self,
+        *,
+        dataset_path: str,
+        data_iterator: GenericDataChunkIterator,
+        chunk_encoder: Callable[[numpy.ndarray], bytes] | None = None,
+        number_of_workers: int | None = None,
+        executor: Literal["thread", "process"] = "thread",
+    ) -> None:
+        """
+        Parameters
+        ----------
+        dataset_path : str
+            The location of the dataset within the HDF5 file, such as '/acquisition/PumpProbeImagingGreen/data'.
+        data_iterator : GenericDataChunkIterator
+            The iterator over the source data; its buffers are expected to align with the chunks of the dataset.
+        chunk_encoder : callable, optional
+            A picklable function compressing a chunk into the bytes expected by the filter of the dataset.
+            The default is 'gzip' compression at level 4; see `get_chunk_encoder` for other methods.
+        number_of_workers : int, optional
+            The number of workers compressing chunks in parallel.
+            The default is the number of CPUs on the system.
+        executor : "thread" or "process", default: "thread"
+            The type of pool used for compression; threads are usually sufficient since most codecs release the GIL.
+        """
+        self.dataset_path = dataset_path
+        self.data_iterator = data_iterator
+        self.chunk_encoder = chunk_encoder or get_chunk_encoder(compression="gzip")
+        self.number_of_workers = number_of_workers
+        self.executor = executor
+
+        # Created within the `add_to_nwbfile` of an interface, but run after the file is written
+        self.interface_name = get_current_interface_name()
+
+    def write(self, *, file: h5py.File) -> None:
+        for _ in self.iter_write(file=file):
+            pass
+
+    def iter_write(self, *, file: h5py.File, checkpoint: ConversionCheckpoint | None = None):
+        """
+        Write the dataset one buffer at a time, yielding after each so that several writers can take turns.
+
+        If a `checkpoint` is given, each buffer is committed to it once written, and the writing continues after the
+        items already committed by an earlier conversion; see `verify_committed_data`.
+        """
+        dataset = file[self.dataset_path]
+        chunk_shape = dataset.chunks
+
+        committed_length = 0 if checkpoint is None else checkpoint.get_committed_length(dataset_path=self.dataset_path)
+        if committed_length > 0:
+            # Any buffer only partly committed (such as when the buffers were sized differently) is written in full
+            buffer_selections = self.data_iterator.buffer_selection_generator
+            self.data_iterator.buffer_selection_generator = (
+                selection for selection in buffer_selections if selection[0].stop > committed_length
+            )
+
+        executor_class = {
+            "thread": concurrent.futures.ThreadPoolExecutor,
+            "process": concurrent.futures.ProcessPoolExecutor,
+        }[self.executor]
+        number_of_workers = self.number_of_workers or os.cpu_count()
+        maximum_chunks_in_flight = 2 * number_of_workers
+        try:
+            with executor_class(max_workers=number_of_workers) as executor:
+                pending_chunks = collections.deque()
+                for buffer in self.data_iterator:
+                    for chunk_offset, chunk_data in _iterate_chunks_in_buffer(
+                        buffer_data=buffer.data, buffer_selection=buffer.selection, chunk_shape=chunk_shape
+                    ):
+                        future = executor.submit(_encode_chunk_and_time, self.chunk_encoder, chunk_data)
+                        pending_chunks.append((chunk_offset, chunk_data.nbytes, future))
+
+                        while len(pending_chunks) > maximum_chunks_in_flight:
+                            self._write_chunk(dataset=dataset, pending_chunk=pending_chunks.popleft())
+
+                    if checkpoint is not None:
+                        while len(pending_chunks) > 0:
+                            self._write_chunk(dataset=dataset, pending_chunk=pending_chunks.popleft())
+
+                        with measure_stage(stage="checkpoint_commit", interface_name=self.interface_name):
+                            checkpoint.commit(
+                                file=file, dataset_path=self.dataset_path, committed_length=buffer.selection[0].stop
+                            )
+
+                    yield
+
+                while len(pending_chunks) > 0:
+                    self._write_chunk(dataset=dataset, pending_chunk=pending_chunks.popleft())
+        finally:
+            # Also when the writing fails or is abandoned, so that no reading goes on in the background
+            if isinstance(self.data_iterator, PrefetchingDataChunkIterator):
+                self.data_iterator.stop_prefetching()
+
+    def verify_committed_data(self, *, file: h5py.File, committed_length: int) -> str | None:
+        """
+        Check the dataset left by an earlier conversion before resuming it after its first `committed_length` items.
+
+        The dataset must have the shape, type, and chunking of the data, and its last committed chunks must match the
+        source. Returns a description of the first mismatch, if any.
+        """
+        if self.dataset_path not in file:
+            return f"The dataset '{self.dataset_path}' is missing."
+
+        dataset = file[self.dataset_path]
+        data_iterator = self.data_iterator
+        if (
+            dataset.shape != tuple(data_iterator.maxshape)
+            or dataset.dtype != data_iterator.dtype
+            or dataset.chunks != tuple(data_iterator.chunk_shape)
+        ):
+            return f"The dataset '{self.dataset_path}' has another shape, type, or chunking than its data."
+        if committed_length == 0:
+            return None
+
+        chunk_length = dataset.chunks[0]
+        start = (committed_length - 1) // chunk_length * chunk_length
+        selection = (slice(start, committed_length), *(slice(0, axis_length) for axis_length in dataset.shape[1:]))
+        if not numpy.array_equal(dataset[selection], data_iterator._get_data(selection=selection)):
+            return f"The last committed chunks of the dataset '{self.dataset_path}' differ from the source."
+
+        return None
+
+    def _write_chunk(self, *, dataset: h5py.Dataset, pending_chunk: tuple) -> None:
+        chunk_offset, chunk_size_in_bytes, future = pending_chunk
+        encoded_chunk, wall_time, cpu_time = future.result()
+
+        # The times of the workers add up, so may exceed the elapsed time of the whole conversion
+        record_stage(
+            interface_name=self.interface_name,
+            stage="compression",
+            calls=1,
+            wall_time_in_s=wall_time,
+            cpu_time_in_s=cpu_time,
+            bytes_read=chunk_size_in_bytes,
+            bytes_written=len(encoded_chunk),
+            number_of_chunks=1,
+        )
+
+        with measure_stage(stage="direct_chunk_write", interface_name=self.interface_name):
+            dataset.id.write_direct_chunk(offsets=chunk_offset, data=encoded_chunk)
+            count(bytes_written=len(encoded_chunk), number_of_chunks=1)
+
+
+def _encode_chunk_and_time(
+    chunk_encoder: Callable[[numpy.ndarray], bytes], chunk_data: numpy.ndarray
+) -> tuple[bytes, float, float]:
+    """Compress a chunk in a worker, also returning the elapsed and CPU times of the worker thread in seconds."""
+    start_cpu_time = time.thread_time()
+    start_wall_time = time.perf_counter()
+    encoded_chunk = chunk_encoder(chunk_data)
+
+    return encoded_chunk, time.perf_counter() - start_wall_time, time.thread_time() - start_cpu_time
+
+
+def _iterate_chunks_in_buffer(
+    *, buffer_data: numpy.ndarray, buffer_selection: tuple[slice, ...], chunk_shape: tuple[int, ...]
+):
+    """Split a buffer into full-sized chunks, padding those on the edges as HDF5 expects for direct writes."""
+    chunk_starts_per_axis = [
+        range(axis_selection.start, axis_selection.stop, axis_chunk_length)
+        for axis_selection, axis_chunk_length in zip(buffer_selection, chunk_shape)
+    ]
+    buffer_bounds = [(axis_selection.start, axis_selection.stop) for axis_selection in buffer_selection]
+    for chunk_offset in itertools.product(*chunk_starts_per_axis):
+        slice_within_buffer = tuple(
+            slice(start - buffer_start, min(start + length, stop) - buffer_start)
+            for start, (buffer_start, stop), length in zip(chunk_offset, buffer_bounds, chunk_shape)
+        )
+        chunk_data = buffer_data[slice_within_buffer]
+
+        if chunk_data.shape != tuple(chunk_shape):
+            padded_chunk_data = numpy.zeros(shape=chunk_shape, dtype=chunk_data.dtype)
+            padded_chunk_data[tuple(slice(0, length) for length in chunk_data.shape)] = chunk_data
+            chunk_data = padded_chunk_data
+
+        yield chunk_offset, numpy.ascontiguousarray(chunk_data)
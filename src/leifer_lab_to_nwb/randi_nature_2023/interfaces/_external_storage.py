@@ -0,0 +1,159 @@
+"""Datasets that refer to the bytes of the raw binary sources in place, instead of holding a copy of them."""
+
+import math
+import pathlib
+from typing import Callable
+
+import h5py
+import numpy
+import pydantic
+
+from ._instrumentation import get_current_interface_name, measure_stage
+
+
+def get_external_frames_file_path(*, nwbfile_path: str | pathlib.Path) -> pathlib.Path:
+    """
+    Get the path of the file next to an NWB file that maps the raw binary sources its datasets refer to.
+
+    It must be kept next to the NWB file, as well as the sources at their original location, for the data to be read.
+    """
+    nwbfile_path = pathlib.Path(nwbfile_path)
+    return nwbfile_path.with_name(f"{nwbfile_path.name}.external.h5")
+
+
+def replace_placeholder_dataset(
+    *, file: h5py.File, dataset_path: str, create_dataset: Callable[[h5py.Group, str], h5py.Dataset]
+) -> h5py.Dataset:
+    """
+    Replace a dataset, such as the empty one written for a `DeferredDataChunkIterator`, keeping its attributes.
+
+    The `create_dataset` function is given the parent group and the name of the dataset, once the placeholder is
+    removed.
+    """
+    placeholder = file[dataset_path]
+    parent, name = placeholder.parent, dataset_path.rsplit("/", maxsplit=1)[-1]
+    attributes = dict(placeholder.attrs)
+    del parent[name]
+
+    dataset = create_dataset(parent, name)
+    dataset.attrs.update(attributes)
+    return dataset
+
+
+class ExternalReferenceDatasetWriter:
+    """
+    Replace a placeholder dataset of an HDF5 file by one that reads its data from a raw binary file in place.
+
+    If the data is a single contiguous range of the binary file (such as the first depths of the NeuroPAL volume), the
+    dataset uses HDF5 external storage pointing directly at that range.
+
+    Otherwise (such as a single channel of the interleaved PumpProbe frames), HDF5 would need an external segment per
+    frame, but an object header holds no more than a few thousand of them. The whole binary file is then mapped by a
+    single segment of a dataset in the file given by `get_external_frames_file_path`, and the dataset is a virtual
+    dataset selecting its data from that one.
+
+    Either way, nothing is copied or compressed, so the file is written in moments; the data is read from the binary
+    file on each access, with the speed (and the availability) of its storage.
+    """
+
+    def __init__(
+        self,
+        *,
+        dataset_path: str,
+        dat_file_path: pydantic.FilePath,
+        source_shape: tuple[int, ...],
+        dtype: numpy.dtype,
+        selection: tuple[slice, ...],
+    ) -> None:
+        """
+        Parameters
+        ----------
+        dataset_path : str
+            The location of the placeholder dataset within the HDF5 file, such as '/acquisition/NeuroPALImaging/data'.
+        dat_file_path : FilePath
+            Path to the raw binary file. Referred to by its absolute path, so it may not be moved.
+        source_shape : tuple of ints
+            The shape of the full array stored in the binary file from its first byte; any trailing bytes are ignored.
+        dtype : numpy.dtype
+            The data type of the array stored in the binary file.
+        selection : tuple of slices
+            The part of the array that makes up the data of the dataset, with one slice per axis.
+        """
+        self.dataset_path = dataset_path
+        self.dat_file_path = pathlib.Path(dat_file_path).resolve()
+        self.source_shape = tuple(source_shape)
+        self.dtype = numpy.dtype(dtype)
+        self.selection = tuple(
+            slice(*axis_selection.indices(axis_length))
+            for axis_selection, axis_length in zip(selection, self.source_shape)
+        )
+
+        # Created within the `add_to_nwbfile` of an interface, but run after the file is written
+        self.interface_name = get_current_interface_name()
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return tuple(axis_selection.stop - axis_selection.start for axis_selection in self.selection)
+
+    def write(self, *, file: h5py.File) -> None:
+        for _ in self.iter_write(file=file):
+            pass
+
+    def iter_write(self, *, file: h5py.File):
+        """Replace the dataset in a single step; a generator only to take turns with the other deferred writers."""
+        with measure_stage(stage="reference_write", interface_name=self.interface_name):
+            if self._is_contiguous():
+                row_size_in_bytes = math.prod(self.source_shape[1:]) * self.dtype.itemsize
+                offset = self.selection[0].start * row_size_in_bytes
+                size = math.prod(self.shape) * self.dtype.itemsize
+                external = [(str(self.dat_file_path), offset, size)]
+                replace_placeholder_dataset(
+                    file=file,
+                    dataset_path=self.dataset_path,
+                    create_dataset=lambda parent, name: parent.create_dataset(
+                        name=name, shape=self.shape, dtype=self.dtype, external=external
+                    ),
+                )
+            else:
+                external_frames_file_path = get_external_frames_file_path(nwbfile_path=file.filename)
+                source_name = self._map_source(external_frames_file_path=external_frames_file_path)
+
+                # Referred to by its relative path, which is resolved from the folder of the NWB file
+                layout = h5py.VirtualLayout(shape=self.shape, dtype=self.dtype)
+                virtual_source = h5py.VirtualSource(
+                    path_or_dataset=external_frames_file_path.name, name=source_name, shape=self.source_shape
+                )
+                layout[...] = virtual_source[self.selection]
+                replace_placeholder_dataset(
+                    file=file,
+                    dataset_path=self.dataset_path,
+                    create_dataset=lambda parent, name: parent.create_virtual_dataset(name=name, layout=layout),
+                )
+
+        yield
+
+    def _is_contiguous(self) -> bool:
+        """Whether the selection is a range along the first axis only, which is then a single range of bytes."""
+        first_axis_selection, *other_axis_selections = self.selection
+        return first_axis_selection.step == 1 and all(
+            axis_selection == slice(0, axis_length, 1)
+            for axis_selection, axis_length in zip(other_axis_selections, self.source_shape[1:])
+        )
+
+    def _map_source(self, *, external_frames_file_path: pathlib.Path) -> str:
+        """Map the whole binary file as a single external segment; shared by all datasets selecting from it."""
+        source_name = self.dat_file_path.name
+        with h5py.File(name=external_frames_file_path, mode="a") as external_frames_file:
+            # Any mapping left from an earlier conversion of the same file may be of another shape
+            if source_name in external_frames_file:
+                del external_frames_file[source_name]
+
+            size = math.prod(self.source_shape) * self.dtype.itemsize
+            external_frames_file.create_dataset(
+                name=source_name,
+                shape=self.source_shape,
+                dtype=self.dtype,
+                external=[(str(self.dat_file_path), 0, size)],
+            )
+
+        return source_name
@@ -0,0 +1,46 @@
+"""Alignment of the per-frame tables of the PumpProbe recording with its raw frames."""
+
+import numpy
+import pandas
+
+# This was hardcoded via discussion in
+# https://github.com/catalystneuro/leifer_lab_to_nwb/issues/2
+DEPTH_SCANNING_PIEZO_VOLTS_TO_UM = 1 / 0.125
+
+
+def get_frame_timestamps_and_depths(
+    *, sync_table: pandas.DataFrame, timestamps_table: pandas.DataFrame
+) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Get the timestamps and depths (in um) of the raw frames.
+
+    Parameters
+    ----------
+    sync_table : pandas.DataFrame
+        The table of the 'other-frameSynchronous.txt' file, with a row for every frame index of the camera.
+    timestamps_table : pandas.DataFrame
+        The table of the 'framesDetails.txt' file, with a row for every frame in the '.dat' file.
+
+    Returns
+    -------
+    timestamps : numpy.ndarray
+        The timestamp of each frame of the 'framesDetails.txt' file.
+    depth_per_frame_in_um : numpy.ndarray
+        The depth of each of those frames, from the piezo position of its row of the 'other-frameSynchronous.txt'
+        file; shorter than the timestamps if that table ends earlier.
+    """
+    # From prototyping data, the frameSync seems to start first...
+    frame_indices = sync_table["Frame index"]
+
+    # ...then the frameDetails has timestamps for a subset of the frame indices
+    number_of_frames = timestamps_table.shape[0]
+
+    frame_count_delay = timestamps_table["frameCount"][0] - frame_indices[0]
+    frame_count_end = frame_count_delay + number_of_frames
+
+    sync_subtable = sync_table.iloc[frame_count_delay:frame_count_end]
+
+    timestamps = numpy.array(timestamps_table["Timestamp"])
+    depth_per_frame_in_um = numpy.array(sync_subtable["Piezo position (V)"] * DEPTH_SCANNING_PIEZO_VOLTS_TO_UM)
+
+    return timestamps, depth_per_frame_in_um
@@ -0,0 +1,309 @@
+"""Measurement of where the time, input/output and memory of a conversion go, for each interface and stage."""
+
+import contextlib
+import contextvars
+import cProfile
+import importlib
+import json
+import math
+import os
+import pathlib
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows, where the peak memory is then not reported
+    resource = None
+
+# Set to a comma-separated list of stage names (or '*' for all) to profile those stages, without any change to the code
+PROFILE_STAGES_ENVIRONMENT_VARIABLE = "LEIFER_LAB_TO_NWB_PROFILE_STAGES"
+
+# Set to 'module:factory' to use another profiler than cProfile; see `measure_stage`
+PROFILER_ENVIRONMENT_VARIABLE = "LEIFER_LAB_TO_NWB_PROFILER"
+
+# The folder of the cProfile statistics; defaults to the current working directory
+PROFILE_FOLDER_ENVIRONMENT_VARIABLE = "LEIFER_LAB_TO_NWB_PROFILE_FOLDER_PATH"
+
+# The name under which the stages that are not specific to any interface (such as writing the file) are reported
+SESSION_STAGES_NAME = "session"
+
+_STAGE_METRICS = (
+    "calls",
+    "wall_time_in_s",
+    "cpu_time_in_s",
+    "bytes_read",
+    "bytes_written",
+    "storage_bytes_read",
+    "storage_bytes_written",
+    "number_of_chunks",
+)
+
+_active_instrumentation = contextvars.ContextVar("active_instrumentation", default=None)
+_current_interface_name = contextvars.ContextVar("current_interface_name", default=None)
+_current_stage_key = contextvars.ContextVar("current_stage_key", default=None)
+
+
+class ConversionInstrumentation:
+    """
+    Totals of the metrics of each stage of each interface over a single conversion.
+
+    Owned by the `RandiNature2023Converter`, which activates it while constructing its interfaces and running the
+    conversion. Each stage accumulates...
+        calls : the number of times the stage was entered
+        wall_time_in_s, cpu_time_in_s : the elapsed and CPU times; the CPU time is that of the whole process
+        bytes_read, bytes_written : the bytes of data pulled from the sources and handed to the file, as counted by
+            the code of the stage
+        storage_bytes_read, storage_bytes_written : the bytes actually transferred to and from storage by the whole
+            process during the stage, as reported by the operating system (Linux only)
+        number_of_chunks : the number of dataset chunks handled by the stage
+        peak_rss_in_bytes : the peak resident memory of the process as of the end of the stage
+
+    Stages may be nested (such as the iteration over chunks within the writing of the file), in which case the outer
+    stage includes the inner one.
+    """
+
+    def __init__(self) -> None:
+        # Keyed by the name of the interface (or `SESSION_STAGES_NAME`) and the name of the stage
+        self.stages = dict()
+        self.start_time = time.perf_counter()
+
+        self._lock = threading.Lock()
+        self._profiles = dict()
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Have every stage measured within this context add to the totals of this one."""
+        token = _active_instrumentation.set(self)
+        try:
+            yield self
+        finally:
+            _active_instrumentation.reset(token)
+
+    def add(self, *, interface_name: str | None, stage: str, **metrics: float) -> None:
+        """Add to the totals of a stage, which is created if it was not measured before."""
+        key = (interface_name or SESSION_STAGES_NAME, stage)
+        with self._lock:
+            stage_totals = self.stages.setdefault(key, dict.fromkeys(_STAGE_METRICS, 0))
+            for name, value in metrics.items():
+                if name == "peak_rss_in_bytes":
+                    stage_totals[name] = max(stage_totals.get(name) or 0, value or 0)
+                else:
+                    stage_totals[name] = stage_totals.get(name, 0) + (value or 0)
+
+    def get_report(self) -> dict:
+        stages = dict()
+        for (interface_name, stage), stage_totals in self.stages.items():
+            stages.setdefault(interface_name, dict())[stage] = dict(stage_totals)
+
+        return dict(
+            wall_time_in_s=time.perf_counter() - self.start_time,
+            peak_rss_in_bytes=_get_peak_rss_in_bytes(),
+            stages=stages,
+        )
+
+    def write_report(self, *, report_file_path: str | pathlib.Path, **details) -> dict:
+        """
+        Write the report of the conversion as JSON, along with any `details` (such as the path of the NWB file).
+
+        Also saves the statistics of any stages profiled with cProfile.
+        """
+        report = dict(**details, **self.get_report())
+        report_file_path = pathlib.Path(report_file_path)
+        with open(file=report_file_path, mode="w") as io:
+            json.dump(obj=report, fp=io, indent=2, default=str)
+
+        self._dump_profiles(report_file_path=report_file_path)
+        return report
+
+    def _profile(self, *, interface_name: str | None, stage: str) -> contextlib.AbstractContextManager:
+        profiled_stages = os.environ.get(PROFILE_STAGES_ENVIRONMENT_VARIABLE, "")
+        if profiled_stages != "*" and stage not in profiled_stages.split(","):
+            return contextlib.nullcontext()
+
+        profiler_factory_name = os.environ.get(PROFILER_ENVIRONMENT_VARIABLE, None)
+        if profiler_factory_name is not None:
+            module_name, _, factory_name = profiler_factory_name.partition(":")
+            profiler_factory = getattr(importlib.import_module(module_name), factory_name)
+            return profiler_factory(interface_name=interface_name or SESSION_STAGES_NAME, stage=stage)
+
+        # A single profile accumulates over every call of the same stage
+        key = (interface_name or SESSION_STAGES_NAME, stage)
+        with self._lock:
+            profile = self._profiles.setdefault(key, cProfile.Profile())
+        return _enable_profile(profile=profile)
+
+    def _dump_profiles(self, *, report_file_path: pathlib.Path) -> None:
+        profile_folder_path = pathlib.Path(os.environ.get(PROFILE_FOLDER_ENVIRONMENT_VARIABLE, os.getcwd()))
+        for (interface_name, stage), profile in self._profiles.items():
+            profile_file_name = f"{report_file_path.name.removesuffix('.report.json')}_{interface_name}_{stage}.prof"
+            profile_file_path = profile_folder_path / profile_file_name
+            profile.dump_stats(file=profile_file_path)
+
+
+@contextlib.contextmanager
+def measure_stage(*, stage: str, interface_name: str | None = None):
+    """
+    Measure the code within this context as a stage of the active conversion, if any (otherwise does nothing).
+
+    Parameters
+    ----------
+    stage : str
+        The name of the stage, such as "chunk_iteration".
+    interface_name : str, optional
+        The interface the stage belongs to. Defaults to that of any enclosing stage.
+
+    Notes
+    -----
+    The stages named in the environment variable `LEIFER_LAB_TO_NWB_PROFILE_STAGES` (comma-separated, or '*' for all)
+    are profiled with cProfile, one profile per stage of each interface; the statistics are saved as '.prof' files
+    in the folder of the environment variable `LEIFER_LAB_TO_NWB_PROFILE_FOLDER_PATH` along with the report.
+
+    Another profiler may be attached through the environment variable `LEIFER_LAB_TO_NWB_PROFILER`, as
+    'module:factory'; the factory is called with the `interface_name` and `stage` keyword arguments and must return
+    a context manager, which is entered around each call of the stage.
+    """
+    instrumentation = _active_instrumentation.get()
+    if instrumentation is None:
+        yield
+        return
+
+    interface_name = interface_name or _current_interface_name.get()
+    interface_token = _current_interface_name.set(interface_name)
+    stage_token = _current_stage_key.set((interface_name, stage))
+
+    start_storage_bytes_read, start_storage_bytes_written = _get_storage_bytes()
+    start_cpu_time = time.process_time()
+    start_wall_time = time.perf_counter()
+    try:
+        with instrumentation._profile(interface_name=interface_name, stage=stage):
+            yield
+    finally:
+        wall_time = time.perf_counter() - start_wall_time
+        cpu_time = time.process_time() - start_cpu_time
+        end_storage_bytes_read, end_storage_bytes_written = _get_storage_bytes()
+
+        _current_stage_key.reset(stage_token)
+        _current_interface_name.reset(interface_token)
+
+        instrumentation.add(
+            interface_name=interface_name,
+            stage=stage,
+            calls=1,
+            wall_time_in_s=wall_time,
+            cpu_time_in_s=cpu_time,
+            storage_bytes_read=end_storage_bytes_read - start_storage_bytes_read,
+            storage_bytes_written=end_storage_bytes_written - start_storage_bytes_written,
+            peak_rss_in_bytes=_get_peak_rss_in_bytes(),
+        )
+
+
+def count(**counters: int) -> None:
+    """Add to the counters (such as `bytes_read` or `number_of_chunks`) of the innermost stage being measured."""
+    instrumentation = _active_instrumentation.get()
+    stage_key = _current_stage_key.get()
+    if instrumentation is None or stage_key is None:
+        return
+
+    interface_name, stage = stage_key
+    instrumentation.add(interface_name=interface_name, stage=stage, **counters)
+
+
+def record_stage(*, interface_name: str | None, stage: str, **metrics: float) -> None:
+    """Add metrics measured elsewhere (such as by the workers of a pool) to a stage of the active conversion, if any."""
+    instrumentation = _active_instrumentation.get()
+    if instrumentation is None:
+        return
+
+    instrumentation.add(interface_name=interface_name, stage=stage, **metrics)
+
+
+def get_current_interface_name() -> str | None:
+    """Get the name of the interface whose stage is being measured, such as to attribute later work to it."""
+    return _current_interface_name.get()
+
+
+def count_chunks_in_selection(*, selection: tuple[slice, ...], chunk_shape: tuple[int, ...]) -> int:
+    """Count the chunks touched by a selection whose start is aligned with the chunks, as that of a buffer is."""
+    return math.prod(
+        math.ceil((axis_selection.stop - axis_selection.start) / axis_chunk_length)
+        for axis_selection, axis_chunk_length in zip(selection, chunk_shape)
+    )
+
+
+def get_report_file_path(*, nwbfile_path: str | pathlib.Path) -> pathlib.Path:
+    """Get the path of the report of a conversion, next to its NWB file."""
+    nwbfile_path = pathlib.Path(nwbfile_path)
+    return nwbfile_path.with_name(f"{nwbfile_path.name}.report.json")
+
+
+def aggregate_conversion_reports(*, report_file_paths: list[str | pathlib.Path]) -> dict:
+    """
+    Combine the reports of many conversions, such as every session of the dataset.
+
+    Returns
+    -------
+    dict
+        The "number_of_reports"; the totals of each stage of each interface over all reports, as "stages" (with the
+        largest peak memory rather than the sum); and the "sessions" summarized by their NWB file, wall time and peak
+        memory, from the slowest to the fastest.
+    """
+    stage_totals = ConversionInstrumentation()
+    sessions = list()
+    for report_file_path in report_file_paths:
+        with open(file=report_file_path, mode="r") as io:
+            report = json.load(fp=io)
+
+        for interface_name, stages in report["stages"].items():
+            for stage, metrics in stages.items():
+                stage_totals.add(interface_name=interface_name, stage=stage, **metrics)
+
+        sessions.append(
+            dict(
+                report_file_path=str(report_file_path),
+                nwbfile_path=report.get("nwbfile_path", None),
+                wall_time_in_s=report["wall_time_in_s"],
+                peak_rss_in_bytes=report["peak_rss_in_bytes"],
+            )
+        )
+    sessions.sort(key=lambda session: session["wall_time_in_s"], reverse=True)
+
+    return dict(
+        number_of_reports=len(sessions),
+        stages=stage_totals.get_report()["stages"],
+        sessions=sessions,
+    )
+
+
+@contextlib.contextmanager
+def _enable_profile(*, profile: cProfile.Profile):
+    try:
+        profile.enable()
+    except ValueError:  # Another stage is already being profiled, which then includes this one
+        yield
+        return
+
+    try:
+        yield
+    finally:
+        profile.disable()
+
+
+def _get_storage_bytes() -> tuple[int, int]:
+    """Get the bytes read from and written to storage by this process so far, or zeros if this is not reported."""
+    try:
+        with open(file="/proc/self/io", mode="r") as io:
+            counters = dict(line.split(": ") for line in io.read().splitlines())
+    except (OSError, ValueError):
+        return 0, 0
+
+    return int(counters.get("read_bytes", 0)), int(counters.get("write_bytes", 0))
+
+
+def _get_peak_rss_in_bytes() -> int | None:
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in kilobytes on Linux, but in bytes on macOS
+    return peak_rss if os.uname().sysname == "Darwin" else peak_rss * 1024
@@ -0,0 +1,265 @@
+"""Conversion of a PumpProbe recording while it is still being acquired, appending its frames as they complete."""
+
+import io
+import math
+import os
+import pathlib
+import time
+
+import h5py
+import numpy
+import pandas
+import pydantic
+
+from ._frame_tables import get_frame_timestamps_and_depths
+from ._instrumentation import count, get_current_interface_name, measure_stage
+
+
+class GrowingPumpProbeRecording:
+    """
+    Follow the source files of a PumpProbe recording as they are written by the acquisition.
+
+    The raw frames ('sCMOS_Frames_U16_1024x512.dat'), their timestamps ('framesDetails.txt'), and the piezo positions
+    ('other-frameSynchronous.txt') are each appended to as frames are acquired, not necessarily at the same pace. A
+    frame is only complete once all three hold it, so the number of frames is the smallest of the three.
+
+    Only the lines of the tables appended since the last update are parsed, and only whole lines; a line still being
+    written is picked up by a later update.
+    """
+
+    def __init__(
+        self,
+        *,
+        pump_probe_folder_path: pydantic.DirectoryPath,
+        frame_shape: tuple[int, int] = (1024, 512),
+        dtype: numpy.dtype = numpy.dtype("uint16"),
+    ) -> None:
+        """
+        Parameters
+        ----------
+        pump_probe_folder_path : DirectoryPath
+            Path to the pumpprobe folder being written by the acquisition; any of its files may not exist yet.
+        frame_shape : tuple of two ints, default: (1024, 512)
+            The shape of each full frame of the raw binary file.
+        dtype : numpy.dtype, default: uint16
+            The data type of the raw binary file.
+        """
+        pump_probe_folder_path = pathlib.Path(pump_probe_folder_path)
+        self.dat_file_path = pump_probe_folder_path / "sCMOS_Frames_U16_1024x512.dat"
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = numpy.dtype(dtype)
+
+        self._sync_table = _GrowingTable(file_path=pump_probe_folder_path / "other-frameSynchronous.txt")
+        self._timestamps_table = _GrowingTable(file_path=pump_probe_folder_path / "framesDetails.txt")
+
+        self.number_of_frames = 0
+        self.timestamps = numpy.empty(shape=0, dtype="float64")
+        self.depth_per_frame_in_um = numpy.empty(shape=0, dtype="float64")
+
+        self._source_sizes = None
+        self._last_update_time = None
+        self.last_growth_time = time.monotonic()
+
+    @property
+    def frame_size_in_bytes(self) -> int:
+        return math.prod(self.frame_shape) * self.dtype.itemsize
+
+    def update(self, *, poll_interval_in_s: float = 0.0) -> int:
+        """
+        Pick up the frames completed since the last update, returning their number.
+
+        Waits until at least `poll_interval_in_s` seconds have passed since the last update, so that the files are not
+        checked more often than that, however many writers follow the recording.
+        """
+        if self._last_update_time is not None:
+            time.sleep(max(self._last_update_time + poll_interval_in_s - time.monotonic(), 0.0))
+        self._last_update_time = time.monotonic()
+
+        source_sizes = tuple(
+            _get_file_size(file_path=file_path)
+            for file_path in (self.dat_file_path, self._sync_table.file_path, self._timestamps_table.file_path)
+        )
+        if source_sizes == self._source_sizes:
+            return 0
+        self._source_sizes = source_sizes
+        self.last_growth_time = time.monotonic()
+
+        self._sync_table.update()
+        self._timestamps_table.update()
+        if self._sync_table.table.shape[0] == 0 or self._timestamps_table.table.shape[0] == 0:
+            return 0
+
+        timestamps, depth_per_frame_in_um = get_frame_timestamps_and_depths(
+            sync_table=self._sync_table.table, timestamps_table=self._timestamps_table.table
+        )
+        number_of_frames = min(
+            timestamps.shape[0], depth_per_frame_in_um.shape[0], source_sizes[0] // self.frame_size_in_bytes
+        )
+
+        number_of_new_frames = max(number_of_frames - self.number_of_frames, 0)
+        self.number_of_frames = max(number_of_frames, self.number_of_frames)
+        self.timestamps = timestamps[: self.number_of_frames]
+        self.depth_per_frame_in_um = depth_per_frame_in_um[: self.number_of_frames]
+
+        return number_of_new_frames
+
+    def get_idle_time_in_s(self) -> float:
+        """Get the time since any of the source files last grew, as of the last update."""
+        return time.monotonic() - self.last_growth_time
+
+    def read_frames(self, *, start: int, stop: int, frame_slicing: tuple[slice, slice]) -> numpy.ndarray:
+        """Read a range of complete frames, sliced within each frame (such as to a single channel)."""
+        # Mapped anew on each read, since the file grows after any earlier mapping
+        frames = numpy.memmap(
+            filename=self.dat_file_path, dtype=self.dtype, mode="r", shape=(self.number_of_frames, *self.frame_shape)
+        )
+        data = numpy.array(frames[(slice(start, stop), *frame_slicing)])
+        del frames
+
+        return data
+
+
+class LiveSeriesWriter:
+    """
+    Append the frames of a growing PumpProbe recording to the resizable datasets of a series in an HDF5 file.
+
+    The data, 'timestamps', and 'depth_per_frame_in_um' of the series are written empty along time with the file;
+    each time `batch_length` more frames are complete, they are appended to all three together and the file is
+    flushed. The file is written in single-writer multiple-reader (SWMR) mode (see `requires_swmr`), so it can be read
+    (such as by an analysis following the experiment) with every batch appended so far at any time, by opening it
+    with `h5py.File(..., mode="r", swmr=True)`.
+
+    The acquisition is taken to have ended once none of the source files grew for `end_of_acquisition_timeout_in_s`
+    seconds, at which point the remaining frames are appended and the writing finishes.
+    """
+
+    # Has `RandiNature2023Converter.run_conversion` write the file in SWMR mode, which it must be created for
+    requires_swmr = True
+
+    def __init__(
+        self,
+        *,
+        series_path: str,
+        recording: GrowingPumpProbeRecording,
+        channel_frame_slicing: tuple[slice, slice],
+        batch_length: int,
+        poll_interval_in_s: float = 10.0,
+        end_of_acquisition_timeout_in_s: float = 300.0,
+        maximum_number_of_frames: int | None = None,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        series_path : str
+            The location of the series within the HDF5 file, such as '/acquisition/PumpProbeImagingGreen'.
+        recording : GrowingPumpProbeRecording
+            The recording being acquired; shared by the writers of all its channels.
+        channel_frame_slicing : tuple of slices
+            The part of each frame that makes up the data of the series.
+        batch_length : int
+            The number of frames appended at once; a multiple of the length of the chunks of the data.
+        poll_interval_in_s : float, default: 10.0
+            How often to check for newly completed frames, in seconds.
+        end_of_acquisition_timeout_in_s : float, default: 300.0
+            How long the source files may go without growing before the acquisition is taken to have ended.
+        maximum_number_of_frames : int, optional
+            Stop after this many frames, such as for a stub test.
+        """
+        self.series_path = series_path.rstrip("/")
+        self.recording = recording
+        self.channel_frame_slicing = channel_frame_slicing
+        self.batch_length = batch_length
+        self.poll_interval_in_s = poll_interval_in_s
+        self.end_of_acquisition_timeout_in_s = end_of_acquisition_timeout_in_s
+        self.maximum_number_of_frames = maximum_number_of_frames
+
+        # Created within the `add_to_nwbfile` of an interface, but run after the file is written
+        self.interface_name = get_current_interface_name()
+
+    def write(self, *, file: h5py.File) -> None:
+        for _ in self.iter_write(file=file):
+            pass
+
+    def iter_write(self, *, file: h5py.File):
+        """Append the frames of each batch as they complete, yielding after each batch or check of the recording."""
+        data = file[f"{self.series_path}/data"]
+        timestamps = file[f"{self.series_path}/timestamps"]
+        depth_per_frame_in_um = file[f"{self.series_path}/depth_per_frame_in_um"]
+
+        number_of_written_frames = data.shape[0]
+        while True:
+            number_of_frames = self.recording.number_of_frames
+            if self.maximum_number_of_frames is not None:
+                number_of_frames = min(number_of_frames, self.maximum_number_of_frames)
+
+            number_of_pending_frames = number_of_frames - number_of_written_frames
+            acquisition_ended = (
+                self.recording.get_idle_time_in_s() >= self.end_of_acquisition_timeout_in_s
+                or number_of_frames == self.maximum_number_of_frames
+            )
+
+            if number_of_pending_frames >= self.batch_length or (acquisition_ended and number_of_pending_frames > 0):
+                start = number_of_written_frames
+                stop = start + min(number_of_pending_frames, self.batch_length)
+                with measure_stage(stage="live_append", interface_name=self.interface_name):
+                    batch_data = self.recording.read_frames(
+                        start=start, stop=stop, frame_slicing=self.channel_frame_slicing
+                    )
+                    for dataset, batch in (
+                        (data, batch_data),
+                        (timestamps, self.recording.timestamps[start:stop]),
+                        (depth_per_frame_in_um, self.recording.depth_per_frame_in_um[start:stop]),
+                    ):
+                        dataset.resize(size=stop, axis=0)
+                        dataset[start:stop] = batch
+
+                    # Makes the batch visible to the readers of the file
+                    file.flush()
+                    count(bytes_read=batch_data.nbytes)
+
+                number_of_written_frames = stop
+            elif acquisition_ended:
+                return
+            else:
+                self.recording.update(poll_interval_in_s=self.poll_interval_in_s)
+
+            yield
+
+
+class _GrowingTable:
+    """A tab-separated table with a header line, parsed a block of newly appended whole lines at a time."""
+
+    def __init__(self, *, file_path: pathlib.Path) -> None:
+        self.file_path = file_path
+        self.table = pandas.DataFrame()
+
+        self._header = None
+        self._number_of_parsed_bytes = 0
+
+    def update(self) -> None:
+        if not self.file_path.exists():
+            return
+
+        with open(file=self.file_path, mode="rb") as file:
+            file.seek(self._number_of_parsed_bytes)
+            new_bytes = file.read()
+        new_bytes = new_bytes[: new_bytes.rfind(b"\n") + 1]
+        if len(new_bytes) == 0:
+            return
+        self._number_of_parsed_bytes += len(new_bytes)
+
+        new_text = new_bytes.decode()
+        if self._header is None:
+            self._header, _, new_text = new_text.partition("\n")
+        if new_text.strip() == "":
+            return
+
+        new_rows = pandas.read_table(io.StringIO(f"{self._header}\n{new_text}"), index_col=False)
+        self.table = pandas.concat(objs=[self.table, new_rows], ignore_index=True)
+
+
+def _get_file_size(*, file_path: pathlib.Path) -> int:
+    try:
+        return os.stat(file_path).st_size
+    except FileNotFoundError:
+        return 0
@@ -0,0 +1,90 @@
+"""Sizing of the buffers of the imaging data so that a conversion stays within a given amount of memory."""
+
+import os
+import pathlib
+
+# The fraction of the memory available when a conversion starts that it may use for its buffers by default
+DEFAULT_MEMORY_BUDGET_FRACTION = 0.5
+
+# The fixed size of the buffers before they were derived from the available memory; used when that is unknown
+MAXIMUM_DEFAULT_MEMORY_BUDGET_IN_BYTES = 10e9
+
+
+def get_available_memory_in_bytes() -> int | None:
+    """
+    Get the memory that may still be used by this process without swapping, or None if it is not known.
+
+    This is the smaller of the memory available on the system (which excludes that of other running conversions) and
+    any memory limit left by the control group of the process, such as one set by a container or a batch scheduler.
+    """
+    available_memory_values = list()
+
+    try:
+        with open(file="/proc/meminfo", mode="r") as io:
+            memory_info = dict(line.split(":", maxsplit=1) for line in io.read().splitlines())
+        available_memory_values.append(int(memory_info["MemAvailable"].split()[0]) * 1024)  # Reported in kB
+    except (OSError, KeyError, ValueError):
+        if hasattr(os, "sysconf") and "SC_AVPHYS_PAGES" in os.sysconf_names:
+            available_memory_values.append(os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE"))
+
+    control_group_folder_path = pathlib.Path("/sys/fs/cgroup")
+    try:
+        memory_limit = (control_group_folder_path / "memory.max").read_text().strip()
+        if memory_limit != "max":
+            memory_usage = int((control_group_folder_path / "memory.current").read_text().strip())
+            available_memory_values.append(int(memory_limit) - memory_usage)
+    except (OSError, ValueError):
+        pass
+
+    if len(available_memory_values) == 0:
+        return None
+    return max(min(available_memory_values), 0)
+
+
+def get_default_memory_budget_in_bytes() -> int:
+    """
+    Get the memory a conversion may use for its buffers when no budget is specified.
+
+    This is `DEFAULT_MEMORY_BUDGET_FRACTION` of the memory available when the conversion starts, up to
+    `MAXIMUM_DEFAULT_MEMORY_BUDGET_IN_BYTES`.
+    """
+    available_memory = get_available_memory_in_bytes()
+    if available_memory is None:
+        return int(MAXIMUM_DEFAULT_MEMORY_BUDGET_IN_BYTES)
+
+    return int(min(available_memory * DEFAULT_MEMORY_BUDGET_FRACTION, MAXIMUM_DEFAULT_MEMORY_BUDGET_IN_BYTES))
+
+
+def fit_buffer_to_memory_budget(
+    *, memory_budget_in_bytes: float, bytes_per_item: int, chunk_length: int, number_of_items: int
+) -> tuple[int, int]:
+    """
+    Choose the lengths of the chunks and of the buffer along the first axis, such as time, within a memory budget.
+
+    The buffer is the largest whole number of chunks whose items fit within the budget. If not even a single chunk
+    fits, the chunks are shortened to the length of the buffer instead.
+
+    Parameters
+    ----------
+    memory_budget_in_bytes : float
+        The memory the buffer may take.
+    bytes_per_item : int
+        The memory taken by each item along the first axis, such as a frame, including any copies made of it while
+        it is written.
+    chunk_length : int
+        The preferred length of the chunks along the first axis.
+    number_of_items : int
+        The length of the data along the first axis.
+
+    Returns
+    -------
+    chunk_length : int
+        The length of the chunks, which is at most that requested.
+    buffer_length : int
+        The length of the buffer, which is a multiple of the `chunk_length` unless it covers all items.
+    """
+    maximum_buffer_length = max(int(memory_budget_in_bytes // bytes_per_item), 1)
+    chunk_length = max(min(chunk_length, maximum_buffer_length, number_of_items), 1)
+    buffer_length = max(maximum_buffer_length // chunk_length * chunk_length, chunk_length)
+
+    return chunk_length, min(buffer_length, number_of_items)
@@ -0,0 +1,122 @@
+"""Reading of the raw NeuroPAL volume in a way that can be shared across processes."""
+
+import math
+import pathlib
+from typing import Literal
+
+import numpy
+import pydantic
+
+from ._instrumentation import count, count_chunks_in_selection, get_current_interface_name, measure_stage
+from ._prefetching import PrefetchingDataChunkIterator
+from ._sequential_file_reader import DEFAULT_READ_SIZE_IN_BYTES, SequentialFileReader
+
+
+class NeuroPALVolumeDataChunkIterator(PrefetchingDataChunkIterator):
+    """
+    Iterate over the raw NeuroPAL volume stored as consecutive frames in the 'frames-2048x2048.dat' file.
+
+    Unlike a generic iterator over a memory map, this can be pickled (by reopening the file), which is required when
+    writing with multiple processes. The buffers may also be read ahead in the background; see
+    `PrefetchingDataChunkIterator`.
+    """
+
+    def __init__(
+        self,
+        *,
+        dat_file_path: pydantic.FilePath,
+        data_shape: tuple[int, int, int, int],
+        dtype: numpy.dtype,
+        number_of_depths: int | None = None,
+        read_method: Literal["memmap", "sequential"] = "memmap",
+        read_size_in_bytes: int = DEFAULT_READ_SIZE_IN_BYTES,
+        **kwargs,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        dat_file_path : FilePath
+            Path to the 'frames-2048x2048.dat' file.
+        data_shape : tuple of four ints
+            The shape of the full volume, as (depths, channels, x, y).
+            Any bytes in the file beyond this shape are ignored.
+        dtype : numpy.dtype
+            The data type of the frames.
+        number_of_depths : int, optional
+            Limit the iteration to the first depths of the volume, such as for stub tests.
+        read_method : "memmap" or "sequential", default: "memmap"
+            Whether to copy each buffer out of a memory map of the file, or to read it through a
+            `SequentialFileReader`, in long reads that are then dropped from the page cache.
+        read_size_in_bytes : int, default: 64 MiB
+            The size of each read from the file with the "sequential" `read_method`.
+        """
+        self.dat_file_path = pathlib.Path(dat_file_path)
+        self.data_shape = tuple(data_shape)
+        self.number_of_depths = number_of_depths if number_of_depths is not None else data_shape[0]
+
+        self.memory_map = numpy.memmap(filename=self.dat_file_path, dtype=dtype, mode="r", shape=self.data_shape)
+
+        if read_method not in ("memmap", "sequential"):
+            message = f"Unknown `read_method` '{read_method}'! Please choose either 'memmap' or 'sequential'."
+            raise ValueError(message)
+        self.read_method = read_method
+        self.read_size_in_bytes = read_size_in_bytes
+
+        # The buffers of the prefetched reads and of the chunks still being written may be in use at once
+        self.sequential_file_reader = None
+        if read_method == "sequential":
+            self.sequential_file_reader = SequentialFileReader(
+                file_path=self.dat_file_path,
+                read_size_in_bytes=read_size_in_bytes,
+                maximum_pooled_buffers=kwargs.get("number_of_prefetched_buffers", 0) + 3,
+            )
+
+        # The chunks are usually iterated once the file is written, outside of the `add_to_nwbfile` of the interface
+        self.interface_name = get_current_interface_name()
+
+        super().__init__(**kwargs)
+
+    def _to_dict(self) -> dict:
+        return dict(
+            dat_file_path=str(self.dat_file_path),
+            data_shape=self.data_shape,
+            dtype=self.memory_map.dtype.str,
+            number_of_depths=self.number_of_depths,
+            read_method=self.read_method,
+            read_size_in_bytes=self.read_size_in_bytes,
+            chunk_shape=self.chunk_shape,
+            buffer_shape=self.buffer_shape,
+        )
+
+    @classmethod
+    def _from_dict(cls, dictionary: dict) -> "NeuroPALVolumeDataChunkIterator":
+        return cls(**dictionary, display_progress=False)
+
+    def _get_data(self, selection: tuple[slice, slice, slice, slice]) -> numpy.ndarray:
+        with measure_stage(stage="chunk_iteration", interface_name=self.interface_name):
+            data = self._read(selection=selection)
+            count(
+                bytes_read=data.nbytes,
+                number_of_chunks=count_chunks_in_selection(selection=selection, chunk_shape=self.chunk_shape),
+            )
+
+        return data
+
+    def _read(self, *, selection: tuple[slice, slice, slice, slice]) -> numpy.ndarray:
+        if self.sequential_file_reader is None:
+            return numpy.array(self.memory_map[selection])
+
+        # The depths are stored one after the other, so the full depths of the selection are a single range
+        depth_size_in_bytes = math.prod(self.data_shape[1:]) * self.memory_map.dtype.itemsize
+        depths = self.sequential_file_reader.read(
+            offset=selection[0].start * depth_size_in_bytes,
+            shape=(selection[0].stop - selection[0].start, *self.data_shape[1:]),
+            dtype=self.memory_map.dtype,
+        )
+        return depths[(slice(None), *selection[1:])]
+
+    def _get_maxshape(self) -> tuple[int, int, int, int]:
+        return (self.number_of_depths, *self.data_shape[1:])
+
+    def _get_dtype(self) -> numpy.dtype:
+        return self.memory_map.dtype
@@ -1,5 +1,5 @@
-import json
 import pathlib
+from typing import Literal
 
 import ndx_microscopy
 import neuroconv
@@ -7,6 +7,14 @@ import numpy
 import pydantic
 import pynwb
 
+from ._compression import CompressionMethod
+from ._dataset_io import configure_dataset_io
+from ._memory_budget import fit_buffer_to_memory_budget, get_default_memory_budget_in_bytes
+from ._neuropal_frame_reader import NeuroPALVolumeDataChunkIterator
+from ._sequential_file_reader import DEFAULT_READ_SIZE_IN_BYTES
+from ._session_context import get_session_context
+from ._source_checks import check_neuropal_brains, check_neuropal_volume, raise_for_issues
+
 
 class NeuroPALImagingInterface(neuroconv.basedatainterface.BaseDataInterface):
     """Custom interface for automatically setting metadata and conversion options for this experiment."""
@@ -21,6 +29,7 @@ class NeuroPALImagingInterface(neuroconv.basedatainterface.BaseDataInterface):
             Path to the multicolor folder.
         """
         super().__init__(multicolor_folder_path=multicolor_folder_path)
+        self.session_context = get_session_context()
         multicolor_folder_path = pathlib.Path(multicolor_folder_path)
 
         # If the device setup is ever changed, these may need to be exposed as keyword arguments
@@ -29,9 +38,27 @@ class NeuroPALImagingInterface(neuroconv.basedatainterface.BaseDataInterface):
         number_of_channels = 4
         number_of_depths = 26
 
+        brains_file_path = multicolor_folder_path / "brains.json"
+        self.brains_info = self.session_context.load_json(file_path=brains_file_path)
+
+        # Some basic homogeneity checks, also for imaging compatibility; shared with `preflight_dataset`
+        dat_file_path = multicolor_folder_path / "frames-2048x2048.dat"
+        volume_size_in_bytes = number_of_channels * number_of_depths * frame_shape[0] * frame_shape[1] * dtype.itemsize
+        raise_for_issues(
+            issues=[
+                *check_neuropal_brains(brains_info=self.brains_info),
+                *check_neuropal_volume(
+                    brains_info=self.brains_info,
+                    number_of_depths=number_of_depths,
+                    dat_file_size_in_bytes=dat_file_path.stat().st_size,
+                    volume_size_in_bytes=volume_size_in_bytes,
+                ),
+            ]
+        )
+
         # This file always has a few bytes on the end that make it not automatically reshapable as expected
         # No clue where it comes from but they ignore those bytes even in their own processing code
-        dat_file_path = multicolor_folder_path / "frames-2048x2048.dat"
+        self.dat_file_path = dat_file_path
         unshaped_data = numpy.memmap(filename=dat_file_path, dtype=dtype, mode="r")
         clipped_data = unshaped_data[: number_of_channels * number_of_depths * frame_shape[0] * frame_shape[1]]
 
@@ -41,30 +68,6 @@ class NeuroPALImagingInterface(neuroconv.basedatainterface.BaseDataInterface):
 
         self.data = shaped_data
 
-        brains_file_path = multicolor_folder_path / "brains.json"
-        with open(brains_file_path, "r") as io:
-            self.brains_info = json.load(fp=io)
-
-        # Some basic homogeneity checks
-        assert len(self.brains_info["nInVolume"]) == 1, "Only one labeling is supported."
-        assert (
-            len(self.brains_info["nInVolume"]) == len(self.brains_info["zOfFrame"])
-            and len(self.brains_info["zOfFrame"]) == len(self.brains_info["labels"])
-            and len(self.brains_info["labels"]) == len(self.brains_info["labels_confidences"])
-            and len(self.brains_info["labels_confidences"]) == len(self.brains_info["labels_comments"])
-        ), "Mismatch in JSON substructure lengths."
-        assert (
-            self.brains_info["nInVolume"][0] == len(self.brains_info["labels"][0])
-            and self.brains_info["nInVolume"][0] == len(self.brains_info["labels_confidences"][0])
-            and self.brains_info["nInVolume"][0] == len(self.brains_info["labels_comments"][0])
-        ), "Length of contents does not match number of ROIs."
-
-        # Additional homogeneity check for imaging compatibility
-        json_depth_length = len(self.brains_info["zOfFrame"][0])
-        assert (
-            json_depth_length == number_of_depths
-        ), f"Mismatch between length of 'zOfFrame' ({json_depth_length}) and number of depths ({number_of_depths})."
-
     def add_to_nwbfile(
         self,
         *,
@@ -72,7 +75,77 @@ class NeuroPALImagingInterface(neuroconv.basedatainterface.BaseDataInterface):
         metadata: dict | None = None,
         stub_test: bool = False,
         stub_depths: int = 3,
+        backend: Literal["hdf5", "zarr"] = "hdf5",
+        compression: CompressionMethod = "gzip",
+        compression_options: dict | None = None,
+        number_of_compression_workers: int | None = None,
+        compression_executor: Literal["thread", "process"] = "thread",
+        memory_budget_in_bytes: int | None = None,
+        number_of_prefetched_buffers: int = 1,
+        read_method: Literal["memmap", "sequential"] = "memmap",
+        read_size_in_bytes: int = DEFAULT_READ_SIZE_IN_BYTES,
+        storage_mode: Literal["copy", "reference", "sharded"] = "copy",
+        number_of_shards: int | None = None,
+        resumable: bool = False,
     ) -> None:
+        """
+        Add the NeuroPAL volume to the NWB file.
+
+        Parameters
+        ----------
+        nwbfile : pynwb.NWBFile
+            The in-memory NWB file to add the data to.
+        metadata : dict, optional
+            Unused; kept for consistency with other interfaces.
+        stub_test : bool, default: False
+            Whether to only write the first `stub_depths` depths.
+        stub_depths : int, default: 3
+            The number of depths to write when `stub_test` is True.
+        backend : "hdf5" or "zarr", default: "hdf5"
+            The backend the NWB file will be written with; set automatically by `RandiNature2023Converter`.
+        compression : str, default: "gzip"
+            The compression method; one of "gzip", "lzf", "blosc", "zstd", "lz4", or "bitshuffle".
+            With HDF5, all but "gzip" and "lzf" require the `hdf5plugin` package, for both writing and reading.
+        compression_options : dict, optional
+            Options specific to the compression method, such as {"cname": "zstd", "clevel": 5, "shuffle": "bit"} for
+            "blosc" or {"level": 4} for "gzip".
+        number_of_compression_workers : int, optional
+            If specified, chunks are compressed by this many workers in parallel and written directly to the file
+            once it has been created, instead of being compressed serially by HDF5.
+            This mode is only available when writing through `RandiNature2023Converter.run_conversion`.
+        compression_executor : "thread" or "process", default: "thread"
+            The type of pool used when `number_of_compression_workers` is specified.
+        memory_budget_in_bytes : int, optional
+            The memory the buffer of the volume may take; the buffer holds as many depths as fit. Set automatically
+            by `RandiNature2023Converter` from its `memory_budget_in_gb`.
+            The default is `get_default_memory_budget_in_bytes`.
+        number_of_prefetched_buffers : int, default: 1
+            The number of buffers read from the source in the background while the previous ones are compressed and
+            written; see `PrefetchingDataChunkIterator`. These count towards the `memory_budget_in_bytes`.
+            If 0, reading, compressing, and writing take turns.
+        read_method : "memmap" or "sequential", default: "memmap"
+            How the raw frames are read from the '.dat' file. "memmap" copies them out of a memory map, leaving the
+            reading ahead and caching to the operating system. "sequential" reads them in long reads of
+            `read_size_in_bytes` into reusable aligned buffers, hinting the operating system to read ahead and to
+            drop them from the page cache once read; see `SequentialFileReader`. The latter is usually faster over
+            network mounts, and does not evict the cached files of other users of shared nodes.
+        read_size_in_bytes : int, default: 64 MiB
+            The size of each read with the "sequential" `read_method`.
+        storage_mode : "copy", "reference", or "sharded", default: "copy"
+            Whether to copy the raw frames into the NWB file, or to have the dataset refer to them in the '.dat' file
+            through HDF5 external storage, without copying or compressing them; see `ExternalReferenceDatasetWriter`.
+            The latter makes small "index" files written in moments, for internal analysis only: they can only be
+            read alongside the original '.dat' file and their '.external.h5' file, and only with the HDF5 backend.
+            "sharded" compresses the frames into shard files along depth, written in parallel processes into a
+            '.shards' folder next to the NWB file, whose dataset stitches them together; see `ShardedDatasetWriter`.
+            The file can then only be read alongside that folder, and only with the HDF5 backend.
+        number_of_shards : int, optional
+            The number of shard files with the "sharded" `storage_mode`; the default is the number of CPUs.
+        resumable : bool, default: False
+            Whether to write the data so that an interrupted conversion can continue where it stopped, through a
+            `DirectChunkDatasetWriter` that commits each buffer to a checkpoint. Set automatically by
+            `RandiNature2023Converter.run_conversion` when resuming is requested; only with the "copy" `storage_mode`.
+        """
         if "Microscope" not in nwbfile.devices:
             microscope = ndx_microscopy.Microscope(name="Microscope")
             nwbfile.add_device(devices=microscope)
@@ -124,17 +197,60 @@ class NeuroPALImagingInterface(neuroconv.basedatainterface.BaseDataInterface):
             data=optical_channels,
         )
 
-        # Not exposing chunking/buffering control here for simplicity; note that a single frame is about 8 MB
+        # Not exposing chunking control here for simplicity; note that a single frame is about 8 MB
         chunk_shape = (1, 1, self.data_shape[-2], self.data_shape[-1])
 
         # Best we can do is limit the number of depths that are written by stub
-        imaging_data = self.data if not stub_test else self.data[:stub_depths, :, :, :]
-        data_iterator = neuroconv.tools.hdmf.SliceableDataChunkIterator(data=imaging_data, chunk_shape=chunk_shape)
-        data_iterator = pynwb.H5DataIO(data_iterator, compression="gzip")
+        number_of_depths = self.data_shape[0] if not stub_test else stub_depths
+
+        # Each depth of the buffer may be held twice: once read, and by the chunks of the previous buffer that are
+        # still being compressed or written; plus once more for each prefetched buffer
+        memory_budget_in_bytes = memory_budget_in_bytes or get_default_memory_budget_in_bytes()
+        depth_size_in_bytes = int(numpy.prod(self.data_shape[1:])) * self.data.dtype.itemsize
+        _, buffer_depths = fit_buffer_to_memory_budget(
+            memory_budget_in_bytes=memory_budget_in_bytes,
+            bytes_per_item=(2 + number_of_prefetched_buffers) * depth_size_in_bytes,
+            chunk_length=chunk_shape[0],
+            number_of_items=number_of_depths,
+        )
+        buffer_shape = (buffer_depths, *self.data_shape[1:])
+
+        volume_data_iterator = NeuroPALVolumeDataChunkIterator(
+            dat_file_path=self.dat_file_path,
+            data_shape=self.data_shape,
+            dtype=self.data.dtype,
+            number_of_depths=number_of_depths,
+            chunk_shape=chunk_shape,
+            buffer_shape=buffer_shape,
+            number_of_prefetched_buffers=number_of_prefetched_buffers,
+            read_method=read_method,
+            read_size_in_bytes=read_size_in_bytes,
+        )
 
         source_depths = self.brains_info["zOfFrame"][0]
         depth_per_frame_in_um = source_depths if not stub_test else source_depths[:stub_depths]
 
+        data_iterator, self.deferred_dataset_writers = configure_dataset_io(
+            data_iterator=volume_data_iterator,
+            dataset_path="/acquisition/NeuroPALImaging/data",
+            backend=backend,
+            compression=compression,
+            compression_options=compression_options,
+            number_of_compression_workers=number_of_compression_workers,
+            compression_executor=compression_executor,
+            storage_mode=storage_mode,
+            raw_source=dict(
+                dat_file_path=self.dat_file_path,
+                source_shape=self.data_shape,
+                dtype=self.data.dtype,
+                selection=(slice(0, number_of_depths), slice(None), slice(None), slice(None)),
+            ),
+            number_of_shards=number_of_shards,
+            resumable=resumable,
+            shard_datasets=dict(depth_per_frame_in_um=depth_per_frame_in_um),
+            sharded_write_group=self.session_context.get_sharded_write_group(),
+        )
+
         light_sources_used_by_volume = pynwb.base.VectorData(
             name="light_sources", description="Light sources used by this MultiChannelVolume.", data=light_sources
         )
@@ -1,12 +1,20 @@
-import json
 import pathlib
 
 import ndx_microscopy
 import neuroconv
+import numpy
 import pydantic
 import pynwb
 
-from ._box_utils import _calculate_voxel_mask
+from ._box_utils import _calculate_voxel_masks
+from ._session_context import get_session_context
+from ._source_checks import (
+    check_box_shape,
+    check_neuropal_brains,
+    check_neuropal_coordinates,
+    load_box_shape_mapping,
+    raise_for_issues,
+)
 
 
 class NeuroPALSegmentationInterface(neuroconv.basedatainterface.BaseDataInterface):
@@ -21,30 +29,21 @@ class NeuroPALSegmentationInterface(neuroconv.basedatainterface.BaseDataInterfac
             Path to the multicolor folder.
         """
         super().__init__(multicolor_folder_path=multicolor_folder_path)
+        self.session_context = get_session_context()
         multicolor_folder_path = pathlib.Path(multicolor_folder_path)
 
         brains_file_path = multicolor_folder_path / "brains.json"
-        with open(brains_file_path, "r") as io:
-            self.brains_info = json.load(fp=io)
-
-        # Some basic homogeneity checks
-        assert len(self.brains_info["nInVolume"]) == 1, "Only one labeling is supported."
-        assert (
-            len(self.brains_info["nInVolume"]) == len(self.brains_info["zOfFrame"])
-            and len(self.brains_info["zOfFrame"]) == len(self.brains_info["labels"])
-            and len(self.brains_info["labels"]) == len(self.brains_info["labels_confidences"])
-            and len(self.brains_info["labels_confidences"]) == len(self.brains_info["labels_comments"])
-        ), "Mismatch in JSON substructure lengths."
-        assert (
-            self.brains_info["nInVolume"][0] == len(self.brains_info["labels"][0])
-            and self.brains_info["nInVolume"][0] == len(self.brains_info["labels_confidences"][0])
-            and self.brains_info["nInVolume"][0] == len(self.brains_info["labels_comments"][0])
-        ), "Length of contents does not match number of ROIs."
-
-        # Load the local box shape mapping
-        box_shape_file_path = pathlib.Path(__file__).parent.parent / "session_to_box_shape.json"
-        with open(file=box_shape_file_path, mode="r") as io:
-            box_shape_mapping = json.load(fp=io)
+        self.brains_info = self.session_context.load_json(file_path=brains_file_path)
+
+        # Some basic homogeneity checks, shared with `preflight_dataset`
+        box_shape_mapping = load_box_shape_mapping()
+        raise_for_issues(
+            issues=[
+                *check_neuropal_brains(brains_info=self.brains_info),
+                *check_neuropal_coordinates(brains_info=self.brains_info),
+                *check_box_shape(box_shape_mapping=box_shape_mapping, folder_name=multicolor_folder_path.name),
+            ]
+        )
         self.box_shape = box_shape_mapping[multicolor_folder_path.name]
 
     def add_to_nwbfile(
@@ -68,44 +67,50 @@ class NeuroPALSegmentationInterface(neuroconv.basedatainterface.BaseDataInterfac
         else:
             imaging_space = nwbfile.lab_meta_data["NeuroPALImagingSpace"]
 
+        number_of_rois = self.brains_info["nInVolume"][0]
+        centroids_zyx = numpy.asarray(self.brains_info["coordZYX"][:number_of_rois])
+        voxel_masks, voxel_mask_index = _calculate_voxel_masks(
+            centroids_zyx=centroids_zyx, box_shape=tuple(self.box_shape), method="box"
+        )
+
+        voxel_mask_column = pynwb.core.VectorData(
+            name="voxel_mask",
+            description=(
+                "Voxel masks for each ROI: a list of indices and weights for the ROI. "
+                "Voxel masks are concatenated and parallel to this table via an index."
+            ),
+            data=voxel_masks,
+        )
+        columns = [
+            voxel_mask_column,
+            pynwb.core.VectorIndex(name="voxel_mask_index", data=voxel_mask_index, target=voxel_mask_column),
+            pynwb.core.VectorData(
+                name="centroids", description="The centroids of each ROI.", data=centroids_zyx[:, ::-1]
+            ),
+            pynwb.core.VectorData(
+                name="labels",
+                description="The C. elegans cell names labeled from the NeuroPAL imaging.",
+                data=list(self.brains_info["labels"][0][:number_of_rois]),
+            ),
+            pynwb.core.VectorData(
+                name="labels_confidences",
+                description="The C. elegans cell names labeled from the NeuroPAL imaging.",
+                data=list(self.brains_info["labels_confidences"][0][:number_of_rois]),
+            ),
+            pynwb.core.VectorData(
+                name="labels_comments",
+                description="Various comments about the cell label classification process.",
+                data=list(self.brains_info["labels_comments"][0][:number_of_rois]),
+            ),
+        ]
+
         plane_segmentation = ndx_microscopy.MicroscopyPlaneSegmentation(
             name="NeuroPALPlaneSegmentation",
             description="The NeuroPAL segmentation of the C. elegans brain with cell labels.",
             imaging_space=imaging_space,
+            id=list(range(number_of_rois)),
+            columns=columns,
         )
-        plane_segmentation.add_column(name="centroids", description="The centroids of each ROI.")
-        plane_segmentation.add_column(
-            name="labels",
-            description="The C. elegans cell names labeled from the NeuroPAL imaging.",
-        )
-        plane_segmentation.add_column(
-            name="labels_confidences",
-            description="The C. elegans cell names labeled from the NeuroPAL imaging.",
-        )
-        plane_segmentation.add_column(
-            name="labels_comments",
-            description="Various comments about the cell label classification process.",
-        )
-
-        number_of_rois = self.brains_info["nInVolume"][0]
-        for neuropal_roi_id in range(number_of_rois):
-            centroid_info = self.brains_info["coordZYX"][neuropal_roi_id]
-            centroid = (centroid_info[2], centroid_info[1], centroid_info[0])
-
-            if tuple(self.box_shape) not in ((1, 3, 3), (3, 5, 5), (5, 5, 5)):
-                message = f"Box shape {self.box_shape} has not been implemented."
-                raise NotImplementedError(message)
-
-            voxel_mask = _calculate_voxel_mask(centroid_zyx=centroid_info, box_shape=self.box_shape, method="box")
-
-            plane_segmentation.add_row(
-                id=neuropal_roi_id,
-                voxel_mask=voxel_mask,
-                centroids=centroid,
-                labels=self.brains_info["labels"][0][neuropal_roi_id],
-                labels_confidences=self.brains_info["labels_confidences"][0][neuropal_roi_id],
-                labels_comments=self.brains_info["labels_comments"][0][neuropal_roi_id],
-            )
 
         image_segmentation = ndx_microscopy.MicroscopySegmentations(
             name="NeuroPALSegmentations", microscopy_plane_segmentations=[plane_segmentation]
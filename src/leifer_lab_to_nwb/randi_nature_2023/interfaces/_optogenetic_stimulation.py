@@ -4,10 +4,12 @@ from typing import Union
 import ndx_patterned_ogen
 import neuroconv
 import numpy
-import pandas
 import pydantic
 import pynwb
 
+from ._session_context import get_session_context
+from ._source_checks import check_optogenetic_stimulation, raise_for_issues
+
 
 class OptogeneticStimulationInterface(neuroconv.BaseDataInterface):
 
@@ -20,21 +22,29 @@ class OptogeneticStimulationInterface(neuroconv.BaseDataInterface):
         pump_probe_folder_path : DirectoryPath
             Path to the raw pumpprobe folder.
         """
+        self.session_context = get_session_context()
+
         pump_probe_folder_path = pathlib.Path(pump_probe_folder_path)
 
         optogenetic_stimulus_file_path = pump_probe_folder_path / "pharosTriggers.txt"
-        self.optogenetic_stimulus_table = pandas.read_table(
-            filepath_or_buffer=optogenetic_stimulus_file_path, index_col=False
-        )
+        self.optogenetic_stimulus_table = self.session_context.read_table(file_path=optogenetic_stimulus_file_path)
 
         timestamps_file_path = pump_probe_folder_path / "framesDetails.txt"
-        self.timestamps_table = pandas.read_table(filepath_or_buffer=timestamps_file_path, index_col=False)
+        self.timestamps_table = self.session_context.read_table(file_path=timestamps_file_path)
         self.timestamps = numpy.array(self.timestamps_table["Timestamp"])
 
         target_pumpprobe_ids_file_path = pump_probe_folder_path / "targets_manually_located.txt"
-        self.target_pumpprobe_ids = pandas.read_table(
-            filepath_or_buffer=target_pumpprobe_ids_file_path, header=0, index_col=False
-        ).to_numpy()[:, 0]
+        target_pumpprobe_ids_table = self.session_context.read_table(file_path=target_pumpprobe_ids_file_path)
+        self.target_pumpprobe_ids = target_pumpprobe_ids_table.to_numpy()[:, 0]
+
+        # The same checks as `preflight_dataset`, such as that each stimulus has its own manually located target
+        raise_for_issues(
+            issues=check_optogenetic_stimulation(
+                stimulus_table=self.optogenetic_stimulus_table,
+                timestamps_table=self.timestamps_table,
+                target_ids_table=target_pumpprobe_ids_table,
+            )
+        )
 
     def add_to_nwbfile(
         self,
@@ -118,20 +128,40 @@ class OptogeneticStimulationInterface(neuroconv.BaseDataInterface):
             device=ogen_device,
             optical_channel=optical_channel,
         )
+
+        # One single-voxel target per stimulus, all built at once from their columns
+        number_of_stimuli = self.optogenetic_stimulus_table.shape[0]
+        pixel_masks = numpy.empty(
+            shape=number_of_stimuli, dtype=[("x", "uint32"), ("y", "uint32"), ("weight", "float32")]
+        )
+        pixel_masks["x"] = self.optogenetic_stimulus_table["optogTargetX"].to_numpy().astype("uint32")
+        pixel_masks["y"] = self.optogenetic_stimulus_table["optogTargetY"].to_numpy().astype("uint32")
+        pixel_masks["weight"] = 1.0
+
+        pixel_mask_column = pynwb.core.VectorData(
+            name="pixel_mask",
+            description="Pixel masks for each ROI: a list of indices and weights for the ROI.",
+            data=pixel_masks,
+        )
         targeted_plane_segmentation = pynwb.ophys.PlaneSegmentation(
             name="TargetPlaneSegmentation",
             description="Table for storing the target centroids, defined by a one-voxel mask.",
             imaging_plane=imaging_plane,
+            id=list(range(number_of_stimuli)),
+            columns=[
+                pixel_mask_column,
+                pynwb.core.VectorIndex(
+                    name="pixel_mask_index",
+                    data=numpy.arange(1, number_of_stimuli + 1, dtype="int64"),
+                    target=pixel_mask_column,
+                ),
+                pynwb.core.VectorData(
+                    name="depth_in_um",
+                    description="Targeted depth in micrometers.",
+                    data=self.optogenetic_stimulus_table["optogTargetZ"].to_numpy(),
+                ),
+            ],
         )
-        targeted_plane_segmentation.add_column(name="depth_in_um", description="Targeted depth in micrometers.")
-        for target_x_index, target_y_index, depth_in_um in zip(
-            self.optogenetic_stimulus_table["optogTargetX"],
-            self.optogenetic_stimulus_table["optogTargetY"],
-            self.optogenetic_stimulus_table["optogTargetZ"],
-        ):
-            targeted_plane_segmentation.add_roi(
-                pixel_mask=[(int(target_x_index), int(target_y_index), 1.0)], depth_in_um=depth_in_um
-            )
 
         image_segmentation = pynwb.ophys.ImageSegmentation(name="TargetedImageSegmentation")
         image_segmentation.add_plane_segmentation(targeted_plane_segmentation)
@@ -143,8 +173,68 @@ class OptogeneticStimulationInterface(neuroconv.BaseDataInterface):
         # TODO: may have to adjust this for unc-31 mutant strain subjects
         stimulus_duration_in_s = 500.0 / 1e3
         stimulus_start_times_in_s = self.timestamps[
-            self.optogenetic_stimulus_table["frameCount"] - self.timestamps_table["frameCount"][0]
+            numpy.array(self.optogenetic_stimulus_table["frameCount"] - self.timestamps_table["frameCount"][0])
         ]
+
+        # The 'targets' of the table reference an `OptogeneticStimulusTarget`, not the rows of an ROI table, so a single
+        # target covers all targeted ROIs; the ROI of each stimulus is in the 'targeted_roi' column
+        stimulus_target = ndx_patterned_ogen.OptogeneticStimulusTarget(
+            name="OptogeneticStimulusTarget",
+            targeted_rois=targeted_plane_segmentation.create_roi_table_region(
+                name="targeted_rois", description="All targeted ROIs.", region=list(range(number_of_stimuli))
+            ),
+        )
+        nwbfile.add_lab_meta_data(stimulus_target)
+
+        # Cast to NaN to indicate not manually located or failed targeting
+        target_pumpprobe_ids = self.target_pumpprobe_ids.astype("float64")
+        target_pumpprobe_ids[target_pumpprobe_ids <= 0] = numpy.nan
+
+        columns = [
+            pynwb.core.VectorData(
+                name="start_time", description="Start time of epoch, in seconds.", data=stimulus_start_times_in_s
+            ),
+            pynwb.core.VectorData(
+                name="stop_time",
+                description="Stop time of epoch, in seconds.",
+                data=stimulus_start_times_in_s + stimulus_duration_in_s,
+            ),
+            pynwb.core.VectorData(
+                name="targets",
+                description="Targeted ROIs for the optogenetic stimulus.",
+                data=[stimulus_target] * number_of_stimuli,
+            ),
+            pynwb.core.VectorData(
+                name="stimulus_pattern",
+                description="The pattern of the optogenetic stimulus.",
+                data=[temporal_focusing] * number_of_stimuli,
+            ),
+            pynwb.core.VectorData(
+                name="stimulus_site",
+                description="The site of the optogenetic stimulus.",
+                data=[site] * number_of_stimuli,
+            ),
+            pynwb.core.VectorData(
+                name="power",
+                description="Power (in Watts) defined as a constant value for the stimulus.",
+                data=numpy.full(shape=number_of_stimuli, fill_value=1.2 / 1e3),  # Hardcoded from the paper
+            ),
+            pynwb.core.DynamicTableRegion(
+                name="targeted_roi",
+                description="The ROI of the 'TargetPlaneSegmentation' that was targeted by each stimulus.",
+                data=list(range(number_of_stimuli)),
+                table=targeted_plane_segmentation,
+            ),
+            pynwb.core.VectorData(
+                name="target_pumpprobe_id",
+                description=(
+                    "Manually targeted ID in the PumpProbe space. "
+                    "Values are upcast to float to allow NaN; cast back to int to lookup correspond NeuroPAL label."
+                ),
+                data=target_pumpprobe_ids,
+            ),
+        ]
+
         stimulus_table = ndx_patterned_ogen.PatternedOptogeneticStimulusTable(
             name="OptogeneticStimulusTable",
             description=(
@@ -158,38 +248,7 @@ class OptogeneticStimulationInterface(neuroconv.BaseDataInterface):
                 "built-in pulse picker, and the power of the laser at the sample was 1.2mW at 500kHz. Neuron "
                 "identities were assigned to stimulated neurons after the completion of experiments using NeuroPAL."
             ),
+            id=list(range(number_of_stimuli)),
+            columns=columns,
         )
-
-        stimulus_table.add_column(
-            name="target_pumpprobe_id",
-            description=(
-                "Manually targeted ID in the PumpProbe space. "
-                "Values are upcast to float to allow NaN; cast back to int to lookup correspond NeuroPAL label."
-            ),
-        )
-
-        for index, start_time_in_s in enumerate(stimulus_start_times_in_s):
-            targeted_roi_reference = targeted_plane_segmentation.create_roi_table_region(
-                name="targeted_rois", description="The targeted ROI.", region=[index]
-            )
-            # TODO: create a container of targets so they don't all get dumped to outer level of general
-            stimulus_target = ndx_patterned_ogen.OptogeneticStimulusTarget(
-                name=f"OptogeneticStimulusTarget{index}", targeted_rois=targeted_roi_reference
-            )
-            nwbfile.add_lab_meta_data(stimulus_target)
-
-            # Cast to NaN to indicate not manually located or failed targeting
-            target_pumpprobe_id = (
-                float(self.target_pumpprobe_ids[index]) if self.target_pumpprobe_ids[index] > 0 else numpy.nan
-            )
-
-            stimulus_table.add_interval(
-                start_time=start_time_in_s,
-                stop_time=start_time_in_s + stimulus_duration_in_s,
-                targets=stimulus_target,
-                stimulus_pattern=temporal_focusing,
-                stimulus_site=site,
-                power=1.2 / 1e3,  # Hardcoded from the paper; TODO: should be 'power_in_W'
-                target_pumpprobe_id=target_pumpprobe_id,
-            )
         nwbfile.add_time_intervals(stimulus_table)
@@ -0,0 +1,98 @@
+"""Reading of the next buffers of a data chunk iterator in the background, while the current one is written."""
+
+import contextvars
+import queue
+import threading
+
+from hdmf.data_utils import DataChunk, GenericDataChunkIterator
+
+# Marks the end of the buffers in the queue of a prefetching iterator
+_END_OF_BUFFERS = object()
+
+
+class PrefetchingDataChunkIterator(GenericDataChunkIterator):
+    """
+    A data chunk iterator that reads its next buffers on a background thread, ahead of when they are requested.
+
+    The reading of the source (through `_get_data`) then overlaps with the compression and writing of the previous
+    buffers, whether those are done by HDF5 or by a `DirectChunkDatasetWriter`, so that the throughput approaches
+    that of the slowest of these stages rather than that of all of them in turn.
+
+    At most `number_of_prefetched_buffers` buffers are held in a bounded queue, in addition to the one being written.
+    Any error raised while reading is raised again by the iteration, in the order of the buffers.
+
+    Subclasses implement `_get_data` as for any `GenericDataChunkIterator`; it is called from the background thread,
+    so anything it shares with other iterators must be thread-safe.
+    """
+
+    def __init__(self, *, number_of_prefetched_buffers: int = 0, **kwargs) -> None:
+        """
+        Parameters
+        ----------
+        number_of_prefetched_buffers : int, default: 0
+            The number of buffers read ahead of the one being written. If 0, each buffer is read when requested.
+        **kwargs
+            The keyword arguments of `GenericDataChunkIterator`, such as `chunk_shape` and `buffer_shape`.
+        """
+        self.number_of_prefetched_buffers = number_of_prefetched_buffers
+
+        self._prefetched_buffers = None
+        self._stop_prefetching = threading.Event()
+
+        super().__init__(**kwargs)
+
+    def __next__(self) -> DataChunk:
+        if self.number_of_prefetched_buffers == 0:
+            return super().__next__()
+
+        if self._prefetched_buffers is None:
+            self._start_prefetching()
+
+        prefetched_buffer = self._prefetched_buffers.get()
+        if prefetched_buffer is _END_OF_BUFFERS:
+            self._prefetched_buffers.put(_END_OF_BUFFERS)  # Any further request also ends the iteration
+            if self.display_progress:
+                self.progress_bar.write("\n")  # Allows text to be written to new lines after completion
+            raise StopIteration
+        if isinstance(prefetched_buffer, BaseException):
+            raise prefetched_buffer
+
+        if self.display_progress:
+            self.progress_bar.update(n=1)
+        return prefetched_buffer
+
+    def stop_prefetching(self) -> None:
+        """Stop reading ahead, such as when the iteration is abandoned; the buffers already read are discarded."""
+        self._stop_prefetching.set()
+
+    def _start_prefetching(self) -> None:
+        self._prefetched_buffers = queue.Queue(maxsize=self.number_of_prefetched_buffers)
+
+        # The reading is measured as a stage of the conversion of this thread, if any
+        context = contextvars.copy_context()
+        thread = threading.Thread(
+            target=context.run, args=(self._prefetch,), name=f"prefetch_{type(self).__name__}", daemon=True
+        )
+        thread.start()
+
+    def _prefetch(self) -> None:
+        try:
+            for buffer_selection in self.buffer_selection_generator:
+                data_chunk = DataChunk(data=self._get_data(selection=buffer_selection), selection=buffer_selection)
+                if not self._put(item=data_chunk):
+                    return
+        except Exception as exception:
+            self._put(item=exception)
+            return
+
+        self._put(item=_END_OF_BUFFERS)
+
+    def _put(self, *, item) -> bool:
+        """Wait for room in the queue, unless prefetching was stopped; returns whether the item was queued."""
+        while not self._stop_prefetching.is_set():
+            try:
+                self._prefetched_buffers.put(item, timeout=1.0)
+                return True
+            except queue.Full:
+                continue
+        return False
@@ -0,0 +1,216 @@
+"""Shared reading of the raw PumpProbe frames so that each frame is pulled from the source only once."""
+
+import collections
+import pathlib
+import threading
+from typing import Literal
+
+import numpy
+import pydantic
+
+from ._instrumentation import count, count_chunks_in_selection, get_current_interface_name, measure_stage
+from ._prefetching import PrefetchingDataChunkIterator
+from ._sequential_file_reader import DEFAULT_READ_SIZE_IN_BYTES, SequentialFileReader
+from ._volume_projections import VolumeProjectionAccumulator
+
+
+class PumpProbeFrameReader:
+    """
+    Reads blocks of full frames from the raw PumpProbe file and shares them across all optical channels.
+
+    Each optical channel is a sub-region of the full 1024x512 frame. When the channels are written in an interleaved
+    fashion (as done by the `RandiNature2023Converter`), a block of frames is read once by whichever channel asks for
+    it first and is then served from memory to the remaining channels before being released.
+    """
+
+    def __init__(
+        self,
+        *,
+        dat_file_path: pydantic.FilePath,
+        number_of_frames: int,
+        frame_shape: tuple[int, int],
+        dtype: numpy.dtype,
+        maximum_cached_blocks: int = 1,
+        read_method: Literal["memmap", "sequential"] = "memmap",
+        read_size_in_bytes: int = DEFAULT_READ_SIZE_IN_BYTES,
+    ) -> None:
+        self.dat_file_path = pathlib.Path(dat_file_path)
+        self.number_of_frames = number_of_frames
+        self.frame_shape = frame_shape
+        self.dtype = numpy.dtype(dtype)
+        self.maximum_cached_blocks = maximum_cached_blocks
+
+        full_shape = (number_of_frames, frame_shape[0], frame_shape[1])
+        self.memory_map = numpy.memmap(filename=self.dat_file_path, dtype=self.dtype, mode="r", shape=full_shape)
+
+        self.channel_names = list()
+
+        # Maps (start, stop) of the frame range to the block of full frames and the channels that have consumed it
+        self._cached_blocks = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        self.sequential_file_reader = None
+        self.set_read_method(read_method=read_method, read_size_in_bytes=read_size_in_bytes)
+
+    @property
+    def number_of_channels(self) -> int:
+        return max(len(self.channel_names), 1)
+
+    @property
+    def read_method(self) -> Literal["memmap", "sequential"]:
+        return "memmap" if self.sequential_file_reader is None else "sequential"
+
+    def set_read_method(
+        self,
+        *,
+        read_method: Literal["memmap", "sequential"],
+        read_size_in_bytes: int = DEFAULT_READ_SIZE_IN_BYTES,
+    ) -> None:
+        """Choose how the blocks are read; set after `maximum_cached_blocks` so that enough buffers are reused."""
+        if read_method not in ("memmap", "sequential"):
+            message = f"Unknown `read_method` '{read_method}'! Please choose either 'memmap' or 'sequential'."
+            raise ValueError(message)
+
+        with self._lock:
+            if self.sequential_file_reader is not None:
+                self.sequential_file_reader.close()
+                self.sequential_file_reader = None
+
+            # Beyond the cached blocks, those of the buffers handed to the channels may still be in use
+            if read_method == "sequential":
+                self.sequential_file_reader = SequentialFileReader(
+                    file_path=self.dat_file_path,
+                    read_size_in_bytes=read_size_in_bytes,
+                    maximum_pooled_buffers=self.maximum_cached_blocks + 2,
+                )
+
+    def register_channel(self, channel_name: str) -> None:
+        if channel_name not in self.channel_names:
+            self.channel_names.append(channel_name)
+
+    def read(
+        self, *, channel_name: str, frame_slice: slice, channel_frame_slicing: tuple[slice, slice]
+    ) -> numpy.ndarray:
+        """Return the data for a single channel over a range of frames, reading the full frames only if needed."""
+        key = (frame_slice.start, frame_slice.stop)
+
+        # Held while reading, so that a channel requesting the same block waits for it rather than reading it again
+        with self._lock:
+            if key in self._cached_blocks:
+                block, consumed_by = self._cached_blocks[key]
+            else:
+                block = self._read_block(frame_slice=frame_slice)
+                count(bytes_read=block.nbytes)
+                consumed_by = set()
+
+                self._cached_blocks[key] = (block, consumed_by)
+                while len(self._cached_blocks) > self.maximum_cached_blocks:
+                    self._cached_blocks.popitem(last=False)
+
+            consumed_by.add(channel_name)
+            if consumed_by.issuperset(self.channel_names):
+                self._cached_blocks.pop(key, None)
+
+        return block[:, channel_frame_slicing[0], channel_frame_slicing[1]]
+
+    def _read_block(self, *, frame_slice: slice) -> numpy.ndarray:
+        if self.sequential_file_reader is None:
+            return numpy.array(self.memory_map[frame_slice])
+
+        frame_size_in_bytes = self.frame_shape[0] * self.frame_shape[1] * self.dtype.itemsize
+        return self.sequential_file_reader.read(
+            offset=frame_slice.start * frame_size_in_bytes,
+            shape=(frame_slice.stop - frame_slice.start, *self.frame_shape),
+            dtype=self.dtype,
+        )
+
+
+class PumpProbeChannelDataChunkIterator(PrefetchingDataChunkIterator):
+    """
+    Iterate over the data of a single optical channel by requesting its frames from a `PumpProbeFrameReader`.
+
+    If given a `volume_projection_accumulator`, the frames of each buffer are also added to it as they are read.
+    """
+
+    def __init__(
+        self,
+        *,
+        frame_reader: PumpProbeFrameReader,
+        channel_name: str,
+        channel_frame_slicing: tuple[slice, slice],
+        number_of_frames: int,
+        volume_projection_accumulator: VolumeProjectionAccumulator | None = None,
+        **kwargs,
+    ) -> None:
+        self.frame_reader = frame_reader
+        self.channel_name = channel_name
+        self.channel_frame_slicing = channel_frame_slicing
+        self.number_of_frames = number_of_frames
+        self.volume_projection_accumulator = volume_projection_accumulator
+
+        # The chunks are usually iterated once the file is written, outside of the `add_to_nwbfile` of the interface
+        self.interface_name = get_current_interface_name()
+
+        super().__init__(**kwargs)
+
+    def _to_dict(self) -> dict:
+        # Used for pickling, such as when writing in parallel; each process then opens its own reader of the frames
+        return dict(
+            frame_reader_kwargs=dict(
+                dat_file_path=str(self.frame_reader.dat_file_path),
+                number_of_frames=self.frame_reader.number_of_frames,
+                frame_shape=self.frame_reader.frame_shape,
+                dtype=self.frame_reader.dtype.str,
+                read_method=self.frame_reader.read_method,
+                read_size_in_bytes=(
+                    self.frame_reader.sequential_file_reader.read_size_in_bytes
+                    if self.frame_reader.sequential_file_reader is not None
+                    else DEFAULT_READ_SIZE_IN_BYTES
+                ),
+            ),
+            channel_name=self.channel_name,
+            channel_frame_slicing=self.channel_frame_slicing,
+            number_of_frames=self.number_of_frames,
+            chunk_shape=self.chunk_shape,
+            buffer_shape=self.buffer_shape,
+        )
+
+    @classmethod
+    def _from_dict(cls, dictionary: dict) -> "PumpProbeChannelDataChunkIterator":
+        frame_reader = PumpProbeFrameReader(**dictionary["frame_reader_kwargs"])
+        frame_reader.register_channel(channel_name=dictionary["channel_name"])
+
+        return cls(
+            frame_reader=frame_reader,
+            channel_name=dictionary["channel_name"],
+            channel_frame_slicing=dictionary["channel_frame_slicing"],
+            number_of_frames=dictionary["number_of_frames"],
+            chunk_shape=dictionary["chunk_shape"],
+            buffer_shape=dictionary["buffer_shape"],
+            display_progress=False,
+        )
+
+    def _get_data(self, selection: tuple[slice, slice, slice]) -> numpy.ndarray:
+        with measure_stage(stage="chunk_iteration", interface_name=self.interface_name):
+            channel_data = self.frame_reader.read(
+                channel_name=self.channel_name,
+                frame_slice=selection[0],
+                channel_frame_slicing=self.channel_frame_slicing,
+            )
+            count(number_of_chunks=count_chunks_in_selection(selection=selection, chunk_shape=self.chunk_shape))
+
+        if self.volume_projection_accumulator is not None:
+            with measure_stage(stage="volume_projection", interface_name=self.interface_name):
+                self.volume_projection_accumulator.add_frames(start=selection[0].start, frames=channel_data)
+
+        return channel_data[:, selection[1], selection[2]]
+
+    def _get_maxshape(self) -> tuple[int, int, int]:
+        return (
+            self.number_of_frames,
+            self.channel_frame_slicing[0].stop - self.channel_frame_slicing[0].start,
+            self.channel_frame_slicing[1].stop - self.channel_frame_slicing[1].start,
+        )
+
+    def _get_dtype(self) -> numpy.dtype:
+        return self.frame_reader.dtype
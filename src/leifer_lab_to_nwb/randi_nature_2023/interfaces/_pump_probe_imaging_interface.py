@@ -4,11 +4,21 @@ from typing import Literal
 import ndx_microscopy
 import neuroconv
 import numpy
-import pandas
 import pydantic
 import pynwb
 
+from ._compression import CompressionMethod, get_hdf5_compression_kwargs
+from ._dataset_io import configure_dataset_io
+from ._frame_tables import get_frame_timestamps_and_depths
 from ._globals import _DEFAULT_CHANNEL_FRAME_SLICING, _DEFAULT_CHANNEL_NAMES
+from ._live_recording import LiveSeriesWriter
+from ._memory_budget import fit_buffer_to_memory_budget, get_default_memory_budget_in_bytes
+from ._pump_probe_frame_reader import PumpProbeChannelDataChunkIterator
+from ._sequential_file_reader import DEFAULT_READ_SIZE_IN_BYTES
+from ._session_context import get_session_context
+from ._source_checks import check_pump_probe_frames, raise_for_issues
+from ._volume_projections import VolumeProjectionAccumulator, VolumeProjectionWriter
+from ._volume_utils import calculate_volume_aligned_chunk_length, get_frames_per_volume_from_depths
 
 
 class PumpProbeImagingInterface(neuroconv.basedatainterface.BaseDataInterface):
@@ -23,6 +33,7 @@ class PumpProbeImagingInterface(neuroconv.basedatainterface.BaseDataInterface):
         pump_probe_folder_path: pydantic.DirectoryPath,
         channel_name: Literal[_DEFAULT_CHANNEL_NAMES] | str,
         channel_frame_slicing: tuple[slice, slice] | None = None,
+        live: bool = False,
     ) -> None:
         """
         A custom interface for the raw volumetric PumpProbe data.
@@ -42,12 +53,20 @@ class PumpProbeImagingInterface(neuroconv.basedatainterface.BaseDataInterface):
             The default slicing is:
                 GreenChannel=(slice(0, 512), slice(0, 512))
                 RedChannel=(slice(512, 1024), slice(0, 512))
+        live : bool, default: False
+            Whether the recording is still being acquired. Only its frames completed so far are then known, and the
+            NWB file is written with resizable datasets to which the later frames are appended as they are completed,
+            until the acquisition ends; see `LiveSeriesWriter`. Only with the HDF5 backend.
         """
         super().__init__(
             pump_probe_folder_path=pump_probe_folder_path,
             channel_name=channel_name,
             channel_frame_slicing=channel_frame_slicing,
+            live=live,
         )
+        # Parsed sources and the raw frame reader are borrowed from the session of the converter, if any
+        self.session_context = get_session_context()
+
         if channel_name not in _DEFAULT_CHANNEL_NAMES and channel_frame_slicing is None:
             raise ValueError(
                 f"A custom `optical_channel_name` was specified ('{channel_name}') and was not one of the "
@@ -58,49 +77,69 @@ class PumpProbeImagingInterface(neuroconv.basedatainterface.BaseDataInterface):
         self.channel_frame_slicing = channel_frame_slicing or _DEFAULT_CHANNEL_FRAME_SLICING[channel_name]
 
         pump_probe_folder_path = pathlib.Path(pump_probe_folder_path)
+        self.pump_probe_folder_path = pump_probe_folder_path
 
         # If the device setup is ever changed, these may need to be exposed as keyword arguments
         dtype = numpy.dtype("uint16")
         frame_shape = (1024, 512)
 
-        # From prototyping data, the frameSync seems to start first...
-        sync_table_file_path = pump_probe_folder_path / "other-frameSynchronous.txt"
-        sync_table = pandas.read_table(filepath_or_buffer=sync_table_file_path, index_col=False)
-        frame_indices = sync_table["Frame index"]
-
-        # ...then the frameDetails has timestamps for a subset of the frame indices
-        timestamps_file_path = pump_probe_folder_path / "framesDetails.txt"
-        timestamps_table = pandas.read_table(filepath_or_buffer=timestamps_file_path, index_col=False)
-        number_of_frames = timestamps_table.shape[0]
+        self.live = live
+        if live:
+            # Only the frames completed so far; the others are appended to the file as they are acquired
+            self.recording = self.session_context.get_live_pump_probe_recording(
+                pump_probe_folder_path=pump_probe_folder_path, frame_shape=frame_shape, dtype=dtype
+            )
+            self.recording.update()
+            number_of_frames = self.recording.number_of_frames
+            self.timestamps = self.recording.timestamps
+            self.series_depth_per_frame_in_um = self.recording.depth_per_frame_in_um
+            self.frame_reader = None
+        else:
+            sync_table_file_path = pump_probe_folder_path / "other-frameSynchronous.txt"
+            sync_table = self.session_context.read_table(file_path=sync_table_file_path)
+            timestamps_file_path = pump_probe_folder_path / "framesDetails.txt"
+            timestamps_table = self.session_context.read_table(file_path=timestamps_file_path)
+            number_of_frames = timestamps_table.shape[0]
 
-        frame_count_delay = timestamps_table["frameCount"][0] - frame_indices[0]
-        frame_count_end = frame_count_delay + number_of_frames
+            # The same checks as `preflight_dataset`
+            dat_file_path = pump_probe_folder_path / "sCMOS_Frames_U16_1024x512.dat"
+            frame_size_in_bytes = frame_shape[0] * frame_shape[1] * dtype.itemsize
+            raise_for_issues(
+                issues=check_pump_probe_frames(
+                    sync_table=sync_table,
+                    timestamps_table=timestamps_table,
+                    number_of_frames_in_file=dat_file_path.stat().st_size // frame_size_in_bytes,
+                )
+            )
 
-        sync_subtable = sync_table.iloc[frame_count_delay:frame_count_end]
+            self.timestamps, self.series_depth_per_frame_in_um = get_frame_timestamps_and_depths(
+                sync_table=sync_table, timestamps_table=timestamps_table
+            )
 
-        self.timestamps = numpy.array(timestamps_table["Timestamp"])
+            # The reader is shared with the other channels of the same session
+            self.frame_reader = self.session_context.get_pump_probe_frame_reader(
+                dat_file_path=dat_file_path, number_of_frames=number_of_frames, frame_shape=frame_shape, dtype=dtype
+            )
+            self.frame_reader.register_channel(channel_name=self.channel_name)
 
-        # This was hardcoded via discussion in
-        # https://github.com/catalystneuro/leifer_lab_to_nwb/issues/2
-        depth_scanning_piezo_volts_to_um = 1 / 0.125
-        self.series_depth_per_frame_in_um = numpy.array(
-            sync_subtable["Piezo position (V)"] * depth_scanning_piezo_volts_to_um
+        self.data_shape = (
+            number_of_frames,
+            self.channel_frame_slicing[0].stop - self.channel_frame_slicing[0].start,
+            self.channel_frame_slicing[1].stop - self.channel_frame_slicing[1].start,
         )
 
-        full_shape = (number_of_frames, frame_shape[0], frame_shape[1])
-
-        dat_file_path = pump_probe_folder_path / "sCMOS_Frames_U16_1024x512.dat"
-        self.imaging_data_memory_map = numpy.memmap(filename=dat_file_path, dtype=dtype, mode="r", shape=full_shape)
+    def get_frames_per_volume(self) -> numpy.ndarray:
+        """
+        Get the number of frames in each volume (complete scan cycle over depths).
 
-        # This slicing operation *should* be lazy since it does not usually include fancy indexing
-        full_slice = (slice(0, number_of_frames), self.channel_frame_slicing[0], self.channel_frame_slicing[1])
-        self.imaging_data_for_channel = self.imaging_data_memory_map[full_slice]
+        Taken from the 'zOfFrame' field of the 'brains.json' file if it exists; otherwise inferred from the piezo.
+        """
+        brains_file_path = self.pump_probe_folder_path / "brains.json"
+        if not brains_file_path.exists():
+            return get_frames_per_volume_from_depths(depth_per_frame=self.series_depth_per_frame_in_um)
 
-        self.data_shape = (
-            number_of_frames,
-            full_slice[1].stop - full_slice[1].start,
-            full_slice[2].stop - full_slice[2].start,
-        )
+        brains_summary = self.session_context.load_pump_probe_brains_summary(file_path=brains_file_path)
+        return brains_summary["frames_per_volume"]
 
     def add_to_nwbfile(
         self,
@@ -111,7 +150,115 @@ class PumpProbeImagingInterface(neuroconv.basedatainterface.BaseDataInterface):
         stub_frames: int = 70,
         display_progress: bool = True,
         progress_bar_options: dict | None = None,
+        chunking: Literal["size", "volume"] = "size",
+        chunk_tile_shape: tuple[int, int] | None = None,
+        backend: Literal["hdf5", "zarr"] = "hdf5",
+        compression: CompressionMethod = "gzip",
+        compression_options: dict | None = None,
+        number_of_compression_workers: int | None = None,
+        compression_executor: Literal["thread", "process"] = "thread",
+        memory_budget_in_bytes: int | None = None,
+        number_of_prefetched_buffers: int = 1,
+        read_method: Literal["memmap", "sequential"] = "memmap",
+        read_size_in_bytes: int = DEFAULT_READ_SIZE_IN_BYTES,
+        storage_mode: Literal["copy", "reference", "sharded"] = "copy",
+        number_of_shards: int | None = None,
+        resumable: bool = False,
+        live_batch_frames: int = 1000,
+        live_poll_interval_in_s: float = 10.0,
+        live_end_of_acquisition_timeout_in_s: float = 300.0,
+        volume_projections: bool = False,
     ) -> None:
+        """
+        Add the raw imaging data for this channel to the NWB file.
+
+        Parameters
+        ----------
+        nwbfile : pynwb.NWBFile
+            The in-memory NWB file to add the data to.
+        metadata : dict, optional
+            Unused; kept for consistency with other interfaces.
+        stub_test : bool, default: False
+            Whether to only write the first `stub_frames` frames.
+        stub_frames : int, default: 70
+            The number of frames to write when `stub_test` is True.
+        display_progress : bool, default: True
+            Whether to display a progress bar while writing the data.
+        progress_bar_options : dict, optional
+            Additional keyword arguments passed to the `tqdm` progress bar.
+        chunking : "size" or "volume", default: "size"
+            How to choose the number of frames in each chunk.
+            "size" targets chunks of about 10 MB.
+            "volume" aligns the chunks with the volumes (scan cycles) so that reading a single volume touches as few
+            chunks as possible; see `get_frames_per_volume`. Since the chunks all have the same length, each holds
+            exactly one volume only if all volumes have the same number of frames; otherwise each holds about one.
+        chunk_tile_shape : tuple of two ints, optional
+            Only used when `chunking="volume"`.
+            If specified, each frame is additionally split into tiles of this shape (along x and y).
+        backend : "hdf5" or "zarr", default: "hdf5"
+            The backend the NWB file will be written with; set automatically by `RandiNature2023Converter`.
+        compression : str, default: "gzip"
+            The compression method; one of "gzip", "lzf", "blosc", "zstd", "lz4", or "bitshuffle".
+            With HDF5, all but "gzip" and "lzf" require the `hdf5plugin` package, for both writing and reading.
+        compression_options : dict, optional
+            Options specific to the compression method, such as {"cname": "zstd", "clevel": 5, "shuffle": "bit"} for
+            "blosc" or {"level": 4} for "gzip".
+        number_of_compression_workers : int, optional
+            If specified, chunks are compressed by this many workers in parallel and written directly to the file
+            once it has been created, instead of being compressed serially by HDF5.
+            This mode is only available when writing through `RandiNature2023Converter.run_conversion`.
+        compression_executor : "thread" or "process", default: "thread"
+            The type of pool used when `number_of_compression_workers` is specified.
+        memory_budget_in_bytes : int, optional
+            The memory the buffer of this channel may take; the buffer (and, if not even a single chunk fits, the
+            chunks) are sized to it. Set automatically by `RandiNature2023Converter` from its `memory_budget_in_gb`.
+            The default is an equal share, across the channels, of `get_default_memory_budget_in_bytes`.
+        number_of_prefetched_buffers : int, default: 1
+            The number of buffers read from the source in the background while the previous ones are compressed and
+            written; see `PrefetchingDataChunkIterator`. These count towards the `memory_budget_in_bytes`.
+            If 0, reading, compressing, and writing take turns.
+        read_method : "memmap" or "sequential", default: "memmap"
+            How the raw frames are read from the '.dat' file. "memmap" copies them out of a memory map, leaving the
+            reading ahead and caching to the operating system. "sequential" reads them in long reads of
+            `read_size_in_bytes` into reusable aligned buffers, hinting the operating system to read ahead and to
+            drop them from the page cache once read; see `SequentialFileReader`. The latter is usually faster over
+            network mounts, and does not evict the cached files of other users of shared nodes.
+        read_size_in_bytes : int, default: 64 MiB
+            The size of each read with the "sequential" `read_method`.
+        storage_mode : "copy", "reference", or "sharded", default: "copy"
+            Whether to copy the raw frames into the NWB file, or to have the dataset refer to them in the '.dat' file
+            through HDF5 external storage, without copying or compressing them; see `ExternalReferenceDatasetWriter`.
+            The latter makes small "index" files written in moments, for internal analysis only: they can only be
+            read alongside the original '.dat' file and their '.external.h5' file, and only with the HDF5 backend.
+            "sharded" compresses the frames into shard files along time, written in parallel processes into a
+            '.shards' folder next to the NWB file, whose dataset stitches them together; see `ShardedDatasetWriter`.
+            The file can then only be read alongside that folder, and only with the HDF5 backend.
+        number_of_shards : int, optional
+            The number of shard files with the "sharded" `storage_mode`; the default is the number of CPUs.
+        resumable : bool, default: False
+            Whether to write the data so that an interrupted conversion can continue where it stopped, through a
+            `DirectChunkDatasetWriter` that commits each buffer to a checkpoint. Set automatically by
+            `RandiNature2023Converter.run_conversion` when resuming is requested; only with the "copy" `storage_mode`.
+        live_batch_frames : int, default: 1000
+            Only used when the interface is `live`.
+            The number of frames appended to the file at once, as they are acquired; fewer if they do not fit within
+            the `memory_budget_in_bytes`. The file can be read in SWMR mode with every batch appended so far at any
+            time; see `LiveSeriesWriter`.
+        live_poll_interval_in_s : float, default: 10.0
+            Only used when the interface is `live`.
+            How often to check the source files for newly acquired frames, in seconds.
+        live_end_of_acquisition_timeout_in_s : float, default: 300.0
+            Only used when the interface is `live`.
+            How long the source files may go without growing before the acquisition is taken to have ended, in
+            seconds; the remaining frames are then appended and the file is finalized.
+        volume_projections : bool, default: False
+            Whether to also write the maximum and mean projections over depth of each volume (see
+            `get_frames_per_volume`) as the 'PumpProbeMaximumProjection<channel>' and
+            'PumpProbeMeanProjection<channel>' series of the 'ophys' processing module, for quick looks and quality
+            control. They are computed from the raw frames as they are read for writing, so the data is then always
+            written through a `DirectChunkDatasetWriter`; only with the "copy" `storage_mode` and the HDF5 backend,
+            and not when resuming or `live`.
+        """
         progress_bar_options = progress_bar_options or dict()
 
         if "Microscope" not in nwbfile.devices:
@@ -145,41 +292,309 @@ class PumpProbeImagingInterface(neuroconv.basedatainterface.BaseDataInterface):
         )
         nwbfile.add_lab_meta_data(lab_meta_data=optical_channel)
 
-        # Not exposing chunking/buffering control here for simplicity; but this is where they would be passed
-        num_frames = self.data_shape[0] if not stub_test else stub_frames
+        series_name = f"PumpProbeImaging{self.channel_name}"
+        if self.live and volume_projections is True:
+            message = "The volume projections are not computed for a `live` recording, whose volumes are still open!"
+            raise ValueError(message)
+        if self.live:
+            data_io, timestamps, depth_per_frame_in_um = self._configure_live_datasets(
+                series_name=series_name,
+                stub_test=stub_test,
+                stub_frames=stub_frames,
+                backend=backend,
+                compression=compression,
+                compression_options=compression_options,
+                number_of_compression_workers=number_of_compression_workers,
+                memory_budget_in_bytes=memory_budget_in_bytes,
+                storage_mode=storage_mode,
+                resumable=resumable,
+                live_batch_frames=live_batch_frames,
+                live_poll_interval_in_s=live_poll_interval_in_s,
+                live_end_of_acquisition_timeout_in_s=live_end_of_acquisition_timeout_in_s,
+            )
+            self._add_series_to_nwbfile(
+                nwbfile=nwbfile,
+                series_name=series_name,
+                microscope=microscope,
+                light_source=light_source,
+                imaging_space=imaging_space,
+                optical_channel=optical_channel,
+                data=data_io,
+                timestamps=timestamps,
+                depth_per_frame_in_um=depth_per_frame_in_um,
+            )
+            return
+
+        if volume_projections is True and (storage_mode != "copy" or backend != "hdf5" or resumable):
+            message = (
+                "The volume projections are computed while copying the data with the HDF5 backend! "
+                "Please use the 'copy' `storage_mode` and the 'hdf5' backend, without resuming."
+            )
+            raise ValueError(message)
+
+        num_frames = self.data_shape[0] if not stub_test else min(stub_frames, self.data_shape[0])
         x = self.data_shape[1]
         y = self.data_shape[2]
-        frame_size_bytes = x * y * self.imaging_data_for_channel.dtype.itemsize
-        chunk_size_bytes = 10.0 * 1e6  # 10 MB default
-        num_frames_per_chunk = int(chunk_size_bytes / frame_size_bytes)
-        chunk_shape = (max(min(num_frames_per_chunk, num_frames), 1), x, y)
-        buffer_shape = (min(chunk_shape[0] * 100 * 10, num_frames), x, y)  # 10 GB by default
+        if chunking == "size":
+            frame_size_bytes = x * y * self.frame_reader.dtype.itemsize
+            chunk_size_bytes = 10.0 * 1e6  # 10 MB default
+            num_frames_per_chunk = int(chunk_size_bytes / frame_size_bytes)
+            chunk_shape = (max(min(num_frames_per_chunk, num_frames), 1), x, y)
+        elif chunking == "volume":
+            tile_shape = chunk_tile_shape or (x, y)
+            tile_shape = (min(tile_shape[0], x), min(tile_shape[1], y))
 
-        imaging_data = (
-            self.imaging_data_for_channel if not stub_test else self.imaging_data_for_channel[:stub_frames, ...]
+            # Volumes are typically a few dozen frames; the upper limit only guards against unexpected scan patterns
+            tile_size_bytes = tile_shape[0] * tile_shape[1] * self.frame_reader.dtype.itemsize
+            maximum_chunk_size_bytes = 64.0 * 1e6
+            num_frames_per_chunk = calculate_volume_aligned_chunk_length(
+                frames_per_volume=self.get_frames_per_volume(),
+                maximum_chunk_length=max(int(maximum_chunk_size_bytes / tile_size_bytes), 1),
+            )
+            chunk_shape = (max(min(num_frames_per_chunk, num_frames), 1), tile_shape[0], tile_shape[1])
+        else:
+            message = f"Unknown `chunking` mode '{chunking}'! Please choose either 'size' or 'volume'."
+            raise ValueError(message)
+
+        if memory_budget_in_bytes is None:
+            memory_budget_in_bytes = get_default_memory_budget_in_bytes() / self.frame_reader.number_of_channels
+
+        # Each frame of the buffer is held twice: as part of the block of full frames shared by all channels, and as
+        # the contiguous copy of this channel made when writing it; plus once more for each prefetched buffer
+        # The buffer along time must match across those channels for the shared blocks to line up, which it does as
+        # long as they are given the same budget
+        chunk_length, buffer_frames = fit_buffer_to_memory_budget(
+            memory_budget_in_bytes=memory_budget_in_bytes,
+            bytes_per_item=(2 + number_of_prefetched_buffers) * x * y * self.frame_reader.dtype.itemsize,
+            chunk_length=chunk_shape[0],
+            number_of_items=num_frames,
         )
-        data_iterator = pynwb.H5DataIO(
-            neuroconv.tools.hdmf.SliceableDataChunkIterator(
-                data=imaging_data,
-                chunk_shape=chunk_shape,
-                buffer_shape=buffer_shape,
-                display_progress=display_progress,
-                progress_bar_options=progress_bar_options,
-            ),
-            compression="gzip",
+        chunk_shape = (chunk_length, *chunk_shape[1:])
+        buffer_shape = (buffer_frames, x, y)
+
+        # The prefetching of each channel may run ahead of the others by up to its queue, plus the buffer it is reading
+        self.frame_reader.maximum_cached_blocks = max(
+            self.frame_reader.maximum_cached_blocks, number_of_prefetched_buffers + 2
+        )
+        self.frame_reader.set_read_method(read_method=read_method, read_size_in_bytes=read_size_in_bytes)
+
+        volume_projection_accumulator = None
+        if volume_projections is True:
+            volume_projection_accumulator = VolumeProjectionAccumulator(
+                frames_per_volume=self.get_frames_per_volume(),
+                number_of_frames=num_frames,
+                frame_shape=(x, y),
+                dtype=self.frame_reader.dtype,
+            )
+
+        channel_data_iterator = PumpProbeChannelDataChunkIterator(
+            frame_reader=self.frame_reader,
+            channel_name=self.channel_name,
+            channel_frame_slicing=self.channel_frame_slicing,
+            number_of_frames=num_frames,
+            chunk_shape=chunk_shape,
+            buffer_shape=buffer_shape,
+            display_progress=display_progress,
+            progress_bar_options=progress_bar_options,
+            number_of_prefetched_buffers=number_of_prefetched_buffers,
+            volume_projection_accumulator=volume_projection_accumulator,
         )
 
         timestamps = self.timestamps if not stub_test else self.timestamps[:stub_frames]
+        depth_per_frame_in_um = self.series_depth_per_frame_in_um[:num_frames]
+
+        data_iterator, self.deferred_dataset_writers = configure_dataset_io(
+            data_iterator=channel_data_iterator,
+            dataset_path=f"/acquisition/{series_name}/data",
+            backend=backend,
+            compression=compression,
+            compression_options=compression_options,
+            number_of_compression_workers=number_of_compression_workers,
+            compression_executor=compression_executor,
+            storage_mode=storage_mode,
+            raw_source=dict(
+                dat_file_path=self.frame_reader.dat_file_path,
+                source_shape=(self.frame_reader.number_of_frames, *self.frame_reader.frame_shape),
+                dtype=self.frame_reader.dtype,
+                selection=(slice(0, num_frames), *self.channel_frame_slicing),
+            ),
+            number_of_shards=number_of_shards,
+            resumable=resumable,
+            shard_datasets=dict(timestamps=timestamps, depth_per_frame_in_um=depth_per_frame_in_um),
+            sharded_write_group=self.session_context.get_sharded_write_group(),
+            always_defer=volume_projections,
+        )
+
+        self._add_series_to_nwbfile(
+            nwbfile=nwbfile,
+            series_name=series_name,
+            microscope=microscope,
+            light_source=light_source,
+            imaging_space=imaging_space,
+            optical_channel=optical_channel,
+            data=data_iterator,
+            timestamps=timestamps,
+            depth_per_frame_in_um=depth_per_frame_in_um,
+        )
+
+        if volume_projection_accumulator is not None and volume_projection_accumulator.number_of_volumes != 0:
+            self._add_volume_projections_to_nwbfile(
+                nwbfile=nwbfile,
+                accumulator=volume_projection_accumulator,
+                timestamps=timestamps,
+                compression=compression,
+                compression_options=compression_options,
+            )
+
+    def _add_volume_projections_to_nwbfile(
+        self,
+        *,
+        nwbfile: pynwb.NWBFile,
+        accumulator: VolumeProjectionAccumulator,
+        timestamps: numpy.ndarray,
+        compression: CompressionMethod,
+        compression_options: dict | None,
+    ) -> None:
+        """Add the empty series of the volume projections, and the writer filling them as the raw data is written."""
+        number_of_volumes = accumulator.number_of_volumes
+        x, y = accumulator.frame_shape
+        hdf5_compression_kwargs = get_hdf5_compression_kwargs(
+            compression=compression, compression_options=compression_options
+        )
+        ophys_module = neuroconv.tools.nwb_helpers.get_module(
+            nwbfile=nwbfile, name="ophys", description="Contains projections of the raw imaging data."
+        )
 
+        # Each volume is timed by its first frame
+        volume_timestamps = numpy.asarray(timestamps)[accumulator.volume_start_frames]
+        projection_series_names = dict()
+        for projection, dtype in (("Maximum", accumulator.dtype), ("Mean", numpy.dtype("float32"))):
+            series_name = f"PumpProbe{projection}Projection{self.channel_name}"
+            projection_series = pynwb.image.ImageSeries(
+                name=series_name,
+                description=(
+                    f"The {projection.lower()} projection over depth of each volume of the raw PumpProbe imaging "
+                    f"data of the {self.channel_name} channel, timed by the first frame of the volume."
+                ),
+                data=pynwb.H5DataIO(
+                    data=None,
+                    shape=(number_of_volumes, x, y),
+                    dtype=dtype,
+                    chunks=(1, x, y),
+                    **hdf5_compression_kwargs,
+                ),
+                unit="n.a.",
+                timestamps=volume_timestamps,
+            )
+            ophys_module.add(projection_series)
+            projection_series_names[projection] = series_name
+
+        self.deferred_dataset_writers.append(
+            VolumeProjectionWriter(
+                maximum_dataset_path=f"/processing/ophys/{projection_series_names['Maximum']}/data",
+                mean_dataset_path=f"/processing/ophys/{projection_series_names['Mean']}/data",
+                accumulator=accumulator,
+            )
+        )
+
+    def _configure_live_datasets(
+        self,
+        *,
+        series_name: str,
+        stub_test: bool,
+        stub_frames: int,
+        backend: Literal["hdf5", "zarr"],
+        compression: CompressionMethod,
+        compression_options: dict | None,
+        number_of_compression_workers: int | None,
+        memory_budget_in_bytes: int | None,
+        storage_mode: Literal["copy", "reference", "sharded"],
+        resumable: bool,
+        live_batch_frames: int,
+        live_poll_interval_in_s: float,
+        live_end_of_acquisition_timeout_in_s: float,
+    ) -> tuple[pynwb.H5DataIO, pynwb.H5DataIO, pynwb.H5DataIO]:
+        """Create the empty resizable datasets of a live recording, and the writer appending its frames to them."""
+        if backend != "hdf5" or storage_mode != "copy" or number_of_compression_workers is not None or resumable:
+            message = (
+                "Live conversion is specific to copying the data with the HDF5 backend, compressed by HDF5! "
+                "Please use the 'copy' `storage_mode` and the 'hdf5' backend, without `number_of_compression_workers` "
+                "or resuming."
+            )
+            raise ValueError(message)
+
+        x = self.data_shape[1]
+        y = self.data_shape[2]
+        dtype = self.recording.dtype
+
+        # The length of the recording is not known yet, so the chunks are always sized rather than volume-aligned
+        frame_size_bytes = x * y * dtype.itemsize
+        chunk_size_bytes = 10.0 * 1e6  # 10 MB default
+        num_frames_per_chunk = max(int(chunk_size_bytes / frame_size_bytes), 1)
+
+        if memory_budget_in_bytes is None:
+            memory_budget_in_bytes = get_default_memory_budget_in_bytes() / len(_DEFAULT_CHANNEL_NAMES)
+
+        # Each frame of a batch is held twice: as read from the file, and as compressed by HDF5
+        chunk_length, batch_length = fit_buffer_to_memory_budget(
+            memory_budget_in_bytes=memory_budget_in_bytes,
+            bytes_per_item=2 * frame_size_bytes,
+            chunk_length=num_frames_per_chunk,
+            number_of_items=max(live_batch_frames, num_frames_per_chunk),
+        )
+        batch_length = min(batch_length, max(live_batch_frames // chunk_length, 1) * chunk_length)
+
+        data_io = pynwb.H5DataIO(
+            data=None,
+            shape=(0, x, y),
+            dtype=dtype,
+            maxshape=(None, x, y),
+            chunks=(chunk_length, x, y),
+            **get_hdf5_compression_kwargs(compression=compression, compression_options=compression_options),
+        )
+        timestamps, depth_per_frame_in_um = (
+            pynwb.H5DataIO(
+                data=None, shape=(0,), dtype=numpy.dtype("float64"), maxshape=(None,), chunks=(batch_length,)
+            )
+            for _ in range(2)
+        )
+
+        self.deferred_dataset_writers = [
+            LiveSeriesWriter(
+                series_path=f"/acquisition/{series_name}",
+                recording=self.recording,
+                channel_frame_slicing=self.channel_frame_slicing,
+                batch_length=batch_length,
+                poll_interval_in_s=live_poll_interval_in_s,
+                end_of_acquisition_timeout_in_s=live_end_of_acquisition_timeout_in_s,
+                maximum_number_of_frames=stub_frames if stub_test else None,
+            )
+        ]
+
+        return data_io, timestamps, depth_per_frame_in_um
+
+    def _add_series_to_nwbfile(
+        self,
+        *,
+        nwbfile: pynwb.NWBFile,
+        series_name: str,
+        microscope: ndx_microscopy.Microscope,
+        light_source: ndx_microscopy.MicroscopyLightSource,
+        imaging_space: ndx_microscopy.PlanarImagingSpace,
+        optical_channel: ndx_microscopy.MicroscopyOpticalChannel,
+        data,
+        timestamps,
+        depth_per_frame_in_um,
+    ) -> None:
         variable_depth_microscopy_series = ndx_microscopy.VariableDepthMicroscopySeries(
-            name=f"PumpProbeImaging{self.channel_name}",
+            name=series_name,
             description="The raw functional imaging data of the variable-depth PumpProbe scan.",
             microscope=microscope,
             light_source=light_source,
             imaging_space=imaging_space,
             optical_channel=optical_channel,
-            data=data_iterator,
-            depth_per_frame_in_um=self.series_depth_per_frame_in_um[:num_frames],
+            data=data,
+            depth_per_frame_in_um=depth_per_frame_in_um,
             unit="n.a.",
             timestamps=timestamps,
         )
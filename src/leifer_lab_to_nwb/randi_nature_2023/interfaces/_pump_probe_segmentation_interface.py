@@ -1,18 +1,23 @@
-import json
 import pathlib
-import pickle
 import warnings
 from typing import Literal
 
 import ndx_microscopy
 import neuroconv
 import numpy
-import pandas
 import pydantic
 import pynwb
 
 from ._globals import _DEFAULT_CHANNEL_NAMES
-from ._box_utils import _calculate_voxel_mask
+from ._box_utils import _calculate_voxel_masks
+from ._session_context import get_session_context
+from ._source_checks import (
+    check_box_shape,
+    check_pump_probe_brains_summary,
+    check_pump_probe_signal,
+    load_box_shape_mapping,
+    raise_for_issues,
+)
 
 
 class PumpProbeSegmentationInterface(neuroconv.basedatainterface.BaseDataInterface):
@@ -29,6 +34,7 @@ class PumpProbeSegmentationInterface(neuroconv.basedatainterface.BaseDataInterfa
             Path to the pumpprobe folder.
         """
         super().__init__(pump_probe_folder_path=pump_probe_folder_path, channel_name=channel_name)
+        self.session_context = get_session_context()
         pump_probe_folder_path = pathlib.Path(pump_probe_folder_path)
 
         self.channel_name = channel_name
@@ -37,43 +43,41 @@ class PumpProbeSegmentationInterface(neuroconv.basedatainterface.BaseDataInterfa
         # The files on the other hand are all lower case
         lower_channel_name = channel_name.lower()
         signal_file_path = pump_probe_folder_path / f"{lower_channel_name}.pickle"
-        with open(file=signal_file_path, mode="rb") as io:
-            self.signal_info = pickle.load(file=io)
-
-        # Ignore ref_index from the mask info since that varies quite a bit (it's the frame index used for labels)
-        # And strip extra version attachments
-        mask_type_info = {key: self.signal_info.info[key] for key in ["method", "version"]}
-        mask_type_info["version"] = mask_type_info["version"].split("-")[0]
-        all_expected_mask_type_info = [
-            {"method": "box", "version": "v1.0"},  # Seen in earlier; usually .dirty; might still produce similar boxes
-            {"method": "box", "version": "1.5"},  # The gold standard example; from the Fig. 1 data
-            {"method": "weightedMask", "version": "1.5"},  # Note however that the full mask is unavailable
-        ]
-        assert mask_type_info in all_expected_mask_type_info, (
-            "Unimplemented method detected for mask type."
-            f"\n\nFull signal info: {json.dumps(obj=self.signal_info.info, indent=2)}"
-            "\n\nPlease raise an issue to have the new mask type incorporated."
-        )
+        self.signal_info = self.session_context.load_signal(file_path=signal_file_path)
 
         # Load the local box shape mapping
-        box_shape_file_path = pathlib.Path(__file__).parent.parent / "session_to_box_shape.json"
-        with open(file=box_shape_file_path, mode="r") as io:
-            box_shape_mapping = json.load(fp=io)
-        self.box_shape = box_shape_mapping[pump_probe_folder_path.name]
+        box_shape_mapping = load_box_shape_mapping()
 
-        # Load general ROI metadata
+        # Load general ROI metadata; only the coordinates of the labeled volume are read from this (very large) file
         brains_file_path = pump_probe_folder_path / "brains.json"
-        with open(brains_file_path, "r") as io:
-            self.brains_info = json.load(fp=io)
+        self.brains_summary = self.session_context.load_pump_probe_brains_summary(file_path=brains_file_path)
 
         # Technically every frame at every depth has a timestamp (and these are in the source MicroscopySeries)
         # But the fluorescence is aggregated per volume (over time) and so the timestamps are averaged over those frames
         timestamps_file_path = pump_probe_folder_path / "framesDetails.txt"
-        timestamps_table = pandas.read_table(filepath_or_buffer=timestamps_file_path, index_col=False)
+        timestamps_table = self.session_context.read_table(file_path=timestamps_file_path)
         timestamps = numpy.array(timestamps_table["Timestamp"])
 
+        # The same checks as `preflight_dataset`, such as for mismatched files
+        raise_for_issues(
+            issues=[
+                *check_pump_probe_brains_summary(
+                    brains_summary=self.brains_summary, number_of_timestamps=timestamps_table.shape[0]
+                ),
+                *check_pump_probe_signal(
+                    signal=self.signal_info, signal_file_name=signal_file_path.name, brains_summary=self.brains_summary
+                ),
+                *check_box_shape(
+                    box_shape_mapping=box_shape_mapping,
+                    folder_name=pump_probe_folder_path.name,
+                    validate_shape=self.signal_info.info["method"] == "box",
+                ),
+            ]
+        )
+        self.box_shape = box_shape_mapping[pump_probe_folder_path.name]
+
         averaged_timestamps = numpy.empty(shape=self.signal_info.data.shape[0], dtype=numpy.float64)
-        z_of_frame_lengths = [len(entry) for entry in self.brains_info["zOfFrame"]]
+        z_of_frame_lengths = self.brains_summary["frames_per_volume"]
         cumulative_sum_of_lengths = numpy.cumsum(z_of_frame_lengths)
         for volume_index, (z_of_frame_length, cumulative_sum) in enumerate(
             zip(z_of_frame_lengths, cumulative_sum_of_lengths)
@@ -110,55 +114,11 @@ class PumpProbeSegmentationInterface(neuroconv.basedatainterface.BaseDataInterfa
         else:
             imaging_space = nwbfile.lab_meta_data["PumpProbeImagingSpace"]
 
-        plane_segmentation = ndx_microscopy.MicroscopyPlaneSegmentation(
-            name=f"PumpProbe{self.channel_name}PlaneSegmentation",
-            description=(
-                "The PumpProbe segmentation of the C. elegans brain. "
-                "Only some of these local ROI IDs match the NeuroPAL IDs with cell labels. "
-                "Note that the Z-axis of the `voxel_mask` is in reference to the index of that depth in its scan cycle."
-            ),
-            imaging_space=imaging_space,
-        )
-        plane_segmentation.add_column(name="centroids", description="The centroids of each ROI.")
-        plane_segmentation.add_column(
-            name="neuropal_ids",
-            description=(
-                "The NeuroPAL ROI ID that has been matched to this PumpProbe ID. Blank means the ROI was not matched."
-            ),
-        )
-
-        # In most sessions, the labeled frame index is fixed to be the 30th frame
-        # But there are many others where this is not the case
-        labeled_frame_indices = [
-            index for index, frame_labels in enumerate(self.brains_info["labels"]) if len(frame_labels) != 0
-        ]
-        if len(labeled_frame_indices) == 0:
-            raise ValueError("No labeled frames found in the 'brains.json' file.")
-        if len(labeled_frame_indices) > 1:
-            raise ValueError("More than one labeled frame in the 'brains.json' file.")
-        labeled_frame_index = labeled_frame_indices[0]
-
-        # Check for possible file mismatches based on recorded metadata
-        if self.signal_info.info["ref_index"] != labeled_frame_index:
-            message = (
-                "Mismatch in the labeled frame index between the signal "
-                f"({self.signal_info.info['ref_index']}) and brains ({labeled_frame_index}) files!"
-            )
-            raise ValueError(message)
-
+        # The labeled frame was checked to be unique and to match the signal, as was the number of ROIs
         # There are coords for each 'nInVolume', but only the ones for the span of the labeled frames are used
-        number_of_rois_from_signal = self.signal_info.data.shape[1]
-        number_of_rois_from_brains = self.brains_info["nInVolume"][labeled_frame_index]
-        if number_of_rois_from_signal != number_of_rois_from_brains:
-            message = (
-                "Mismatch in the number of ROIs between the signal "
-                f"({number_of_rois_from_signal}) and brains ({number_of_rois_from_brains}) files!"
-            )
-            raise ValueError(message)
-        number_of_rois = number_of_rois_from_signal
+        number_of_rois = self.signal_info.data.shape[1]
 
-        sub_start = sum(self.brains_info["nInVolume"][:labeled_frame_index])
-        sub_coordinates = self.brains_info["coordZYX"][sub_start : (sub_start + number_of_rois)]
+        sub_coordinates = self.brains_summary["coordZYX"]
 
         mask_type = self.signal_info.info["method"]
         if mask_type == "weightedMask":
@@ -169,27 +129,48 @@ class PumpProbeSegmentationInterface(neuroconv.basedatainterface.BaseDataInterfa
             )
             warnings.warn(message=message, stacklevel=3)
 
-        for pump_probe_roi_id in range(number_of_rois):
-            centroid_info = sub_coordinates[pump_probe_roi_id]
-            centroid = (centroid_info[2], centroid_info[1], centroid_info[0])
-
-            if mask_type == "box" and tuple(self.box_shape) not in ((1, 3, 3), (3, 5, 5), (5, 5, 5)):
-                message = f"Box shape {self.box_shape} has not been implemented."
-                raise NotImplementedError(message)
+        # The 'weightedMask' type only has its centroid, which is a box of a single voxel
+        mask_box_shape = tuple(self.box_shape) if mask_type == "box" else (1, 1, 1)
+        voxel_masks, voxel_mask_index = _calculate_voxel_masks(
+            centroids_zyx=sub_coordinates[:number_of_rois], box_shape=mask_box_shape
+        )
 
-            if mask_type == "box":
-                voxel_mask = _calculate_voxel_mask(
-                    centroid_zyx=centroid_info, box_shape=self.box_shape, method=mask_type
-                )
-            elif mask_type == "weightedMask":
-                voxel_mask = [(centroid[0], centroid[1], centroid[2], 1.0)]
+        # All columns are assembled up front so that the table is built in one pass rather than row by row
+        voxel_mask_column = pynwb.core.VectorData(
+            name="voxel_mask",
+            description=(
+                "Voxel masks for each ROI: a list of indices and weights for the ROI. "
+                "Voxel masks are concatenated and parallel to this table via an index."
+            ),
+            data=voxel_masks,
+        )
+        voxel_mask_index_column = pynwb.core.VectorIndex(
+            name="voxel_mask_index", data=voxel_mask_index, target=voxel_mask_column
+        )
+        centroids_column = pynwb.core.VectorData(
+            name="centroids",
+            description="The centroids of each ROI.",
+            data=numpy.asarray(sub_coordinates[:number_of_rois])[:, ::-1],  # From (z, y, x) to (x, y, z)
+        )
+        neuropal_ids_column = pynwb.core.VectorData(
+            name="neuropal_ids",
+            description=(
+                "The NeuroPAL ROI ID that has been matched to this PumpProbe ID. Blank means the ROI was not matched."
+            ),
+            data=[label.replace(" ", "") for label in self.brains_summary["labels"][:number_of_rois]],
+        )
 
-            plane_segmentation.add_row(
-                id=pump_probe_roi_id,
-                voxel_mask=voxel_mask,
-                centroids=centroid,
-                neuropal_ids=self.brains_info["labels"][labeled_frame_index][pump_probe_roi_id].replace(" ", ""),
-            )
+        plane_segmentation = ndx_microscopy.MicroscopyPlaneSegmentation(
+            name=f"PumpProbe{self.channel_name}PlaneSegmentation",
+            description=(
+                "The PumpProbe segmentation of the C. elegans brain. "
+                "Only some of these local ROI IDs match the NeuroPAL IDs with cell labels. "
+                "Note that the Z-axis of the `voxel_mask` is in reference to the index of that depth in its scan cycle."
+            ),
+            imaging_space=imaging_space,
+            id=list(range(number_of_rois)),
+            columns=[voxel_mask_column, voxel_mask_index_column, centroids_column, neuropal_ids_column],
+        )
 
         image_segmentation = ndx_microscopy.MicroscopySegmentations(
             name=f"PumpProbe{self.channel_name}Segmentations", microscopy_plane_segmentations=[plane_segmentation]
@@ -0,0 +1,150 @@
+"""Reading of large binary files in long sequential reads that leave the page cache to the other users of a node."""
+
+import math
+import os
+import pathlib
+import sys
+import threading
+import weakref
+
+import numpy
+import pydantic
+
+# The size of each read; large enough for network mounts to stream at full speed
+DEFAULT_READ_SIZE_IN_BYTES = 64 * 1024**2
+
+# The page size of most systems, which is also sufficient for the direct I/O of most file systems
+_BUFFER_ALIGNMENT_IN_BYTES = 4096
+
+
+class SequentialFileReader:
+    """
+    Read ranges of a large binary file, such as the raw frames, into reusable page-aligned buffers.
+
+    Compared to a memory map...
+      - the file is read in long calls of `read_size_in_bytes` rather than faulted in a page at a time, which is much
+        faster over network mounts
+      - the operating system is told that the file is read sequentially, and to start reading each next range while
+        the current one is copied (`POSIX_FADV_SEQUENTIAL` and `POSIX_FADV_WILLNEED`)
+      - once read, each range is dropped from the page cache (`POSIX_FADV_DONTNEED`), so that streaming a session of
+        hundreds of GB does not evict the cached files of everyone else on the node
+
+    The hints are only given where `os.posix_fadvise` exists, such as on Linux; elsewhere, only the long reads apply.
+
+    A buffer is only reused once nothing refers to it anymore (such as the chunks of an earlier read that are still
+    being compressed), so the data returned by `read` is never overwritten while in use.
+    """
+
+    def __init__(
+        self,
+        *,
+        file_path: pydantic.FilePath,
+        read_size_in_bytes: int = DEFAULT_READ_SIZE_IN_BYTES,
+        evict_after_read: bool = True,
+        maximum_pooled_buffers: int = 4,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        file_path : FilePath
+            The path to the binary file.
+        read_size_in_bytes : int, default: 64 MiB
+            The size of each read from the file; each call of `read` makes as many as needed.
+        evict_after_read : bool, default: True
+            Whether to drop each range from the page cache once it is read.
+        maximum_pooled_buffers : int, default: 4
+            The number of buffers kept for reuse; should cover every read whose data may still be in use at once.
+            Any further buffer is allocated for a single read.
+        """
+        self.file_path = pathlib.Path(file_path)
+        self.read_size_in_bytes = read_size_in_bytes
+        self.evict_after_read = evict_after_read
+        self.maximum_pooled_buffers = maximum_pooled_buffers
+
+        self._file_descriptor = None
+        self._pooled_buffers = list()
+        self._lock = threading.Lock()
+
+    def read(self, *, offset: int, shape: tuple[int, ...], dtype: numpy.dtype) -> numpy.ndarray:
+        """Read the array of the given shape and type that starts at the `offset` (in bytes) of the file."""
+        dtype = numpy.dtype(dtype)
+        number_of_bytes = math.prod(shape) * dtype.itemsize
+
+        with self._lock:
+            file_descriptor = self._open()
+            buffer = self._get_buffer(number_of_bytes=number_of_bytes)
+            memory = memoryview(buffer)
+
+            position = 0
+            while position < number_of_bytes:
+                read_size = min(self.read_size_in_bytes, number_of_bytes - position)
+
+                # Have the next range read by the kernel while this one is copied
+                if hasattr(os, "posix_fadvise"):
+                    next_offset = offset + position + read_size
+                    os.posix_fadvise(file_descriptor, next_offset, self.read_size_in_bytes, os.POSIX_FADV_WILLNEED)
+
+                number_of_bytes_read = _read_at(
+                    file_descriptor=file_descriptor,
+                    memory=memory[position : position + read_size],
+                    offset=offset + position,
+                )
+                if number_of_bytes_read == 0:
+                    message = (
+                        f"Unable to read {number_of_bytes} bytes at offset {offset} of '{self.file_path}', which ends "
+                        f"after {offset + position} bytes!"
+                    )
+                    raise EOFError(message)
+                position += number_of_bytes_read
+
+            if self.evict_after_read is True and hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(file_descriptor, offset, number_of_bytes, os.POSIX_FADV_DONTNEED)
+
+        return buffer.view(dtype).reshape(shape)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file_descriptor is not None:
+                self._finalizer()
+                self._file_descriptor = None
+            self._pooled_buffers.clear()
+
+    def _open(self) -> int:
+        if self._file_descriptor is None:
+            self._file_descriptor = os.open(self.file_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+            self._finalizer = weakref.finalize(self, os.close, self._file_descriptor)
+
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(self._file_descriptor, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        return self._file_descriptor
+
+    def _get_buffer(self, *, number_of_bytes: int) -> numpy.ndarray:
+        """Get a page-aligned buffer of bytes, reusing a pooled one that nothing refers to anymore if possible."""
+        for allocation in self._pooled_buffers:
+            # Referred to only by the pool, this loop, and the call itself; any view of it (even of the aligned part)
+            # refers to it as its base
+            if allocation.nbytes >= number_of_bytes + _BUFFER_ALIGNMENT_IN_BYTES and sys.getrefcount(allocation) == 3:
+                return _align(allocation=allocation, number_of_bytes=number_of_bytes)
+
+        allocation = numpy.empty(shape=number_of_bytes + _BUFFER_ALIGNMENT_IN_BYTES, dtype="uint8")
+        if len(self._pooled_buffers) < self.maximum_pooled_buffers:
+            self._pooled_buffers.append(allocation)
+
+        return _align(allocation=allocation, number_of_bytes=number_of_bytes)
+
+
+def _align(*, allocation: numpy.ndarray, number_of_bytes: int) -> numpy.ndarray:
+    start = -allocation.ctypes.data % _BUFFER_ALIGNMENT_IN_BYTES
+    return allocation[start : start + number_of_bytes]
+
+
+def _read_at(*, file_descriptor: int, memory: memoryview, offset: int) -> int:
+    if hasattr(os, "preadv"):
+        return os.preadv(file_descriptor, [memory], offset)
+
+    # Such as on Windows; the reads are serialized by the lock of the reader
+    os.lseek(file_descriptor, offset, os.SEEK_SET)
+    data = os.read(file_descriptor, len(memory))
+    memory[: len(data)] = data
+    return len(data)
@@ -0,0 +1,121 @@
+"""Sharing of the sources of a session across all the interfaces of a single conversion."""
+
+import contextlib
+import contextvars
+import pathlib
+import types
+from typing import Callable
+
+import numpy
+import pandas
+import pydantic
+
+from ._live_recording import GrowingPumpProbeRecording
+from ._pump_probe_frame_reader import PumpProbeFrameReader
+from ._sharded_storage import ShardedWriteGroup
+from ._source_cache import load_json, load_pump_probe_brains_summary, load_signal, read_table, use_source_cache
+
+_active_session_context = contextvars.ContextVar("active_session_context", default=None)
+
+
+class SessionSourceContext:
+    """
+    Loads each source file of a session at most once, lending the parsed contents to every interface that asks for it.
+
+    Owned by the `RandiNature2023Converter`, which activates it while constructing its interfaces. The contents are
+    shared, so they must be treated as read-only.
+    """
+
+    def __init__(self, *, source_cache_folder_path: pydantic.DirectoryPath | None = None) -> None:
+        """
+        Parameters
+        ----------
+        source_cache_folder_path : DirectoryPath, optional
+            The folder of the on-disk cache of the parsed sources; see `use_source_cache`.
+        """
+        self.source_cache_folder_path = source_cache_folder_path
+
+        # Keyed by the name of the loader and the resolved path of the source
+        self._loaded_sources = dict()
+        self._pump_probe_frame_readers = dict()
+        self._live_pump_probe_recordings = dict()
+        self._sharded_write_group = None
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Have any interface constructed within this context borrow its sources from this one."""
+        token = _active_session_context.set(self)
+        try:
+            yield self
+        finally:
+            _active_session_context.reset(token)
+
+    def read_table(self, *, file_path: pydantic.FilePath) -> pandas.DataFrame:
+        return self._load(loader=read_table, file_path=file_path)
+
+    def load_json(self, *, file_path: pydantic.FilePath) -> dict:
+        return self._load(loader=load_json, file_path=file_path)
+
+    def load_pump_probe_brains_summary(self, *, file_path: pydantic.FilePath) -> dict[str, numpy.ndarray]:
+        return self._load(loader=load_pump_probe_brains_summary, file_path=file_path)
+
+    def load_signal(self, *, file_path: pydantic.FilePath) -> types.SimpleNamespace:
+        return self._load(loader=load_signal, file_path=file_path)
+
+    def get_pump_probe_frame_reader(
+        self,
+        *,
+        dat_file_path: pydantic.FilePath,
+        number_of_frames: int,
+        frame_shape: tuple[int, int],
+        dtype: numpy.dtype,
+    ) -> PumpProbeFrameReader:
+        """Get the reader of the raw frames shared by all the optical channels of the same file."""
+        key = pathlib.Path(dat_file_path).resolve()
+        if key not in self._pump_probe_frame_readers:
+            self._pump_probe_frame_readers[key] = PumpProbeFrameReader(
+                dat_file_path=dat_file_path, number_of_frames=number_of_frames, frame_shape=frame_shape, dtype=dtype
+            )
+
+        return self._pump_probe_frame_readers[key]
+
+    def get_live_pump_probe_recording(
+        self,
+        *,
+        pump_probe_folder_path: pydantic.DirectoryPath,
+        frame_shape: tuple[int, int],
+        dtype: numpy.dtype,
+    ) -> GrowingPumpProbeRecording:
+        """Get the recording still being acquired that is followed by all the optical channels of the same folder."""
+        key = pathlib.Path(pump_probe_folder_path).resolve()
+        if key not in self._live_pump_probe_recordings:
+            self._live_pump_probe_recordings[key] = GrowingPumpProbeRecording(
+                pump_probe_folder_path=pump_probe_folder_path, frame_shape=frame_shape, dtype=dtype
+            )
+
+        return self._live_pump_probe_recordings[key]
+
+    def get_sharded_write_group(self) -> ShardedWriteGroup:
+        """Get the group whose single pool of processes writes the shards of all the sharded datasets."""
+        if self._sharded_write_group is None:
+            self._sharded_write_group = ShardedWriteGroup()
+
+        return self._sharded_write_group
+
+    def _load(self, *, loader: Callable, file_path: pydantic.FilePath):
+        key = (loader.__name__, pathlib.Path(file_path).resolve())
+        if key not in self._loaded_sources:
+            with use_source_cache(source_cache_folder_path=self.source_cache_folder_path):
+                self._loaded_sources[key] = loader(file_path=file_path)
+
+        return self._loaded_sources[key]
+
+
+def get_session_context() -> SessionSourceContext:
+    """
+    Get the context of the ongoing conversion.
+
+    Outside of one (such as when using an interface on its own), a new context is returned that shares nothing.
+    """
+    session_context = _active_session_context.get()
+    return session_context if session_context is not None else SessionSourceContext()
@@ -0,0 +1,434 @@
+"""Writing of the imaging data as shard files along time, in parallel processes, stitched into a virtual dataset."""
+
+import collections
+import concurrent.futures
+import contextlib
+import math
+import multiprocessing
+import os
+import pathlib
+import time
+
+import h5py
+import numpy
+import pydantic
+
+from ._compression import CompressionMethod, get_hdf5_compression_kwargs
+from ._external_storage import replace_placeholder_dataset
+from ._instrumentation import get_current_interface_name, measure_stage, record_stage
+
+
+def get_shards_folder_path(*, nwbfile_path: str | pathlib.Path) -> pathlib.Path:
+    """
+    Get the path of the folder next to an NWB file that holds the shard files its datasets are stitched from.
+
+    It must be kept next to the NWB file for the data to be read.
+    """
+    nwbfile_path = pathlib.Path(nwbfile_path)
+    return nwbfile_path.with_name(f"{nwbfile_path.name}.shards")
+
+
+def calculate_shard_ranges(*, number_of_items: int, chunk_length: int, number_of_shards: int) -> list[tuple[int, int]]:
+    """
+    Split the items along the first axis, such as the frames, into at most `number_of_shards` contiguous ranges.
+
+    Each range, except possibly the last, is a whole number of chunks, so that no chunk is split across shards.
+    """
+    number_of_chunks = math.ceil(number_of_items / chunk_length)
+    shard_length = math.ceil(number_of_chunks / number_of_shards) * chunk_length
+
+    return [(start, min(start + shard_length, number_of_items)) for start in range(0, number_of_items, shard_length)]
+
+
+class ShardedWriteGroup:
+    """
+    The sharded datasets of a conversion, whose shards are all written by a single pool of processes.
+
+    The datasets selected from the same raw binary file along the same items (such as the channels of the PumpProbe
+    frames) are split into the same ranges, and each range of the source is read once by a single worker, which writes
+    it into the shard of each of those datasets. The writing of all the datasets added to the group starts on the first
+    turn of any of their `ShardedDatasetWriter`, which then take turns in waiting for the shards to be done.
+
+    Owned by the `SessionSourceContext` of the conversion, so that the imaging interfaces share it.
+    """
+
+    def __init__(self, *, number_of_workers: int | None = None) -> None:
+        """
+        Parameters
+        ----------
+        number_of_workers : int, optional
+            The number of processes writing shards at once. The default is the number of CPUs on the system.
+        """
+        self.number_of_workers = number_of_workers
+
+        # The writers added since the last writing started, and the writers of each shard task of the ongoing one
+        self._writers = list()
+        self._executor = None
+        self._pending_tasks = dict()
+        self._shard_file_paths = list()
+
+    def add_writer(self, *, writer: "ShardedDatasetWriter") -> None:
+        self._writers.append(writer)
+
+    def iter_write_shards(self, *, writer: "ShardedDatasetWriter", file: h5py.File):
+        """
+        Write the shards of every writer added so far, unless started already, yielding until those of the `writer`
+        are done.
+
+        If the writing fails or is abandoned, the shards of the ongoing writing are removed.
+        """
+        try:
+            if writer in self._writers:
+                self._start_writing(file=file)
+
+            while any(writer in task_writers for task_writers in self._pending_tasks.values()):
+                done_futures, _ = concurrent.futures.wait(
+                    self._pending_tasks, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done_futures:
+                    task_writers = self._pending_tasks.pop(future)
+                    wall_time, cpu_time, bytes_read_per_shard, bytes_written_per_shard = future.result()
+
+                    # The times of the workers add up, so may exceed the elapsed time of the whole conversion; those of
+                    # a task shared by several writers are split evenly between them
+                    for task_writer, bytes_read, bytes_written in zip(
+                        task_writers, bytes_read_per_shard, bytes_written_per_shard
+                    ):
+                        record_stage(
+                            interface_name=task_writer.interface_name,
+                            stage="shard_write",
+                            calls=1,
+                            wall_time_in_s=wall_time / len(task_writers),
+                            cpu_time_in_s=cpu_time / len(task_writers),
+                            bytes_read=bytes_read,
+                            bytes_written=bytes_written,
+                        )
+                yield
+        except BaseException:
+            self._abort_writing(file=file)
+            raise
+
+        if len(self._pending_tasks) == 0 and self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            self._shard_file_paths = list()
+
+    def _start_writing(self, *, file: h5py.File) -> None:
+        writers, self._writers = self._writers, list()
+        shards_folder_path = get_shards_folder_path(nwbfile_path=file.filename)
+        shards_folder_path.mkdir(exist_ok=True)
+        for writer in writers:
+            for stale_shard_file_path in shards_folder_path.glob(f"{writer.shard_name}_*.h5"):
+                stale_shard_file_path.unlink()  # Such as those of an earlier conversion into more shards
+
+        # The writers of the same items of the same source share the reading of each of their ranges
+        writers_per_source = collections.defaultdict(list)
+        for writer in writers:
+            source_key = (
+                writer.dat_file_path,
+                writer.source_shape,
+                writer.dtype,
+                writer.selection[0].indices(writer.source_shape[0]),
+                writer.chunk_shape[0],
+                writer.number_of_shards,
+            )
+            writers_per_source[source_key].append(writer)
+
+        tasks = list()
+        for source_writers in writers_per_source.values():
+            for shard_index, shard_range in enumerate(source_writers[0].shard_ranges):
+                tasks.append((source_writers, shard_index, shard_range))
+
+        # The buffers of all the writers are shared between the workers, each reading whole chunks of its source
+        number_of_workers = min(len(tasks), self.number_of_workers or os.cpu_count())
+        worker_buffer_size_in_bytes = sum(
+            writer.buffer_length * math.prod(writer.shape[1:]) * writer.dtype.itemsize for writer in writers
+        ) // max(number_of_workers, 1)
+
+        # Spawned rather than forked, since this process has the NWB file open through HDF5
+        if self._executor is None and len(tasks) != 0:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=number_of_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        for source_writers, shard_index, (start, stop) in tasks:
+            first_writer = source_writers[0]
+            first_axis_selection = first_writer.selection[0]
+            step = first_axis_selection.step
+            read_selection = _get_bounding_selection(selections=[writer.selection[1:] for writer in source_writers])
+
+            chunk_length = first_writer.chunk_shape[0]
+            item_size_in_bytes = (
+                math.prod(len(range(axis.start, axis.stop, axis.step)) for axis in read_selection)
+                * first_writer.dtype.itemsize
+            )
+            buffer_length = max(worker_buffer_size_in_bytes // item_size_in_bytes // chunk_length, 1) * chunk_length
+
+            shards = list()
+            for writer in source_writers:
+                shard_file_path = writer.get_shard_file_path(
+                    shards_folder_path=shards_folder_path, shard_index=shard_index
+                )
+                self._shard_file_paths.append(shard_file_path)
+                shards.append(
+                    dict(
+                        shard_file_path=shard_file_path,
+                        selection=tuple(
+                            slice(axis.start - read_axis.start, axis.stop - read_axis.start, axis.step)
+                            for axis, read_axis in zip(writer.selection[1:], read_selection)
+                        ),
+                        chunk_shape=writer.chunk_shape,
+                        compression=writer.compression,
+                        compression_options=writer.compression_options,
+                        shard_datasets={name: data[start:stop] for name, data in writer.shard_datasets.items()},
+                    )
+                )
+
+            future = self._executor.submit(
+                _write_shards,
+                dat_file_path=first_writer.dat_file_path,
+                source_shape=first_writer.source_shape,
+                dtype=first_writer.dtype,
+                selection=(
+                    slice(first_axis_selection.start + start * step, first_axis_selection.start + stop * step, step),
+                    *read_selection,
+                ),
+                buffer_length=buffer_length,
+                shards=shards,
+            )
+            self._pending_tasks[future] = source_writers
+
+    def _abort_writing(self, *, file: h5py.File) -> None:
+        """Stop the ongoing writing, removing all of its shards; any other writer of it then fails as well."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self._pending_tasks = dict()
+
+        for shard_file_path in self._shard_file_paths:
+            shard_file_path.unlink(missing_ok=True)
+        self._shard_file_paths = list()
+
+        shards_folder_path = get_shards_folder_path(nwbfile_path=file.filename)
+        if shards_folder_path.exists() and not any(shards_folder_path.iterdir()):
+            shards_folder_path.rmdir()
+
+
+class ShardedDatasetWriter:
+    """
+    Replace a placeholder dataset of an HDF5 file by a virtual dataset stitched from shard files written in parallel.
+
+    The data, a selection of a raw binary file, is split along its first axis (such as time) into ranges of whole
+    chunks. Each range is read, compressed, and written to its own HDF5 file by a separate process, in the folder given
+    by `get_shards_folder_path`, along with the matching slices of any other per-item datasets (such as the timestamps).
+    The dataset is then a virtual dataset mapping each range to its shard, so that the file reads as a single series.
+
+    Each shard is a standalone HDF5 file with a 'data' dataset, so the wall-clock time of writing a single large
+    session scales with the number of cores rather than that of a single HDF5 filter pipeline. The processes are those
+    of its `ShardedWriteGroup`, shared with the other sharded datasets of the conversion.
+    """
+
+    def __init__(
+        self,
+        *,
+        dataset_path: str,
+        dat_file_path: pydantic.FilePath,
+        source_shape: tuple[int, ...],
+        dtype: numpy.dtype,
+        selection: tuple[slice, ...],
+        chunk_shape: tuple[int, ...],
+        buffer_length: int,
+        compression: CompressionMethod = "gzip",
+        compression_options: dict | None = None,
+        number_of_shards: int | None = None,
+        shard_datasets: dict[str, numpy.ndarray] | None = None,
+        group: ShardedWriteGroup | None = None,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        dataset_path : str
+            The location of the placeholder dataset within the HDF5 file, such as
+            '/acquisition/PumpProbeImagingGreen/data'.
+        dat_file_path : FilePath
+            Path to the raw binary file.
+        source_shape : tuple of ints
+            The shape of the full array stored in the binary file from its first byte; any trailing bytes are ignored.
+        dtype : numpy.dtype
+            The data type of the array stored in the binary file.
+        selection : tuple of slices
+            The part of the array that makes up the data of the dataset, with one slice per axis.
+        chunk_shape : tuple of ints
+            The shape of the chunks of each shard.
+        buffer_length : int
+            The number of items along the first axis that the writing of the whole dataset may hold in memory at once;
+            shared between the processes writing the shards.
+        compression : str, default: "gzip"
+            The compression method of the shards; see `get_hdf5_compression_kwargs`.
+        compression_options : dict, optional
+            Options specific to the compression method.
+        number_of_shards : int, optional
+            The number of shards to split the data into; fewer if there are not as many chunks along the first axis.
+            The default is the number of CPUs on the system.
+        shard_datasets : dict, optional
+            Any other datasets aligned with the first axis of the data, such as the "timestamps", whose slices are
+            written to each shard next to its data.
+        group : ShardedWriteGroup, optional
+            The group whose processes write the shards, such as that of the `SessionSourceContext`.
+            By default, the dataset is written by a group of its own.
+        """
+        self.dataset_path = dataset_path
+        self.dat_file_path = pathlib.Path(dat_file_path).resolve()
+        self.source_shape = tuple(source_shape)
+        self.dtype = numpy.dtype(dtype)
+        self.selection = tuple(
+            slice(*axis_selection.indices(axis_length))
+            for axis_selection, axis_length in zip(selection, self.source_shape)
+        )
+        self.chunk_shape = tuple(chunk_shape)
+        self.buffer_length = buffer_length
+        self.compression = compression
+        self.compression_options = compression_options
+        self.number_of_shards = number_of_shards or os.cpu_count()
+        self.shard_datasets = {name: numpy.asarray(data) for name, data in (shard_datasets or dict()).items()}
+        self.group = group if group is not None else ShardedWriteGroup()
+        self.group.add_writer(writer=self)
+
+        # Created within the `add_to_nwbfile` of an interface, but run after the file is written
+        self.interface_name = get_current_interface_name()
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return tuple(
+            len(range(axis_selection.start, axis_selection.stop, axis_selection.step))
+            for axis_selection in self.selection
+        )
+
+    @property
+    def shard_name(self) -> str:
+        """The name of the neurodata object, such as 'PumpProbeImagingGreen', which prefixes that of its shards."""
+        return self.dataset_path.rstrip("/").split("/")[-2]
+
+    @property
+    def shard_ranges(self) -> list[tuple[int, int]]:
+        return calculate_shard_ranges(
+            number_of_items=self.shape[0], chunk_length=self.chunk_shape[0], number_of_shards=self.number_of_shards
+        )
+
+    def get_shard_file_path(self, *, shards_folder_path: pathlib.Path, shard_index: int) -> pathlib.Path:
+        return shards_folder_path / f"{self.shard_name}_{shard_index:05d}.h5"
+
+    def write(self, *, file: h5py.File) -> None:
+        for _ in self.iter_write(file=file):
+            pass
+
+    def iter_write(self, *, file: h5py.File):
+        """Write the shards in parallel, yielding as they are done, then replace the dataset by their stitching."""
+        yield from self.group.iter_write_shards(writer=self, file=file)
+
+        with measure_stage(stage="shard_stitching", interface_name=self.interface_name):
+            # Referred to by their relative paths, which are resolved from the folder of the NWB file
+            shards_folder_path = get_shards_folder_path(nwbfile_path=file.filename)
+            layout = h5py.VirtualLayout(shape=self.shape, dtype=self.dtype)
+            for shard_index, (start, stop) in enumerate(self.shard_ranges):
+                shard_file_path = self.get_shard_file_path(
+                    shards_folder_path=shards_folder_path, shard_index=shard_index
+                )
+                virtual_source = h5py.VirtualSource(
+                    path_or_dataset=f"{shards_folder_path.name}/{shard_file_path.name}",
+                    name="data",
+                    shape=(stop - start, *self.shape[1:]),
+                )
+                layout[start:stop] = virtual_source
+            replace_placeholder_dataset(
+                file=file,
+                dataset_path=self.dataset_path,
+                create_dataset=lambda parent, name: parent.create_virtual_dataset(name=name, layout=layout),
+            )
+
+
+def _get_bounding_selection(*, selections: list[tuple[slice, ...]]) -> tuple[slice, ...]:
+    """Get the smallest contiguous selection containing each of the `selections` (with resolved slices)."""
+    return tuple(
+        slice(
+            min(axis_selection.start for axis_selection in axis_selections),
+            max(axis_selection.stop for axis_selection in axis_selections),
+            1,
+        )
+        for axis_selections in zip(*selections)
+    )
+
+
+def _write_shards(
+    *,
+    dat_file_path: pathlib.Path,
+    source_shape: tuple[int, ...],
+    dtype: numpy.dtype,
+    selection: tuple[slice, ...],
+    buffer_length: int,
+    shards: list[dict],
+) -> tuple[float, float, list[int], list[int]]:
+    """
+    Write a selection of a raw binary file to shard files, one buffer at a time, in a worker process.
+
+    Each buffer is read once and its part selected by each of the `shards` (relative to the `selection`) is written to
+    that shard, along with its "shard_datasets".
+
+    Returns the elapsed and CPU times of the worker in seconds, and the numbers of bytes read and written per shard.
+    """
+    start_cpu_time = time.process_time()
+    start_wall_time = time.perf_counter()
+
+    source = numpy.memmap(filename=dat_file_path, dtype=dtype, mode="r", shape=source_shape)
+    first_axis_selection, *other_axis_selections = selection
+    step = first_axis_selection.step
+    number_of_items = len(range(first_axis_selection.start, first_axis_selection.stop, step))
+
+    bytes_read_per_shard = [0] * len(shards)
+    with contextlib.ExitStack() as stack:
+        datasets = list()
+        for shard in shards:
+            # Also registers any filter from `hdf5plugin` within this process
+            compression_kwargs = get_hdf5_compression_kwargs(
+                compression=shard["compression"], compression_options=shard["compression_options"]
+            )
+            compression_kwargs.pop("allow_plugin_filters", None)
+
+            shard_file = stack.enter_context(h5py.File(name=shard["shard_file_path"], mode="w"))
+            shape = (
+                number_of_items,
+                *(len(range(axis.start, axis.stop, axis.step)) for axis in shard["selection"]),
+            )
+            datasets.append(
+                shard_file.create_dataset(
+                    name="data",
+                    shape=shape,
+                    dtype=dtype,
+                    chunks=tuple(
+                        min(chunk_length, axis_length) for chunk_length, axis_length in zip(shard["chunk_shape"], shape)
+                    ),
+                    **compression_kwargs,
+                )
+            )
+            for name, data in shard["shard_datasets"].items():
+                shard_file.create_dataset(name=name, data=data)
+
+        for start in range(0, number_of_items, buffer_length):
+            stop = min(start + buffer_length, number_of_items)
+            buffer_selection = (
+                slice(first_axis_selection.start + start * step, first_axis_selection.start + stop * step, step),
+                *other_axis_selections,
+            )
+            buffer_data = numpy.array(source[buffer_selection])
+            for shard_index, (shard, dataset) in enumerate(zip(shards, datasets)):
+                shard_data = numpy.ascontiguousarray(buffer_data[(slice(None), *shard["selection"])])
+                dataset[start:stop] = shard_data
+                bytes_read_per_shard[shard_index] += shard_data.nbytes
+
+        bytes_written_per_shard = [dataset.id.get_storage_size() for dataset in datasets]
+
+    return (
+        time.perf_counter() - start_wall_time,
+        time.process_time() - start_cpu_time,
+        bytes_read_per_shard,
+        bytes_written_per_shard,
+    )
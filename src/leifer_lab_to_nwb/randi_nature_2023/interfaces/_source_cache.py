@@ -0,0 +1,255 @@
+"""Opt-in on-disk cache of the parsed text, JSON, and pickle sources of a session."""
+
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import pathlib
+import pickle
+import types
+import zipfile
+from typing import Callable
+
+import numpy
+import pandas
+import pydantic
+
+from ._brains_json import read_pump_probe_brains_summary
+
+SOURCE_CACHE_ENVIRONMENT_VARIABLE = "LEIFER_LAB_TO_NWB_SOURCE_CACHE_FOLDER_PATH"
+
+# Bump whenever the layout of the cached arrays changes so that older entries are ignored
+_SOURCE_CACHE_VERSION = 2
+
+_source_cache_folder_path = contextvars.ContextVar("source_cache_folder_path", default=None)
+
+
+@contextlib.contextmanager
+def use_source_cache(*, source_cache_folder_path: pydantic.DirectoryPath | None):
+    """
+    Cache the parsed sources read within this context to the given folder.
+
+    If `source_cache_folder_path` is None, the folder set by the environment variable
+    `LEIFER_LAB_TO_NWB_SOURCE_CACHE_FOLDER_PATH` is used, if any.
+    """
+    token = _source_cache_folder_path.set(source_cache_folder_path)
+    try:
+        yield
+    finally:
+        _source_cache_folder_path.reset(token)
+
+
+def get_source_cache_folder_path() -> pathlib.Path | None:
+    source_cache_folder_path = _source_cache_folder_path.get() or os.environ.get(SOURCE_CACHE_ENVIRONMENT_VARIABLE)
+    return pathlib.Path(source_cache_folder_path) if source_cache_folder_path else None
+
+
+def read_table(file_path: pydantic.FilePath) -> pandas.DataFrame:
+    """Equivalent to `pandas.read_table(filepath_or_buffer=file_path, index_col=False)` for the '.txt' sources."""
+    arrays = _load_arrays(file_path=file_path, kind="table", encode=_encode_table)
+    if arrays is None:
+        return pandas.read_table(filepath_or_buffer=file_path, index_col=False)
+
+    header = json.loads(str(arrays["header"]))
+    data = dict()
+    for index, column_name in enumerate(header["columns"]):
+        column = arrays[f"column_{index}"]
+        if f"missing_{index}" in arrays:
+            column = column.astype(object)
+            column[arrays[f"missing_{index}"]] = numpy.nan
+        data[column_name] = column
+    return pandas.DataFrame(data=data)
+
+
+def load_json(file_path: pydantic.FilePath) -> dict:
+    """
+    Load a JSON source whose top level is a dictionary, such as 'brains.json'.
+
+    Lists of numbers or strings are returned as arrays; lists of such lists are returned as two-dimensional arrays
+    when all are of the same length, and otherwise as lists of arrays. Anything else is returned as parsed.
+    """
+    arrays = _load_arrays(file_path=file_path, kind="json", encode=_encode_json)
+
+    header = json.loads(str(arrays["header"]))
+    content = dict()
+    for index, entry in enumerate(header["entries"]):
+        match entry["kind"]:
+            case "array":
+                content[entry["key"]] = arrays[f"values_{index}"]
+            case "ragged":
+                lengths = arrays[f"lengths_{index}"]
+                content[entry["key"]] = numpy.split(arrays[f"values_{index}"], numpy.cumsum(lengths)[:-1])
+            case "json":
+                content[entry["key"]] = entry["value"]
+    return content
+
+
+def load_pump_probe_brains_summary(file_path: pydantic.FilePath) -> dict[str, numpy.ndarray]:
+    """Load the parts of a pumpprobe 'brains.json' file used by the conversion; see `read_pump_probe_brains_summary`."""
+    return _load_arrays(file_path=file_path, kind="brains_summary", encode=read_pump_probe_brains_summary)
+
+
+def load_signal(file_path: pydantic.FilePath) -> types.SimpleNamespace:
+    """
+    Load the parts of a pickled `wormdatamodel.signal.Signal` (such as 'green.pickle') used by the conversion.
+
+    These are the `data`, `info`, `nan_interpolated`, and `nan_mask` attributes.
+    """
+    arrays = _load_arrays(file_path=file_path, kind="signal", encode=_encode_signal)
+    if arrays is None:
+        return _read_signal(file_path=pathlib.Path(file_path))
+
+    return types.SimpleNamespace(
+        data=arrays["data"],
+        info=json.loads(str(arrays["info"])),
+        nan_interpolated=bool(arrays["nan_interpolated"]),
+        nan_mask=arrays.get("nan_mask", None),
+    )
+
+
+def _load_arrays(
+    *, file_path: pydantic.FilePath, kind: str, encode: Callable[[pathlib.Path], dict[str, numpy.ndarray] | None]
+) -> dict[str, numpy.ndarray] | None:
+    """
+    Get the columnar form of a source, from the cache if possible.
+
+    The sources are always passed through their columnar form, so that the result does not depend on the cache.
+    The form must hold the parsed source without any loss; a source that it cannot hold as is (for which `encode`
+    returns None) is neither cached nor converted, and None is returned so that the source is parsed directly.
+    """
+    file_path = pathlib.Path(file_path)
+    source_cache_folder_path = get_source_cache_folder_path()
+    if source_cache_folder_path is None:
+        return encode(file_path)
+
+    # Any change to the source produces a new key; stale entries are simply never read again
+    file_stat = file_path.stat()
+    key = f"{_SOURCE_CACHE_VERSION}|{kind}|{file_path.resolve()}|{file_stat.st_size}|{file_stat.st_mtime_ns}"
+    key_hash = hashlib.sha1(key.encode()).hexdigest()[:16]
+    cache_file_path = source_cache_folder_path / f"{file_path.parent.name}_{file_path.stem}_{key_hash}.npz"
+
+    if cache_file_path.exists():
+        try:
+            with numpy.load(file=cache_file_path, allow_pickle=False) as cached_arrays:
+                return {name: cached_arrays[name] for name in cached_arrays.files}
+        except (OSError, ValueError, zipfile.BadZipFile):
+            pass  # Such as a partially copied cache folder; simply parse the source again
+
+    arrays = encode(file_path)
+    if arrays is None:
+        return None
+
+    # Written to a temporary file first so that concurrent conversions never see a partial entry
+    source_cache_folder_path.mkdir(parents=True, exist_ok=True)
+    temporary_file_path = cache_file_path.with_name(f"{cache_file_path.stem}_{os.getpid()}.tmp.npz")
+    numpy.savez(temporary_file_path, **arrays)
+    os.replace(src=temporary_file_path, dst=cache_file_path)
+
+    return arrays
+
+
+def _encode_table(file_path: pathlib.Path) -> dict[str, numpy.ndarray] | None:
+    table = pandas.read_table(filepath_or_buffer=file_path, index_col=False)
+
+    arrays = dict(header=numpy.array(json.dumps(obj=dict(columns=[str(name) for name in table.columns]))))
+    for index, column_name in enumerate(table.columns):
+        column = table[column_name].to_numpy()
+        if column.dtype != object:
+            arrays[f"column_{index}"] = column
+            continue
+
+        # Columns of text hold strings, with NaN for missing values; anything else is left to pandas
+        is_missing = pandas.isna(column)
+        if not all(isinstance(value, str) for value in column[~is_missing]):
+            return None
+        arrays[f"column_{index}"] = numpy.where(is_missing, "", column).astype(str)
+        if is_missing.any():
+            arrays[f"missing_{index}"] = is_missing
+    return arrays
+
+
+def _encode_json(file_path: pathlib.Path) -> dict[str, numpy.ndarray]:
+    with open(file=file_path, mode="r") as io:
+        content = json.load(fp=io)
+
+    entries = list()
+    arrays = dict()
+    for index, (key, value) in enumerate(content.items()):
+        values = _as_homogeneous_array(value) if isinstance(value, list) else None
+        if values is not None:
+            entries.append(dict(key=key, kind="array"))
+            arrays[f"values_{index}"] = values
+            continue
+
+        is_nested = isinstance(value, list) and all(isinstance(sub_value, list) for sub_value in value)
+        lengths = [len(sub_value) for sub_value in value] if is_nested else list()
+        values = _as_homogeneous_array([item for sub_value in value for item in sub_value]) if is_nested else None
+        if values is not None and len(set(lengths)) == 1:
+            entries.append(dict(key=key, kind="array"))
+            arrays[f"values_{index}"] = values.reshape(len(lengths), lengths[0])
+        elif values is not None:
+            entries.append(dict(key=key, kind="ragged"))
+            arrays[f"values_{index}"] = values
+            arrays[f"lengths_{index}"] = numpy.array(lengths, dtype="int64")
+        else:
+            entries.append(dict(key=key, kind="json", value=value))
+
+    arrays["header"] = numpy.array(json.dumps(obj=dict(entries=entries)))
+    return arrays
+
+
+def _as_homogeneous_array(values: list) -> numpy.ndarray | None:
+    """Convert a flat list to an array only if doing so loses nothing, such as the distinction of ints and floats."""
+    value_types = set(type(value) for value in values)
+    if len(value_types) == 0:
+        return None
+    if value_types == {str}:
+        return numpy.array(values, dtype=str)
+    if value_types == {bool}:
+        return numpy.array(values, dtype=bool)
+    if value_types == {int}:
+        return numpy.array(values, dtype="int64")
+    if value_types == {float}:
+        return numpy.array(values, dtype="float64")
+    return None
+
+
+def _read_signal(*, file_path: pathlib.Path) -> types.SimpleNamespace:
+    with open(file=file_path, mode="rb") as io:
+        signal = pickle.load(file=io)
+
+    return types.SimpleNamespace(
+        data=numpy.asarray(signal.data),
+        info=signal.info,
+        nan_interpolated=bool(getattr(signal, "nan_interpolated", False)),
+        nan_mask=numpy.asarray(signal.nan_mask) if getattr(signal, "nan_mask", None) is not None else None,
+    )
+
+
+def _encode_signal(file_path: pathlib.Path) -> dict[str, numpy.ndarray] | None:
+    signal = _read_signal(file_path=file_path)
+
+    # The info is held as JSON, which only holds the plain values of a JSON document as they are
+    if not _is_plain_json(signal.info):
+        return None
+
+    arrays = dict(
+        data=signal.data,
+        info=numpy.array(json.dumps(obj=signal.info)),
+        nan_interpolated=numpy.array(signal.nan_interpolated),
+    )
+    if signal.nan_mask is not None:
+        arrays["nan_mask"] = signal.nan_mask
+    return arrays
+
+
+def _is_plain_json(value) -> bool:
+    """Whether the value is made only of the types that JSON restores exactly (so not tuples or NumPy scalars)."""
+    if value is None or type(value) in (str, int, float, bool):
+        return True
+    if type(value) is list:
+        return all(_is_plain_json(item) for item in value)
+    if type(value) is dict:
+        return all(type(key) is str and _is_plain_json(item) for key, item in value.items())
+    return False
@@ -0,0 +1,257 @@
+"""Consistency checks of the parsed sources of a session, shared by the interfaces and `preflight_dataset`."""
+
+import json
+import pathlib
+import types
+import warnings
+
+import numpy
+import pandas
+
+from ._box_utils import _calculate_box_offsets
+
+BOX_SHAPE_FILE_PATH = pathlib.Path(__file__).parent.parent / "session_to_box_shape.json"
+
+# As expected by the `PumpProbeSegmentationInterface`
+EXPECTED_MASK_TYPE_INFO = (
+    {"method": "box", "version": "v1.0"},  # Seen in earlier; usually .dirty; might still produce similar boxes
+    {"method": "box", "version": "1.5"},  # The gold standard example; from the Fig. 1 data
+    {"method": "weightedMask", "version": "1.5"},  # Note however that the full mask is unavailable
+)
+
+
+def raise_for_issues(*, issues: list[tuple[str, str]]) -> None:
+    """
+    Raise the errors found by any of the checks as a single ValueError, after warning of the other issues.
+
+    Each check returns its issues as a list of (severity, message), the severity being either "error" or "warning".
+    """
+    for severity, message in issues:
+        if severity == "warning":
+            warnings.warn(message=message, stacklevel=3)
+
+    error_messages = [message for severity, message in issues if severity == "error"]
+    if len(error_messages) != 0:
+        message = "\n".join(error_messages)
+        raise ValueError(message)
+
+
+def load_box_shape_mapping() -> dict[str, list[int]]:
+    """Load the shape of the box masks of each session, keyed by the name of its folder."""
+    with open(file=BOX_SHAPE_FILE_PATH, mode="r") as io:
+        return json.load(fp=io)
+
+
+def check_box_shape(
+    *, box_shape_mapping: dict[str, list[int]], folder_name: str, validate_shape: bool = True
+) -> list[tuple[str, str]]:
+    """Check that a box shape is specified for the session (and, if `validate_shape`, that it is usable)."""
+    if folder_name not in box_shape_mapping:
+        return [("error", f"No box shape is specified for '{folder_name}' in 'session_to_box_shape.json'!")]
+    if not validate_shape:
+        return list()
+
+    try:
+        _calculate_box_offsets(box_shape=tuple(box_shape_mapping[folder_name]))
+    except ValueError as exception:
+        return [("error", str(exception))]
+
+    return list()
+
+
+def check_pump_probe_frames(
+    *, sync_table: pandas.DataFrame, timestamps_table: pandas.DataFrame, number_of_frames_in_file: int
+) -> list[tuple[str, str]]:
+    """Check that every timestamped frame has a depth and is held by the '.dat' file."""
+    issues = list()
+    number_of_frames = timestamps_table.shape[0]
+
+    frame_count_delay = int(timestamps_table["frameCount"][0] - sync_table["Frame index"][0])
+    if frame_count_delay < 0:
+        message = "The 'framesDetails.txt' file starts before the 'other-frameSynchronous.txt' file!"
+        issues.append(("error", message))
+    elif frame_count_delay + number_of_frames > sync_table.shape[0]:
+        message = (
+            f"The 'other-frameSynchronous.txt' file only has {sync_table.shape[0] - frame_count_delay} depths after "
+            f"the first frame of the 'framesDetails.txt' file, which has {number_of_frames} timestamps!"
+        )
+        issues.append(("error", message))
+
+    if number_of_frames_in_file < number_of_frames:
+        message = (
+            f"The 'sCMOS_Frames_U16_1024x512.dat' file only holds {number_of_frames_in_file} frames, "
+            f"but the 'framesDetails.txt' file has {number_of_frames} timestamps!"
+        )
+        issues.append(("error", message))
+
+    return issues
+
+
+def check_pump_probe_brains_summary(
+    *, brains_summary: dict[str, numpy.ndarray], number_of_timestamps: int
+) -> list[tuple[str, str]]:
+    """Check that the 'brains.json' file has a single labeled volume, and volumes within the timestamped frames."""
+    issues = list()
+
+    labeled_volume_indices = brains_summary["labeled_volume_indices"]
+    if len(labeled_volume_indices) != 1:
+        message = f"Expected exactly one labeled frame in the 'brains.json' file, found {len(labeled_volume_indices)}!"
+        issues.append(("error", message))
+
+    number_of_volume_frames = int(brains_summary["frames_per_volume"].sum())
+    if number_of_volume_frames > number_of_timestamps:
+        message = (
+            f"The volumes of the 'brains.json' file span {number_of_volume_frames} frames, but the "
+            f"'framesDetails.txt' file only has {number_of_timestamps} timestamps; the last volumes would have "
+            "NaN timestamps!"
+        )
+        issues.append(("warning", message))
+
+    return issues
+
+
+def check_pump_probe_signal(
+    *, signal: types.SimpleNamespace, signal_file_name: str, brains_summary: dict[str, numpy.ndarray]
+) -> list[tuple[str, str]]:
+    """Check that a signal (such as 'green.pickle') has a known mask type and matches the 'brains.json' file."""
+    issues = list()
+
+    # Ignore ref_index from the mask info since that varies quite a bit (it's the frame index used for labels)
+    # And strip extra version attachments
+    mask_type_info = {key: signal.info.get(key) for key in ["method", "version"]}
+    mask_type_info["version"] = str(mask_type_info["version"]).split("-")[0]
+    if mask_type_info not in EXPECTED_MASK_TYPE_INFO:
+        message = (
+            f"Unimplemented mask type {mask_type_info} in the '{signal_file_name}' file! "
+            "Please raise an issue to have the new mask type incorporated."
+        )
+        issues.append(("error", message))
+
+    frames_per_volume = brains_summary["frames_per_volume"]
+    number_of_volumes = signal.data.shape[0]
+    if len(frames_per_volume) > number_of_volumes:
+        message = (
+            f"The 'brains.json' file has {len(frames_per_volume)} volumes, but the '{signal_file_name}' file only "
+            f"has {number_of_volumes}!"
+        )
+        issues.append(("error", message))
+    elif len(frames_per_volume) < number_of_volumes:
+        message = (
+            f"The '{signal_file_name}' file has {number_of_volumes} volumes, but the 'brains.json' file only has "
+            f"{len(frames_per_volume)}; the timestamps of the last volumes would be undefined!"
+        )
+        issues.append(("warning", message))
+
+    if signal.nan_interpolated and signal.nan_mask is None:
+        issues.append(("error", f"The '{signal_file_name}' file is NaN-interpolated but has no NaN mask!"))
+
+    labeled_volume_indices = brains_summary["labeled_volume_indices"]
+    if len(labeled_volume_indices) != 1:
+        return issues  # Reported by `check_pump_probe_brains_summary`
+
+    # Check for possible file mismatches based on recorded metadata
+    labeled_volume_index = int(labeled_volume_indices[0])
+    if signal.info.get("ref_index") != labeled_volume_index:
+        message = (
+            f"Mismatch in the labeled frame index between the '{signal_file_name}' "
+            f"({signal.info.get('ref_index')}) and 'brains.json' ({labeled_volume_index}) files!"
+        )
+        issues.append(("error", message))
+
+    # There are coords for each 'nInVolume', but only the ones for the span of the labeled frames are used
+    number_of_rois_from_signal = signal.data.shape[1]
+    number_of_rois_from_brains = int(brains_summary["nInVolume"][labeled_volume_index])
+    if number_of_rois_from_signal != number_of_rois_from_brains:
+        message = (
+            f"Mismatch in the number of ROIs between the '{signal_file_name}' ({number_of_rois_from_signal}) and "
+            f"'brains.json' ({number_of_rois_from_brains}) files!"
+        )
+        issues.append(("error", message))
+
+    return issues
+
+
+def check_neuropal_brains(*, brains_info: dict) -> list[tuple[str, str]]:
+    """Check the homogeneity of the fields of a NeuroPAL 'brains.json' file."""
+    if len(brains_info["nInVolume"]) != 1:
+        return [("error", "Only one labeling is supported.")]
+
+    lengths = [
+        len(brains_info[key]) for key in ("nInVolume", "zOfFrame", "labels", "labels_confidences", "labels_comments")
+    ]
+    if len(set(lengths)) != 1:
+        return [("error", "Mismatch in JSON substructure lengths.")]
+
+    number_of_rois = brains_info["nInVolume"][0]
+    if any(len(brains_info[key][0]) != number_of_rois for key in ("labels", "labels_confidences", "labels_comments")):
+        return [("error", "Length of contents does not match number of ROIs.")]
+
+    return list()
+
+
+def check_neuropal_volume(
+    *, brains_info: dict, number_of_depths: int, dat_file_size_in_bytes: int, volume_size_in_bytes: int
+) -> list[tuple[str, str]]:
+    """Check that the NeuroPAL 'brains.json' file has a depth per frame, and that the '.dat' file holds a volume."""
+    issues = list()
+
+    if len(brains_info.get("zOfFrame", [])) != 0 and len(brains_info["zOfFrame"][0]) != number_of_depths:
+        message = (
+            f"Mismatch between length of 'zOfFrame' ({len(brains_info['zOfFrame'][0])}) and number of depths "
+            f"({number_of_depths})."
+        )
+        issues.append(("error", message))
+
+    if dat_file_size_in_bytes < volume_size_in_bytes:
+        message = (
+            f"The 'frames-2048x2048.dat' file holds {dat_file_size_in_bytes} bytes, fewer than the "
+            f"{volume_size_in_bytes} of a full volume!"
+        )
+        issues.append(("error", message))
+
+    return issues
+
+
+def check_neuropal_coordinates(*, brains_info: dict) -> list[tuple[str, str]]:
+    """Check that the NeuroPAL 'brains.json' file has the coordinates of every ROI."""
+    if len(brains_info.get("nInVolume", [])) != 0 and len(brains_info["coordZYX"]) < brains_info["nInVolume"][0]:
+        message = (
+            f"The 'brains.json' file has only {len(brains_info['coordZYX'])} coordinates for "
+            f"{brains_info['nInVolume'][0]} ROIs!"
+        )
+        return [("error", message)]
+
+    return list()
+
+
+def check_optogenetic_stimulation(
+    *,
+    stimulus_table: pandas.DataFrame,
+    timestamps_table: pandas.DataFrame,
+    target_ids_table: pandas.DataFrame,
+) -> list[tuple[str, str]]:
+    """Check that every stimulus of the 'pharosTriggers.txt' file is within the frames and has its own target."""
+    issues = list()
+
+    missing_columns = {"frameCount", "optogTargetX", "optogTargetY", "optogTargetZ"} - set(stimulus_table.columns)
+    if len(missing_columns) != 0:
+        return [("error", f"The 'pharosTriggers.txt' file is missing the columns {sorted(missing_columns)}!")]
+
+    frame_indices = stimulus_table["frameCount"].to_numpy() - timestamps_table["frameCount"][0]
+    number_of_out_of_range_stimuli = int(((frame_indices < 0) | (frame_indices >= timestamps_table.shape[0])).sum())
+    if number_of_out_of_range_stimuli != 0:
+        message = (
+            f"{number_of_out_of_range_stimuli} stimuli of the 'pharosTriggers.txt' file are outside of the frames of "
+            "the 'framesDetails.txt' file!"
+        )
+        issues.append(("error", message))
+
+    # Each stimulus has its own manually located target, in the same order
+    if target_ids_table.shape[0] != stimulus_table.shape[0]:
+        message = (
+            f"The number of targets in the 'targets_manually_located.txt' file ({target_ids_table.shape[0]}) does not "
+            f"match the number of stimuli in the 'pharosTriggers.txt' file ({stimulus_table.shape[0]})!"
+        )
+        issues.append(("error", message))
+
+    return issues
@@ -0,0 +1,192 @@
+"""Projections of each volume of the PumpProbe scan, computed from the raw frames as they are read for writing."""
+
+import collections
+import threading
+
+import h5py
+import numpy
+
+from ._instrumentation import get_current_interface_name, measure_stage
+
+
+class VolumeProjectionAccumulator:
+    """
+    Reduce the frames of each volume (scan cycle) of a single channel to their maximum and mean over depth.
+
+    The frames are added in order, a range at a time, as they are read for writing the raw data (such as by a
+    `PumpProbeChannelDataChunkIterator`), so the projections cost no additional read of the source. Only the volumes
+    still open are accumulated; each volume is queued once its last frame is added, until it is taken by
+    `pop_completed_volumes`. Only the volumes that end within the `number_of_frames` are projected.
+
+    Frames may be added from another thread than the one taking the completed volumes.
+    """
+
+    def __init__(
+        self,
+        *,
+        frames_per_volume: numpy.ndarray,
+        number_of_frames: int,
+        frame_shape: tuple[int, int],
+        dtype: numpy.dtype,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        frames_per_volume : numpy.ndarray
+            The number of frames in each consecutive volume, from the first frame; see `get_frames_per_volume`.
+        number_of_frames : int
+            The number of frames that will be added.
+        frame_shape : tuple of two ints
+            The shape of each frame of the channel.
+        dtype : numpy.dtype
+            The data type of the frames, which is also that of the maximum projections.
+        """
+        frames_per_volume = numpy.asarray(frames_per_volume, dtype="int64")
+        volume_end_frames = numpy.cumsum(frames_per_volume)
+        volume_start_frames = volume_end_frames - frames_per_volume
+
+        # Empty volumes have no projection
+        is_projected = (frames_per_volume > 0) & (volume_end_frames <= number_of_frames)
+        self.volume_start_frames = volume_start_frames[is_projected]
+        self.volume_end_frames = volume_end_frames[is_projected]
+
+        self.number_of_frames = number_of_frames
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = numpy.dtype(dtype)
+
+        self.number_of_added_frames = 0
+        self._volume_index = 0
+        self._maximum = None
+        self._sum = None
+        self._completed_volumes = collections.deque()
+        self._lock = threading.Lock()
+
+    @property
+    def number_of_volumes(self) -> int:
+        return self.volume_start_frames.shape[0]
+
+    @property
+    def is_complete(self) -> bool:
+        """Whether every frame has been added and every volume taken."""
+        with self._lock:
+            return self.number_of_added_frames >= self.number_of_frames and len(self._completed_volumes) == 0
+
+    def add_frames(self, *, start: int, frames: numpy.ndarray) -> None:
+        """
+        Add the consecutive frames from the `start` frame on.
+
+        Frames that were already added (such as those of a range read again) are skipped.
+        """
+        with self._lock:
+            if start > self.number_of_added_frames:
+                message = (
+                    f"The frames of the volume projections must be added in order, but frame {start} was added after "
+                    f"the first {self.number_of_added_frames} frames!"
+                )
+                raise ValueError(message)
+
+            stop = start + frames.shape[0]
+            if stop <= self.number_of_added_frames:
+                return
+            frames = frames[self.number_of_added_frames - start :]
+            start = self.number_of_added_frames
+            self.number_of_added_frames = stop
+
+            while self._volume_index < self.number_of_volumes:
+                volume_start = self.volume_start_frames[self._volume_index]
+                volume_end = self.volume_end_frames[self._volume_index]
+                if volume_start >= stop:
+                    break
+
+                volume_frames = frames[max(volume_start, start) - start : min(volume_end, stop) - start]
+                if volume_frames.shape[0] != 0:
+                    self._add_volume_frames(volume_frames=volume_frames)
+                if volume_end > stop:
+                    break
+
+                mean = (self._sum / (volume_end - volume_start)).astype("float32")
+                self._completed_volumes.append((self._volume_index, self._maximum, mean))
+                self._volume_index += 1
+                self._maximum = None
+                self._sum = None
+
+    def pop_completed_volumes(self) -> list[tuple[int, numpy.ndarray, numpy.ndarray]]:
+        """Take the index, maximum projection, and mean projection of each volume completed since the last call."""
+        with self._lock:
+            completed_volumes = list(self._completed_volumes)
+            self._completed_volumes.clear()
+
+        return completed_volumes
+
+    def _add_volume_frames(self, *, volume_frames: numpy.ndarray) -> None:
+        maximum = volume_frames.max(axis=0)
+        total = volume_frames.sum(axis=0, dtype="float64")
+        if self._maximum is None:
+            self._maximum = maximum
+            self._sum = total
+        else:
+            numpy.maximum(self._maximum, maximum, out=self._maximum)
+            self._sum += total
+
+
+class VolumeProjectionWriter:
+    """
+    Fill the placeholder datasets of the volume projections of an HDF5 file as the volumes are completed.
+
+    The volumes are completed while the raw data is read for writing, which must happen after the file is written,
+    through a `DirectChunkDatasetWriter` that takes turns with this one; each turn writes the volumes completed since
+    the previous one. Only the open and completed volumes are ever held in memory.
+    """
+
+    def __init__(
+        self,
+        *,
+        maximum_dataset_path: str,
+        mean_dataset_path: str,
+        accumulator: VolumeProjectionAccumulator,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        maximum_dataset_path : str
+            The location of the placeholder dataset of the maximum projections within the HDF5 file, such as
+            '/processing/ophys/PumpProbeMaximumProjectionGreen/data'.
+        mean_dataset_path : str
+            The location of the placeholder dataset of the mean projections.
+        accumulator : VolumeProjectionAccumulator
+            The accumulator added to as the raw data is read.
+        """
+        self.maximum_dataset_path = maximum_dataset_path
+        self.mean_dataset_path = mean_dataset_path
+        self.accumulator = accumulator
+
+        # Created within the `add_to_nwbfile` of an interface, but run after the file is written
+        self.interface_name = get_current_interface_name()
+
+    def write(self, *, file: h5py.File) -> None:
+        for _ in self.iter_write(file=file):
+            pass
+
+    def iter_write(self, *, file: h5py.File):
+        """Write the volumes completed since the previous turn, yielding after each turn until all are written."""
+        maximum_dataset = file[self.maximum_dataset_path]
+        mean_dataset = file[self.mean_dataset_path]
+
+        while True:
+            # Checked before taking the volumes, so that none completed in between are left behind
+            is_complete = self.accumulator.is_complete
+            completed_volumes = self.accumulator.pop_completed_volumes()
+
+            if len(completed_volumes) != 0:
+                with measure_stage(stage="volume_projection_write", interface_name=self.interface_name):
+                    # The volumes are completed in order, so those of a single turn are consecutive
+                    start = completed_volumes[0][0]
+                    stop = completed_volumes[-1][0] + 1
+                    maximum_dataset[start:stop] = numpy.stack([maximum for _, maximum, _ in completed_volumes])
+                    mean_dataset[start:stop] = numpy.stack([mean for _, _, mean in completed_volumes])
+
+            if is_complete:
+                return
+
+            # Every frame is added by the time the raw data has been written, which then completes the projections
+            yield
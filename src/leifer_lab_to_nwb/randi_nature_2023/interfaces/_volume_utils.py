@@ -0,0 +1,80 @@
+"""Helpers for relating the individual frames of the PumpProbe scan to the volumes (scan cycles) they belong to."""
+
+import numpy
+
+
+def get_frames_per_volume_from_depths(depth_per_frame: numpy.ndarray) -> numpy.ndarray:
+    """
+    Infer the number of frames in each volume by splitting the frames at every reversal of the scan direction.
+
+    Only used when the volumes are not otherwise specified by the 'zOfFrame' field of the 'brains.json' file.
+    """
+    depth_per_frame = numpy.asarray(depth_per_frame)
+    if depth_per_frame.shape[0] < 2:
+        return numpy.array([depth_per_frame.shape[0]], dtype="int64")
+
+    # Frames without any change in depth carry the direction of the previous one
+    directions = numpy.sign(numpy.diff(depth_per_frame))
+    nonzero_indices = numpy.flatnonzero(directions)
+    if len(nonzero_indices) == 0:
+        return numpy.array([depth_per_frame.shape[0]], dtype="int64")
+    carried_indices = numpy.maximum.accumulate(
+        numpy.where(directions != 0, numpy.arange(directions.shape[0]), nonzero_indices[0])
+    )
+    directions = directions[carried_indices]
+
+    # The i-th direction spans frames i to i + 1, so a new volume starts at the second frame of a reversal
+    volume_start_frames = numpy.concatenate(([0], numpy.flatnonzero(directions[1:] != directions[:-1]) + 1))
+    volume_end_frames = numpy.concatenate((volume_start_frames[1:], [depth_per_frame.shape[0]]))
+    return volume_end_frames - volume_start_frames
+
+
+def calculate_volume_aligned_chunk_length(
+    *, frames_per_volume: numpy.ndarray, maximum_chunk_length: int, chunk_overhead_in_frames: float | None = None
+) -> int:
+    """
+    Choose the length of the chunks along time that minimizes the cost of reading each volume one at a time.
+
+    The cost of reading a volume is the number of frames in all the chunks it touches, plus a fixed overhead for each
+    of those chunks. When all volumes have the same number of frames, this is minimized by chunks of exactly one volume.
+
+    HDF5 chunks all have the same length, so when the volumes vary in length (as real scan cycles do), the chunks
+    cannot line up with every volume; most volumes then span two chunks of about a volume each. The default overhead,
+    of about a volume, is what keeps the chunks from shrinking to a few frames to follow the volumes more closely,
+    which would have each volume touch many more chunks.
+
+    Parameters
+    ----------
+    frames_per_volume : numpy.ndarray
+        The number of frames in each consecutive volume.
+    maximum_chunk_length : int
+        The largest number of frames allowed in a single chunk.
+    chunk_overhead_in_frames : float, optional
+        The fixed cost of reading any chunk, in units of the cost of reading a single frame.
+        The default is the mean number of frames in a volume.
+    """
+    frames_per_volume = numpy.asarray(frames_per_volume, dtype="int64")
+    volume_end_frames = numpy.cumsum(frames_per_volume)
+    volume_start_frames = volume_end_frames - frames_per_volume
+
+    # Empty volumes do not need to be read
+    volume_start_frames = volume_start_frames[frames_per_volume > 0]
+    volume_end_frames = volume_end_frames[frames_per_volume > 0]
+    if len(volume_start_frames) == 0:
+        return max(maximum_chunk_length, 1)
+
+    if chunk_overhead_in_frames is None:
+        chunk_overhead_in_frames = float(numpy.mean(volume_end_frames - volume_start_frames))
+
+    best_chunk_length = 1
+    lowest_cost = numpy.inf
+    for chunk_length in range(1, max(maximum_chunk_length, 1) + 1):
+        number_of_chunks_touched = (volume_end_frames - 1) // chunk_length - volume_start_frames // chunk_length + 1
+        cost = numpy.sum(number_of_chunks_touched * (chunk_length + chunk_overhead_in_frames))
+
+        # Ties favor the larger chunks, which are fewer in total
+        if cost <= lowest_cost:
+            best_chunk_length = chunk_length
+            lowest_cost = cost
+
+    return best_chunk_length